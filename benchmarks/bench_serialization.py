@@ -0,0 +1,113 @@
+"""
+Microbenchmark for memory search response serialization
+
+Compares the cost of turning a list of Memory.to_dict() results into response
+bytes through FastAPI's response_model path (Pydantic validation, dump and the
+standard JSON encoder) against FastJSONResponse, with and without metadata.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_serialization --rows 50 --iterations 2000
+"""
+import argparse
+import json
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+from pydantic import TypeAdapter
+
+from src.backend.api.memory_api import MemoryResponse
+from src.backend.api.responses import FastJSONResponse
+from src.backend.services.memory_tagger_service import EMOTIONS, TOPICS, TRAITS
+
+
+def build_rows(count: int, include_metadata: bool = True, seed: int = 42) -> List[Dict]:
+    """
+    Build memory dictionaries shaped like MemoryService search results
+
+    Args:
+        count: Number of rows to build
+        include_metadata: Whether rows carry the metadata field
+        seed: Random seed so runs are comparable
+
+    Returns:
+        List of memory dictionaries with similarity scores
+    """
+    rng = random.Random(seed)
+    now = datetime(2024, 1, 1)
+    rows = []
+    for i in range(count):
+        row = {
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "dopple_id": "dopple-bench",
+            "user_id": f"user-{i % 7}",
+            "text": " ".join(rng.choice(TOPICS) for _ in range(40)),
+            "role": rng.choice(["user", "dopple"]),
+            "timestamp": (now - timedelta(minutes=i)).isoformat(),
+            "importance": rng.randint(1, 10),
+            "emotions": rng.sample(EMOTIONS, 2),
+            "topics": rng.sample(TOPICS, 3),
+            "traits": rng.sample(TRAITS, 2),
+        }
+        if include_metadata:
+            row["metadata"] = {
+                "conversation_id": str(uuid.UUID(int=rng.getrandbits(128))),
+                "source": "chat",
+                "tokens": [rng.randint(0, 50000) for _ in range(32)],
+            }
+        row["similarity"] = rng.random()
+        rows.append(row)
+    return rows
+
+
+def time_per_call(fn: Callable[[], bytes], iterations: int) -> float:
+    """Return the mean wall time of fn in microseconds"""
+    fn()  # Warm up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50, help="Rows per response")
+    parser.add_argument("--iterations", type=int, default=2000, help="Responses to serialize per case")
+    args = parser.parse_args()
+
+    adapter = TypeAdapter(List[MemoryResponse])
+    rows = build_rows(args.rows)
+    rows_without_metadata = build_rows(args.rows, include_metadata=False)
+
+    def response_model_path() -> bytes:
+        # What FastAPI does for a plain return value with response_model set
+        validated = adapter.validate_python(rows)
+        content = adapter.dump_python(validated, mode="json")
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+    fast_response = FastJSONResponse(None)
+
+    cases = {
+        "response_model": response_model_path,
+        "fast_json": lambda: fast_response.render(rows),
+        "fast_json_no_metadata": lambda: fast_response.render(rows_without_metadata),
+    }
+
+    results = {"rows": args.rows, "iterations": args.iterations, "cases": {}}
+    baseline = None
+    for name, fn in cases.items():
+        micros = time_per_call(fn, args.iterations)
+        baseline = baseline or micros
+        results["cases"][name] = {
+            "us_per_response": round(micros, 2),
+            "bytes": len(fn()),
+            "speedup": round(baseline / micros, 2),
+        }
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Compare two benchmark result files and flag regressions
+
+Usage (from the repository root):
+    python -m benchmarks.compare baseline.json candidate.json --tolerance 0.1
+
+Exits with status 1 if any p95 latency grew or throughput fell by more than
+the tolerance.
+"""
+import argparse
+import json
+import sys
+
+
+def compare(baseline, candidate, tolerance):
+    """Yield (size, operation, metric, old, new, change, regressed) rows"""
+    for size, operations in candidate["results"].items():
+        for operation, metrics in operations.items():
+            old = baseline["results"].get(size, {}).get(operation)
+            if not old:
+                continue
+            for metric, higher_is_better in (("p95_ms", False), ("throughput_per_s", True)):
+                if not old.get(metric):
+                    continue
+                change = (metrics[metric] - old[metric]) / old[metric]
+                regressed = change < -tolerance if higher_is_better else change > tolerance
+                yield size, operation, metric, old[metric], metrics[metric], change, regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed relative change (0.1 = 10%%)")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    regressions = 0
+    print(f"{'size':>8} {'operation':<36} {'metric':<18} {'baseline':>12} {'candidate':>12} {'change':>8}")
+    for size, operation, metric, old, new, change, regressed in compare(baseline, candidate, args.tolerance):
+        regressions += regressed
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{size:>8} {operation:<36} {metric:<18} {old:>12.3f} {new:>12.3f} {change:>+7.1%}{flag}")
+
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Deterministic synthetic data for benchmarks
+
+Embeddings are derived from the text itself, so the stub server, the data
+generator and every run agree on the same vectors. Each text mentions one
+topic; texts sharing a topic land near a common centroid (cosine ~0.85),
+which gives similarity searches realistic hit sets above the default 0.7
+threshold.
+"""
+import hashlib
+import random
+import zlib
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+from src.backend.services.memory_tagger_service import EMOTIONS, TOPICS, TRAITS
+
+CENTROID_WEIGHT = 0.7
+NOISE_WEIGHT = 0.3
+
+PHRASES = [
+    "I keep thinking about {topic} lately",
+    "Tell me more about your take on {topic}",
+    "Yesterday we talked about {topic} for hours",
+    "My favourite thing about {topic} is how it surprises me",
+    "Can we go back to the {topic} conversation from before",
+    "I was reading something about {topic} this morning",
+]
+
+
+@lru_cache(maxsize=None)
+def _topic_centroid(topic: str, dim: int) -> np.ndarray:
+    rng = np.random.default_rng(zlib.crc32(topic.encode("utf-8")))
+    vector = rng.standard_normal(dim)
+    return vector / np.linalg.norm(vector)
+
+
+def topic_of(text: str) -> str:
+    """Return the first known topic mentioned in the text (or the first topic)"""
+    lowered = text.lower()
+    for topic in TOPICS:
+        if topic in lowered:
+            return topic
+    return TOPICS[0]
+
+
+def deterministic_embedding(text: str, dim: int) -> List[float]:
+    """
+    Build a unit embedding for a text without calling any API
+
+    Args:
+        text: Text to embed
+        dim: Embedding dimensionality
+
+    Returns:
+        Unit-length embedding as a list of floats
+    """
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    noise = np.random.default_rng(seed).standard_normal(dim)
+    noise /= np.linalg.norm(noise)
+    vector = CENTROID_WEIGHT * _topic_centroid(topic_of(text), dim) + NOISE_WEIGHT * noise
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def dopple_ids(count: int) -> List[str]:
+    return [f"bench-dopple-{i}" for i in range(count)]
+
+
+def user_ids(count: int) -> List[str]:
+    return [f"bench-user-{i}" for i in range(count)]
+
+
+def query_text(rng: random.Random) -> str:
+    """Generate a search query about a random topic"""
+    return rng.choice(PHRASES).format(topic=rng.choice(TOPICS)) + "?"
+
+
+def generate_memories(
+    count: int,
+    dopples: int,
+    users: int,
+    dim: int,
+    seed: int = 0,
+    start_time: Optional[datetime] = None,
+    batch_size: int = 1000
+) -> Iterator[List[Dict]]:
+    """
+    Generate memories in batches ready for MemoryService.store_memories_bulk
+
+    Args:
+        count: Total number of memories
+        dopples: Number of distinct dopples
+        users: Number of distinct users
+        dim: Embedding dimensionality
+        seed: Random seed
+        start_time: Timestamp of the oldest memory (defaults to 90 days before 2024-01-01)
+        batch_size: Memories per yielded batch
+
+    Yields:
+        Lists of memory dictionaries with precomputed embeddings
+    """
+    rng = random.Random(seed)
+    start_time = start_time or datetime(2024, 1, 1) - timedelta(days=90)
+    step = timedelta(days=90) / max(count, 1)
+    dopple_pool = dopple_ids(dopples)
+    user_pool = user_ids(users)
+
+    batch = []
+    for i in range(count):
+        topic = rng.choice(TOPICS)
+        text = f"{rng.choice(PHRASES).format(topic=topic)} (#{i})"
+        batch.append({
+            "text": text,
+            "dopple_id": rng.choice(dopple_pool),
+            "user_id": rng.choice(user_pool),
+            "role": rng.choice(["user", "dopple"]),
+            "emotions": rng.sample(EMOTIONS, 1),
+            "topics": [topic],
+            "traits": rng.sample(TRAITS, 1),
+            "importance": rng.randint(1, 10),
+            "metadata": {"source": "benchmark", "index": i},
+            "timestamp": start_time + step * i,
+            "embedding": deterministic_embedding(text, dim),
+        })
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -0,0 +1,410 @@
+"""
+End-to-end load test of the FastAPI app under concurrent chat traffic
+
+Seeds a database with synthetic memories, starts the OpenAI stub
+(benchmarks.stub_openai) and the app under uvicorn as local subprocesses,
+then drives a weighted mix of requests across many dopples and users with an
+async httpx client:
+
+  store      POST /api/memory/store (tagged through the stub unless --no-auto-tag)
+  similar    POST /api/memory/search/similar
+  metadata   POST /api/memory/search/metadata
+  stats      GET  /api/memory/stats/{dopple_id}
+  context    POST /api/memory/context
+
+By default the load is closed-loop: --concurrency virtual users each send
+their next request as soon as the previous one returns. With --rate, requests
+are started on a fixed schedule instead (at most --concurrency in flight), and
+latency is measured from the scheduled start so queueing delay is included.
+
+Reports throughput, latency percentiles and error rates per route. Results
+are JSON shaped like run_benchmarks output, so two runs can be compared with
+benchmarks.compare.
+
+Usage (from the repository root):
+    python -m benchmarks.load_test --duration 30 --concurrency 32 --stub-latency-ms 80
+    python -m benchmarks.load_test --mix store=2,similar=5,context=3 --rate 50 --workers 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.datasets import dopple_ids, generate_memories, query_text, user_ids
+from benchmarks.run_benchmarks import git_revision
+from benchmarks.timing import summarize
+from src.backend.services.embedding_service import EMBEDDING_DIMENSIONS
+from src.backend.services.memory_tagger_service import TOPICS
+
+OPERATIONS = ("store", "similar", "metadata", "stats", "context")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db-url", help="Database URL (default: a temporary SQLite file)")
+    parser.add_argument("--seed-memories", type=int, default=2000, help="Memories ingested before the run")
+    parser.add_argument("--dopples", type=int, default=20, help="Distinct dopples in the corpus and the traffic")
+    parser.add_argument("--users", type=int, default=200, help="Distinct users in the corpus and the traffic")
+    parser.add_argument("--dim", type=int, default=EMBEDDING_DIMENSIONS, help="Embedding dimensionality")
+    parser.add_argument(
+        "--mix", default="store=4,similar=4,metadata=1,stats=1",
+        help=f"Comma-separated operation=weight pairs; operations: {', '.join(OPERATIONS)}",
+    )
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of measured load")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Seconds of load before measuring")
+    parser.add_argument("--concurrency", type=int, default=16, help="Virtual users, or max requests in flight with --rate")
+    parser.add_argument("--rate", type=float, default=0.0, help="Requests per second on a fixed schedule (0 is closed-loop)")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="Closed-loop pause between a user's requests")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Request timeout in seconds")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=0.7)
+    parser.add_argument("--context-tokens", type=int, default=500, help="Token budget of context requests")
+    parser.add_argument("--no-auto-tag", action="store_true", help="Store without calling the tagger")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--stub-latency-ms", type=float, default=50.0, help="Latency added by the stub API")
+    parser.add_argument("--stub-jitter-ms", type=float, default=20.0)
+    parser.add_argument("--stub-error-rate", type=float, default=0.0, help="Share of stub requests answered with 429")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results JSON to this file instead of stdout")
+    return parser.parse_args()
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """Parse --mix into positive weights per operation"""
+    mix = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise SystemExit(f"Unknown operation {name!r} in --mix; choose from {', '.join(OPERATIONS)}")
+        mix[name] = float(weight or 1)
+    mix = {name: weight for name, weight in mix.items() if weight > 0}
+    if not mix:
+        raise SystemExit("--mix needs at least one operation with a positive weight")
+    return mix
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def seed_database(args):
+    """Recreate the schema and bulk-ingest the corpus the traffic runs against"""
+    # Imported here: the engine reads DATABASE_URL at import time
+    from src.backend.db.database import Base, engine, init_db, seed_metadata
+    from src.backend.services.memory_service import MemoryService
+
+    Base.metadata.drop_all(bind=engine)
+    init_db()
+    seed_metadata()
+    for batch in generate_memories(args.seed_memories, args.dopples, args.users, args.dim, seed=args.seed):
+        MemoryService.store_memories_bulk(batch, generate_embeddings=False, deduplicate=False)
+    engine.dispose()
+
+
+def start_process(command: List[str], env: Dict[str, str], log_path: str) -> subprocess.Popen:
+    log = open(log_path, "ab")
+    return subprocess.Popen(command, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def wait_until_up(url: str, process: subprocess.Popen, log_path: str, timeout: float = 60.0, ok=(200,)):
+    """Poll url until it answers with one of the ok statuses"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            with open(log_path, errors="replace") as f:
+                tail = f.read()[-2000:]
+            raise SystemExit(f"{' '.join(process.args)} exited with {process.returncode}:\n{tail}")
+        try:
+            if httpx.get(url, timeout=1.0).status_code in ok:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit(f"{url} did not come up within {timeout:.0f}s (see {log_path})")
+
+
+def stop_process(process: Optional[subprocess.Popen]):
+    if process is None or process.poll() is not None:
+        return
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+class TrafficGenerator:
+    """Builds requests for the configured mix and records their outcomes per route"""
+
+    def __init__(self, args, mix: Dict[str, float]):
+        self.args = args
+        self.operations = list(mix)
+        self.weights = list(mix.values())
+        self.dopples = dopple_ids(args.dopples)
+        self.users = user_ids(args.users)
+        self.rng = random.Random(args.seed)
+        self.measuring = False
+        self.latencies: Dict[str, List[float]] = {}
+        self.statuses: Dict[str, Dict[str, int]] = {}
+        self.sequence = 0
+
+    def next_request(self) -> Tuple[str, str, str, Optional[dict], Optional[dict]]:
+        """Pick an operation and build (route, method, url, json, params) for it"""
+        rng = self.rng
+        operation = rng.choices(self.operations, self.weights)[0]
+        dopple_id = rng.choice(self.dopples)
+        user_id = rng.choice(self.users)
+        if operation == "store":
+            self.sequence += 1
+            body = {
+                "text": f"{query_text(rng)} (load #{self.sequence})",
+                "dopple_id": dopple_id,
+                "user_id": user_id,
+                "role": rng.choice(["user", "dopple"]),
+                "auto_tag": not self.args.no_auto_tag,
+            }
+            return "POST /api/memory/store", "POST", "/api/memory/store", body, None
+        if operation == "similar":
+            body = {
+                "text": query_text(rng),
+                "dopple_id": dopple_id,
+                # Half the searches span the whole dopple, like recalling across users
+                "user_id": user_id if rng.random() < 0.5 else None,
+                "top_k": self.args.top_k,
+                "similarity_threshold": self.args.threshold,
+                "include_metadata": False,
+            }
+            return "POST /api/memory/search/similar", "POST", "/api/memory/search/similar", body, None
+        if operation == "metadata":
+            body = {"dopple_id": dopple_id, "topics": [rng.choice(TOPICS)], "limit": 20, "include_metadata": False}
+            return "POST /api/memory/search/metadata", "POST", "/api/memory/search/metadata", body, None
+        if operation == "stats":
+            params = {"user_id": user_id} if rng.random() < 0.5 else None
+            return "GET /api/memory/stats/{dopple_id}", "GET", f"/api/memory/stats/{dopple_id}", None, params
+        body = {
+            "text": query_text(rng),
+            "dopple_id": dopple_id,
+            "user_id": user_id,
+            "max_tokens": self.args.context_tokens,
+            "similarity_threshold": self.args.threshold,
+        }
+        return "POST /api/memory/context", "POST", "/api/memory/context", body, None
+
+    async def send(self, client: httpx.AsyncClient, started: Optional[float] = None):
+        """Send one request; latency runs from started (its scheduled time) when given"""
+        route, method, url, body, params = self.next_request()
+        started = time.perf_counter() if started is None else started
+        try:
+            response = await client.request(method, url, json=body, params=params)
+            outcome = str(response.status_code)
+        except httpx.TimeoutException:
+            outcome = "timeout"
+        except httpx.HTTPError as e:
+            outcome = type(e).__name__
+        latency = time.perf_counter() - started
+        if not self.measuring:
+            return
+        statuses = self.statuses.setdefault(route, {})
+        statuses[outcome] = statuses.get(outcome, 0) + 1
+        # Timeouts and connection failures have no meaningful latency
+        if outcome.isdigit():
+            self.latencies.setdefault(route, []).append(latency)
+
+    def report(self, elapsed: float) -> Dict[str, Dict]:
+        results = {}
+        for route in sorted(self.statuses):
+            results[route] = self._summary(self.latencies.get(route, []), self.statuses[route], elapsed)
+        results["all"] = self._summary(
+            [latency for latencies in self.latencies.values() for latency in latencies],
+            self._merged_statuses(),
+            elapsed,
+        )
+        return results
+
+    @staticmethod
+    def _summary(latencies: List[float], statuses: Dict[str, int], elapsed: float) -> Dict:
+        requests = sum(statuses.values())
+        errors = sum(count for outcome, count in statuses.items() if not (outcome.isdigit() and int(outcome) < 400))
+        summary = summarize(latencies, elapsed, items=requests)
+        summary.update(
+            requests=requests,
+            errors=errors,
+            error_rate=round(errors / requests, 4) if requests else 0.0,
+            statuses=dict(sorted(statuses.items())),
+        )
+        return summary
+
+    def _merged_statuses(self) -> Dict[str, int]:
+        merged: Dict[str, int] = {}
+        for statuses in self.statuses.values():
+            for outcome, count in statuses.items():
+                merged[outcome] = merged.get(outcome, 0) + count
+        return merged
+
+
+async def closed_loop(traffic: TrafficGenerator, client: httpx.AsyncClient, stop_at: float, think: float):
+    while time.perf_counter() < stop_at:
+        await traffic.send(client)
+        if think > 0:
+            await asyncio.sleep(think)
+
+
+async def open_loop(traffic: TrafficGenerator, client: httpx.AsyncClient, stop_at: float, rate: float, limit: int):
+    """Start requests on a fixed schedule; once limit are in flight, later ones queue and their latency grows"""
+    slots = asyncio.Semaphore(limit)
+    tasks = set()
+
+    async def scheduled(started: float):
+        async with slots:
+            await traffic.send(client, started)
+
+    interval = 1.0 / rate
+    next_start = time.perf_counter()
+    while next_start < stop_at:
+        delay = next_start - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        task = asyncio.create_task(scheduled(next_start))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        next_start += interval
+    if tasks:
+        await asyncio.gather(*tasks)
+
+
+async def drive(args, base_url: str, traffic: TrafficGenerator) -> float:
+    """Run the warm-up and the measured load; returns the measured wall time"""
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+
+        async def phase(seconds: float):
+            stop_at = time.perf_counter() + seconds
+            if args.rate > 0:
+                await open_loop(traffic, client, stop_at, args.rate, args.concurrency)
+            else:
+                await asyncio.gather(*(
+                    closed_loop(traffic, client, stop_at, args.think_ms / 1000) for _ in range(args.concurrency)
+                ))
+
+        if args.warmup > 0:
+            await phase(args.warmup)
+        traffic.measuring = True
+        started = time.perf_counter()
+        await phase(args.duration)
+        # Requests still in flight when the phase ends are included
+        return time.perf_counter() - started
+
+
+def print_table(results: Dict[str, Dict]):
+    print(
+        f"{'route':<36} {'requests':>9} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>8}",
+        file=sys.stderr,
+    )
+    for route, summary in results.items():
+        print(
+            f"{route:<36} {summary['requests']:>9} {summary['throughput_per_s']:>9.1f} {summary['p50_ms']:>9.1f} "
+            f"{summary['p95_ms']:>9.1f} {summary['p99_ms']:>9.1f} {summary['error_rate']:>7.1%}",
+            file=sys.stderr,
+        )
+
+
+def main():
+    args = parse_args()
+    mix = parse_mix(args.mix)
+    workdir = tempfile.mkdtemp(prefix="memory-load-")
+    db_url = args.db_url or f"sqlite:///{os.path.join(workdir, 'load.db')}"
+
+    stub_port, app_port = free_port(), free_port()
+    stub_url = f"http://127.0.0.1:{stub_port}/v1"
+    app_url = f"http://127.0.0.1:{app_port}"
+    # One database for the seed and the server; shard and replica settings of the caller would point elsewhere
+    database = {"DATABASE_URL": db_url, "DATABASE_SHARDS": "", "DATABASE_REPLICA_URLS": ""}
+    env = dict(os.environ, **database, OPENAI_BASE_URL=stub_url, OPENAI_API_KEY="load-test")
+    os.environ.update(database)
+
+    import logging
+    logging.basicConfig(level=logging.WARNING)
+
+    started = time.perf_counter()
+    seed_database(args)
+    print(f"Seeded {args.seed_memories} memories in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    stub_log, app_log = os.path.join(workdir, "stub.log"), os.path.join(workdir, "app.log")
+    stub = app = None
+    try:
+        stub = start_process(
+            [
+                sys.executable, "-m", "benchmarks.stub_openai", "--port", str(stub_port), "--dim", str(args.dim),
+                "--latency-ms", str(args.stub_latency_ms), "--jitter-ms", str(args.stub_jitter_ms),
+                "--error-rate", str(args.stub_error_rate),
+            ],
+            env, stub_log,
+        )
+        # The stub only serves POST; any HTTP answer means it is listening
+        wait_until_up(f"http://127.0.0.1:{stub_port}/", stub, stub_log, ok=range(200, 600))
+        app = start_process(
+            [
+                sys.executable, "-m", "uvicorn", "src.backend.main:app", "--host", "127.0.0.1",
+                "--port", str(app_port), "--workers", str(args.workers), "--log-level", "warning",
+            ],
+            env, app_log,
+        )
+        # /ready turns 200 once the schema is up and vector warm-up has finished
+        wait_until_up(f"{app_url}/ready", app, app_log, timeout=120.0)
+
+        traffic = TrafficGenerator(args, mix)
+        mode = f"{args.rate:g} req/s open-loop" if args.rate > 0 else "closed-loop"
+        print(f"Running {args.duration:g}s of {mode} load with concurrency {args.concurrency}", file=sys.stderr)
+        elapsed = asyncio.run(drive(args, app_url, traffic))
+        results = traffic.report(elapsed)
+        try:
+            server = httpx.get(f"{app_url}/health", timeout=5.0).json()
+        except (httpx.HTTPError, ValueError):
+            server = None
+    finally:
+        stop_process(app)
+        stop_process(stub)
+
+    print_table(results)
+    report = {
+        "meta": {
+            "started_at": datetime.utcnow().isoformat(),
+            "git_revision": git_revision(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "database": db_url.split(":", 1)[0],
+            "args": vars(args),
+            "mix": mix,
+            "elapsed_seconds": round(elapsed, 3),
+            "server_health": server,
+            "logs": {"app": app_log, "stub": stub_log},
+        },
+        # Keyed like run_benchmarks sizes so benchmarks.compare can diff two runs
+        "results": {f"c{args.concurrency}": results},
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
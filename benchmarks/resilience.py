@@ -0,0 +1,145 @@
+"""
+Provider resilience harness: embedding and tagging calls against a throttled stub
+
+Runs concurrent EmbeddingService and MemoryTaggerService calls through the
+shared provider client (src/backend/services/provider_client.py) against
+benchmarks.stub_openai in a series of scenarios:
+
+  healthy     no errors
+  throttled   a share of requests answered with 429 + Retry-After; retries absorb them
+  outage      every request answered with 429; the circuit opens and calls fail fast,
+              tagging degrades to the local tagger
+  recovery    errors stop; after the reset interval a probe closes the circuit
+              and the load succeeds again
+
+Each scenario reports success rate, latency percentiles, stub-side request and
+429 counts, client retries and the circuit state, and checks the behaviour
+expected of it. The exit status is non-zero if any check fails.
+
+Usage (from the repository root):
+    python -m benchmarks.resilience --calls 200 --concurrency 16 --error-rate 0.3
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200, help="Calls per scenario")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent callers")
+    parser.add_argument("--error-rate", type=float, default=0.3, help="Share of 429s in the throttled scenario")
+    parser.add_argument("--retry-after", type=float, default=0.05, help="Retry-After seconds sent by the stub")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="Stub latency per request")
+    parser.add_argument("--circuit-reset", type=float, default=1.0, help="Seconds the circuit stays open")
+    parser.add_argument("--output", help="Write results JSON to this file instead of stdout")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    # The provider client reads its settings at import time; keep backoff short so the run is quick
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+    os.environ.setdefault("OPENAI_BACKOFF_BASE", "0.05")
+    os.environ.setdefault("OPENAI_BACKOFF_MAX", "0.5")
+    os.environ.setdefault("OPENAI_CIRCUIT_RESET_SECONDS", str(args.circuit_reset))
+    os.environ.setdefault("OPENAI_MAX_CONCURRENCY", str(args.concurrency))
+
+    from benchmarks.stub_openai import start_stub_server
+    from benchmarks.timing import summarize
+
+    server, base_url = start_stub_server(latency_ms=args.latency_ms, dim=64, retry_after=args.retry_after)
+    os.environ["OPENAI_BASE_URL"] = base_url
+
+    from src.backend.services import provider_client
+    from src.backend.services.embedding_service import EmbeddingService
+    from src.backend.services.memory_tagger_service import MemoryTaggerService
+    from src.backend.services.metrics_service import external_api_retries
+
+    def embed(i):
+        EmbeddingService.generate_embedding(f"resilience probe {i}")
+
+    def tag(i):
+        # Degrades to the local tagger instead of raising
+        MemoryTaggerService.tag_memory(f"resilience probe {i}")
+
+    def run(name, call, error_rate):
+        server.config.error_rate = error_rate
+        requests_before, throttled_before = server.config.requests, server.config.throttled
+        retries_before = sum(external_api_retries._values.values())
+        latencies, failures = [], {}
+        lock = threading.Lock()
+
+        def timed(i):
+            start = time.perf_counter()
+            try:
+                call(i)
+            except Exception as e:
+                with lock:
+                    failures[type(e).__name__] = failures.get(type(e).__name__, 0) + 1
+            latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(timed, range(args.calls)))
+        elapsed = time.perf_counter() - start
+        operation = "embedding" if call is embed else "tagging"
+        return {
+            "scenario": name,
+            "operation": operation,
+            "error_rate": error_rate,
+            "success_rate": round(1 - sum(failures.values()) / args.calls, 4),
+            "failures": failures,
+            "latency": summarize(latencies, elapsed),
+            "provider_requests": server.config.requests - requests_before,
+            "provider_429s": server.config.throttled - throttled_before,
+            "client_retries": int(sum(external_api_retries._values.values()) - retries_before),
+            "circuit": provider_client.openai_client.breaker(operation).state,
+        }
+
+    results = [run("healthy", embed, 0.0), run("throttled", embed, args.error_rate)]
+    outage = run("outage", embed, 1.0)
+    results.append(outage)
+    tag_outage = run("outage_tagging", tag, 1.0)
+    results.append(tag_outage)
+    # Once the reset interval has passed, the first call is the probe that closes the circuit;
+    # calls arriving while it is in flight still fail fast
+    time.sleep(args.circuit_reset + 0.1)
+    server.config.error_rate = 0.0
+    embed(0)
+    results.append(run("recovery", embed, 0.0))
+    server.shutdown()
+
+    by_name = {result["scenario"]: result for result in results}
+    checks = {
+        "healthy calls all succeed": by_name["healthy"]["success_rate"] == 1.0,
+        "retries absorb throttling": by_name["throttled"]["success_rate"] >= 0.99,
+        "outage opens the circuit": by_name["outage"]["circuit"] == provider_client.CIRCUIT_OPEN,
+        "open circuit fails fast": (
+            by_name["outage"]["failures"].get("CircuitOpenError", 0) > 0
+            and by_name["outage"]["provider_requests"] < args.calls
+        ),
+        "tagging degrades to the local tagger": by_name["outage_tagging"]["success_rate"] == 1.0,
+        "circuit closes after recovery": (
+            by_name["recovery"]["circuit"] == provider_client.CIRCUIT_CLOSED
+            and by_name["recovery"]["success_rate"] == 1.0
+        ),
+    }
+    report = {"results": results, "checks": checks}
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+    for check, passed in checks.items():
+        print(f"{'PASS' if passed else 'FAIL'}  {check}", file=sys.stderr)
+    sys.exit(0 if all(checks.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Throughput and latency benchmarks for the semantic memory service
+
+For each corpus size the schema is recreated, synthetic memories with
+deterministic embeddings are bulk-ingested, and then store_memory,
+find_similar_memories, search_memories_by_metadata and get_memory_stats are
+measured. Embedding and tagging calls go to a local stub server
+(benchmarks.stub_openai) with configurable latency. Results are written as
+JSON; compare two runs with benchmarks.compare.
+
+Usage (from the repository root):
+    python -m benchmarks.run_benchmarks --sizes 1000,10000 --output results.json
+    python -m benchmarks.run_benchmarks --db-url postgresql://localhost/bench --sizes 100000 --dim 256
+
+Large corpora store one JSON vector per row; use a smaller --dim for 1M rows.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks.datasets import dopple_ids, generate_memories, query_text, user_ids
+from benchmarks.stub_openai import start_stub_server
+from benchmarks.timing import LatencyRecorder
+from src.backend.services.embedding_service import EMBEDDING_DIMENSIONS
+from src.backend.services.memory_tagger_service import TOPICS
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db-url", help="Database URL (default: a temporary SQLite file)")
+    parser.add_argument("--sizes", default="1000,10000", help="Comma-separated corpus sizes")
+    parser.add_argument("--dopples", type=int, default=10, help="Distinct dopples in the corpus")
+    parser.add_argument("--users", type=int, default=50, help="Distinct users in the corpus")
+    parser.add_argument("--dim", type=int, default=EMBEDDING_DIMENSIONS, help="Embedding dimensionality")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Memories per bulk ingest batch")
+    parser.add_argument("--store-ops", type=int, default=50, help="Single store_memory calls per size")
+    parser.add_argument("--queries", type=int, default=50, help="Calls per search/stats operation")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=0.7)
+    parser.add_argument("--stub-latency-ms", type=float, default=0.0, help="Latency added by the stub API")
+    parser.add_argument("--stub-jitter-ms", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results JSON to this file instead of stdout")
+    return parser.parse_args()
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def run_size(size, args, rng):
+    """Recreate the schema, ingest `size` memories and benchmark every operation"""
+    # Imported here: the engine and OpenAI client read their environment at import time
+    from src.backend.db.database import Base, engine, init_db, seed_metadata
+    from src.backend.services.memory_service import MemoryService
+
+    Base.metadata.drop_all(bind=engine)
+    init_db()
+    seed_metadata()
+
+    results = {}
+
+    ingest = LatencyRecorder()
+    for batch in generate_memories(size, args.dopples, args.users, args.dim, seed=args.seed, batch_size=args.batch_size):
+        with ingest.measure(items=len(batch)):
+            MemoryService.store_memories_bulk(batch, generate_embeddings=False, deduplicate=False)
+    results["bulk_ingest"] = ingest.summary()
+
+    dopples = dopple_ids(args.dopples)
+    users = user_ids(args.users)
+
+    store = LatencyRecorder()
+    for i in range(args.store_ops):
+        with store.measure():
+            MemoryService.store_memory(
+                text=f"{query_text(rng)} (store #{i})",
+                dopple_id=rng.choice(dopples),
+                user_id=rng.choice(users),
+                role="user",
+                topics=[rng.choice(TOPICS)],
+            )
+    results["store_memory"] = store.summary()
+
+    similar_user = LatencyRecorder()
+    similar_dopple = LatencyRecorder()
+    hits = 0
+    for _ in range(args.queries):
+        dopple_id = rng.choice(dopples)
+        with similar_user.measure():
+            found = MemoryService.find_similar_memories(
+                query_text(rng), dopple_id=dopple_id, user_id=rng.choice(users),
+                top_k=args.top_k, similarity_threshold=args.threshold
+            )
+        hits += len(found)
+        with similar_dopple.measure():
+            MemoryService.find_similar_memories(
+                query_text(rng), dopple_id=dopple_id,
+                top_k=args.top_k, similarity_threshold=args.threshold
+            )
+    results["find_similar_memories"] = dict(similar_user.summary(), mean_results=round(hits / max(args.queries, 1), 2))
+    results["find_similar_memories_dopple_wide"] = similar_dopple.summary()
+
+    metadata = LatencyRecorder()
+    for _ in range(args.queries):
+        with metadata.measure():
+            MemoryService.search_memories_by_metadata(
+                dopple_id=rng.choice(dopples), topics=[rng.choice(TOPICS)], limit=20
+            )
+    results["search_memories_by_metadata"] = metadata.summary()
+
+    stats = LatencyRecorder()
+    for _ in range(args.queries):
+        with stats.measure():
+            MemoryService.get_memory_stats(rng.choice(dopples), user_id=rng.choice([None, rng.choice(users)]))
+    results["get_memory_stats"] = stats.summary()
+
+    return results
+
+
+def main():
+    args = parse_args()
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+
+    server, base_url = start_stub_server(latency_ms=args.stub_latency_ms, jitter_ms=args.stub_jitter_ms, dim=args.dim)
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ["OPENAI_API_KEY"] = "benchmark"
+    # Queries repeat across iterations; measure the search path, not result cache hits
+    os.environ.setdefault("SEARCH_CACHE_ENABLED", "false")
+
+    db_url = args.db_url
+    if not db_url:
+        db_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='memory-bench-'), 'bench.db')}"
+    os.environ["DATABASE_URL"] = db_url
+
+    import logging
+    logging.basicConfig(level=logging.WARNING)
+
+    report = {
+        "meta": {
+            "started_at": datetime.utcnow().isoformat(),
+            "git_revision": git_revision(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "database": db_url.split(":", 1)[0],
+            "args": vars(args),
+        },
+        "results": {},
+    }
+
+    for size in sizes:
+        started = time.perf_counter()
+        report["results"][str(size)] = run_size(size, args, random.Random(args.seed))
+        print(f"size={size} done in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    report["meta"]["stub_requests"] = server.config.requests
+    server.shutdown()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+Local stand-in for the OpenAI embeddings and chat completions APIs
+
+Serves deterministic embeddings (see benchmarks.datasets) and tag responses
+with configurable latency, so benchmarks exercise the real client code path
+without network access or API cost. Point the services at it with
+OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+
+It can also play a throttled provider: a share of requests (or every request
+over a requests-per-minute limit) is answered with 429 and a Retry-After header.
+
+Usage (from the repository root):
+    python -m benchmarks.stub_openai --port 8099 --latency-ms 80 --jitter-ms 20
+    python -m benchmarks.stub_openai --error-rate 0.3 --rpm-limit 600
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+
+from benchmarks.datasets import deterministic_embedding, topic_of
+from src.backend.services.embedding_service import EMBEDDING_DIMENSIONS
+from src.backend.services.memory_tagger_service import EMOTIONS, TRAITS
+
+
+class StubConfig:
+    """Mutable settings shared by all request handler threads"""
+
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        dim: int = EMBEDDING_DIMENSIONS,
+        error_rate: float = 0.0,
+        rpm_limit: int = 0,
+        retry_after: float = 1.0
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.dim = dim
+        self.error_rate = error_rate  # Share of requests answered with 429
+        self.rpm_limit = rpm_limit  # Requests per rolling minute before 429s; 0 is unlimited
+        self.retry_after = retry_after
+        self.requests = 0
+        self.throttled = 0
+        self._recent = deque()
+        self._lock = threading.Lock()
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def should_throttle(self) -> bool:
+        """Decide whether to answer the current request with 429"""
+        with self._lock:
+            throttle = random.random() < self.error_rate
+            if self.rpm_limit and not throttle:
+                now = time.monotonic()
+                while self._recent and now - self._recent[0] > 60:
+                    self._recent.popleft()
+                throttle = len(self._recent) >= self.rpm_limit
+                if not throttle:
+                    self._recent.append(now)
+            if throttle:
+                self.throttled += 1
+            return throttle
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    config: StubConfig = None
+
+    def log_message(self, format, *args):  # Keep benchmark output clean
+        pass
+
+    def do_POST(self):
+        self.config.count_request()
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+
+        delay = self.config.latency_ms + random.uniform(0, self.config.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+        if self.config.should_throttle():
+            self._send(
+                429,
+                {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                headers={"Retry-After": f"{self.config.retry_after:g}"},
+            )
+        elif self.path.endswith("/embeddings"):
+            self._send(200, self._embeddings(body))
+        elif self.path.endswith("/chat/completions"):
+            self._send(200, self._chat_completion(body))
+        else:
+            self._send(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+
+    def _embeddings(self, body):
+        inputs = body.get("input", "")
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        tokens = sum(len(text.split()) for text in inputs)
+        return {
+            "object": "list",
+            "data": [
+                {"object": "embedding", "index": i, "embedding": deterministic_embedding(text, self.config.dim)}
+                for i, text in enumerate(inputs)
+            ],
+            "model": body.get("model", "stub"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    @staticmethod
+    def _tags(text: str):
+        rng = random.Random(text)
+        return {
+            "emotions": rng.sample(EMOTIONS, 1),
+            "topics": [topic_of(text)],
+            "traits": rng.sample(TRAITS, 1),
+            "importance": rng.randint(1, 10),
+        }
+
+    def _chat_completion(self, body):
+        prompt = body["messages"][-1]["content"]
+        if "Texts to analyze:" in prompt:
+            # Batch tagging prompt: one numbered text per line
+            lines = prompt.split("Texts to analyze:", 1)[-1].strip().splitlines()
+            content = json.dumps({"results": [self._tags(line) for line in lines if line.strip()]})
+        else:
+            # The tagger prompt lists every category; only look at the quoted text
+            content = json.dumps(self._tags(prompt.split("Text to analyze:", 1)[-1]))
+        return {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(prompt.split()), "completion_tokens": 20, "total_tokens": len(prompt.split()) + 20},
+        }
+
+    def _send(self, status: int, payload, headers: dict = None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_stub_server(
+    port: int = 0,
+    latency_ms: float = 0.0,
+    jitter_ms: float = 0.0,
+    dim: int = EMBEDDING_DIMENSIONS,
+    error_rate: float = 0.0,
+    rpm_limit: int = 0,
+    retry_after: float = 1.0
+) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    Start the stub server on a background thread
+
+    Args:
+        port: Port to bind (0 picks a free port)
+        latency_ms: Fixed latency added to every response
+        jitter_ms: Additional uniformly distributed latency
+        dim: Dimensionality of returned embeddings
+        error_rate: Share of requests answered with 429
+        rpm_limit: Requests per rolling minute before answering 429 (0 is unlimited)
+        retry_after: Retry-After seconds sent with 429 responses
+
+    Returns:
+        The server (its .config can be changed while running) and its OpenAI base URL
+    """
+    config = StubConfig(latency_ms, jitter_ms, dim, error_rate, rpm_limit, retry_after)
+    handler = type("ConfiguredStubHandler", (StubHandler,), {"config": config})
+    # The default listen backlog of 5 drops connections under concurrent load and adds 1s SYN retries
+    server_class = type("StubHTTPServer", (ThreadingHTTPServer,), {"request_queue_size": 128})
+    server = server_class(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    server.config = config
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--dim", type=int, default=EMBEDDING_DIMENSIONS)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 429")
+    parser.add_argument("--rpm-limit", type=int, default=0, help="Requests per minute before 429s (0 is unlimited)")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429s")
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(
+        args.port, args.latency_ms, args.jitter_ms, args.dim, args.error_rate, args.rpm_limit, args.retry_after
+    )
+    print(f"Stub OpenAI API listening on {base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
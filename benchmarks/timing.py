@@ -0,0 +1,63 @@
+"""Latency summaries shared by the benchmark scripts"""
+import math
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies: List[float], elapsed: float, items: int = None) -> Dict[str, float]:
+    """
+    Summarize per-call latencies
+
+    Args:
+        latencies: Per-call wall times in seconds
+        elapsed: Total wall time of the measured loop in seconds
+        items: Items processed (defaults to one per call), for throughput
+
+    Returns:
+        Dictionary with call count, latency percentiles in milliseconds and throughput per second
+    """
+    values = sorted(latencies)
+    items = len(values) if items is None else items
+    return {
+        "calls": len(values),
+        "items": items,
+        "mean_ms": round(sum(values) / len(values) * 1000, 3) if values else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+        "max_ms": round(values[-1] * 1000, 3) if values else 0.0,
+        "throughput_per_s": round(items / elapsed, 2) if elapsed > 0 else 0.0,
+    }
+
+
+class LatencyRecorder:
+    """Collects per-call latencies for one benchmarked operation"""
+
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.items = 0
+        self._started = None
+        self._elapsed = 0.0
+
+    @contextmanager
+    def measure(self, items: int = 1):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            self.latencies.append(duration)
+            self._elapsed += duration
+            self.items += items
+
+    def summary(self) -> Dict[str, float]:
+        return summarize(self.latencies, self._elapsed, self.items)
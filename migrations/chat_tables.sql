@@ -51,6 +51,9 @@ CREATE TABLE IF NOT EXISTS chat_messages (
   updated_at TIMESTAMP WITH TIME ZONE DEFAULT now()
 );
 
+-- 메모리 동기화 워커가 (timestamp, id) 순서로 새 메시지를 읽기 위한 인덱스
+CREATE INDEX IF NOT EXISTS chat_messages_timestamp_id_idx ON chat_messages (timestamp, id);
+
 -- RLS 정책 설정
 ALTER TABLE chat_messages ENABLE ROW LEVEL SECURITY;
 
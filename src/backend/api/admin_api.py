@@ -0,0 +1,357 @@
+import hmac
+import os
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi.responses import Response
+from pydantic import BaseModel, Field
+
+from src.backend.db.database import get_replica_stats
+from src.backend.services.chat_sync_service import ChatSyncBusy, ChatSyncService
+from src.backend.services import consolidation_service
+from src.backend.services.consolidation_service import ConsolidationInProgress, ConsolidationService
+from src.backend.services import reembedding_service, single_flight
+from src.backend.services.dedup_service import DedupService
+from src.backend.services.deletion_service import DeletionService
+from src.backend.services.embedding_model_service import EmbeddingModelService
+from src.backend.services.reembedding_service import ReembeddingConflict, ReembeddingService
+from src.backend.services.profiling_service import profile_store
+from src.backend.services.tiering_service import TieringService
+from src.backend.services.search_cache import search_cache
+from src.backend.services.shared_vector_store import shared_vector_store
+from src.backend.services.vector_cache import vector_cache
+
+ADMIN_API_TOKEN = os.getenv("ADMIN_API_TOKEN")
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """
+    Require the X-Admin-Token header to match ADMIN_API_TOKEN
+
+    The admin API fails closed: without a configured token every request is
+    refused, since several endpoints rewrite or delete data.
+    """
+    if not ADMIN_API_TOKEN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Admin API is disabled; set ADMIN_API_TOKEN to enable it"
+        )
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token.encode(), ADMIN_API_TOKEN.encode()):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid admin token")
+
+
+# Request models
+class ConsolidationRequest(BaseModel):
+    dopple_id: Optional[str] = None
+    user_id: Optional[str] = None
+    min_age_days: float = Field(default_factory=lambda: consolidation_service.CONSOLIDATION_MIN_AGE_DAYS, ge=0)
+    max_importance: int = Field(default_factory=lambda: consolidation_service.CONSOLIDATION_MAX_IMPORTANCE, ge=1, le=10)
+    similarity_threshold: float = Field(default_factory=lambda: consolidation_service.CONSOLIDATION_SIMILARITY, gt=0, le=1)
+    min_cluster_size: int = Field(default_factory=lambda: consolidation_service.CONSOLIDATION_MIN_CLUSTER_SIZE, ge=2)
+    dry_run: bool = False
+
+class DedupPolicyUpdate(BaseModel):
+    enabled: Optional[bool] = None
+    exact_match: Optional[bool] = None
+    similarity_threshold: Optional[float] = Field(None, gt=0, le=1, description="Null disables the embedding check")
+    window: Optional[int] = Field(None, ge=1, le=10000)
+    bump_importance: Optional[bool] = None
+
+class TierRebalanceRequest(BaseModel):
+    dopple_id: Optional[str] = None
+    max_age_days: Optional[float] = Field(None, ge=0)
+    min_importance: Optional[int] = Field(None, ge=1, le=10)
+
+class ReembedRequest(BaseModel):
+    target_model: str = Field(..., min_length=1)
+    batch_size: int = Field(default_factory=lambda: reembedding_service.REEMBED_BATCH_SIZE, ge=1, le=2048)
+    rate_limit: Optional[float] = Field(None, ge=0, description="Texts per second; 0 is unlimited")
+    cutover: bool = Field(True, description="Activate the target model once every memory is re-embedded")
+
+class ChatSyncRunRequest(BaseModel):
+    max_batches: Optional[int] = Field(None, ge=1, description="Stop after this many batches; null runs until caught up")
+
+class MemoryDeleteRequest(BaseModel):
+    dopple_id: Optional[str] = None
+    user_id: Optional[str] = None
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    emotions: Optional[List[str]] = None
+    topics: Optional[List[str]] = None
+    traits: Optional[List[str]] = None
+    all_tenants: bool = Field(False, description="Allow a delete that is not scoped to a dopple or user")
+
+class MemoryDeleteResponse(BaseModel):
+    memories: int
+    archived_memories: int
+    search_versions: int
+    batches: int
+
+class ActivateModelRequest(BaseModel):
+    model: str = Field(..., min_length=1)
+    force: bool = Field(False, description="Activate even if some memories lack an embedding of the model")
+
+
+# Initialize router
+router = APIRouter(
+    prefix="/api/admin",
+    tags=["admin"],
+    dependencies=[Depends(require_admin)],
+    responses={404: {"description": "Not found"}},
+)
+
+# ---- Profiling ----
+
+@router.get("/profiles")
+async def list_profiles():
+    """
+    List captured request profiles, newest first
+    """
+    return profile_store.list()
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str):
+    """
+    Get a profile's service call spans, SQL timings and top functions
+    """
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile
+
+@router.get("/profiles/{profile_id}/pstats")
+async def download_profile(profile_id: str):
+    """
+    Download a profile in pstats format (open with pstats.Stats or snakeviz)
+    """
+    data = profile_store.get_pstats(profile_id)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return Response(
+        content=data,
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="{profile_id}.prof"'},
+    )
+
+# ---- Database ----
+
+@router.get("/replicas")
+async def get_replicas():
+    """
+    Get read replica health, replication lag and read counts
+    """
+    return get_replica_stats()
+
+# ---- Chat sync ----
+
+@router.get("/chat-sync")
+def get_chat_sync_status():
+    """
+    Get the chat_messages sync checkpoint, totals, lag and throughput
+    """
+    return ChatSyncService.get_status()
+
+@router.post("/chat-sync/run")
+def run_chat_sync(request: ChatSyncRunRequest):
+    """
+    Sync new chat messages into memories now, until caught up or max_batches
+    """
+    try:
+        return ChatSyncService.run(max_batches=request.max_batches)
+    except ChatSyncBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+# ---- Deletion ----
+
+@router.post("/memories/delete", response_model=MemoryDeleteResponse)
+def delete_memories(request: MemoryDeleteRequest):
+    """
+    Delete every memory matching the filters (e.g. all of a user's memories)
+
+    A dopple_id or user_id is required unless all_tenants is set.
+    """
+    try:
+        return DeletionService.delete_memories(**request.model_dump())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# ---- Caches ----
+
+@router.get("/vector-cache")
+async def get_vector_cache_stats():
+    """
+    Get hot vector cache memory usage and hit rate
+    """
+    stats = vector_cache.stats()
+    if shared_vector_store is not None:
+        stats["shared_store"] = shared_vector_store.stats()
+    return stats
+
+@router.post("/vectors/compact")
+def compact_vectors(min_dead_ratio: float = 0.0):
+    """
+    Rewrite cached vector sets, vector files and cold segments without their tombstoned rows
+    """
+    return DeletionService.compact(min_dead_ratio)
+
+@router.get("/search-cache")
+async def get_search_cache_stats():
+    """
+    Get search result cache memory usage and hit rate
+    """
+    return search_cache.stats()
+
+@router.get("/single-flight")
+async def get_single_flight_stats():
+    """
+    Get how many concurrent duplicate embeddings and searches were coalesced
+    """
+    return single_flight.get_stats()
+
+# ---- Consolidation ----
+
+@router.post("/consolidate")
+def consolidate_memories(request: ConsolidationRequest):
+    """
+    Merge clusters of old, low-importance memories into summaries and archive the originals
+    """
+    # Plain def: the run is blocking database and NumPy work, so it goes to the threadpool
+    try:
+        return ConsolidationService.run(
+            dopple_id=request.dopple_id,
+            user_id=request.user_id,
+            min_age_days=request.min_age_days,
+            max_importance=request.max_importance,
+            similarity_threshold=request.similarity_threshold,
+            min_cluster_size=request.min_cluster_size,
+            dry_run=request.dry_run,
+        )
+    except ConsolidationInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@router.get("/consolidate/last")
+async def get_last_consolidation():
+    """
+    Get the report of the most recent consolidation run
+    """
+    return ConsolidationService.last_report()
+
+@router.get("/consolidate/sources/{summary_id}")
+def get_consolidation_sources(summary_id: str):
+    """
+    Get the archived memories a summary memory replaced
+    """
+    return ConsolidationService.get_sources(summary_id)
+
+# ---- Ingest dedup ----
+
+@router.get("/dedup-policies/{dopple_id}")
+def get_dedup_policy(dopple_id: str):
+    """
+    Get a dopple's ingest dedup policy (environment defaults if none is stored)
+    """
+    return DedupService.get_policy(dopple_id)
+
+@router.put("/dedup-policies/{dopple_id}")
+def update_dedup_policy(dopple_id: str, update: DedupPolicyUpdate):
+    """
+    Create or update a dopple's ingest dedup policy; omitted fields are left unchanged
+    """
+    return DedupService.set_policy(dopple_id, update.model_dump(exclude_unset=True))
+
+# ---- Tiers ----
+
+@router.get("/tiers")
+def get_tier_stats(dopple_id: Optional[str] = None):
+    """
+    Get memory counts per search tier and cold segment usage
+    """
+    return TieringService.get_stats(dopple_id)
+
+@router.post("/tiers/rebalance")
+def rebalance_tiers(request: TierRebalanceRequest):
+    """
+    Move memories between the hot and cold tiers by age and importance
+    """
+    settings = request.model_dump(exclude_none=True)
+    return TieringService.rebalance(**settings)
+
+# ---- Embedding models ----
+
+@router.get("/embedding-models")
+def get_embedding_models():
+    """
+    Get the active embedding model and how much of the corpus each model covers
+    """
+    return EmbeddingModelService.get_stats()
+
+@router.post("/embedding-models/activate")
+def activate_embedding_model(request: ActivateModelRequest):
+    """
+    Switch searches and new memories to another embedding model
+    """
+    stats = EmbeddingModelService.get_stats()
+    coverage = stats["models"].get(request.model, {}).get("embeddings", 0)
+    if coverage < stats["memories"] and not request.force:
+        raise HTTPException(
+            status_code=409,
+            detail=f"{stats['memories'] - coverage} memories have no {request.model} embedding; re-embed first or force",
+        )
+    previous = EmbeddingModelService.set_active_model(request.model)
+    return {"active_model": request.model, "previous_model": previous}
+
+@router.post("/embedding-models/reembed", status_code=202)
+def start_reembedding(request: ReembedRequest):
+    """
+    Start a background job that embeds every memory with the target model
+    """
+    try:
+        return ReembeddingService.start_job(
+            target_model=request.target_model,
+            batch_size=request.batch_size,
+            rate_limit=request.rate_limit,
+            cutover=request.cutover,
+        )
+    except ReembeddingConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@router.get("/embedding-models/jobs")
+def list_reembedding_jobs(limit: int = 20):
+    """
+    List re-embedding jobs with progress and throughput, newest first
+    """
+    return ReembeddingService.list_jobs(limit)
+
+@router.get("/embedding-models/jobs/{job_id}")
+def get_reembedding_job(job_id: str):
+    """
+    Get a re-embedding job's progress, throughput and checkpoint
+    """
+    job = ReembeddingService.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.post("/embedding-models/jobs/{job_id}/pause")
+def pause_reembedding_job(job_id: str):
+    """
+    Pause a re-embedding job after its current batch
+    """
+    try:
+        return ReembeddingService.pause_job(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Job not found")
+    except ReembeddingConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@router.post("/embedding-models/jobs/{job_id}/resume")
+def resume_reembedding_job(job_id: str):
+    """
+    Resume a paused or failed re-embedding job from its checkpoint
+    """
+    try:
+        return ReembeddingService.resume_job(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Job not found")
+    except ReembeddingConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
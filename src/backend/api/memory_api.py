@@ -2,11 +2,18 @@ from fastapi import APIRouter, Depends, HTTPException, Query, Body, status
 from typing import List, Dict, Any, Optional
 from pydantic import BaseModel, Field
 from datetime import datetime
+from sqlalchemy.orm import Session
 
+from src.backend.services.context_service import (
+    CONTEXT_CANDIDATES, CONTEXT_MAX_TOKENS, CONTEXT_SIMILARITY_THRESHOLD, ContextService,
+)
 from src.backend.services.memory_service import MemoryService
 from src.backend.services.memory_tagger_service import MemoryTaggerService
 from src.backend.services.embedding_service import EmbeddingService
-from src.backend.db.database import get_db, init_db, seed_metadata
+from src.backend.services.metrics_service import time_stage
+from src.backend.db.database import get_session, init_db, seed_metadata
+from src.backend.db.sharding import ShardMoving
+from src.backend.api.responses import FastJSONResponse
 
 # Initialize router
 router = APIRouter(
@@ -40,8 +47,10 @@ class MemoryResponse(BaseModel):
     topics: List[str]
     traits: List[str]
     importance: int
-    metadata: Optional[Dict[str, Any]]
+    occurrences: int = 1
+    metadata: Optional[Dict[str, Any]] = None
     similarity: Optional[float] = None
+    relevance: Optional[float] = None
 
 class MemorySearchQuery(BaseModel):
     text: str
@@ -50,6 +59,49 @@ class MemorySearchQuery(BaseModel):
     top_k: int = 5
     similarity_threshold: float = 0.7
     mock: bool = False
+    include_metadata: bool = True
+    recency_half_life_days: Optional[float] = Field(None, ge=0, description="Rank by similarity decayed with this half-life; 0 disables")
+    importance_weight: Optional[float] = Field(None, ge=0, le=1, description="Weight of importance in the ranking")
+
+class MemoryBatchSearchQuery(BaseModel):
+    queries: List[str] = Field(..., min_length=1, max_length=32, description="Texts to search for")
+    dopple_id: Optional[str] = None
+    user_id: Optional[str] = None
+    top_k: int = 5
+    similarity_threshold: float = 0.7
+    mock: bool = False
+    include_metadata: bool = True
+    recency_half_life_days: Optional[float] = Field(None, ge=0, description="Rank by similarity decayed with this half-life; 0 disables")
+    importance_weight: Optional[float] = Field(None, ge=0, le=1, description="Weight of importance in the ranking")
+    deduplicate: bool = Field(False, description="Return each memory only under the query it matches best")
+
+class MemoryContextQuery(BaseModel):
+    text: str
+    dopple_id: str
+    user_id: Optional[str] = None
+    max_tokens: int = Field(CONTEXT_MAX_TOKENS, ge=1, le=200000, description="Token budget of the context block")
+    candidates: int = Field(CONTEXT_CANDIDATES, ge=1, le=500, description="Ranked memories considered for packing")
+    similarity_threshold: float = CONTEXT_SIMILARITY_THRESHOLD
+    chronological: bool = Field(False, description="Order the context lines by time instead of relevance")
+    mock: bool = False
+    recency_half_life_days: Optional[float] = Field(None, ge=0, description="Rank by similarity decayed with this half-life; 0 disables")
+    importance_weight: Optional[float] = Field(None, ge=0, le=1, description="Weight of importance in the ranking")
+
+class ContextMemory(BaseModel):
+    id: str
+    role: str
+    timestamp: Optional[str] = None
+    token_count: int
+    similarity: float
+    relevance: Optional[float] = None
+
+class MemoryContextResponse(BaseModel):
+    context: str
+    tokens: int
+    max_tokens: int
+    memories: List[ContextMemory]
+    candidates: int
+    skipped: int
 
 class MemoryMetadataSearchQuery(BaseModel):
     dopple_id: Optional[str] = None
@@ -62,6 +114,7 @@ class MemoryMetadataSearchQuery(BaseModel):
     end_date: Optional[datetime] = None
     limit: int = 20
     offset: int = 0
+    include_metadata: bool = True
 
 class MemoryStatsResponse(BaseModel):
     total_memories: int
@@ -81,9 +134,12 @@ class ConversationAnalysisRequest(BaseModel):
     conversation: List[Dict[str, Any]]
 
 # ---- Endpoints ----
+# Plain def throughout: the handlers block on the database and the provider client
+# (rate-limit waits, backoff), so FastAPI runs them in its threadpool instead of
+# stalling the event loop.
 
 @router.post("/init")
-async def initialize_memory_system():
+def initialize_memory_system():
     """
     Initialize the memory system database and seed metadata
     """
@@ -95,14 +151,15 @@ async def initialize_memory_system():
         raise HTTPException(status_code=500, detail=f"Failed to initialize memory system: {str(e)}")
 
 @router.post("/store", response_model=str)
-async def store_memory(memory: MemoryCreate):
+def store_memory(memory: MemoryCreate):
     """
     Store a new memory and generate embedding
     """
     try:
         # Auto-tag memory if requested
         if memory.auto_tag:
-            tags = MemoryTaggerService.tag_memory(memory.text, use_mock=memory.mock_tag)
+            with time_stage("store_memory", "tag"):
+                tags = MemoryTaggerService.tag_memory(memory.text, use_mock=memory.mock_tag)
             if not memory.emotions:
                 memory.emotions = tags.get('emotions', [])
             if not memory.topics:
@@ -126,23 +183,36 @@ async def store_memory(memory: MemoryCreate):
             generate_embedding=True,
             mock_embedding=False
         )
-        
+        # No request-scoped session: the service commits its own short transactions
+        # so that no pooled connection waits on the tagger or embedding calls
         return memory_id
+    except ShardMoving as e:
+        raise HTTPException(
+            status_code=503, detail=str(e), headers={"Retry-After": str(int(e.retry_after + 0.999))}
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to store memory: {str(e)}")
 
+# Memory endpoints return FastJSONResponse: the service already builds dictionaries
+# matching MemoryResponse, so the response_model is kept for the OpenAPI schema only
+# and the payload is not validated and re-serialized a second time.
+
 @router.get("/get/{memory_id}", response_model=MemoryResponse)
-async def get_memory(memory_id: str):
+def get_memory(
+    memory_id: str,
+    include_metadata: bool = True,
+    db: Session = Depends(get_session)
+):
     """
     Get memory by ID
     """
-    memory = MemoryService.get_memory(memory_id)
+    memory = MemoryService.get_memory(memory_id, include_metadata=include_metadata, db=db)
     if not memory:
         raise HTTPException(status_code=404, detail="Memory not found")
-    return memory
+    return FastJSONResponse(memory)
 
 @router.post("/search/similar", response_model=List[MemoryResponse])
-async def search_similar_memories(query: MemorySearchQuery):
+def search_similar_memories(query: MemorySearchQuery, db: Session = Depends(get_session)):
     """
     Search for memories similar to the provided text
     """
@@ -152,12 +222,56 @@ async def search_similar_memories(query: MemorySearchQuery):
         user_id=query.user_id,
         top_k=query.top_k,
         similarity_threshold=query.similarity_threshold,
-        mock=query.mock
+        mock=query.mock,
+        include_metadata=query.include_metadata,
+        recency_half_life_days=query.recency_half_life_days,
+        importance_weight=query.importance_weight,
+        db=db
+    )
+    return FastJSONResponse(memories)
+
+@router.post("/search/similar/batch", response_model=List[List[MemoryResponse]])
+def search_similar_memories_batch(query: MemoryBatchSearchQuery, db: Session = Depends(get_session)):
+    """
+    Search for memories similar to several texts at once, returning top_k results per text
+    """
+    results = MemoryService.find_similar_memories_batch(
+        query_texts=query.queries,
+        dopple_id=query.dopple_id,
+        user_id=query.user_id,
+        top_k=query.top_k,
+        similarity_threshold=query.similarity_threshold,
+        mock=query.mock,
+        include_metadata=query.include_metadata,
+        deduplicate=query.deduplicate,
+        recency_half_life_days=query.recency_half_life_days,
+        importance_weight=query.importance_weight,
+        db=db
     )
-    return memories
+    return FastJSONResponse(results)
+
+@router.post("/context", response_model=MemoryContextResponse)
+def build_context(query: MemoryContextQuery, db: Session = Depends(get_session)):
+    """
+    Assemble the memories most relevant to a conversation turn into a context block within a token budget
+    """
+    context = ContextService.build_context(
+        query_text=query.text,
+        dopple_id=query.dopple_id,
+        user_id=query.user_id,
+        max_tokens=query.max_tokens,
+        candidates=query.candidates,
+        similarity_threshold=query.similarity_threshold,
+        chronological=query.chronological,
+        mock=query.mock,
+        recency_half_life_days=query.recency_half_life_days,
+        importance_weight=query.importance_weight,
+        db=db
+    )
+    return FastJSONResponse(context)
 
 @router.post("/search/metadata", response_model=List[MemoryResponse])
-async def search_memories_by_metadata(query: MemoryMetadataSearchQuery):
+def search_memories_by_metadata(query: MemoryMetadataSearchQuery, db: Session = Depends(get_session)):
     """
     Search for memories by metadata filters
     """
@@ -171,23 +285,26 @@ async def search_memories_by_metadata(query: MemoryMetadataSearchQuery):
         start_date=query.start_date,
         end_date=query.end_date,
         limit=query.limit,
-        offset=query.offset
+        offset=query.offset,
+        include_metadata=query.include_metadata,
+        db=db
     )
-    return memories
+    return FastJSONResponse(memories)
 
 @router.get("/stats/{dopple_id}", response_model=MemoryStatsResponse)
-async def get_memory_stats(
+def get_memory_stats(
     dopple_id: str,
-    user_id: Optional[str] = None
+    user_id: Optional[str] = None,
+    db: Session = Depends(get_session)
 ):
     """
     Get memory statistics for a dopple
     """
-    stats = MemoryService.get_memory_stats(dopple_id, user_id)
+    stats = MemoryService.get_memory_stats(dopple_id, user_id, db=db)
     return stats
 
 @router.post("/tag", response_model=TagResponse)
-async def tag_text(
+def tag_text(
     text: str = Body(..., embed=True),
     use_mock: bool = Body(False, embed=True)
 ):
@@ -198,7 +315,7 @@ async def tag_text(
     return tags
 
 @router.post("/analyze-conversation")
-async def analyze_conversation(request: ConversationAnalysisRequest):
+def analyze_conversation(request: ConversationAnalysisRequest):
     """
     Analyze a conversation to extract trends and insights
     """
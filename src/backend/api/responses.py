@@ -0,0 +1,30 @@
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the standard encoder
+    orjson = None
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response for payloads that are already shaped like their response model
+
+    Endpoints returning this class skip FastAPI's response_model validation and
+    serialization, so the content must be plain JSON-compatible data (e.g. the
+    dictionaries produced by Memory.to_dict()). Rendering uses orjson when it is
+    installed and the standard json module otherwise.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+        return json.dumps(
+            content,
+            ensure_ascii=False,
+            allow_nan=False,
+            separators=(",", ":"),
+        ).encode("utf-8")
@@ -1,33 +1,164 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, insert, inspect, literal, select, text
+from sqlalchemy.exc import DBAPIError, IntegrityError, OperationalError, ProgrammingError, TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import QueuePool
+import hashlib
+import json
+import logging
 import os
+import threading
+import time
 from contextlib import contextmanager
-from typing import Generator, Any
+from typing import Callable, Generator, Any, Dict, List, Optional, TypeVar
+
+from src.backend.db.replicas import DATABASE_REPLICA_URLS, ReplicaSet, WritePins, parse_replicas
+from src.backend.db.sharding import (
+    DATABASE_SHARD_MAP, DATABASE_SHARDS, RoutingSession, ShardMap, ShardRouter, has_writes, parse_shards, read_only,
+    replica_used, route,
+)
+
+logger = logging.getLogger(__name__)
 
 # Environment variables or config
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./semantic_memory.db")
 USE_SQLITE = DATABASE_URL.startswith("sqlite")
 
-# Create SQLAlchemy engine
-if USE_SQLITE:
-    engine = create_engine(
-        DATABASE_URL, connect_args={"check_same_thread": False}
+# Connection pool settings
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # seconds to wait for a connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds, -1 disables
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+
+# SQLite settings
+SQLITE_WAL = os.getenv("SQLITE_WAL", "true").lower() == "true"
+
+
+class PoolMetrics:
+    """Thread-safe counters for connection pool checkouts"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record_checkout(self, wait_seconds: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_seconds_total += wait_seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, wait_seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_seconds_total": self.wait_seconds_total,
+                "wait_seconds_max": self.wait_seconds_max,
+            }
+
+
+pool_metrics = PoolMetrics()
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long callers wait for a connection"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            pool_metrics.record_checkout(time.perf_counter() - start, timed_out=True)
+            raise
+        pool_metrics.record_checkout(time.perf_counter() - start)
+        return connection
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Enable WAL so readers do not block the writer, and relax fsync to NORMAL"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+def create_db_engine(url: str):
+    """
+    Create a SQLAlchemy engine with the configured pool settings
+    
+    Args:
+        url: Database URL
+        
+    Returns:
+        SQLAlchemy engine
+    """
+    if url.startswith("sqlite"):
+        connect_args = {"check_same_thread": False}
+        if ":memory:" in url or url in ("sqlite://", "sqlite:///"):
+            # In-memory databases live in a single connection; keep SQLAlchemy's default pool
+            return create_engine(url, connect_args=connect_args)
+        db_engine = create_engine(
+            url,
+            connect_args=connect_args,
+            poolclass=InstrumentedQueuePool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+        )
+        if SQLITE_WAL:
+            event.listen(db_engine, "connect", _set_sqlite_pragmas)
+        return db_engine
+
+    return create_engine(
+        url,
+        poolclass=InstrumentedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
     )
-else:
-    engine = create_engine(DATABASE_URL)
 
-# Create SessionLocal class
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# One engine per shard; with DATABASE_SHARDS unset there is a single shard on DATABASE_URL
+shard_urls = parse_shards(DATABASE_SHARDS, DATABASE_URL)
+# Read-only service calls go to these when they are healthy (see run_read)
+replicas = ReplicaSet(parse_replicas(DATABASE_REPLICA_URLS, list(shard_urls)), create_db_engine)
+router = ShardRouter(shard_urls, create_db_engine, ShardMap(DATABASE_SHARD_MAP), replicas)
+
+# Pairs written recently in this process; their reads stay on the primary
+write_pins = WritePins()
+
+# Engine of the first shard, which also holds the global tables
+engine = router.engines[router.default]
+
+# Create SessionLocal class; sessions pick the engine per statement (see RoutingSession)
+SessionLocal = sessionmaker(class_=RoutingSession, router=router, autocommit=False, autoflush=False)
 
 # Base class for models
 Base = declarative_base()
 
+T = TypeVar("T")
+
 @contextmanager
-def get_db() -> Generator[Any, None, None]:
-    """Context manager to get a database session"""
+def get_db(dopple_id: Optional[str] = None, shard: Optional[str] = None) -> Generator[Any, None, None]:
+    """
+    Context manager to get a database session, committed once on exit
+    
+    Args:
+        dopple_id: Route the session to this dopple's shard
+        shard: Route the session to a named shard
+    """
     db = SessionLocal()
     try:
+        route(db, dopple_id=dopple_id, shard=shard)
         yield db
         db.commit()
     except Exception:
@@ -36,80 +167,406 @@ def get_db() -> Generator[Any, None, None]:
     finally:
         db.close()
 
+@contextmanager
+def session_scope(
+    db: Optional[Session] = None, dopple_id: Optional[str] = None, shard: Optional[str] = None
+) -> Generator[Session, None, None]:
+    """
+    Reuse a caller-provided session, or open a new transactional one
+    
+    When a session is passed in, the caller owns the transaction and commits it;
+    otherwise the session is committed when the block exits. Either way the
+    session is routed to the dopple's (or the named) shard when one is given.
+    """
+    if db is not None:
+        yield route(db, dopple_id=dopple_id, shard=shard)
+        return
+    with get_db(dopple_id=dopple_id, shard=shard) as session:
+        yield session
+
+def for_each_shard(fn: Callable[[Session], T], db: Optional[Session] = None, reads: bool = False) -> List[T]:
+    """
+    Run a query on every shard, in parallel when there are several
+    
+    Each shard gets its own session, committed on exit. With a single shard the
+    caller's session (if any) is used instead, so unsharded deployments run
+    exactly as before.
+    
+    Args:
+        fn: Function taking a session routed to one shard
+        db: Optional session, used only when there is a single shard
+        reads: fn only reads; run it on replicas where possible (see run_read)
+        
+    Returns:
+        Results in shard order
+    """
+    if not router.sharded:
+        if reads:
+            return [run_read(fn, db)]
+        with session_scope(db) as session:
+            return [fn(session)]
+    
+    def run(shard: str) -> T:
+        if reads:
+            return run_read(fn, shard=shard)
+        with get_db(shard=shard) as session:
+            return fn(session)
+    
+    return list(router.fan_out(run).values())
+
+def run_read(
+    fn: Callable[[Session], T],
+    db: Optional[Session] = None,
+    dopple_id: Optional[str] = None,
+    user_id: Optional[str] = None,
+    shard: Optional[str] = None
+) -> T:
+    """
+    Run a read-only function on a replica of its shard when that is safe
+    
+    The primary is used when the shard has no healthy replica, when the
+    session has uncommitted writes, or while the (dopple, user) scope is pinned
+    after a recent write. A database error on a replica takes it out of
+    rotation and the function is rerun on the primary.
+    
+    Args:
+        fn: Function taking the session; must not write
+        db: Optional session; the caller owns its transaction
+        dopple_id: Dopple the read is scoped to (routes to its shard)
+        user_id: User the read is scoped to
+        shard: Shard to read from when the read is not scoped to a dopple
+        
+    Returns:
+        Result of fn
+    """
+    with session_scope(db, dopple_id=dopple_id, shard=shard) as session:
+        if not replicas or has_writes(session) or write_pins.is_pinned(dopple_id, user_id):
+            return fn(session)
+        with read_only(session):
+            try:
+                return fn(session)
+            except DBAPIError as e:
+                replica = replica_used(session)
+                if replica is None:
+                    raise
+                replica.mark_down(e)
+                # Nothing was written (checked above); drop the failed replica transaction
+                session.rollback()
+        return fn(session)
+
+_PINS_KEY = "replica_pins"
+
+def pin_after_commit(db: Session, dopple_id: str, user_id: str) -> None:
+    """Keep a pair's reads on the primary for a while once the session's write commits"""
+    if replicas:
+        db.info.setdefault(_PINS_KEY, set()).add((dopple_id, user_id))
+
+@event.listens_for(RoutingSession, "after_commit")
+def _apply_pins(session):
+    for dopple_id, user_id in session.info.pop(_PINS_KEY, ()):
+        write_pins.pin(dopple_id, user_id)
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _discard_pins(session):
+    session.info.pop(_PINS_KEY, None)
+
+def get_replica_stats() -> Dict[str, Any]:
+    """Health, lag and read counts of every replica, plus reads that fell back to a primary"""
+    return {"replicas": replicas.stats(), "primary_reads": replicas.primary_reads}
+
+def get_session() -> Generator[Session, None, None]:
+    """FastAPI dependency providing a request-scoped session with a single commit"""
+    with get_db() as db:
+        yield db
+
+def get_pool_stats() -> Dict[str, Any]:
+    """
+    Get connection pool usage and checkout wait statistics
+    
+    Returns:
+        Dictionary with pool gauges and checkout counters
+    """
+    pools = [shard_engine.pool for shard_engine in router.engines.values()]
+    
+    def total(attribute: str):
+        values = [getattr(pool, attribute)() for pool in pools if hasattr(pool, attribute)]
+        return sum(values) if values else None
+    
+    stats = {
+        "shards": len(pools),
+        "pool_size": total("size"),
+        "checked_out": total("checkedout"),
+        "overflow": total("overflow"),
+    }
+    stats.update(pool_metrics.snapshot())
+    return stats
+
+# Seed metadata; changing these lists changes the seed fingerprint, so the next startup reseeds
+SEED_EMOTIONS = [
+    {"name": "happy", "description": "Feeling or showing pleasure or contentment", "intensity": 7},
+    {"name": "sad", "description": "Feeling or showing sorrow; unhappy", "intensity": 6},
+    {"name": "angry", "description": "Feeling or showing strong annoyance, displeasure, or hostility", "intensity": 8},
+    {"name": "surprised", "description": "Feeling or showing surprise", "intensity": 5},
+    {"name": "afraid", "description": "Feeling fear or anxiety", "intensity": 7},
+    {"name": "disgusted", "description": "Feeling or showing strong dislike or disapproval", "intensity": 6},
+    {"name": "neutral", "description": "Not feeling or showing any strong emotion", "intensity": 3},
+    {"name": "curious", "description": "Eager to know or learn something", "intensity": 6},
+    {"name": "excited", "description": "Very enthusiastic and eager", "intensity": 8},
+    {"name": "thoughtful", "description": "Absorbed in or involving thought", "intensity": 5},
+]
+
+SEED_TOPICS = [
+    {"name": "personal", "description": "Personal information about the user or dopple"},
+    {"name": "work", "description": "Discussion about work-related topics"},
+    {"name": "family", "description": "Discussion about family members or family relations"},
+    {"name": "relationships", "description": "Discussion about relationships"},
+    {"name": "hobbies", "description": "Discussion about hobbies and interests"},
+    {"name": "education", "description": "Discussion about education or learning"},
+    {"name": "health", "description": "Discussion about health and wellness"},
+    {"name": "entertainment", "description": "Discussion about movies, games, books, etc."},
+    {"name": "technology", "description": "Discussion about technology topics"},
+    {"name": "philosophy", "description": "Discussion about philosophical concepts"},
+    {"name": "art", "description": "Discussion about art and creativity"},
+    {"name": "science", "description": "Discussion about scientific topics"},
+    {"name": "ethics", "description": "Discussion about ethical dilemmas and concepts"},
+]
+
+SEED_TRAITS = [
+    {"name": "creative", "description": "Showing creativity and imagination", "intensity": 7},
+    {"name": "analytical", "description": "Relating to or using analysis", "intensity": 6},
+    {"name": "empathetic", "description": "Showing an ability to understand and share the feelings of another", "intensity": 8},
+    {"name": "logical", "description": "Characterized by clear, sound reasoning", "intensity": 7},
+    {"name": "decisive", "description": "Having or showing the ability to make decisions quickly and effectively", "intensity": 6},
+    {"name": "adaptable", "description": "Able to adjust to new conditions or situations", "intensity": 7},
+    {"name": "optimistic", "description": "Hopeful and confident about the future", "intensity": 6},
+    {"name": "pessimistic", "description": "Tending to see the worst aspect of things", "intensity": 4},
+    {"name": "curious", "description": "Eager to know or learn something", "intensity": 8},
+    {"name": "cautious", "description": "Careful to avoid potential problems or dangers", "intensity": 5},
+    {"name": "adventurous", "description": "Willing to take risks and try new experiences", "intensity": 7},
+    {"name": "organized", "description": "Arranged in a systematic way", "intensity": 6},
+    {"name": "spontaneous", "description": "Done or occurring as a result of a sudden impulse", "intensity": 7},
+]
+
+# schema_meta keys
+SCHEMA_KEY = "schema"
+SEED_KEY = "seed"
+# Part of the schema fingerprint; bump it when init_db learns a new kind of migration so markers written before rerun it
+SCHEMA_MIGRATIONS_VERSION = 2
+
 def init_db():
-    """Initialize database with tables"""
+    """
+    Initialize database with tables, and bring existing tables up to the models
+    
+    create_all only creates missing tables, so columns and indexes added to a
+    model later (e.g. memories.token_count) are added to existing tables here.
+    
+    Raises:
+        RuntimeError: If a shard's live schema still lacks a declared column or index
+    """
     # Import all models to ensure they're registered with Base.metadata
-    from src.backend.models.semantic_memory import Memory, Embedding, Emotion, Topic, PersonalityTrait
+    from src.backend.models.semantic_memory import Memory, Embedding, Emotion, Topic, PersonalityTrait, ArchivedMemory, DedupPolicy, EmbeddingModelState, ReembeddingJob, SchedulerLease, SchemaMeta, SearchVersion
+    
+    # Create tables on every shard; each holds the full schema
+    for shard, shard_engine in router.engines.items():
+        Base.metadata.create_all(bind=shard_engine)
+        _add_missing_columns(shard_engine)
+        with shard_engine.begin() as connection:
+            for table in Base.metadata.sorted_tables:
+                for index in table.indexes:
+                    index.create(bind=connection, checkfirst=True)
+        missing = schema_differences(shard_engine)
+        if missing:
+            raise RuntimeError(f"Schema of shard {shard} does not match the models; missing {', '.join(missing)}")
+
+def _column_ddl(column, dialect) -> str:
+    """Column clause of an ALTER TABLE ... ADD COLUMN; scalar defaults become server defaults so existing rows get them"""
+    preparer = dialect.identifier_preparer
+    ddl = f"{preparer.format_column(column)} {column.type.compile(dialect=dialect)}"
+    default = column.default.arg if column.default is not None and column.default.is_scalar else None
+    if column.server_default is not None:
+        ddl += f" DEFAULT {column.server_default.arg}"
+    elif default is not None:
+        ddl += f" DEFAULT {literal(default, column.type).compile(dialect=dialect, compile_kwargs={'literal_binds': True})}"
+    if not column.nullable:
+        if default is None and column.server_default is None:
+            raise RuntimeError(
+                f"Cannot add NOT NULL column {column.table.name}.{column.name} without a default; migrate it by hand"
+            )
+        ddl += " NOT NULL"
+    return ddl
+
+def _add_missing_columns(shard_engine) -> List[str]:
+    """
+    Add declared columns that a shard's existing tables lack
     
-    # Create tables
-    Base.metadata.create_all(bind=engine)
+    Returns:
+        Added columns as "table.column"
+    """
+    added = []
+    existing = _live_columns(shard_engine)
+    preparer = shard_engine.dialect.identifier_preparer
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing:
+            continue
+        for column in table.columns:
+            if column.name in existing[table.name]:
+                continue
+            statement = f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {_column_ddl(column, shard_engine.dialect)}"
+            try:
+                with shard_engine.begin() as connection:
+                    connection.execute(text(statement))
+            except (OperationalError, ProgrammingError):
+                # Another worker starting at the same time may have added it first
+                if column.name not in _live_columns(shard_engine).get(table.name, set()):
+                    raise
+                continue
+            added.append(f"{table.name}.{column.name}")
+    if added:
+        logger.info(f"Added columns {', '.join(added)} to {shard_engine.url.render_as_string(hide_password=True)}")
+    return added
+
+def _live_columns(shard_engine) -> Dict[str, set]:
+    inspector = inspect(shard_engine)
+    return {name: {column["name"] for column in inspector.get_columns(name)} for name in inspector.get_table_names()}
+
+def schema_differences(shard_engine) -> List[str]:
+    """Declared tables, columns and indexes missing from a shard's live schema"""
+    inspector = inspect(shard_engine)
+    live_tables = set(inspector.get_table_names())
+    missing = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in live_tables:
+            missing.append(table.name)
+            continue
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        missing.extend(f"{table.name}.{column.name}" for column in table.columns if column.name not in columns)
+        indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        missing.extend(index.name for index in table.indexes if index.name not in indexes)
+    return missing
+
+def _insert_missing(db: Session, model, rows: List[Dict[str, Any]], key: str = "name") -> int:
+    """
+    Insert rows whose key is not present yet, in one statement where the dialect allows it
+    
+    Args:
+        db: Session
+        model: Mapped class with a unique key column
+        rows: Column values per row
+        key: Unique column identifying a row
+        
+    Returns:
+        Number of rows inserted
+    """
+    if not rows:
+        return 0
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        # Column defaults (ids) are filled in per row by SQLAlchemy
+        statement = dialect_insert(model.__table__).on_conflict_do_nothing(index_elements=[key])
+        return db.execute(statement, rows).rowcount or 0
+    
+    column = getattr(model, key)
+    existing = {value for (value,) in db.query(column).filter(column.in_([row[key] for row in rows]))}
+    missing = [row for row in rows if row[key] not in existing]
+    if missing:
+        db.execute(insert(model.__table__), missing)
+    return len(missing)
 
 def seed_metadata():
     """Seed the database with initial metadata (emotions, topics, traits)"""
     from src.backend.models.semantic_memory import Emotion, Topic, PersonalityTrait
     
-    with get_db() as db:
-        # Seed emotions if they don't exist
-        emotions = [
-            {"name": "happy", "description": "Feeling or showing pleasure or contentment", "intensity": 7},
-            {"name": "sad", "description": "Feeling or showing sorrow; unhappy", "intensity": 6},
-            {"name": "angry", "description": "Feeling or showing strong annoyance, displeasure, or hostility", "intensity": 8},
-            {"name": "surprised", "description": "Feeling or showing surprise", "intensity": 5},
-            {"name": "afraid", "description": "Feeling fear or anxiety", "intensity": 7},
-            {"name": "disgusted", "description": "Feeling or showing strong dislike or disapproval", "intensity": 6},
-            {"name": "neutral", "description": "Not feeling or showing any strong emotion", "intensity": 3},
-            {"name": "curious", "description": "Eager to know or learn something", "intensity": 6},
-            {"name": "excited", "description": "Very enthusiastic and eager", "intensity": 8},
-            {"name": "thoughtful", "description": "Absorbed in or involving thought", "intensity": 5},
-        ]
-        
-        for emotion_data in emotions:
-            emotion = db.query(Emotion).filter_by(name=emotion_data["name"]).first()
-            if not emotion:
-                db.add(Emotion(**emotion_data))
-        
-        # Seed topics if they don't exist
-        topics = [
-            {"name": "personal", "description": "Personal information about the user or dopple"},
-            {"name": "work", "description": "Discussion about work-related topics"},
-            {"name": "family", "description": "Discussion about family members or family relations"},
-            {"name": "relationships", "description": "Discussion about relationships"},
-            {"name": "hobbies", "description": "Discussion about hobbies and interests"},
-            {"name": "education", "description": "Discussion about education or learning"},
-            {"name": "health", "description": "Discussion about health and wellness"},
-            {"name": "entertainment", "description": "Discussion about movies, games, books, etc."},
-            {"name": "technology", "description": "Discussion about technology topics"},
-            {"name": "philosophy", "description": "Discussion about philosophical concepts"},
-            {"name": "art", "description": "Discussion about art and creativity"},
-            {"name": "science", "description": "Discussion about scientific topics"},
-            {"name": "ethics", "description": "Discussion about ethical dilemmas and concepts"},
-        ]
-        
-        for topic_data in topics:
-            topic = db.query(Topic).filter_by(name=topic_data["name"]).first()
-            if not topic:
-                db.add(Topic(**topic_data))
-        
-        # Seed personality traits if they don't exist
-        traits = [
-            {"name": "creative", "description": "Showing creativity and imagination", "intensity": 7},
-            {"name": "analytical", "description": "Relating to or using analysis", "intensity": 6},
-            {"name": "empathetic", "description": "Showing an ability to understand and share the feelings of another", "intensity": 8},
-            {"name": "logical", "description": "Characterized by clear, sound reasoning", "intensity": 7},
-            {"name": "decisive", "description": "Having or showing the ability to make decisions quickly and effectively", "intensity": 6},
-            {"name": "adaptable", "description": "Able to adjust to new conditions or situations", "intensity": 7},
-            {"name": "optimistic", "description": "Hopeful and confident about the future", "intensity": 6},
-            {"name": "pessimistic", "description": "Tending to see the worst aspect of things", "intensity": 4},
-            {"name": "curious", "description": "Eager to know or learn something", "intensity": 8},
-            {"name": "cautious", "description": "Careful to avoid potential problems or dangers", "intensity": 5},
-            {"name": "adventurous", "description": "Willing to take risks and try new experiences", "intensity": 7},
-            {"name": "organized", "description": "Arranged in a systematic way", "intensity": 6},
-            {"name": "spontaneous", "description": "Done or occurring as a result of a sudden impulse", "intensity": 7},
-        ]
-        
-        for trait_data in traits:
-            trait = db.query(PersonalityTrait).filter_by(name=trait_data["name"]).first()
-            if not trait:
-                db.add(PersonalityTrait(**trait_data))
-        
-        db.commit() 
\ No newline at end of file
+    # Every shard has its own tag tables, so tag joins never cross shards
+    for shard in router.names:
+        with get_db(shard=shard) as db:
+            # One insert per table; names that already exist are left untouched
+            _insert_missing(db, Emotion, SEED_EMOTIONS)
+            _insert_missing(db, Topic, SEED_TOPICS)
+            _insert_missing(db, PersonalityTrait, SEED_TRAITS)
+
+def _fingerprint(payload: Any) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+def schema_fingerprint() -> str:
+    """Digest of the tables, columns and indexes declared on Base.metadata"""
+    # Importing the models registers their tables
+    from src.backend.models import semantic_memory  # noqa: F401
+    
+    tables = []
+    for table in sorted(Base.metadata.tables.values(), key=lambda t: t.name):
+        tables.append({
+            "name": table.name,
+            "columns": [
+                [column.name, str(column.type), column.nullable, column.primary_key, column.unique, column.index]
+                for column in table.columns
+            ],
+            "indexes": sorted(index.name or "" for index in table.indexes),
+            "constraints": sorted(constraint.name or "" for constraint in table.constraints if constraint.name),
+        })
+    return _fingerprint({"migrations": SCHEMA_MIGRATIONS_VERSION, "tables": tables})
+
+def seed_fingerprint() -> str:
+    """Digest of the seed metadata lists"""
+    return _fingerprint([SEED_EMOTIONS, SEED_TOPICS, SEED_TRAITS])
+
+def _read_shard_markers(shard_engine) -> Dict[str, str]:
+    from src.backend.models.semantic_memory import SchemaMeta
+    
+    try:
+        with shard_engine.connect() as connection:
+            return dict(connection.execute(select(SchemaMeta.key, SchemaMeta.value)).all())
+    except (OperationalError, ProgrammingError):
+        # No schema_meta table yet: a fresh database, or one created before the markers existed
+        return {}
+
+def _read_markers() -> Dict[str, str]:
+    """Markers every shard agrees on; a newly added shard has none, so the work reruns everywhere"""
+    shard_markers = [_read_shard_markers(shard_engine) for shard_engine in router.engines.values()]
+    first = shard_markers[0]
+    return {key: value for key, value in first.items() if all(other.get(key) == value for other in shard_markers[1:])}
+
+def _write_markers(markers: Dict[str, str]):
+    from src.backend.models.semantic_memory import SchemaMeta
+    
+    for shard in router.names:
+        with get_db(shard=shard) as db:
+            for key, value in markers.items():
+                db.merge(SchemaMeta(key=key, value=value))
+
+def bootstrap_db() -> Dict[str, str]:
+    """
+    Create the schema and seed metadata, skipping whatever the stored fingerprints say is current
+    
+    A restart against an up-to-date database costs a single SELECT per shard. When several
+    workers start together, each may apply the (idempotent) schema and seed
+    work; the one that loses the race to write the markers re-reads them. The
+    schema marker is only written once init_db has checked every shard's live
+    tables against the models.
+    
+    Returns:
+        Dictionary with "schema" and "seed" set to "current" or "applied"
+    """
+    schema, seed = schema_fingerprint(), seed_fingerprint()
+    markers = _read_markers()
+    result = {"schema": "current", "seed": "current"}
+    updates = {}
+    if markers.get(SCHEMA_KEY) != schema:
+        init_db()
+        result["schema"] = "applied"
+        updates[SCHEMA_KEY] = schema
+    if markers.get(SEED_KEY) != seed:
+        seed_metadata()
+        result["seed"] = "applied"
+        updates[SEED_KEY] = seed
+    if updates:
+        try:
+            _write_markers(updates)
+        except IntegrityError:
+            # Another worker wrote the markers first
+            if any(_read_markers().get(key) != value for key, value in updates.items()):
+                raise
+    return result
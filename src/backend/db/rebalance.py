@@ -0,0 +1,196 @@
+"""
+Row copying between shards for the dopple rebalancing tool (see sharding.move_dopple)
+
+Every row keyed by a dopple moves with it: memories, their embeddings and tag
+associations, archived memories, the dedup policy and search versions. Tag ids
+differ between shards (each seeds its own tag tables), so associations are
+copied by tag name.
+"""
+from typing import Callable, Dict, List, Set
+
+from sqlalchemy import delete, func, insert, select, update
+
+from src.backend.models.semantic_memory import (
+    ArchivedMemory, DedupPolicy, Embedding, Emotion, Memory, PersonalityTrait, SearchVersion, Topic,
+    memory_emotion_association, memory_topic_association, memory_trait_association,
+)
+
+# (association table, tag column, tag model)
+_ASSOCIATIONS = [
+    (memory_emotion_association, "emotion_id", Emotion),
+    (memory_topic_association, "topic_id", Topic),
+    (memory_trait_association, "trait_id", PersonalityTrait),
+]
+
+# Tables with a dopple_id column whose rows are copied whole
+_DOPPLE_TABLES = [ArchivedMemory.__table__, DedupPolicy.__table__]
+
+
+def _chunks(items: List, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _memory_ids(db, dopple_id: str) -> Set[str]:
+    table = Memory.__table__
+    return set(db.execute(select(table.c.id).where(table.c.dopple_id == dopple_id)).scalars())
+
+
+def _primary_key(table, row) -> tuple:
+    return tuple(row[column.name] for column in table.primary_key.columns)
+
+
+def _copy_rows(source_db, target_db, table, rows: List[dict], refresh: bool) -> int:
+    """Insert rows missing on the target; with refresh, overwrite the ones already there"""
+    if not rows:
+        return 0
+    key_columns = list(table.primary_key.columns)
+    if len(key_columns) == 1:
+        column = key_columns[0]
+        existing = set(target_db.execute(
+            select(column).where(column.in_([row[column.name] for row in rows]))
+        ).scalars())
+        existing = {(value,) for value in existing}
+    else:
+        existing = set()
+        for row in rows:
+            condition = [column == row[column.name] for column in key_columns]
+            if target_db.execute(select(func.count()).select_from(table).where(*condition)).scalar():
+                existing.add(_primary_key(table, row))
+    missing = [row for row in rows if _primary_key(table, row) not in existing]
+    if missing:
+        target_db.execute(insert(table), missing)
+    if refresh:
+        for row in rows:
+            if _primary_key(table, row) in existing:
+                condition = [column == row[column.name] for column in key_columns]
+                target_db.execute(update(table).where(*condition).values(**row))
+    return len(missing)
+
+
+def _tag_names(db, model) -> Dict[str, str]:
+    return dict(db.execute(select(model.id, model.name)).all())
+
+
+def _copy_associations(source_db, target_db, memory_ids: List[str]) -> int:
+    """Replace the target's tag associations of these memories with the source's, matched by tag name"""
+    copied = 0
+    for association, tag_column, tag_model in _ASSOCIATIONS:
+        rows = source_db.execute(
+            select(association.c.memory_id, tag_model.name, tag_model.description)
+            .join(tag_model, tag_model.id == association.c[tag_column])
+            .where(association.c.memory_id.in_(memory_ids))
+        ).all()
+        target_ids = {name: tag_id for tag_id, name in _tag_names(target_db, tag_model).items()}
+        for _, name, description in rows:
+            if name not in target_ids:
+                # A tag created at runtime on the source shard only
+                tag = tag_model(name=name, description=description)
+                target_db.add(tag)
+                target_db.flush()
+                target_ids[name] = tag.id
+        target_db.execute(delete(association).where(association.c.memory_id.in_(memory_ids)))
+        if rows:
+            target_db.execute(insert(association), [
+                {"memory_id": memory_id, tag_column: target_ids[name]} for memory_id, name, _ in rows
+            ])
+            copied += len(rows)
+    return copied
+
+
+def _delete_memories(db, memory_ids: List[str], batch_size: int) -> int:
+    deleted = 0
+    for chunk in _chunks(memory_ids, batch_size):
+        for association, _, _ in _ASSOCIATIONS:
+            db.execute(delete(association).where(association.c.memory_id.in_(chunk)))
+        db.execute(delete(Embedding.__table__).where(Embedding.__table__.c.memory_id.in_(chunk)))
+        deleted += db.execute(delete(Memory.__table__).where(Memory.__table__.c.id.in_(chunk))).rowcount or 0
+    return deleted
+
+
+def copy_dopple(
+    get_db: Callable, source: str, target: str, dopple_id: str, batch_size: int, refresh: bool = False
+) -> Dict[str, int]:
+    """
+    Copy a dopple's rows from one shard to another
+
+    Without refresh, only rows missing on the target are inserted, so the copy
+    can run (and be repeated) while the dopple takes writes. With refresh, rows
+    already copied are overwritten and rows deleted on the source since are
+    removed from the target; this is the final pass, run with writes frozen.
+
+    Args:
+        get_db: Session factory accepting shard=
+        source: Source shard name
+        target: Target shard name
+        dopple_id: Dopple to copy
+        batch_size: Memories per batch
+        refresh: Overwrite existing rows and drop rows gone from the source
+
+    Returns:
+        Rows inserted per table
+    """
+    counts = {"memories": 0, "embeddings": 0, "associations": 0}
+    memory_table, embedding_table = Memory.__table__, Embedding.__table__
+
+    with get_db(shard=source) as source_db, get_db(shard=target) as target_db:
+        source_ids = sorted(_memory_ids(source_db, dopple_id))
+        if refresh:
+            stale = sorted(_memory_ids(target_db, dopple_id) - set(source_ids))
+            counts["deleted_on_target"] = _delete_memories(target_db, stale, batch_size)
+
+        for chunk in _chunks(source_ids, batch_size):
+            memories = [dict(row._mapping) for row in source_db.execute(
+                select(memory_table).where(memory_table.c.id.in_(chunk))
+            )]
+            counts["memories"] += _copy_rows(source_db, target_db, memory_table, memories, refresh)
+            embeddings = [dict(row._mapping) for row in source_db.execute(
+                select(embedding_table).where(embedding_table.c.memory_id.in_(chunk))
+            )]
+            if refresh:
+                # Embeddings replaced on the source (re-embedding) since the first pass
+                kept = [row["id"] for row in embeddings]
+                target_db.execute(
+                    delete(embedding_table)
+                    .where(embedding_table.c.memory_id.in_(chunk), embedding_table.c.id.not_in(kept))
+                )
+            counts["embeddings"] += _copy_rows(source_db, target_db, embedding_table, embeddings, refresh)
+            counts["associations"] += _copy_associations(source_db, target_db, chunk)
+            target_db.flush()
+
+        for table in _DOPPLE_TABLES:
+            rows = [dict(row._mapping) for row in source_db.execute(
+                select(table).where(table.c.dopple_id == dopple_id)
+            )]
+            counts[table.name] = 0
+            for chunk in _chunks(rows, batch_size):
+                counts[table.name] += _copy_rows(source_db, target_db, table, chunk, refresh)
+
+        # Versions move one past the source's, so results cached from the source never match the target
+        versions = SearchVersion.__table__
+        rows = [dict(row._mapping) for row in source_db.execute(
+            select(versions).where(versions.c.dopple_id == dopple_id)
+        )]
+        for row in rows:
+            row["version"] += 1
+        counts["search_versions"] = _copy_rows(source_db, target_db, versions, rows, refresh=True)
+    return counts
+
+
+def delete_dopple(get_db: Callable, shard: str, dopple_id: str, batch_size: int) -> Dict[str, int]:
+    """
+    Delete a dopple's rows from a shard, one batch per transaction
+
+    Returns:
+        Rows deleted per table
+    """
+    with get_db(shard=shard) as db:
+        memory_ids = sorted(_memory_ids(db, dopple_id))
+    counts = {"memories": 0}
+    for chunk in _chunks(memory_ids, batch_size):
+        with get_db(shard=shard) as db:
+            counts["memories"] += _delete_memories(db, chunk, batch_size)
+    with get_db(shard=shard) as db:
+        for table in _DOPPLE_TABLES + [SearchVersion.__table__]:
+            counts[table.name] = db.execute(delete(table).where(table.c.dopple_id == dopple_id)).rowcount or 0
+    return counts
@@ -0,0 +1,233 @@
+"""
+Read replicas for search and stats queries
+
+Each shard can have streaming replicas. Read-only MemoryService calls run
+their queries on a healthy replica (see database.run_read) so heavy search
+load does not compete with writes for the primary. A background thread
+probes every replica and takes it out of rotation while it is unreachable or
+lagging more than REPLICA_MAX_LAG_SECONDS; a query that fails on a replica
+marks it down and is rerun on the primary.
+
+Reads of a (dopple, user) pair go to the primary for REPLICA_PIN_SECONDS after
+a write to it commits in this process, so a client that writes and then
+searches sees its write even while the replicas catch up.
+"""
+import itertools
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# Comma-separated replica URLs of the first shard, or shard=url entries for any shard
+DATABASE_REPLICA_URLS = os.getenv("DATABASE_REPLICA_URLS", "")
+# Seconds reads of a dopple/user pair stay on the primary after a write to it
+REPLICA_PIN_SECONDS = float(os.getenv("REPLICA_PIN_SECONDS", "5"))
+# Seconds between replica health probes
+REPLICA_HEALTH_INTERVAL_SECONDS = float(os.getenv("REPLICA_HEALTH_INTERVAL_SECONDS", "5"))
+# Replicas further behind than this are skipped until they catch up
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "10"))
+
+# Replay delay of a PostgreSQL standby; zero when it has replayed everything it received
+_POSTGRES_LAG = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+def parse_replicas(spec: str, shards: List[str]) -> Dict[str, List[str]]:
+    """
+    Parse DATABASE_REPLICA_URLS into replica URLs per shard
+
+    Args:
+        spec: Comma-separated entries, each a URL (a replica of the first shard) or shard=url
+        shards: Configured shard names, first shard first
+
+    Returns:
+        Replica URLs by shard name; shards without replicas are left out
+    """
+    replicas: Dict[str, List[str]] = {}
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, separator, url = item.partition("=")
+        # URLs can contain '=' in their query string, never before the scheme
+        if not separator or "://" in name:
+            name, url = shards[0], item
+        name, url = name.strip(), url.strip()
+        if name not in shards:
+            raise ValueError(f"DATABASE_REPLICA_URLS names unknown shard {name!r}")
+        replicas.setdefault(name, []).append(url)
+    return replicas
+
+
+class Replica:
+    """One replica engine and its last known health"""
+
+    def __init__(self, shard: str, index: int, engine):
+        self.name = f"{shard}-r{index}"
+        self.shard = shard
+        self.engine = engine
+        self.healthy = True
+        self.lag_seconds = 0.0
+        self.failures = 0
+        self.reads = 0
+        self.last_error: Optional[str] = None
+        self.checked_at: Optional[float] = None
+
+    def probe(self):
+        """Check connectivity and replication lag"""
+        try:
+            with self.engine.connect() as connection:
+                if self.engine.dialect.name == "postgresql":
+                    lag = float(connection.execute(_POSTGRES_LAG).scalar() or 0.0)
+                else:
+                    connection.execute(text("SELECT 1"))
+                    lag = 0.0
+        except Exception as e:
+            self.mark_down(e)
+        else:
+            was_healthy = self.healthy
+            self.lag_seconds = lag
+            self.healthy = lag <= REPLICA_MAX_LAG_SECONDS
+            if self.healthy and not was_healthy:
+                logger.info(f"Replica {self.name} is back in rotation")
+            elif not self.healthy and was_healthy:
+                logger.warning(f"Replica {self.name} is {lag:.1f}s behind; reading from the primary")
+        self.checked_at = time.monotonic()
+
+    def mark_down(self, error: Exception):
+        if self.healthy:
+            logger.warning(f"Replica {self.name} taken out of rotation: {str(error)}")
+        self.healthy = False
+        self.failures += 1
+        self.last_error = str(error)[:500]
+
+
+class ReplicaSet:
+    """Replicas of every shard, picked round-robin among the healthy ones"""
+
+    def __init__(self, urls: Dict[str, List[str]], engine_factory: Callable[[str], Any]):
+        self.replicas: Dict[str, List[Replica]] = {
+            shard: [Replica(shard, index, engine_factory(url)) for index, url in enumerate(shard_urls)]
+            for shard, shard_urls in urls.items()
+        }
+        self._cycles = {shard: itertools.cycle(replicas) for shard, replicas in self.replicas.items()}
+        self._lock = threading.Lock()
+        self.primary_reads = 0
+
+    def __bool__(self) -> bool:
+        return bool(self.replicas)
+
+    def choose(self, shard: str) -> Optional[Replica]:
+        """Next healthy replica of a shard, or None to read from the primary"""
+        replicas = self.replicas.get(shard)
+        if not replicas:
+            return None
+        with self._lock:
+            for _ in range(len(replicas)):
+                replica = next(self._cycles[shard])
+                if replica.healthy:
+                    replica.reads += 1
+                    return replica
+            self.primary_reads += 1
+        return None
+
+    def probe_all(self):
+        for replicas in self.replicas.values():
+            for replica in replicas:
+                replica.probe()
+
+    def engines(self) -> List[Any]:
+        return [replica.engine for replicas in self.replicas.values() for replica in replicas]
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            replica.name: {
+                "shard": replica.shard,
+                "healthy": replica.healthy,
+                "lag_seconds": replica.lag_seconds,
+                "reads": replica.reads,
+                "failures": replica.failures,
+                "last_error": replica.last_error,
+            }
+            for replicas in self.replicas.values()
+            for replica in replicas
+        }
+
+
+class WritePins:
+    """
+    Recent writes per (dopple, user), (dopple, *) and (*, user) scope
+
+    Process-local: with several workers, read-your-writes holds for clients
+    whose requests reach the same worker, or once replication catches up.
+    """
+
+    def __init__(self, seconds: float = REPLICA_PIN_SECONDS):
+        self.seconds = seconds
+        self._until: Dict[Tuple[Optional[str], Optional[str]], float] = {}
+        self._lock = threading.Lock()
+
+    def pin(self, dopple_id: str, user_id: str):
+        until = time.monotonic() + self.seconds
+        with self._lock:
+            for key in ((dopple_id, user_id), (dopple_id, None), (None, user_id)):
+                self._until[key] = until
+            if len(self._until) > 10000:
+                self._prune()
+
+    def is_pinned(self, dopple_id: Optional[str], user_id: Optional[str]) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            if dopple_id is None and user_id is None:
+                # Unscoped reads stay on the primary while anything was written recently
+                return any(until > now for until in self._until.values())
+            return self._until.get((dopple_id, user_id), 0.0) > now
+
+    def _prune(self):
+        now = time.monotonic()
+        for key in [key for key, until in self._until.items() if until <= now]:
+            del self._until[key]
+
+
+# ---- Health checks ----
+
+_health_thread: Optional[threading.Thread] = None
+_health_stop = threading.Event()
+
+
+def start_health_checks(replica_set: ReplicaSet, interval: float = REPLICA_HEALTH_INTERVAL_SECONDS) -> bool:
+    """
+    Start probing replicas in a background thread
+
+    Returns:
+        True if the thread was started
+    """
+    global _health_thread
+    if not replica_set or interval <= 0 or (_health_thread is not None and _health_thread.is_alive()):
+        return False
+    _health_stop.clear()
+
+    def loop():
+        while True:
+            try:
+                replica_set.probe_all()
+            except Exception as e:
+                logger.error(f"Replica health check failed: {str(e)}", exc_info=True)
+            if _health_stop.wait(interval):
+                return
+
+    _health_thread = threading.Thread(target=loop, name="replica-health", daemon=True)
+    _health_thread.start()
+    return True
+
+
+def stop_health_checks():
+    """Stop the replica health check thread"""
+    _health_stop.set()
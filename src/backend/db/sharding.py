@@ -0,0 +1,508 @@
+"""
+Dopple-sharded database routing
+
+Memories, embeddings and everything else keyed by a dopple live on the shard
+its dopple_id hashes to on a consistent-hash ring. A shard map file can pin
+individual dopples elsewhere, which is how the rebalancing tool moves one
+without touching the ring. Tables listed in GLOBAL_TABLES (active model,
+re-embedding jobs, chat sync checkpoint, scheduler leases) live on the first
+shard; the tag tables are seeded on every shard so tag joins stay local.
+
+Sessions route themselves: services call route(db, dopple_id) before touching
+sharded tables, and RoutingSession.get_bind sends each statement to that
+shard's engine. With a single shard (the default) every statement goes to the
+one engine and nothing else changes.
+
+Rebalancing CLI (run from the repository root; DATABASE_SHARDS and
+DATABASE_SHARD_MAP must match the running service):
+    python -m src.backend.db.sharding show --dopple <dopple_id>
+    python -m src.backend.db.sharding plan
+    python -m src.backend.db.sharding move --dopple <dopple_id> --to <shard>
+"""
+import argparse
+import bisect
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, TypeVar
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.util import find_tables
+
+from src.backend.db.replicas import Replica, ReplicaSet
+
+logger = logging.getLogger(__name__)
+
+# Comma-separated name=url pairs, e.g. "s0=sqlite:///s0.db,s1=sqlite:///s1.db"; unset uses DATABASE_URL alone
+DATABASE_SHARDS = os.getenv("DATABASE_SHARDS", "")
+# JSON file pinning dopples to shards (written by the rebalancing tool)
+DATABASE_SHARD_MAP = os.getenv("DATABASE_SHARD_MAP")
+# Seconds a worker trusts its copy of the shard map before checking the file again
+SHARD_MAP_RELOAD_SECONDS = float(os.getenv("SHARD_MAP_RELOAD_SECONDS", "1"))
+# Points per shard on the hash ring; more points spread dopples more evenly
+SHARD_VIRTUAL_NODES = int(os.getenv("SHARD_VIRTUAL_NODES", "64"))
+# Threads used to run a query on every shard at once
+SHARD_FANOUT_WORKERS = int(os.getenv("SHARD_FANOUT_WORKERS", "8"))
+# Rows copied per statement when moving a dopple
+SHARD_MOVE_BATCH_SIZE = int(os.getenv("SHARD_MOVE_BATCH_SIZE", "500"))
+
+DEFAULT_SHARD = "default"
+
+# Single-copy tables kept on the first shard
+GLOBAL_TABLES = frozenset({"embedding_model_state", "reembedding_jobs", "chat_sync_state", "scheduler_leases"})
+# Reference tables seeded on every shard
+REPLICATED_TABLES = frozenset({"emotions", "topics", "personality_traits"})
+
+_ROUTE_KEY = "shard"
+_DOPPLE_KEY = "shard_dopple_id"
+# Session info keys for replica reads (see database.run_read)
+_READ_ONLY_KEY = "read_only"
+_REPLICA_KEY = "replica"
+_WROTE_KEY = "wrote"
+
+T = TypeVar("T")
+
+
+class ShardRoutingError(RuntimeError):
+    """Raised when a statement on a sharded table runs in a session that was never routed"""
+
+
+class ShardMoving(Exception):
+    """Raised when writing to a dopple while it is being moved between shards; retry shortly"""
+
+    def __init__(self, dopple_id: str, retry_after: float):
+        super().__init__(f"Dopple {dopple_id} is being moved between shards")
+        self.dopple_id = dopple_id
+        self.retry_after = retry_after
+
+
+def parse_shards(spec: str, default_url: str) -> Dict[str, str]:
+    """
+    Parse DATABASE_SHARDS into an ordered shard name -> URL mapping
+
+    Args:
+        spec: Comma-separated name=url pairs (may be empty)
+        default_url: URL of the single shard used when spec is empty
+
+    Returns:
+        Shard URLs in declaration order; the first shard holds the global tables
+    """
+    shards: Dict[str, str] = {}
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, separator, url = item.partition("=")
+        if not separator or not name.strip() or not url.strip():
+            raise ValueError(f"Invalid DATABASE_SHARDS entry {item!r}; expected name=url")
+        shards[name.strip()] = url.strip()
+    return shards or {DEFAULT_SHARD: default_url}
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """Consistent-hash ring; adding a shard only moves the dopples that land on its points"""
+
+    def __init__(self, names: Iterable[str], virtual_nodes: int = SHARD_VIRTUAL_NODES):
+        points = sorted((_hash(f"{name}#{i}"), name) for name in names for i in range(virtual_nodes))
+        self._hashes = [point for point, _ in points]
+        self._names = [name for _, name in points]
+
+    def lookup(self, key: str) -> str:
+        index = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._names[index]
+
+
+class ShardMap:
+    """
+    Dopple -> shard overrides and move freezes, shared by all workers through a JSON file
+
+    File format: {"dopples": {"<dopple_id>": "<shard>"}, "frozen": ["<dopple_id>", ...]}
+    """
+
+    def __init__(self, path: Optional[str], reload_seconds: float = SHARD_MAP_RELOAD_SECONDS):
+        self.path = path
+        self.reload_seconds = reload_seconds
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._mtime: Optional[float] = None
+        self.dopples: Dict[str, str] = {}
+        self.frozen: Set[str] = set()
+
+    def _refresh(self):
+        if not self.path:
+            return
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_seconds:
+            return
+        with self._lock:
+            if now - self._checked_at < self.reload_seconds:
+                return
+            self._checked_at = now
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except FileNotFoundError:
+                self.dopples, self.frozen, self._mtime = {}, set(), None
+                return
+            if mtime == self._mtime:
+                return
+            with open(self.path) as f:
+                data = json.load(f)
+            self.dopples = dict(data.get("dopples", {}))
+            self.frozen = set(data.get("frozen", []))
+            self._mtime = mtime
+
+    def get(self, dopple_id: str) -> Optional[str]:
+        self._refresh()
+        return self.dopples.get(dopple_id)
+
+    def is_frozen(self, dopple_id: str) -> bool:
+        self._refresh()
+        return dopple_id in self.frozen
+
+    def update(self, dopples: Optional[Dict[str, Optional[str]]] = None, freeze: Iterable[str] = (), thaw: Iterable[str] = ()):
+        """
+        Rewrite the map file atomically; None as a shard removes a dopple's pin
+
+        Only the rebalancing tool writes the map, one move at a time.
+        """
+        if not self.path:
+            raise RuntimeError("DATABASE_SHARD_MAP is not set")
+        with self._lock:
+            self._checked_at = 0.0
+        self._refresh()
+        assignments = dict(self.dopples)
+        for dopple_id, shard in (dopples or {}).items():
+            if shard is None:
+                assignments.pop(dopple_id, None)
+            else:
+                assignments[dopple_id] = shard
+        frozen = (self.frozen | set(freeze)) - set(thaw)
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w") as f:
+            json.dump({"dopples": assignments, "frozen": sorted(frozen)}, f, indent=2, sort_keys=True)
+        os.replace(temporary, self.path)
+        with self._lock:
+            self.dopples, self.frozen = assignments, frozen
+            self._mtime = os.stat(self.path).st_mtime_ns
+            self._checked_at = time.monotonic()
+
+
+class ShardRouter:
+    """Maps dopples to shard engines and runs work on every shard"""
+
+    def __init__(
+        self,
+        urls: Dict[str, str],
+        engine_factory: Callable[[str], Any],
+        shard_map: ShardMap,
+        replicas: Optional[ReplicaSet] = None
+    ):
+        self.urls = dict(urls)
+        self.names: List[str] = list(urls)
+        self.default = self.names[0]
+        self.engines = {name: engine_factory(url) for name, url in urls.items()}
+        self.shard_map = shard_map
+        self.replicas = replicas or ReplicaSet({}, engine_factory)
+        self.ring = HashRing(self.names)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    @property
+    def sharded(self) -> bool:
+        return len(self.names) > 1
+
+    def ring_shard(self, dopple_id: str) -> str:
+        """Shard the hash ring assigns a dopple to, ignoring the shard map"""
+        return self.ring.lookup(dopple_id) if self.sharded else self.default
+
+    def shard_for(self, dopple_id: str) -> str:
+        """Shard holding a dopple's data"""
+        if not self.sharded:
+            return self.default
+        pinned = self.shard_map.get(dopple_id)
+        return pinned if pinned in self.engines else self.ring.lookup(dopple_id)
+
+    def bind_for(self, session: Session, mapper, clause):
+        """Engine for one statement of a session (see RoutingSession)"""
+        info = session.info
+        write = _is_write(mapper, clause)
+        if write:
+            info[_WROTE_KEY] = True
+        read_only = not write and info.get(_READ_ONLY_KEY, False)
+        if not self.sharded and not read_only:
+            return self.engines[self.default]
+        tables = _table_names(mapper, clause)
+        if tables & GLOBAL_TABLES:
+            return self.engines[self.default]
+        shard = info.get(_ROUTE_KEY)
+        if shard is None:
+            if not self.sharded or (tables and tables <= REPLICATED_TABLES):
+                shard = self.default
+            else:
+                raise ShardRoutingError(
+                    f"Statement on {sorted(tables) or 'unknown tables'} in a session without a shard"
+                )
+        if write:
+            dopple_id = info.get(_DOPPLE_KEY)
+            if dopple_id is not None:
+                self.check_writable(dopple_id)
+        elif read_only:
+            # A session keeps its replica so one read sees a single snapshot
+            replica: Optional[Replica] = info.get(_REPLICA_KEY)
+            if replica is None or replica.shard != shard or not replica.healthy:
+                replica = self.replicas.choose(shard)
+            if replica is not None:
+                info[_REPLICA_KEY] = replica
+                return replica.engine
+        return self.engines[shard]
+
+    def check_writable(self, dopple_id: str):
+        """Raise ShardMoving while a dopple's rows are being moved to another shard"""
+        if self.sharded and self.shard_map.is_frozen(dopple_id):
+            raise ShardMoving(dopple_id, retry_after=max(1.0, SHARD_MAP_RELOAD_SECONDS))
+
+    def fan_out(self, fn: Callable[[str], T]) -> Dict[str, T]:
+        """
+        Run fn(shard_name) for every shard in parallel
+
+        Returns:
+            Results by shard name, in shard order
+        """
+        if not self.sharded:
+            return {self.default: fn(self.default)}
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=max(1, min(SHARD_FANOUT_WORKERS, len(self.names))), thread_name_prefix="shard"
+                    )
+        futures = {name: self._executor.submit(fn, name) for name in self.names}
+        return {name: future.result() for name, future in futures.items()}
+
+
+class RoutingSession(Session):
+    """Session whose statements go to the shard it was routed to (see route)"""
+
+    def __init__(self, router: ShardRouter, **kwargs):
+        super().__init__(**kwargs)
+        self.router = router
+
+    def get_bind(self, mapper=None, *, clause=None, bind=None, **kwargs):
+        if bind is not None:
+            return bind
+        return self.router.bind_for(self, mapper, clause)
+
+
+def route(db: Session, dopple_id: Optional[str] = None, shard: Optional[str] = None) -> Session:
+    """
+    Point a session's subsequent statements at a dopple's shard (or a named shard)
+
+    Pending changes are flushed to the previous shard first, since flushes are
+    routed by the session's shard at flush time.
+
+    Args:
+        db: Session to route
+        dopple_id: Dopple whose shard to use; writes are refused while it is being moved
+        shard: Shard name, for work that is not about a single dopple
+
+    Returns:
+        The session
+    """
+    router: Optional[ShardRouter] = getattr(db, "router", None)
+    if router is None or not router.sharded:
+        return db
+    target = router.shard_for(dopple_id) if dopple_id is not None else shard
+    if target is None:
+        return db
+    current = db.info.get(_ROUTE_KEY)
+    if current is not None and current != target and (db.new or db.dirty or db.deleted):
+        db.flush()
+    db.info[_ROUTE_KEY] = target
+    db.info[_DOPPLE_KEY] = dopple_id
+    return db
+
+
+@contextmanager
+def read_only(db: Session):
+    """Send the session's reads to a replica of its shard while the block runs (writes still go to the primary)"""
+    previous = db.info.get(_READ_ONLY_KEY, False)
+    db.info[_READ_ONLY_KEY] = True
+    try:
+        yield db
+    finally:
+        db.info[_READ_ONLY_KEY] = previous
+        if not previous:
+            db.info.pop(_REPLICA_KEY, None)
+
+
+@contextmanager
+def on_primary(db: Session):
+    """Read from the primary inside a read_only block, e.g. to build caches that outlive the request"""
+    previous = db.info.get(_READ_ONLY_KEY, False)
+    db.info[_READ_ONLY_KEY] = False
+    try:
+        yield db
+    finally:
+        db.info[_READ_ONLY_KEY] = previous
+
+
+def replica_used(db: Session) -> Optional[Replica]:
+    """Replica the session read from in the current read_only block, if any"""
+    return db.info.get(_REPLICA_KEY)
+
+
+def has_writes(db: Session) -> bool:
+    """Whether the session's transaction has written, or is about to write, anything"""
+    return bool(db.new or db.dirty or db.deleted or db.info.get(_WROTE_KEY))
+
+
+@event.listens_for(RoutingSession, "after_commit")
+@event.listens_for(RoutingSession, "after_rollback")
+def _reset_writes(session):
+    session.info.pop(_WROTE_KEY, None)
+
+
+def _table_names(mapper, clause) -> Set[str]:
+    names = set()
+    if mapper is not None:
+        names.update(table.name for table in getattr(mapper, "tables", ()) if hasattr(table, "name"))
+    if clause is not None:
+        for table in find_tables(clause, check_columns=True, include_crud=True, include_joins=True):
+            name = getattr(table, "name", None)
+            if isinstance(name, str):
+                names.add(name)
+    return names
+
+
+def _is_write(mapper, clause) -> bool:
+    # Flushes pass the mapper without a statement
+    return clause is None if mapper is not None else bool(getattr(clause, "is_dml", False))
+
+
+# ---- Rebalancing ----
+
+def _dopples_on(shard: str) -> Set[str]:
+    from src.backend.db.database import get_db
+    from src.backend.models.semantic_memory import Memory
+
+    with get_db(shard=shard) as db:
+        return {row[0] for row in db.query(Memory.dopple_id).distinct().all()}
+
+
+def plan_moves(router: ShardRouter) -> List[Dict[str, str]]:
+    """
+    Dopples whose data is not on the shard the ring assigns them to
+
+    After adding a shard, pin these to where their data is (the map already
+    routes correctly once pinned) and move them at leisure.
+    """
+    located = router.fan_out(_dopples_on)
+    moves = []
+    for shard, dopples in located.items():
+        for dopple_id in sorted(dopples):
+            target = router.ring_shard(dopple_id)
+            if target != shard:
+                moves.append({"dopple_id": dopple_id, "from": shard, "to": target, "routed_to": router.shard_for(dopple_id)})
+    return moves
+
+
+def move_dopple(router: ShardRouter, dopple_id: str, target: str, drain_seconds: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Move a dopple's rows to another shard while the service keeps running
+
+    1. Copy every row to the target while reads and writes continue on the source
+    2. Freeze the dopple in the shard map; writers get ShardMoving (503) until step 4
+    3. Wait until every worker has seen the freeze, then copy what changed meanwhile
+    4. Pin the dopple to the target and lift the freeze
+    5. Delete the rows from the source
+
+    Searches keep being served from the source until the pin lands, so only
+    writes pause, for about two map reload intervals plus the final copy.
+
+    Args:
+        router: Shard router of the running configuration
+        dopple_id: Dopple to move
+        target: Destination shard name
+        drain_seconds: Wait between freezing and the final copy (defaults to twice the reload interval)
+
+    Returns:
+        Source and target shards with rows copied and deleted per table
+    """
+    from src.backend.db.database import get_db
+    from src.backend.db.rebalance import copy_dopple, delete_dopple
+
+    if target not in router.engines:
+        raise ValueError(f"Unknown shard {target!r}; known shards: {', '.join(router.names)}")
+    source = router.shard_for(dopple_id)
+    if source == target:
+        return {}
+    drain_seconds = 2 * SHARD_MAP_RELOAD_SECONDS + 0.5 if drain_seconds is None else drain_seconds
+
+    logger.info(f"Moving dopple {dopple_id} from {source} to {target}: initial copy")
+    copied = copy_dopple(get_db, source, target, dopple_id, SHARD_MOVE_BATCH_SIZE)
+    router.shard_map.update(freeze=[dopple_id])
+    try:
+        time.sleep(drain_seconds)
+        logger.info(f"Moving dopple {dopple_id}: final copy with writes frozen")
+        final = copy_dopple(get_db, source, target, dopple_id, SHARD_MOVE_BATCH_SIZE, refresh=True)
+        pin = None if router.ring_shard(dopple_id) == target else target
+        router.shard_map.update(dopples={dopple_id: pin}, thaw=[dopple_id])
+    except BaseException:
+        router.shard_map.update(thaw=[dopple_id])
+        raise
+    # Readers still on the old map finish against the source before it is emptied
+    time.sleep(drain_seconds)
+    deleted = delete_dopple(get_db, source, dopple_id, SHARD_MOVE_BATCH_SIZE)
+    report = {
+        "dopple_id": dopple_id,
+        "source": source,
+        "target": target,
+        "copied": {table: copied.get(table, 0) + final.get(table, 0) for table in sorted(set(copied) | set(final))},
+        "deleted": deleted,
+    }
+    logger.info(f"Moved dopple {dopple_id} from {source} to {target}: {report['copied']}")
+    return report
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    show = commands.add_parser("show", help="Print the shard a dopple is routed to")
+    show.add_argument("--dopple", required=True)
+    commands.add_parser("plan", help="List dopples stored off their ring shard")
+    move = commands.add_parser("move", help="Move a dopple to another shard online")
+    move.add_argument("--dopple", required=True)
+    move.add_argument("--to", required=True, dest="target")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    from src.backend.db.database import router
+
+    if args.command == "show":
+        result: Any = {
+            "dopple_id": args.dopple,
+            "shard": router.shard_for(args.dopple),
+            "ring_shard": router.ring_shard(args.dopple),
+            "frozen": router.shard_map.is_frozen(args.dopple),
+        }
+    elif args.command == "plan":
+        result = plan_moves(router)
+    else:
+        result = move_dopple(router, args.dopple, args.target)
+    json.dump(result, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
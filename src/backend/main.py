@@ -1,14 +1,24 @@
+import time
+
+# Measured from here so the startup log covers module imports as well
+_process_started = time.perf_counter()
+
 import os
 from fastapi import FastAPI, APIRouter, Depends, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 import logging
-import time
 from typing import Callable
 import uvicorn
 
 from src.backend.api.memory_api import router as memory_router
-from src.backend.db.database import init_db, seed_metadata
+from src.backend.api.admin_api import router as admin_router
+from src.backend.db import replicas as replica_health
+from src.backend.db.database import router as shard_router, bootstrap_db, get_pool_stats, get_replica_stats, replicas
+from src.backend.db.sharding import ShardMoving
+from src.backend.services.metrics_service import registry, http_request_duration
+from src.backend.services import chat_sync_service, consolidation_service, deletion_service, profiling_service, reembedding_service, tiering_service, warmup_service
+from src.backend.services.profiling_service import ProfilingService
 
 # Configure logging
 logging.basicConfig(
@@ -33,15 +43,62 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
-# Add middleware for request logging
+# Add middleware for request logging and latency metrics
 @app.middleware("http")
 async def log_requests(request: Request, call_next: Callable):
-    start_time = time.time()
+    start_time = time.perf_counter()
     response = await call_next(request)
-    process_time = time.time() - start_time
+    process_time = time.perf_counter() - start_time
     logger.info(f"Request: {request.method} {request.url.path} - Time: {process_time:.4f}s")
+    
+    # Label by route template (e.g. /api/memory/get/{memory_id}) to bound cardinality
+    route = request.scope.get("route")
+    http_request_duration.observe(
+        process_time,
+        method=request.method,
+        route=getattr(route, "path", "unmatched"),
+        status=response.status_code,
+    )
     return response
 
+# Opt-in request profiling; nothing is installed unless PROFILE_SAMPLE_RATE or
+# PROFILE_HEADER_ENABLED is set
+if profiling_service.PROFILING_ACTIVE:
+    for shard_engine in list(shard_router.engines.values()) + replicas.engines():
+        ProfilingService.install_sql_timing(shard_engine)
+
+    @app.middleware("http")
+    async def profile_requests(request: Request, call_next: Callable):
+        if not ProfilingService.should_profile(request.headers.get(profiling_service.PROFILE_HEADER)):
+            return await call_next(request)
+        start_time = time.perf_counter()
+        token = ProfilingService.start(request.method, request.url.path)
+        status_code = 500
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+        finally:
+            profile = ProfilingService.finish(token, time.perf_counter() - start_time, status_code)
+        response.headers["X-Profile-Id"] = profile.id
+        return response
+
+# Expose connection pool usage alongside the request metrics
+def _pool_gauges():
+    stats = get_pool_stats()
+    return {(key,): value for key, value in stats.items() if isinstance(value, (int, float))}
+
+registry.gauge("db_pool", "Database connection pool gauges and checkout counters", ["stat"], callback=_pool_gauges)
+
+def _replica_gauges():
+    return {
+        (name, key): float(value)
+        for name, stats in get_replica_stats()["replicas"].items()
+        for key, value in stats.items()
+        if isinstance(value, (int, float))
+    }
+
+registry.gauge("db_replica", "Read replica health, lag and read counts", ["replica", "stat"], callback=_replica_gauges)
+
 # Create main router
 main_router = APIRouter()
 
@@ -49,24 +106,71 @@ main_router = APIRouter()
 async def root():
     return {"message": "Semantic Memory API is running"}
 
+@main_router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text-format metrics"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 @main_router.get("/health")
 async def health_check():
-    return {"status": "healthy"}
+    return {"status": "healthy", "database_pool": get_pool_stats()}
+
+@main_router.get("/ready")
+async def readiness_check():
+    """Liveness stays on /health; this returns 503 until the database is up and warm-up has finished"""
+    warmup = warmup_service.get_status()
+    ready = _database_ready and warmup["ready"]
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "warming", "database": _database_ready, "warmup": warmup},
+    )
 
 # Include routers
 app.include_router(main_router)
 app.include_router(memory_router)
+app.include_router(admin_router)
 
 # Initialize database on startup
+_database_ready = False
+
 @app.on_event("startup")
 async def startup_event():
-    logger.info("Initializing database...")
+    global _database_ready
+    started = time.perf_counter()
     try:
-        init_db()
-        seed_metadata()
-        logger.info("Database initialization completed successfully")
+        status = bootstrap_db()
+        _database_ready = True
+        logger.info(f"Database ready in {(time.perf_counter() - started) * 1000:.1f} ms (schema {status['schema']}, seed {status['seed']})")
     except Exception as e:
         logger.error(f"Database initialization failed: {str(e)}")
+    replica_health.start_health_checks(replicas)
+    consolidation_service.start_scheduler()
+    tiering_service.start_scheduler()
+    deletion_service.start_compactor()
+    reembedding_service.resume_jobs()
+    if _database_ready:
+        warmup_service.start_warmup()
+        chat_sync_service.start_worker()
+    logger.info(f"Startup completed in {(time.perf_counter() - _process_started) * 1000:.1f} ms")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    consolidation_service.stop_scheduler()
+    tiering_service.stop_scheduler()
+    deletion_service.stop_compactor()
+    reembedding_service.stop_workers()
+    warmup_service.stop_warmup()
+    replica_health.stop_health_checks()
+    chat_sync_service.stop_worker()
+
+# Writes to a dopple being moved between shards are refused for a few seconds
+@app.exception_handler(ShardMoving)
+async def shard_moving_handler(request: Request, exc: ShardMoving):
+    return JSONResponse(
+        status_code=503,
+        content={"message": str(exc)},
+        headers={"Retry-After": str(int(exc.retry_after + 0.999))},
+    )
 
 # Error handling for unexpected exceptions
 @app.exception_handler(Exception)
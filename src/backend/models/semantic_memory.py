@@ -1,11 +1,10 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Table, Text, Boolean, JSON, func
-from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy import BigInteger, Column, Integer, String, Float, DateTime, ForeignKey, Table, Text, Boolean, JSON, UniqueConstraint, func
 from sqlalchemy.orm import relationship
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 import uuid
 
-Base = declarative_base()
+from src.backend.db.database import Base
 
 # Association tables for many-to-many relationships
 memory_emotion_association = Table(
@@ -38,20 +37,24 @@ class Memory(Base):
     role = Column(String, nullable=False)  # 'user' or 'dopple'
     timestamp = Column(DateTime, default=datetime.utcnow)
     importance = Column(Integer, default=5)  # 1-10 scale
+    text_hash = Column(String(64), nullable=True, index=True)  # Normalized text digest for dedup
+    occurrences = Column(Integer, default=1)  # Times this memory was stored, counting merged duplicates
+    tier = Column(String(8), nullable=False, default="hot", index=True)  # 'hot' or 'cold' search tier
+    token_count = Column(Integer, nullable=True)  # Tokens of text, counted once at store time (see token_counter)
     
-    # Relationship to the embedding
-    embedding = relationship("Embedding", uselist=False, back_populates="memory", cascade="all, delete-orphan")
+    # Embeddings, one per embedding model version
+    embeddings = relationship("Embedding", back_populates="memory", cascade="all, delete-orphan")
     
     # Relationships to metadata
     emotions = relationship("Emotion", secondary=memory_emotion_association, back_populates="memories")
     topics = relationship("Topic", secondary=memory_topic_association, back_populates="memories")
     traits = relationship("PersonalityTrait", secondary=memory_trait_association, back_populates="memories")
     
-    # Additional metadata as JSON
-    metadata = Column(JSON, nullable=True)
+    # Additional metadata as JSON ("metadata" is reserved on declarative classes)
+    memory_metadata = Column("metadata", JSON, nullable=True)
 
-    def to_dict(self):
-        return {
+    def to_dict(self, include_metadata: bool = True):
+        data = {
             "id": self.id,
             "dopple_id": self.dopple_id,
             "user_id": self.user_id,
@@ -59,24 +62,178 @@ class Memory(Base):
             "role": self.role,
             "timestamp": self.timestamp.isoformat(),
             "importance": self.importance,
+            "occurrences": self.occurrences or 1,
             "emotions": [emotion.name for emotion in self.emotions],
             "topics": [topic.name for topic in self.topics],
             "traits": [trait.name for trait in self.traits],
-            "metadata": self.metadata
         }
+        # Metadata is the heaviest field; callers may skip it for list responses
+        if include_metadata:
+            data["metadata"] = self.memory_metadata
+        return data
 
 
 class Embedding(Base):
     """Store vector embeddings for memories"""
     __tablename__ = 'embeddings'
+    # A memory has at most one embedding per model; several models coexist during a migration
+    __table_args__ = (UniqueConstraint('memory_id', 'model', name='uq_embedding_memory_model'),)
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    memory_id = Column(String, ForeignKey('memories.id'), nullable=False, unique=True)
+    memory_id = Column(String, ForeignKey('memories.id'), nullable=False, index=True)
     # Store embedding vector as a list of floats (will be converted to pgvector in Supabase)
     vector = Column(JSON, nullable=False)  
-    model = Column(String, nullable=False)  # Which embedding model was used
+    model = Column(String, nullable=False, index=True)  # Which embedding model was used
     
-    memory = relationship("Memory", back_populates="embedding")
+    memory = relationship("Memory", back_populates="embeddings")
+
+
+class EmbeddingModelState(Base):
+    """Which embedding model searches and new memories use (a single 'active' row)"""
+    __tablename__ = 'embedding_model_state'
+
+    name = Column(String, primary_key=True, default='active')
+    model = Column(String, nullable=False)
+    activated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class SearchVersion(Base):
+    """Write counter per dopple/user pair; cached search results are only served at the version they were computed at"""
+    __tablename__ = 'search_versions'
+
+    dopple_id = Column(String, primary_key=True)
+    user_id = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+class SchemaMeta(Base):
+    """Fingerprints of the applied schema and seed data, so startup can skip work that is already done"""
+    __tablename__ = 'schema_meta'
+
+    key = Column(String, primary_key=True)
+    value = Column(String, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class ReembeddingJob(Base):
+    """Checkpointed migration of a corpus's embeddings to another model"""
+    __tablename__ = 'reembedding_jobs'
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    source_model = Column(String, nullable=False)
+    target_model = Column(String, nullable=False)
+    status = Column(String, nullable=False, default='pending', index=True)  # pending, running, paused, completed, failed
+    batch_size = Column(Integer, nullable=False, default=100)
+    rate_limit = Column(Float, nullable=True)  # Texts per second; null is unlimited
+    cutover = Column(Boolean, nullable=False, default=True)  # Activate the target model when done
+    # Keyset checkpoint: the last processed memory in (timestamp, id) order on the shard being processed
+    cursor_shard = Column(String, nullable=True)
+    cursor_timestamp = Column(DateTime, nullable=True)
+    cursor_id = Column(String, nullable=True)
+    total = Column(Integer, nullable=False, default=0)
+    processed = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    # Lease so only one worker process runs a job at a time
+    lease_owner = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    completed_at = Column(DateTime, nullable=True)
+
+    def to_dict(self):
+        elapsed = ((self.updated_at or datetime.utcnow()) - self.started_at).total_seconds() if self.started_at else 0
+        throughput = self.processed / elapsed if elapsed > 0 else 0.0
+        remaining = max(self.total - self.processed - self.failed, 0)
+        return {
+            "id": self.id,
+            "source_model": self.source_model,
+            "target_model": self.target_model,
+            "status": self.status,
+            "batch_size": self.batch_size,
+            "rate_limit": self.rate_limit,
+            "cutover": self.cutover,
+            "total": self.total,
+            "processed": self.processed,
+            "failed": self.failed,
+            "progress": self.processed / self.total if self.total else (1.0 if self.status == 'completed' else 0.0),
+            "throughput_per_second": throughput,
+            "eta_seconds": remaining / throughput if throughput and self.status == 'running' else None,
+            "checkpoint": {
+                "shard": self.cursor_shard,
+                "timestamp": self.cursor_timestamp.isoformat() if self.cursor_timestamp else None,
+                "id": self.cursor_id,
+            },
+            "lease_owner": self.lease_owner,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+            "completed_at": self.completed_at.isoformat() if self.completed_at else None,
+        }
+
+
+class SchedulerLease(Base):
+    """Cluster-wide run slot of a periodic background job, so every worker can run its scheduler"""
+    __tablename__ = 'scheduler_leases'
+
+    name = Column(String, primary_key=True)
+    # The worker that took the current slot; the next one opens when it expires
+    lease_owner = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    last_run_at = Column(DateTime, nullable=True)
+
+
+class ChatSyncState(Base):
+    """Checkpoint and lease of the worker that turns chat_messages rows into memories"""
+    __tablename__ = 'chat_sync_state'
+
+    name = Column(String, primary_key=True, default='chat_messages')
+    # Keyset checkpoint: the last synced message in (timestamp, id) order
+    cursor_timestamp = Column(BigInteger, nullable=True)
+    cursor_id = Column(String, nullable=True)
+    synced = Column(Integer, nullable=False, default=0)
+    skipped = Column(Integer, nullable=False, default=0)
+    lease_owner = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    error = Column(Text, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "checkpoint": {"timestamp": self.cursor_timestamp, "id": self.cursor_id},
+            "synced": self.synced,
+            "skipped": self.skipped,
+            "lease_owner": self.lease_owner,
+            "error": self.error,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+        }
+
+
+class DedupPolicy(Base):
+    """Per-dopple settings for near-duplicate detection on ingest"""
+    __tablename__ = 'dedup_policies'
+
+    dopple_id = Column(String, primary_key=True)
+    enabled = Column(Boolean, nullable=False, default=True)
+    exact_match = Column(Boolean, nullable=False, default=True)
+    # Null disables the embedding similarity check
+    similarity_threshold = Column(Float, nullable=True)
+    window = Column(Integer, nullable=False, default=200)  # Recent memories compared by embedding
+    bump_importance = Column(Boolean, nullable=False, default=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            "dopple_id": self.dopple_id,
+            "enabled": self.enabled,
+            "exact_match": self.exact_match,
+            "similarity_threshold": self.similarity_threshold,
+            "window": self.window,
+            "bump_importance": self.bump_importance,
+        }
 
 
 class Emotion(Base):
@@ -111,4 +268,42 @@ class PersonalityTrait(Base):
     description = Column(Text, nullable=True)
     intensity = Column(Integer, default=5)  # 1-10 scale
     
-    memories = relationship("Memory", secondary=memory_trait_association, back_populates="traits") 
\ No newline at end of file
+    memories = relationship("Memory", secondary=memory_trait_association, back_populates="traits") 
+
+class ArchivedMemory(Base):
+    """Cold storage for memories replaced by a consolidated summary or merged into an earlier duplicate"""
+    __tablename__ = 'archived_memories'
+
+    id = Column(String, primary_key=True)  # ID of the original memory
+    summary_id = Column(String, nullable=True, index=True)  # Summary or duplicate memory that replaced it
+    dopple_id = Column(String, nullable=False, index=True)
+    user_id = Column(String, nullable=False, index=True)
+    text = Column(Text, nullable=False)
+    role = Column(String, nullable=False)
+    timestamp = Column(DateTime, nullable=True)
+    importance = Column(Integer, nullable=True)
+    # Tag names are denormalized so the tag association rows can be dropped
+    emotions = Column(JSON, nullable=True)
+    topics = Column(JSON, nullable=True)
+    traits = Column(JSON, nullable=True)
+    memory_metadata = Column("metadata", JSON, nullable=True)
+    vector = Column(JSON, nullable=True)
+    model = Column(String, nullable=True)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "summary_id": self.summary_id,
+            "dopple_id": self.dopple_id,
+            "user_id": self.user_id,
+            "text": self.text,
+            "role": self.role,
+            "timestamp": self.timestamp.isoformat() if self.timestamp else None,
+            "importance": self.importance,
+            "emotions": self.emotions or [],
+            "topics": self.topics or [],
+            "traits": self.traits or [],
+            "metadata": self.memory_metadata,
+            "archived_at": self.archived_at.isoformat() if self.archived_at else None,
+        }
@@ -0,0 +1,459 @@
+import argparse
+import json
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set
+
+from sqlalchemy import JSON, BigInteger, Column, Index, MetaData, String, Table, Text, and_, or_, select
+
+from src.backend.db.database import create_db_engine, for_each_shard, router, session_scope
+from src.backend.models.semantic_memory import ArchivedMemory, ChatSyncState, Memory
+from src.backend.services.embedding_model_service import EmbeddingModelService
+from src.backend.services.embedding_service import EmbeddingService
+from src.backend.services.memory_service import MemoryService
+from src.backend.services.memory_tagger_service import MemoryTaggerService
+from src.backend.services.metrics_service import registry
+
+logger = logging.getLogger(__name__)
+
+# Database holding chat_messages; empty reads it from the first memory shard
+CHAT_SYNC_SOURCE_URL = os.getenv("CHAT_SYNC_SOURCE_URL", "")
+# Messages per micro-batch: one tagging pass, one embedding call and one bulk insert
+CHAT_SYNC_BATCH_SIZE = int(os.getenv("CHAT_SYNC_BATCH_SIZE", "100"))
+# Seconds between polls once the sync has caught up; 0 disables the worker
+CHAT_SYNC_INTERVAL_SECONDS = float(os.getenv("CHAT_SYNC_INTERVAL_SECONDS", "0"))
+# A worker that stops heartbeating for this long loses the sync to another worker
+CHAT_SYNC_LEASE_SECONDS = float(os.getenv("CHAT_SYNC_LEASE_SECONDS", "120"))
+# Unit of chat_messages.timestamp: "ms" (JavaScript Date.now()) or "s"
+CHAT_SYNC_TIMESTAMP_UNIT = os.getenv("CHAT_SYNC_TIMESTAMP_UNIT", "ms")
+# Tag with the local tagger and store mock embeddings (stand-in databases, load tests)
+CHAT_SYNC_MOCK = os.getenv("CHAT_SYNC_MOCK", "false").lower() == "true"
+# Window the sustained throughput is averaged over
+CHAT_SYNC_RATE_WINDOW_SECONDS = float(os.getenv("CHAT_SYNC_RATE_WINDOW_SECONDS", "60"))
+
+STATE_NAME = "chat_messages"
+
+# Chat roles stored as memories; other roles (system, tool) are skipped
+ROLES = {"user": "user", "assistant": "dopple", "dopple": "dopple"}
+
+# Memory IDs are derived from message IDs, so a batch synced twice inserts nothing the second time
+MESSAGE_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "semantic-memory/chat_messages")
+
+# chat_messages as created by migrations/chat_tables.sql. It lives on its own
+# MetaData so create_all never creates it next to the memory tables.
+chat_metadata = MetaData()
+chat_messages = Table(
+    "chat_messages", chat_metadata,
+    Column("id", Text, primary_key=True),
+    Column("user_id", String, nullable=False),
+    Column("dopple_id", Text, nullable=False),
+    Column("conversation_id", Text, nullable=False),
+    Column("role", Text, nullable=False),
+    Column("content", Text, nullable=False),
+    Column("timestamp", BigInteger, nullable=False),
+    Column("image_url", Text, nullable=True),
+    Column("metadata", JSON, nullable=True),
+    Index("chat_messages_timestamp_id_idx", "timestamp", "id"),
+)
+
+chat_sync_messages = registry.counter(
+    "chat_sync_messages_total",
+    "Chat messages read by the sync worker, by what became of them",
+    ["outcome"],
+)
+
+chat_sync_batch_duration = registry.histogram(
+    "chat_sync_batch_duration_seconds",
+    "Time to tag, embed and store one chat sync batch",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+
+# Identifies this process as a lease holder
+_worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+_source_engine = None
+_source_lock = threading.Lock()
+
+
+class ChatSyncBusy(Exception):
+    """Raised when another worker holds the chat sync lease"""
+
+
+class SyncProgress:
+    """In-process lag and throughput of the sync, for metrics and the admin status"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._recent: deque = deque()  # (monotonic time, messages read)
+        self.batches = 0
+        self.messages = 0
+        self.lag_seconds = 0.0
+        self.last_batch_at: Optional[float] = None
+        self.running = False
+        self.error: Optional[str] = None
+
+    def record(self, count: int, lag_seconds: float):
+        now = time.monotonic()
+        with self._lock:
+            self.batches += 1
+            self.messages += count
+            self.lag_seconds = lag_seconds
+            self.last_batch_at = now
+            self.error = None
+            self._recent.append((now, count))
+            self._trim(now)
+
+    def fail(self, error: Exception):
+        with self._lock:
+            self.error = str(error)[:500]
+
+    def _trim(self, now: float):
+        while self._recent and self._recent[0][0] < now - CHAT_SYNC_RATE_WINDOW_SECONDS:
+            self._recent.popleft()
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            return {
+                "running": self.running,
+                "batches": self.batches,
+                "messages": self.messages,
+                "lag_seconds": round(self.lag_seconds, 3),
+                "throughput_per_second": sum(count for _, count in self._recent) / CHAT_SYNC_RATE_WINDOW_SECONDS,
+                "seconds_since_batch": round(now - self.last_batch_at, 3) if self.last_batch_at else None,
+                "error": self.error,
+            }
+
+
+progress = SyncProgress()
+
+registry.gauge(
+    "chat_sync",
+    "Lag, sustained throughput and totals of the chat_messages sync",
+    ["stat"],
+    callback=lambda: {
+        (key,): float(value) for key, value in progress.snapshot().items()
+        if isinstance(value, (int, float))
+    },
+)
+
+
+def source_engine():
+    """Engine of the database holding chat_messages"""
+    global _source_engine
+    with _source_lock:
+        if _source_engine is None:
+            _source_engine = (
+                create_db_engine(CHAT_SYNC_SOURCE_URL) if CHAT_SYNC_SOURCE_URL else router.engines[router.default]
+            )
+        return _source_engine
+
+
+def _epoch_seconds(timestamp: int) -> float:
+    return timestamp / 1000.0 if CHAT_SYNC_TIMESTAMP_UNIT == "ms" else float(timestamp)
+
+
+class ChatSyncService:
+    """Service that tails chat_messages and stores new messages as memories"""
+
+    @staticmethod
+    def get_status() -> Dict:
+        """Checkpoint, lease and totals of the sync, with this process's lag and throughput"""
+        with session_scope() as db:
+            state = db.query(ChatSyncState).filter(ChatSyncState.name == STATE_NAME).first()
+            status = state.to_dict() if state else {"name": STATE_NAME, "checkpoint": None}
+        status["worker"] = progress.snapshot()
+        return status
+
+    @staticmethod
+    def run(max_batches: Optional[int] = None, batch_size: int = CHAT_SYNC_BATCH_SIZE) -> Dict:
+        """
+        Sync batches until caught up with chat_messages, if this worker can lease the sync
+
+        Each batch is stored before the (timestamp, id) checkpoint advances past
+        it. A worker that dies in between leaves the checkpoint behind; the next
+        run re-reads those messages and skips the ones already stored.
+
+        Args:
+            max_batches: Stop after this many batches even if not caught up
+            batch_size: Messages per batch
+
+        Returns:
+            Totals of the run: batches, messages read, memories stored, skipped and duplicates
+
+        Raises:
+            ChatSyncBusy: Another worker holds the lease
+        """
+        if not ChatSyncService._claim():
+            raise ChatSyncBusy("Chat sync is running on another worker")
+        totals = {"batches": 0, "read": 0, "stored": 0, "skipped": 0, "duplicates": 0, "caught_up": False}
+        progress.running = True
+        try:
+            while max_batches is None or totals["batches"] < max_batches:
+                if _stop.is_set():
+                    break
+                result = ChatSyncService.sync_batch(batch_size)
+                if result is None:
+                    totals["caught_up"] = True
+                    break
+                totals["batches"] += 1
+                for key in ("read", "stored", "skipped", "duplicates"):
+                    totals[key] += result[key]
+                if result["caught_up"]:
+                    totals["caught_up"] = True
+                    break
+        except Exception as e:
+            logger.error(f"Chat sync batch failed: {str(e)}", exc_info=True)
+            progress.fail(e)
+            totals["error"] = str(e)
+            with session_scope() as db:
+                db.query(ChatSyncState).filter(ChatSyncState.name == STATE_NAME).update(
+                    {ChatSyncState.error: str(e)[:2000]}, synchronize_session=False
+                )
+        finally:
+            progress.running = False
+            ChatSyncService._release()
+        return totals
+
+    @staticmethod
+    def sync_batch(batch_size: int = CHAT_SYNC_BATCH_SIZE) -> Optional[Dict]:
+        """
+        Convert the next batch of messages after the checkpoint into memories
+
+        The caller must hold the lease.
+
+        Returns:
+            Counts for the batch, or None when there was nothing new
+        """
+        with session_scope() as db:
+            state = db.query(ChatSyncState).filter(ChatSyncState.name == STATE_NAME).first()
+            cursor = (state.cursor_timestamp, state.cursor_id) if state else (None, None)
+
+        # One row past the batch tells whether we are caught up and how old the backlog is
+        rows = ChatSyncService._fetch_after(cursor, batch_size + 1)
+        if not rows:
+            progress.record(0, 0.0)
+            return None
+        start = time.perf_counter()
+        next_row = rows[batch_size] if len(rows) > batch_size else None
+        rows = rows[:batch_size]
+
+        messages = []
+        for row in rows:
+            role = ROLES.get((row["role"] or "").lower())
+            if role is None or not (row["content"] or "").strip():
+                continue
+            messages.append((row, role, str(uuid.uuid5(MESSAGE_NAMESPACE, row["id"]))))
+        existing = ChatSyncService._existing_ids([memory_id for _, _, memory_id in messages])
+        new_messages = [message for message in messages if message[2] not in existing]
+
+        if new_messages:
+            texts = [row["content"] for row, _, _ in new_messages]
+            tags = MemoryTaggerService.tag_memories(texts, use_mock=CHAT_SYNC_MOCK)
+            # Embedded here rather than in store_memories_bulk, which stores memories
+            # without embeddings when the provider fails; a failed batch is retried instead
+            if CHAT_SYNC_MOCK:
+                vectors = [EmbeddingService.mock_embedding() for _ in texts]
+            else:
+                vectors = EmbeddingService.batch_generate_embeddings(texts, EmbeddingModelService.get_active_model())
+            MemoryService.store_memories_bulk(
+                [
+                    ChatSyncService._to_memory(row, role, memory_id, tag, vector)
+                    for (row, role, memory_id), tag, vector in zip(new_messages, tags, vectors)
+                ],
+                generate_embeddings=False,
+            )
+
+        last = rows[-1]
+        skipped = len(rows) - len(messages)
+        with session_scope() as db:
+            advanced = db.query(ChatSyncState).filter(
+                ChatSyncState.name == STATE_NAME, ChatSyncState.lease_owner == _worker_id
+            ).update({
+                ChatSyncState.cursor_timestamp: last["timestamp"],
+                ChatSyncState.cursor_id: last["id"],
+                ChatSyncState.synced: ChatSyncState.synced + len(new_messages),
+                ChatSyncState.skipped: ChatSyncState.skipped + skipped,
+                ChatSyncState.lease_expires_at: datetime.utcnow() + timedelta(seconds=CHAT_SYNC_LEASE_SECONDS),
+                ChatSyncState.error: None,
+            }, synchronize_session=False)
+        if not advanced:
+            raise ChatSyncBusy("Chat sync lease was taken over by another worker")
+
+        duration = time.perf_counter() - start
+        chat_sync_batch_duration.observe(duration)
+        chat_sync_messages.inc(len(new_messages), outcome="stored")
+        chat_sync_messages.inc(skipped, outcome="skipped")
+        chat_sync_messages.inc(len(messages) - len(new_messages), outcome="duplicate")
+        lag = max(time.time() - _epoch_seconds(next_row["timestamp"]), 0.0) if next_row else 0.0
+        progress.record(len(rows), lag)
+        logger.info(
+            f"Chat sync stored {len(new_messages)} of {len(rows)} messages in {duration * 1000:.1f} ms "
+            f"(lag {lag:.1f}s)"
+        )
+        return {
+            "read": len(rows),
+            "stored": len(new_messages),
+            "skipped": skipped,
+            "duplicates": len(messages) - len(new_messages),
+            "caught_up": next_row is None,
+        }
+
+    @staticmethod
+    def _fetch_after(cursor: tuple, limit: int) -> List[Dict]:
+        """Messages after a (timestamp, id) checkpoint, oldest first"""
+        timestamp, message_id = cursor
+        query = select(chat_messages).order_by(chat_messages.c.timestamp, chat_messages.c.id).limit(limit)
+        if timestamp is not None:
+            query = query.where(or_(
+                chat_messages.c.timestamp > timestamp,
+                and_(chat_messages.c.timestamp == timestamp, chat_messages.c.id > message_id),
+            ))
+        with source_engine().connect() as connection:
+            return [dict(row._mapping) for row in connection.execute(query)]
+
+    @staticmethod
+    def _existing_ids(memory_ids: List[str]) -> Set[str]:
+        """Memory IDs already stored, or archived by consolidation, on any shard"""
+        if not memory_ids:
+            return set()
+
+        def lookup(db) -> Set[str]:
+            found = {row[0] for row in db.query(Memory.id).filter(Memory.id.in_(memory_ids))}
+            found.update(row[0] for row in db.query(ArchivedMemory.id).filter(ArchivedMemory.id.in_(memory_ids)))
+            return found
+
+        return set().union(*for_each_shard(lookup))
+
+    @staticmethod
+    def _to_memory(row: Dict, role: str, memory_id: str, tags: Dict, vector: List[float]) -> Dict:
+        metadata = dict(row["metadata"]) if isinstance(row["metadata"], dict) else {}
+        metadata.update({
+            "source": "chat_messages",
+            "message_id": row["id"],
+            "conversation_id": row["conversation_id"],
+        })
+        if row["image_url"]:
+            metadata["image_url"] = row["image_url"]
+        return {
+            "id": memory_id,
+            "text": row["content"],
+            "dopple_id": row["dopple_id"],
+            "user_id": str(row["user_id"]),
+            "role": role,
+            "timestamp": datetime.utcfromtimestamp(_epoch_seconds(row["timestamp"])),
+            "emotions": tags.get("emotions", []),
+            "topics": tags.get("topics", []),
+            "traits": tags.get("traits", []),
+            "importance": tags.get("importance", 5),
+            "metadata": metadata,
+            "embedding": vector,
+        }
+
+    @staticmethod
+    def _claim() -> bool:
+        """Take the sync lease with one conditional update, creating the state row on first use"""
+        now = datetime.utcnow()
+        with session_scope() as db:
+            if not db.query(ChatSyncState).filter(ChatSyncState.name == STATE_NAME).first():
+                db.add(ChatSyncState(name=STATE_NAME))
+                db.flush()
+            claimed = db.query(ChatSyncState).filter(
+                ChatSyncState.name == STATE_NAME,
+                or_(
+                    ChatSyncState.lease_owner.is_(None),
+                    ChatSyncState.lease_owner == _worker_id,
+                    ChatSyncState.lease_expires_at < now,
+                ),
+            ).update({
+                ChatSyncState.lease_owner: _worker_id,
+                ChatSyncState.lease_expires_at: now + timedelta(seconds=CHAT_SYNC_LEASE_SECONDS),
+            }, synchronize_session=False)
+        return bool(claimed)
+
+    @staticmethod
+    def _release():
+        with session_scope() as db:
+            db.query(ChatSyncState).filter(
+                ChatSyncState.name == STATE_NAME, ChatSyncState.lease_owner == _worker_id
+            ).update({ChatSyncState.lease_owner: None}, synchronize_session=False)
+
+
+# ---- Background worker ----
+
+_worker_thread: Optional[threading.Thread] = None
+_stop = threading.Event()
+
+
+def _worker_loop(interval: float):
+    while not _stop.is_set():
+        try:
+            ChatSyncService.run()
+        except ChatSyncBusy:
+            pass
+        except Exception as e:
+            logger.error(f"Chat sync run failed: {str(e)}", exc_info=True)
+        if _stop.wait(interval):
+            return
+
+
+def start_worker(interval: float = CHAT_SYNC_INTERVAL_SECONDS) -> bool:
+    """
+    Start the background chat sync thread
+
+    Args:
+        interval: Seconds between polls once caught up; values <= 0 leave the worker off
+
+    Returns:
+        True if the worker was started
+    """
+    global _worker_thread
+    if interval <= 0 or (_worker_thread is not None and _worker_thread.is_alive()):
+        return False
+    _stop.clear()
+    _worker_thread = threading.Thread(target=_worker_loop, args=(interval,), name="chat-sync", daemon=True)
+    _worker_thread.start()
+    logger.info(f"Chat sync polling every {interval:.0f}s")
+    return True
+
+
+def stop_worker():
+    """Stop the chat sync thread after its current batch and release the lease"""
+    _stop.set()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Sync chat_messages into semantic memories")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status", help="Print the checkpoint, lease and totals")
+    run = commands.add_parser("run", help="Sync until caught up")
+    run.add_argument("--max-batches", type=int, default=None)
+    run.add_argument("--batch-size", type=int, default=CHAT_SYNC_BATCH_SIZE)
+    commands.add_parser("create-source", help="Create chat_messages in CHAT_SYNC_SOURCE_URL (e.g. a SQLite stand-in)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    from src.backend.db.database import bootstrap_db
+
+    if args.command == "create-source":
+        chat_metadata.create_all(bind=source_engine())
+        result: Any = {"created": chat_messages.name}
+    else:
+        bootstrap_db()
+        if args.command == "status":
+            result = ChatSyncService.get_status()
+        else:
+            result = ChatSyncService.run(max_batches=args.max_batches, batch_size=args.batch_size)
+    json.dump(result, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
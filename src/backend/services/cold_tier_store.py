@@ -0,0 +1,346 @@
+import fcntl
+import logging
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.backend.services.metrics_service import record_cache_access
+from src.backend.services.shared_vector_store import _digest
+from src.backend.services.vector_search import VectorRows
+
+logger = logging.getLogger(__name__)
+
+# Directory for compressed cold-tier segment files, shared by all workers on a node;
+# unset reads cold-tier vectors straight from the database
+COLD_SEGMENT_DIR = os.getenv("COLD_SEGMENT_DIR")
+# Decompressed segments kept in memory per process
+COLD_SEGMENT_CACHE_BYTES = int(os.getenv("COLD_SEGMENT_CACHE_BYTES", str(64 * 1024 * 1024)))
+
+CacheKey = Tuple[str, Optional[str], str]
+
+
+class ColdSegmentStore:
+    """
+    Compressed on-disk vector segments for the cold memory tier
+
+    Each (dopple_id, user_id) key maps to one .npz segment per embedding model
+    holding memory IDs, float16 vectors, timestamps and importance. Segments are derived from the database: they are built on
+    first use and dropped when tiers are rebalanced, so the database stays the
+    source of truth. Builds and removals of a segment are serialized across
+    processes with a per-key file lock, so a build that overlaps a rebalance
+    never outlives it.
+
+    Segments are immutable; deleted memories are recorded in a tombstone
+    bitmap file next to the segment, stamped with the segment's mtime so a
+    bitmap never applies to a segment rewritten since. Compaction rewrites a
+    segment without its tombstoned rows.
+
+    A small file next to each segment records the scope's database write
+    version the segment is current with. Readers pass the version they read
+    from the primary, and a segment that does not match (a rebalance,
+    consolidation or delete on another node, or while this one was down) is
+    rebuilt. Local writes advance it once their changes are applied.
+    """
+
+    def __init__(self, directory: str, max_cached_bytes: int = COLD_SEGMENT_CACHE_BYTES):
+        self.directory = directory
+        self.max_cached_bytes = max_cached_bytes
+        # key -> ((segment mtime_ns, tombstones mtime_ns), rows)
+        self._cache: "OrderedDict[CacheKey, Tuple[Tuple[int, int], VectorRows]]" = OrderedDict()
+        self._cached_bytes = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: CacheKey) -> str:
+        dopple_id, user_id, model = key
+        return os.path.join(self.directory, _digest(model), f"{_digest(dopple_id)}-{_digest(user_id or '')}.npz")
+
+    def _model_dirs(self) -> List[str]:
+        return [
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if os.path.isdir(os.path.join(self.directory, name))
+        ]
+
+    @contextmanager
+    def _file_lock(self, path: str):
+        with open(path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def get_or_build(
+        self,
+        key: Tuple[str, Optional[str]],
+        loader: Callable[[], VectorRows],
+        model: str,
+        version: int
+    ) -> VectorRows:
+        """
+        Get a key's cold vectors, building the segment from the database if needed
+
+        Args:
+            key: (dopple_id, user_id) key; user_id None covers the whole dopple
+            loader: Returns the key's cold rows (normalized vectors) from the database
+            model: Embedding model the loader's vectors come from
+            version: The scope's current write version, read from the primary before the loader runs
+
+        Returns:
+            Rows with a float32 matrix
+        """
+        key = (key[0], key[1], model)
+        path = self._path(key)
+        cached = self._read_cached(key, path) if self._read_version(path) == version else None
+        record_cache_access("cold_segment", cached is not None)
+        if cached is not None:
+            return cached
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._file_lock(path):
+            if not os.path.exists(path) or self._read_version(path) != version:
+                self._write(path, loader())
+                self._remove_tombstones(path)
+                self._write_version(path, version)
+            return self._load(key, path)
+
+    def advance(self, dopple_id: str, user_id: str, bumps: int) -> None:
+        """
+        Account for a committed local write's version bumps of a dopple/user pair
+
+        Called once the write's invalidations and tombstones are applied (see
+        vector_cache.advance); if another node wrote meanwhile the versions no
+        longer line up and the segments are rebuilt on next use.
+        """
+        for model_dir in self._model_dirs():
+            for key_user in (user_id, ""):
+                path = os.path.join(model_dir, f"{_digest(dopple_id)}-{_digest(key_user)}.npz")
+                if not os.path.exists(self._version_path(path)):
+                    continue
+                with self._file_lock(path):
+                    version = self._read_version(path)
+                    if version is not None:
+                        self._write_version(path, version + bumps)
+
+    def delete(self, dopple_id: str, user_id: str, memory_ids: List[str]) -> None:
+        """Tombstone deleted memories in every segment, of any model, that covers them"""
+        wanted = set(memory_ids)
+        for model_dir in self._model_dirs():
+            for key_user in (user_id, ""):
+                path = os.path.join(model_dir, f"{_digest(dopple_id)}-{_digest(key_user)}.npz")
+                if not os.path.exists(path):
+                    continue
+                with self._file_lock(path):
+                    try:
+                        stamp = os.stat(path).st_mtime_ns
+                        with np.load(path) as segment:
+                            ids = [memory_id.decode("utf-8") for memory_id in segment["ids"]]
+                    except FileNotFoundError:
+                        continue
+                    deleted = self._read_tombstones(path, stamp, len(ids))
+                    if deleted is None:
+                        deleted = np.zeros(len(ids), dtype=bool)
+                    hits = [i for i, memory_id in enumerate(ids) if memory_id in wanted and not deleted[i]]
+                    if hits:
+                        deleted[hits] = True
+                        self._write_tombstones(path, stamp, deleted)
+
+    def compact(self, min_dead_ratio: float) -> int:
+        """
+        Rewrite segments whose share of tombstoned rows reached min_dead_ratio
+
+        Returns:
+            Number of segments compacted
+        """
+        compacted = 0
+        for model_dir in self._model_dirs():
+            for name in os.listdir(model_dir):
+                if not name.endswith(".tomb.npz"):
+                    continue
+                path = os.path.join(model_dir, name[:-len(".tomb.npz")] + ".npz")
+                with self._file_lock(path):
+                    try:
+                        stamp = os.stat(path).st_mtime_ns
+                        with np.load(path) as segment:
+                            rows = VectorRows(
+                                [memory_id.decode("utf-8") for memory_id in segment["ids"]],
+                                segment["vectors"].astype(np.float32),
+                                segment["timestamps"],
+                                segment["importance"],
+                            )
+                    except FileNotFoundError:
+                        self._remove_tombstones(path)
+                        continue
+                    deleted = self._read_tombstones(path, stamp, len(rows.ids))
+                    if deleted is None:
+                        # Left behind by a segment that was rebuilt since
+                        self._remove_tombstones(path)
+                        continue
+                    if deleted.sum() < min_dead_ratio * len(rows.ids):
+                        continue
+                    live = ~deleted
+                    self._write(path, VectorRows(
+                        [memory_id for memory_id, keep in zip(rows.ids, live) if keep],
+                        rows.matrix[live], rows.timestamps[live], rows.importance[live],
+                    ))
+                    self._remove_tombstones(path)
+                    compacted += 1
+        return compacted
+
+    def invalidate(self, dopple_id: str, user_id: Optional[str] = None) -> None:
+        """Remove segments of every model so they are rebuilt from the database on next use"""
+        paths = []
+        for model_dir in self._model_dirs():
+            if user_id is not None:
+                names = [f"{_digest(dopple_id)}-{_digest(key_user)}.npz" for key_user in (user_id, "")]
+            else:
+                prefix = f"{_digest(dopple_id)}-"
+                names = [
+                    name for name in os.listdir(model_dir)
+                    if name.startswith(prefix) and name.endswith(".npz") and not name.endswith(".tomb.npz")
+                ]
+            paths.extend(os.path.join(model_dir, name) for name in names)
+        for path in paths:
+            with self._file_lock(path):
+                if os.path.exists(path):
+                    os.remove(path)
+                self._remove_tombstones(path)
+                self._remove_version(path)
+        with self._lock:
+            for key in [key for key in self._cache if key[0] == dopple_id]:
+                if user_id is None or key[1] in (user_id, None):
+                    self._cached_bytes -= self._cache.pop(key)[1].matrix.nbytes
+
+    @staticmethod
+    def _tombstones_path(path: str) -> str:
+        return path[:-len(".npz")] + ".tomb.npz"
+
+    @staticmethod
+    def _version_path(path: str) -> str:
+        return path[:-len(".npz")] + ".version"
+
+    def _read_version(self, path: str) -> Optional[int]:
+        """Write version a segment is current with, or None if it has none"""
+        try:
+            with open(self._version_path(path)) as f:
+                return int(f.read())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write_version(self, path: str, version: int):
+        version_path = self._version_path(path)
+        tmp_path = f"{version_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(str(version))
+        os.replace(tmp_path, version_path)
+
+    def _remove_version(self, path: str):
+        try:
+            os.remove(self._version_path(path))
+        except FileNotFoundError:
+            pass
+
+    def _stamp(self, path: str) -> Tuple[int, int]:
+        """Modification times of a segment and its tombstones (0 if there are none)"""
+        mtime = os.stat(path).st_mtime_ns
+        try:
+            return mtime, os.stat(self._tombstones_path(path)).st_mtime_ns
+        except FileNotFoundError:
+            return mtime, 0
+
+    def _read_tombstones(self, path: str, segment_mtime: int, count: int) -> Optional[np.ndarray]:
+        """Tombstone mask of a segment, or None if it has none (or they belong to an older segment)"""
+        try:
+            with np.load(self._tombstones_path(path)) as tombstones:
+                if int(tombstones["segment_mtime"]) != segment_mtime:
+                    return None
+                return np.unpackbits(tombstones["bits"], count=count).astype(bool)
+        except FileNotFoundError:
+            return None
+
+    def _write_tombstones(self, path: str, segment_mtime: int, deleted: np.ndarray):
+        tombstones_path = self._tombstones_path(path)
+        tmp_path = f"{tombstones_path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, segment_mtime=np.int64(segment_mtime), bits=np.packbits(deleted))
+        os.replace(tmp_path, tombstones_path)
+
+    def _remove_tombstones(self, path: str):
+        try:
+            os.remove(self._tombstones_path(path))
+        except FileNotFoundError:
+            pass
+
+    def _read_cached(self, key: CacheKey, path: str) -> Optional[VectorRows]:
+        try:
+            mtime = self._stamp(path)
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] == mtime:
+                self._cache.move_to_end(key)
+                return cached[1]
+        # Rebuilt or tombstoned by another worker since it was cached
+        try:
+            return self._load(key, path)
+        except FileNotFoundError:
+            return None
+
+    def _load(self, key: CacheKey, path: str) -> VectorRows:
+        mtime = self._stamp(path)
+        with np.load(path) as segment:
+            ids = [memory_id.decode("utf-8") for memory_id in segment["ids"]]
+            rows = VectorRows(
+                ids,
+                segment["vectors"].astype(np.float32),
+                segment["timestamps"],
+                segment["importance"],
+                self._read_tombstones(path, mtime[0], len(ids)) if mtime[1] else None,
+            )
+        if rows.matrix.nbytes <= self.max_cached_bytes:
+            with self._lock:
+                previous = self._cache.pop(key, None)
+                if previous is not None:
+                    self._cached_bytes -= previous[1].matrix.nbytes
+                self._cache[key] = (mtime, rows)
+                self._cached_bytes += rows.matrix.nbytes
+                while self._cached_bytes > self.max_cached_bytes and self._cache:
+                    self._cached_bytes -= self._cache.popitem(last=False)[1][1].matrix.nbytes
+        return rows
+
+    def _write(self, path: str, rows: VectorRows):
+        """Write a compressed segment next to the target and atomically move it into place"""
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        # Unit vectors lose well under 1e-3 of cosine precision as float16
+        np.savez_compressed(
+            tmp_path,
+            ids=np.array([memory_id.encode("utf-8") for memory_id in rows.ids], dtype="S64"),
+            vectors=np.asarray(rows.matrix, dtype=np.float16),
+            timestamps=np.asarray(rows.timestamps, dtype=np.float64),
+            importance=np.asarray(rows.importance, dtype=np.float32),
+        )
+        os.replace(tmp_path, path)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            cached_segments, cached_bytes = len(self._cache), self._cached_bytes
+        files = [
+            os.path.join(model_dir, name)
+            for model_dir in self._model_dirs()
+            for name in os.listdir(model_dir)
+            if name.endswith(".npz") and not name.endswith(".tomb.npz")
+        ]
+        return {
+            "segments": len(files),
+            "segment_bytes": sum(os.path.getsize(path) for path in files),
+            "cached_segments": cached_segments,
+            "cached_bytes": cached_bytes,
+        }
+
+
+cold_segment_store = ColdSegmentStore(COLD_SEGMENT_DIR) if COLD_SEGMENT_DIR else None
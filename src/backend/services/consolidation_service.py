@@ -0,0 +1,467 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import Counter as TallyCounter
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session, selectinload
+
+from src.backend.db.database import for_each_shard, session_scope
+from src.backend.models.semantic_memory import (
+    ArchivedMemory, Embedding, Memory,
+    memory_emotion_association, memory_topic_association, memory_trait_association,
+)
+from src.backend.services.embedding_model_service import EmbeddingModelService
+from src.backend.services.metrics_service import registry
+from src.backend.services.scheduler_lease import claim_run
+from src.backend.services.search_cache import bump_version
+from src.backend.services.token_counter import count_tokens
+from src.backend.services.vector_cache import invalidate_after_commit
+from src.backend.services.vector_search import build_matrix, normalize
+
+logger = logging.getLogger(__name__)
+
+# Eligibility policy: only memories at least this old and at most this important are merged
+CONSOLIDATION_MIN_AGE_DAYS = float(os.getenv("CONSOLIDATION_MIN_AGE_DAYS", "30"))
+CONSOLIDATION_MAX_IMPORTANCE = int(os.getenv("CONSOLIDATION_MAX_IMPORTANCE", "4"))
+# Clustering: members must be this similar to the cluster's first memory
+CONSOLIDATION_SIMILARITY = float(os.getenv("CONSOLIDATION_SIMILARITY", "0.85"))
+CONSOLIDATION_MIN_CLUSTER_SIZE = int(os.getenv("CONSOLIDATION_MIN_CLUSTER_SIZE", "3"))
+CONSOLIDATION_MAX_CLUSTER_SIZE = int(os.getenv("CONSOLIDATION_MAX_CLUSTER_SIZE", "50"))
+# Oldest eligible memories considered per (dopple, user) pair in one run
+CONSOLIDATION_MAX_CANDIDATES = int(os.getenv("CONSOLIDATION_MAX_CANDIDATES", "5000"))
+# Archived memories whose summary is at least this similar still count as recallable
+CONSOLIDATION_RECALL_THRESHOLD = float(os.getenv("CONSOLIDATION_RECALL_THRESHOLD", "0.7"))
+# Seconds between background runs. Off (0) by default: runs archive memories, so the
+# operator opts in, e.g. 86400. Every worker may then run the scheduler; a lease in the
+# database lets one run per interval across the cluster
+CONSOLIDATION_INTERVAL_SECONDS = float(os.getenv("CONSOLIDATION_INTERVAL_SECONDS", "0"))
+
+SUMMARY_EXCERPTS = 3
+EXCERPT_LENGTH = 200
+DELETE_CHUNK_SIZE = 500
+
+consolidation_runs = registry.counter(
+    "consolidation_runs_total",
+    "Memory consolidation runs by outcome",
+    ["outcome"],
+)
+
+consolidation_memories_archived = registry.counter(
+    "consolidation_memories_archived_total",
+    "Memories moved to the archive by consolidation",
+)
+
+consolidation_summaries_created = registry.counter(
+    "consolidation_summaries_created_total",
+    "Summary memories created by consolidation",
+)
+
+consolidation_member_similarity = registry.histogram(
+    "consolidation_member_similarity",
+    "Similarity between each archived memory and the summary that replaced it",
+    buckets=(0.5, 0.6, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95, 1.0),
+)
+
+_last_report: Dict = {}
+_run_lock = threading.Lock()
+
+registry.gauge(
+    "consolidation_last_run",
+    "Corpus shrinkage and estimated recall of the most recent consolidation run",
+    ["stat"],
+    callback=lambda: {
+        (key,): value for key, value in _last_report.items()
+        if isinstance(value, (int, float)) and not isinstance(value, bool)
+    },
+)
+
+
+class ConsolidationInProgress(Exception):
+    """Raised when a consolidation run is requested while another is running"""
+
+
+class ConsolidationService:
+    """Service that merges clusters of old, low-importance memories into summaries"""
+
+    @staticmethod
+    def run(
+        dopple_id: Optional[str] = None,
+        user_id: Optional[str] = None,
+        min_age_days: float = CONSOLIDATION_MIN_AGE_DAYS,
+        max_importance: int = CONSOLIDATION_MAX_IMPORTANCE,
+        similarity_threshold: float = CONSOLIDATION_SIMILARITY,
+        min_cluster_size: int = CONSOLIDATION_MIN_CLUSTER_SIZE,
+        dry_run: bool = False,
+        db: Optional[Session] = None
+    ) -> Dict:
+        """
+        Consolidate eligible memories for one or all (dopple, user) pairs
+
+        Each pair is committed separately unless a session is passed in.
+
+        Args:
+            dopple_id: Optional dopple to restrict the run to
+            user_id: Optional user to restrict the run to
+            min_age_days: Only memories older than this are eligible
+            max_importance: Only memories with importance at or below this are eligible
+            similarity_threshold: Minimum similarity between cluster members
+            min_cluster_size: Smallest cluster worth replacing with a summary
+            dry_run: Report what would be consolidated without changing anything
+            db: Optional session; the caller commits it
+
+        Returns:
+            Run report with corpus shrinkage and estimated recall
+
+        Raises:
+            ConsolidationInProgress: If another run is in progress in this process
+        """
+        if not _run_lock.acquire(blocking=False):
+            raise ConsolidationInProgress("A consolidation run is already in progress")
+        try:
+            start = time.perf_counter()
+            cutoff = datetime.utcnow() - timedelta(days=min_age_days)
+            report = {
+                "dry_run": dry_run,
+                "pairs": 0,
+                "memories_before": 0,
+                "candidates": 0,
+                "clusters": 0,
+                "archived": 0,
+                "summaries": 0,
+            }
+            similarities: List[float] = []
+
+            def eligible(session: Session) -> List[Tuple[str, str]]:
+                return ConsolidationService._eligible_pairs(
+                    session, dopple_id, user_id, cutoff, max_importance, min_cluster_size
+                )
+
+            if dopple_id:
+                with session_scope(db, dopple_id=dopple_id) as session:
+                    pairs = eligible(session)
+            else:
+                pairs = [pair for shard_pairs in for_each_shard(eligible, db) for pair in shard_pairs]
+
+            for pair_dopple_id, pair_user_id in pairs:
+                with session_scope(db, dopple_id=pair_dopple_id) as session:
+                    pair_report, pair_similarities = ConsolidationService._consolidate_pair(
+                        session, pair_dopple_id, pair_user_id, cutoff, max_importance,
+                        similarity_threshold, min_cluster_size, dry_run
+                    )
+                report["pairs"] += 1
+                for key, value in pair_report.items():
+                    report[key] += value
+                similarities.extend(pair_similarities)
+
+            net_reduction = report["archived"] - report["summaries"]
+            report["net_reduction"] = net_reduction
+            report["shrinkage_ratio"] = (
+                net_reduction / report["memories_before"] if report["memories_before"] else 0.0
+            )
+            # Fraction of archived memories a search at the default threshold would still
+            # reach through their summary
+            report["recall_estimate"] = (
+                float(np.mean(np.asarray(similarities) >= CONSOLIDATION_RECALL_THRESHOLD))
+                if similarities else 1.0
+            )
+            report["duration_seconds"] = time.perf_counter() - start
+            report["finished_at"] = datetime.utcnow().isoformat()
+
+            if not dry_run:
+                consolidation_memories_archived.inc(report["archived"])
+                consolidation_summaries_created.inc(report["summaries"])
+                for similarity in similarities:
+                    consolidation_member_similarity.observe(similarity)
+                _last_report.clear()
+                _last_report.update(report)
+            consolidation_runs.inc(outcome="dry_run" if dry_run else "success")
+            logger.info(
+                f"Consolidation {'dry run ' if dry_run else ''}finished: archived {report['archived']} "
+                f"memories into {report['summaries']} summaries across {report['pairs']} pairs "
+                f"in {report['duration_seconds']:.2f}s"
+            )
+            return report
+        except Exception:
+            consolidation_runs.inc(outcome="error")
+            raise
+        finally:
+            _run_lock.release()
+
+    @staticmethod
+    def last_report() -> Dict:
+        """Report of the most recent completed (non-dry) run, or an empty dict"""
+        return dict(_last_report)
+
+    @staticmethod
+    def get_sources(summary_id: str, db: Optional[Session] = None) -> List[Dict]:
+        """
+        Get the archived memories a summary memory replaced
+
+        Args:
+            summary_id: ID of the summary memory
+            db: Optional request-scoped session
+
+        Returns:
+            Archived memories as dictionaries, oldest first
+        """
+        def sources(session: Session) -> List[Dict]:
+            archived = session.query(ArchivedMemory).filter(ArchivedMemory.summary_id == summary_id).\
+                order_by(ArchivedMemory.timestamp).all()
+            return [memory.to_dict() for memory in archived]
+
+        # The summary's shard is not known from its ID; only that shard has matches
+        return next((archived for archived in for_each_shard(sources, db) if archived), [])
+
+    @staticmethod
+    def _eligible_query(session: Session, cutoff: datetime, max_importance: int):
+        return session.query(Memory).filter(
+            Memory.timestamp < cutoff,
+            Memory.importance <= max_importance,
+            ConsolidationService._not_summary(),
+        )
+
+    @staticmethod
+    def _not_summary():
+        """Excludes summaries from earlier runs, in SQL so they never take up the candidate limit"""
+        return Memory.memory_metadata["consolidation"].as_string().is_(None)
+
+    @staticmethod
+    def _eligible_pairs(
+        session: Session,
+        dopple_id: Optional[str],
+        user_id: Optional[str],
+        cutoff: datetime,
+        max_importance: int,
+        min_cluster_size: int
+    ) -> List[Tuple[str, str]]:
+        query = session.query(Memory.dopple_id, Memory.user_id).filter(
+            Memory.timestamp < cutoff,
+            Memory.importance <= max_importance,
+            ConsolidationService._not_summary(),
+        )
+        if dopple_id:
+            query = query.filter(Memory.dopple_id == dopple_id)
+        if user_id:
+            query = query.filter(Memory.user_id == user_id)
+        query = query.group_by(Memory.dopple_id, Memory.user_id).\
+            having(func.count(Memory.id) >= min_cluster_size)
+        return [(row[0], row[1]) for row in query.all()]
+
+    @staticmethod
+    def _consolidate_pair(
+        session: Session,
+        dopple_id: str,
+        user_id: str,
+        cutoff: datetime,
+        max_importance: int,
+        similarity_threshold: float,
+        min_cluster_size: int,
+        dry_run: bool
+    ) -> Tuple[Dict[str, int], List[float]]:
+        report = {"memories_before": 0, "candidates": 0, "clusters": 0, "archived": 0, "summaries": 0}
+        report["memories_before"] = session.query(func.count(Memory.id)).filter(
+            Memory.dopple_id == dopple_id, Memory.user_id == user_id
+        ).scalar()
+
+        # Clustered on the active model's embeddings; other models' copies are deleted with the memory
+        model = EmbeddingModelService.get_active_model(session)
+        memories = ConsolidationService._eligible_query(session, cutoff, max_importance).\
+            join(Embedding).\
+            filter(Memory.dopple_id == dopple_id, Memory.user_id == user_id, Embedding.model == model).\
+            options(
+                selectinload(Memory.embeddings),
+                selectinload(Memory.emotions),
+                selectinload(Memory.topics),
+                selectinload(Memory.traits),
+            ).\
+            order_by(Memory.timestamp).\
+            limit(CONSOLIDATION_MAX_CANDIDATES).all()
+
+        embeddings = [
+            next(embedding for embedding in memory.embeddings if embedding.model == model) for memory in memories
+        ]
+        matrix, kept = build_matrix([embedding.vector for embedding in embeddings])
+        memories = [memories[i] for i in kept]
+        embeddings = [embeddings[i] for i in kept]
+        report["candidates"] = len(memories)
+        if len(memories) < min_cluster_size:
+            return report, []
+
+        clusters = ConsolidationService._cluster(matrix, similarity_threshold, min_cluster_size)
+        similarities: List[float] = []
+        archived_ids: List[str] = []
+        for members in clusters:
+            centroid = normalize(matrix[members].mean(axis=0))
+            member_similarities = matrix[members] @ centroid
+            similarities.extend(float(value) for value in member_similarities)
+            report["clusters"] += 1
+            report["archived"] += len(members)
+            report["summaries"] += 1
+            if dry_run:
+                continue
+
+            cluster = [memories[i] for i in members]
+            summary = ConsolidationService._build_summary(cluster, member_similarities, centroid)
+            session.add(summary)
+            session.add(Embedding(memory_id=summary.id, vector=centroid.tolist(), model=model))
+            for i in members:
+                session.add(ConsolidationService._archive(memories[i], embeddings[i], summary.id))
+                archived_ids.append(memories[i].id)
+
+        if archived_ids:
+            session.flush()
+            ConsolidationService._delete_memories(session, archived_ids)
+            invalidate_after_commit(session, dopple_id, user_id)
+            bump_version(session, dopple_id, user_id)
+        return report, similarities
+
+    @staticmethod
+    def _cluster(matrix: np.ndarray, similarity_threshold: float, min_cluster_size: int) -> List[np.ndarray]:
+        """
+        Greedy leader clustering over normalized vectors, oldest leaders first
+
+        Each unassigned memory in turn gathers the unassigned memories at least
+        similarity_threshold similar to it; groups smaller than min_cluster_size
+        are left alone.
+        """
+        remaining = np.ones(matrix.shape[0], dtype=bool)
+        clusters = []
+        for leader in range(matrix.shape[0]):
+            if not remaining[leader]:
+                continue
+            similarities = matrix @ matrix[leader]
+            members = np.flatnonzero(remaining & (similarities >= similarity_threshold))
+            if members.size < min_cluster_size:
+                continue
+            if members.size > CONSOLIDATION_MAX_CLUSTER_SIZE:
+                members = members[np.argsort(-similarities[members], kind="stable")[:CONSOLIDATION_MAX_CLUSTER_SIZE]]
+            remaining[members] = False
+            clusters.append(np.sort(members))
+        return clusters
+
+    @staticmethod
+    def _build_summary(cluster: List[Memory], similarities: np.ndarray, centroid: np.ndarray) -> Memory:
+        """Build the summary memory for a cluster from its most central members"""
+        central = sorted(np.argsort(-similarities, kind="stable")[:SUMMARY_EXCERPTS])
+        excerpts = [ConsolidationService._excerpt(cluster[i].text) for i in central]
+        first, last = cluster[0].timestamp, cluster[-1].timestamp
+        text = (
+            f"Summary of {len(cluster)} memories from {first:%Y-%m-%d} to {last:%Y-%m-%d}: "
+            + " | ".join(excerpts)
+        )
+
+        summary = Memory(
+            id=str(uuid.uuid4()),
+            dopple_id=cluster[0].dopple_id,
+            user_id=cluster[0].user_id,
+            text=text,
+            role=TallyCounter(memory.role for memory in cluster).most_common(1)[0][0],
+            timestamp=last,
+            importance=max(memory.importance or 0 for memory in cluster),
+            token_count=count_tokens(text),
+            memory_metadata={
+                "consolidation": {
+                    "source_ids": [memory.id for memory in cluster],
+                    "source_count": len(cluster),
+                    "first_timestamp": first.isoformat(),
+                    "last_timestamp": last.isoformat(),
+                    "consolidated_at": datetime.utcnow().isoformat(),
+                }
+            },
+        )
+        for key in ("emotions", "topics", "traits"):
+            merged = {}
+            for memory in cluster:
+                for tag in getattr(memory, key):
+                    merged.setdefault(tag.id, tag)
+            setattr(summary, key, list(merged.values()))
+        return summary
+
+    @staticmethod
+    def _excerpt(text: str) -> str:
+        text = " ".join(text.split())
+        return text if len(text) <= EXCERPT_LENGTH else text[:EXCERPT_LENGTH - 3].rstrip() + "..."
+
+    @staticmethod
+    def _archive(memory: Memory, embedding: Embedding, summary_id: str) -> ArchivedMemory:
+        return ArchivedMemory(
+            id=memory.id,
+            summary_id=summary_id,
+            dopple_id=memory.dopple_id,
+            user_id=memory.user_id,
+            text=memory.text,
+            role=memory.role,
+            timestamp=memory.timestamp,
+            importance=memory.importance,
+            emotions=[tag.name for tag in memory.emotions],
+            topics=[tag.name for tag in memory.topics],
+            traits=[tag.name for tag in memory.traits],
+            memory_metadata=memory.memory_metadata,
+            vector=embedding.vector,
+            model=embedding.model,
+        )
+
+    @staticmethod
+    def _delete_memories(session: Session, memory_ids: List[str]):
+        """Delete memories with set-based statements, tag links and embeddings first"""
+        for start in range(0, len(memory_ids), DELETE_CHUNK_SIZE):
+            chunk = memory_ids[start:start + DELETE_CHUNK_SIZE]
+            for association in (memory_emotion_association, memory_topic_association, memory_trait_association):
+                session.execute(association.delete().where(association.c.memory_id.in_(chunk)))
+            session.query(Embedding).filter(Embedding.memory_id.in_(chunk)).delete(synchronize_session=False)
+            session.query(Memory).filter(Memory.id.in_(chunk)).delete(synchronize_session=False)
+        # The deleted rows are still in the identity map; drop them so nothing flushes them again
+        session.expire_all()
+
+
+# ---- Background scheduler ----
+
+_scheduler_thread: Optional[threading.Thread] = None
+_scheduler_stop = threading.Event()
+SCHEDULER_LEASE_NAME = "consolidation"
+
+
+def _scheduler_loop(interval: float):
+    while not _scheduler_stop.wait(interval):
+        try:
+            if claim_run(SCHEDULER_LEASE_NAME, interval):
+                ConsolidationService.run()
+        except ConsolidationInProgress:
+            logger.info("Skipping scheduled consolidation; a run is already in progress")
+        except Exception as e:
+            logger.error(f"Scheduled consolidation failed: {str(e)}", exc_info=True)
+
+
+def start_scheduler(interval: float = CONSOLIDATION_INTERVAL_SECONDS) -> bool:
+    """
+    Start the background consolidation thread
+
+    Each tick only runs if this worker takes the interval's run slot.
+
+    Args:
+        interval: Seconds between runs; values <= 0 leave the scheduler off
+
+    Returns:
+        True if the scheduler was started
+    """
+    global _scheduler_thread
+    if interval <= 0 or (_scheduler_thread is not None and _scheduler_thread.is_alive()):
+        return False
+    _scheduler_stop.clear()
+    _scheduler_thread = threading.Thread(
+        target=_scheduler_loop, args=(interval,), name="consolidation", daemon=True
+    )
+    _scheduler_thread.start()
+    logger.info(f"Memory consolidation scheduled every {interval:.0f}s")
+    return True
+
+
+def stop_scheduler():
+    """Stop the background consolidation thread after its current run"""
+    _scheduler_stop.set()
@@ -0,0 +1,225 @@
+"""
+Token-budgeted prompt context for a dopple conversation
+
+Instead of returning full search results for the chat route to trim, the
+context builder ranks a (dopple, user) pair's memories against the query and
+packs the best ones into a text block that fits a token budget. Packing uses
+the token counts stored with each memory (Memory.token_count), so only the id,
+text and ranking columns of the candidates are read and nothing is
+re-tokenized per turn.
+"""
+import logging
+import os
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from src.backend.db.database import run_read
+from src.backend.models.semantic_memory import Memory
+from src.backend.services.embedding_model_service import EmbeddingModelService
+from src.backend.services.embedding_service import EmbeddingService
+from src.backend.services.memory_service import MemoryService
+from src.backend.services.metrics_service import registry, time_stage
+from src.backend.services.profiling_service import profile_methods
+from src.backend.services.token_counter import count_tokens
+from src.backend.services.vector_search import normalize
+
+logger = logging.getLogger(__name__)
+
+# Default token budget of a context block
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "1000"))
+# Ranked memories considered for packing; smaller memories further down can fill leftover budget
+CONTEXT_CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", "50"))
+# Minimum similarity of a memory to the query to be considered at all
+CONTEXT_SIMILARITY_THRESHOLD = float(os.getenv("CONTEXT_SIMILARITY_THRESHOLD", "0.3"))
+
+context_tokens = registry.histogram(
+    "context_tokens",
+    "Tokens packed into assembled prompt context blocks",
+    buckets=(50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000),
+)
+
+context_memories = registry.counter(
+    "context_memories_total",
+    "Context candidates packed into a block or left out because they did not fit",
+    ["outcome"],
+)
+
+# Tokens of each line's "<role>: " prefix and newline, by role
+_line_overheads: Dict[str, int] = {}
+
+
+def _line_overhead(role: str) -> int:
+    overhead = _line_overheads.get(role)
+    if overhead is None:
+        overhead = _line_overheads[role] = count_tokens(f"{role}: ") + 1
+    return overhead
+
+
+@profile_methods
+class ContextService:
+    """Service that assembles ranked memories into token-budgeted prompt context"""
+
+    @staticmethod
+    def build_context(
+        query_text: str,
+        dopple_id: str,
+        user_id: Optional[str] = None,
+        max_tokens: int = CONTEXT_MAX_TOKENS,
+        candidates: int = CONTEXT_CANDIDATES,
+        similarity_threshold: float = CONTEXT_SIMILARITY_THRESHOLD,
+        chronological: bool = False,
+        mock: bool = False,
+        recency_half_life_days: Optional[float] = None,
+        importance_weight: Optional[float] = None,
+        db: Optional[Session] = None
+    ) -> Dict:
+        """
+        Build a context block of the memories most relevant to a query
+
+        Candidates are ranked like find_similar_memories (hot tier first, relevance
+        when a half-life or importance weight applies) and packed greedily in rank
+        order: a memory that does not fit the remaining budget is skipped so that
+        smaller ones after it can still use it. Each memory takes one
+        "<role>: <text>" line, and its cost is its stored token count plus the
+        tokens of the prefix and newline.
+
+        Args:
+            query_text: Text of the conversation turn to find context for
+            dopple_id: ID of the dopple
+            user_id: Optional filter by user ID
+            max_tokens: Token budget of the context block
+            candidates: Ranked memories considered for packing
+            similarity_threshold: Minimum similarity score (0-1)
+            chronological: Order the packed lines by time instead of rank
+            mock: Whether to use a mock query embedding (for testing)
+            recency_half_life_days: Half-life of the recency decay (see find_similar_memories)
+            importance_weight: Weight of importance in the ranking (see find_similar_memories)
+            db: Optional request-scoped session
+
+        Returns:
+            The context text, tokens used, the budget, the packed memories (id, role,
+            timestamp, token count and scores) and candidate counts
+        """
+        model = EmbeddingModelService.get_active_model(db)
+        try:
+            with time_stage("build_context", "embed"):
+                if mock:
+                    query_embedding = EmbeddingService.mock_embedding()
+                else:
+                    query_embedding = EmbeddingService.generate_embedding(query_text, model)
+        except Exception as e:
+            logger.error(f"Failed to generate embedding for context query: {str(e)}")
+            return ContextService.pack([], max_tokens, chronological)
+
+        query_vector = normalize(query_embedding)
+        ranking = MemoryService._ranking(recency_half_life_days, importance_weight)
+        items = run_read(
+            lambda session: ContextService._candidates(
+                session, query_vector, dopple_id, user_id, candidates, similarity_threshold, ranking, model
+            ),
+            db, dopple_id, user_id,
+        )
+        with time_stage("build_context", "packing"):
+            return ContextService.pack(items, max_tokens, chronological)
+
+    @staticmethod
+    def _candidates(
+        db: Session,
+        query_vector: np.ndarray,
+        dopple_id: str,
+        user_id: Optional[str],
+        limit: int,
+        similarity_threshold: float,
+        ranking,
+        model: str
+    ) -> List[Dict]:
+        """Ranked candidates with the columns packing needs, best first"""
+        ranked = MemoryService._rank_candidates(
+            db, query_vector, dopple_id, user_id, limit, similarity_threshold, ranking, model
+        )
+        if not ranked:
+            return []
+
+        # Only the columns the context needs; tags and metadata are never loaded
+        with time_stage("build_context", "db_read"):
+            rows = {
+                row.id: row
+                for row in db.query(
+                    Memory.id, Memory.text, Memory.role, Memory.timestamp, Memory.importance, Memory.token_count
+                ).filter(Memory.id.in_([memory_id for memory_id, _, _ in ranked])).all()
+            }
+
+        items = []
+        for memory_id, _, similarity in ranked:
+            # pop() also skips duplicate rows a shared vector file can hold and memories deleted meanwhile
+            row = rows.pop(memory_id, None)
+            if row is None:
+                continue
+            item = {
+                "id": row.id,
+                "role": row.role,
+                "timestamp": row.timestamp,
+                "text": row.text,
+                # Memories stored before token counts existed are counted here
+                "token_count": row.token_count if row.token_count is not None else count_tokens(row.text),
+                "similarity": float(similarity),
+            }
+            if ranking:
+                item["relevance"] = MemoryService._relevance(similarity, row.timestamp, row.importance, ranking)
+            items.append(item)
+        if ranking:
+            items.sort(key=lambda item: item["relevance"], reverse=True)
+        return items[:limit]
+
+    @staticmethod
+    def pack(items: List[Dict], max_tokens: int, chronological: bool = False) -> Dict:
+        """
+        Pack ranked candidates into a context block within a token budget
+
+        Args:
+            items: Candidates with role, text, timestamp and token_count, best first
+            max_tokens: Token budget of the block
+            chronological: Order the packed lines by time instead of rank
+
+        Returns:
+            The context block and the memories it holds (see build_context)
+        """
+        used = 0
+        packed = []
+        for item in items:
+            cost = item["token_count"] + _line_overhead(item["role"])
+            if used + cost > max_tokens:
+                continue
+            used += cost
+            packed.append(item)
+        if chronological:
+            # Undated memories go first, in rank order
+            packed.sort(key=lambda item: item["timestamp"] or datetime.min)
+
+        context_tokens.observe(used)
+        context_memories.inc(len(packed), outcome="packed")
+        context_memories.inc(len(items) - len(packed), outcome="skipped")
+
+        memories = []
+        for item in packed:
+            memory = {
+                "id": item["id"],
+                "role": item["role"],
+                "timestamp": item["timestamp"].isoformat() if item["timestamp"] else None,
+                "token_count": item["token_count"],
+                "similarity": item["similarity"],
+            }
+            if "relevance" in item:
+                memory["relevance"] = item["relevance"]
+            memories.append(memory)
+        return {
+            "context": "\n".join(f"{item['role']}: {item['text']}" for item in packed),
+            "tokens": used,
+            "max_tokens": max_tokens,
+            "memories": memories,
+            "candidates": len(items),
+            "skipped": len(items) - len(packed),
+        }
@@ -0,0 +1,221 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import desc
+from sqlalchemy.orm import Session
+
+from src.backend.db.database import session_scope
+from src.backend.models.semantic_memory import DedupPolicy, Embedding, Memory
+from src.backend.services.metrics_service import registry
+from src.backend.services.vector_search import VectorRows, build_matrix, mask_deleted, normalize
+
+logger = logging.getLogger(__name__)
+
+# Defaults for dopples without a row in dedup_policies
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "true").lower() == "true"
+DEDUP_EXACT_MATCH = os.getenv("DEDUP_EXACT_MATCH", "true").lower() == "true"
+DEDUP_SIMILARITY_THRESHOLD = float(os.getenv("DEDUP_SIMILARITY_THRESHOLD", "0.97"))  # <= 0 disables
+DEDUP_WINDOW = int(os.getenv("DEDUP_WINDOW", "200"))
+DEDUP_BUMP_IMPORTANCE = os.getenv("DEDUP_BUMP_IMPORTANCE", "true").lower() == "true"
+# Seconds a dopple's policy is cached in-process
+DEDUP_POLICY_TTL = float(os.getenv("DEDUP_POLICY_TTL", "60"))
+
+dedup_decisions = registry.counter(
+    "dedup_decisions_total",
+    "Ingest dedup decisions: new memory, exact text match or near-duplicate embedding",
+    ["decision"],
+)
+
+
+def text_hash(text: str) -> str:
+    """Digest of a text with case and whitespace normalized"""
+    normalized = " ".join(text.lower().split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def _default_policy(dopple_id: str) -> Dict:
+    return {
+        "dopple_id": dopple_id,
+        "enabled": DEDUP_ENABLED,
+        "exact_match": DEDUP_EXACT_MATCH,
+        "similarity_threshold": DEDUP_SIMILARITY_THRESHOLD if DEDUP_SIMILARITY_THRESHOLD > 0 else None,
+        "window": DEDUP_WINDOW,
+        "bump_importance": DEDUP_BUMP_IMPORTANCE,
+    }
+
+
+class DedupService:
+    """Service for detecting and merging repeated memories at ingest time"""
+
+    _policies: Dict[str, Tuple[float, Dict]] = {}
+    _policies_lock = threading.Lock()
+
+    @staticmethod
+    def get_policy(dopple_id: str, db: Optional[Session] = None) -> Dict:
+        """
+        Get a dopple's dedup policy, falling back to the environment defaults
+
+        Args:
+            dopple_id: Dopple ID
+            db: Optional request-scoped session
+
+        Returns:
+            Policy dictionary
+        """
+        now = time.monotonic()
+        with DedupService._policies_lock:
+            cached = DedupService._policies.get(dopple_id)
+        if cached is not None and now - cached[0] < DEDUP_POLICY_TTL:
+            return cached[1]
+
+        with session_scope(db, dopple_id=dopple_id) as db:
+            row = db.query(DedupPolicy).filter(DedupPolicy.dopple_id == dopple_id).first()
+            policy = row.to_dict() if row else _default_policy(dopple_id)
+        with DedupService._policies_lock:
+            DedupService._policies[dopple_id] = (now, policy)
+        return policy
+
+    @staticmethod
+    def set_policy(dopple_id: str, settings: Dict, db: Optional[Session] = None) -> Dict:
+        """
+        Create or update a dopple's dedup policy
+
+        Args:
+            dopple_id: Dopple ID
+            settings: Policy fields to change; unspecified fields keep their current value
+            db: Optional request-scoped session; the caller commits it
+
+        Returns:
+            The updated policy dictionary
+        """
+        with session_scope(db, dopple_id=dopple_id) as db:
+            row = db.query(DedupPolicy).filter(DedupPolicy.dopple_id == dopple_id).first()
+            if row is None:
+                row = DedupPolicy(**_default_policy(dopple_id))
+                db.add(row)
+            for key in ("enabled", "exact_match", "similarity_threshold", "window", "bump_importance"):
+                if key in settings:
+                    setattr(row, key, settings[key])
+            db.flush()
+            policy = row.to_dict()
+        DedupService.clear_cached_policy(dopple_id)
+        return policy
+
+    @staticmethod
+    def clear_cached_policy(dopple_id: Optional[str] = None):
+        with DedupService._policies_lock:
+            if dopple_id is None:
+                DedupService._policies.clear()
+            else:
+                DedupService._policies.pop(dopple_id, None)
+
+    @staticmethod
+    def find_exact(db: Session, dopple_id: str, user_id: str, role: str, digest: str) -> Optional[Memory]:
+        """Most recent memory of the same speaker with the same normalized text"""
+        return db.query(Memory).filter(
+            Memory.dopple_id == dopple_id,
+            Memory.user_id == user_id,
+            Memory.role == role,
+            Memory.text_hash == digest,
+        ).order_by(desc(Memory.timestamp)).first()
+
+    @staticmethod
+    def find_similar(
+        db: Session,
+        dopple_id: str,
+        user_id: str,
+        role: str,
+        vector: List[float],
+        model: str,
+        threshold: float,
+        window: int,
+        rows: Optional[VectorRows] = None
+    ) -> Optional[Memory]:
+        """
+        Most similar of the speaker's recent memories, if it clears the threshold
+
+        With the pair's cached vectors (rows), only the IDs of the recent memories
+        are read and their normalized vectors are taken from the cache; otherwise
+        the window's embeddings are loaded and decoded from the database.
+
+        Args:
+            db: Database session
+            dopple_id: Dopple ID
+            user_id: User ID
+            role: 'user' or 'dopple'
+            vector: Embedding of the incoming text
+            model: Embedding model of the vector; only embeddings of this model are compared
+            threshold: Minimum cosine similarity to count as a duplicate
+            window: Number of most recent memories to compare against
+            rows: Optional cached vectors of the dopple/user pair in the model
+
+        Returns:
+            The duplicate memory or None
+        """
+        query = normalize(vector)
+        if rows is not None:
+            if not len(rows.ids) or rows.matrix.shape[1] != query.shape[0]:
+                return None
+            recent = {
+                row[0] for row in db.query(Memory.id).filter(
+                    Memory.dopple_id == dopple_id,
+                    Memory.user_id == user_id,
+                    Memory.role == role,
+                ).order_by(desc(Memory.timestamp)).limit(window).all()
+            }
+            scores = mask_deleted(rows.matrix @ query, rows.deleted)
+            # The threshold is high, so only a handful of rows are ever checked against the window
+            for i in sorted(np.flatnonzero(scores >= threshold), key=lambda i: scores[i], reverse=True):
+                if rows.ids[i] in recent:
+                    return db.query(Memory).filter(Memory.id == rows.ids[i]).first()
+            return None
+
+        embeddings = db.query(Embedding.memory_id, Embedding.vector).join(Memory).filter(
+            Memory.dopple_id == dopple_id,
+            Memory.user_id == user_id,
+            Memory.role == role,
+            Embedding.model == model,
+        ).order_by(desc(Memory.timestamp)).limit(window).all()
+        if not embeddings:
+            return None
+
+        matrix, kept = build_matrix([row[1] for row in embeddings])
+        if not kept or matrix.shape[1] != query.shape[0]:
+            return None
+        scores = matrix @ query
+        best = int(np.argmax(scores))
+        if scores[best] < threshold:
+            return None
+        return db.query(Memory).filter(Memory.id == embeddings[kept[best]][0]).first()
+
+    @staticmethod
+    def merge(
+        memory: Memory,
+        importance: Optional[int],
+        bump_importance: bool,
+        emotions: List = None,
+        topics: List = None,
+        traits: List = None
+    ):
+        """Fold a repeated occurrence into an existing memory"""
+        memory.occurrences = (memory.occurrences or 1) + 1
+        current = memory.importance or 5
+        if bump_importance:
+            # Repetition is a signal of importance; capped at the top of the 1-10 scale
+            memory.importance = min(10, max(current, importance or 0) + 1)
+        elif importance:
+            memory.importance = max(current, importance)
+        for key, tags in (("emotions", emotions), ("topics", topics), ("traits", traits)):
+            existing = getattr(memory, key)
+            for tag in tags or []:
+                if tag not in existing:
+                    existing.append(tag)
+
+    @staticmethod
+    def record(decision: str):
+        dedup_decisions.inc(decision=decision)
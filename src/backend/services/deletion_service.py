@@ -0,0 +1,283 @@
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from src.backend.db.database import router, session_scope
+from src.backend.models.semantic_memory import (
+    ArchivedMemory, Embedding, Emotion, Memory, PersonalityTrait, SearchVersion, Topic,
+    memory_emotion_association, memory_topic_association, memory_trait_association,
+)
+from src.backend.services.cold_tier_store import cold_segment_store
+from src.backend.services.metrics_service import registry
+from src.backend.services.search_cache import bump_version
+from src.backend.services.shared_vector_store import shared_vector_store
+from src.backend.services.vector_cache import delete_after_commit, invalidate_after_commit, vector_cache
+
+logger = logging.getLogger(__name__)
+
+# Memories deleted per transaction; each batch holds its locks only briefly
+DELETE_BATCH_SIZE = int(os.getenv("DELETE_BATCH_SIZE", "500"))
+# Memories older than this are deleted by the background thread; 0 keeps everything
+RETENTION_MAX_AGE_DAYS = float(os.getenv("RETENTION_MAX_AGE_DAYS", "0"))
+# Seconds between background compaction (and retention) passes; 0 disables the thread
+VECTOR_COMPACTION_INTERVAL_SECONDS = float(os.getenv("VECTOR_COMPACTION_INTERVAL_SECONDS", "60"))
+# Share of tombstoned rows at which a cached vector set, vector file or cold segment is rewritten
+VECTOR_COMPACTION_MIN_DEAD_RATIO = float(os.getenv("VECTOR_COMPACTION_MIN_DEAD_RATIO", "0.2"))
+
+memories_deleted = registry.counter(
+    "memories_deleted_total",
+    "Memories removed by bulk deletes and retention",
+    ["reason"],
+)
+
+vector_compactions = registry.counter(
+    "vector_compactions_total",
+    "Vector sets, files and segments rewritten without their tombstoned rows",
+    ["store"],
+)
+
+
+class DeletionService:
+    """Service that deletes memories in bulk and compacts the tombstones deletes leave in vector structures"""
+
+    @staticmethod
+    def delete_memories(
+        dopple_id: Optional[str] = None,
+        user_id: Optional[str] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        emotions: Optional[List[str]] = None,
+        topics: Optional[List[str]] = None,
+        traits: Optional[List[str]] = None,
+        all_tenants: bool = False,
+        batch_size: int = DELETE_BATCH_SIZE,
+        reason: str = "request"
+    ) -> Dict:
+        """
+        Delete every memory matching the filters, with their embeddings and tag links
+
+        Each batch of up to batch_size memories is removed with one set-based
+        statement per table in its own transaction. Cached vectors of the deleted
+        memories are tombstoned when the batch commits rather than rebuilt, and
+        the search versions of the affected dopple/user pairs are bumped.
+        Archived originals of consolidated memories matching the dopple, user and
+        date filters are deleted too (their tags are not indexed, so tag filters
+        leave them alone). Forgetting a user (a user_id with no date or tag
+        filters) also deletes the user's search version rows, which lowers the
+        summed version of every dopple-wide scope the user was part of, so
+        results cached for those scopes stay invalid. Deletes not scoped to a
+        dopple run on every shard.
+
+        Args:
+            dopple_id: Only memories of this dopple
+            user_id: Only memories of this user
+            start_date: Only memories at or after this time
+            end_date: Only memories at or before this time
+            emotions: Only memories tagged with any of these emotions
+            topics: Only memories tagged with any of these topics
+            traits: Only memories tagged with any of these traits
+            all_tenants: Allow a delete that is not scoped to a dopple or user
+                (e.g. a date range across every dopple)
+            batch_size: Memories deleted per transaction
+            reason: Label for the deletion metrics ("request", "retention")
+
+        Returns:
+            Counts of deleted memories, archived memories and search version
+            rows, and the number of batches
+
+        Raises:
+            ValueError: No filter was given, or neither dopple_id nor user_id
+                without all_tenants
+        """
+        filters = {
+            "dopple_id": dopple_id, "user_id": user_id, "start_date": start_date, "end_date": end_date,
+            "emotions": emotions, "topics": topics, "traits": traits,
+        }
+        if not any(filters.values()):
+            raise ValueError("At least one filter is required to delete memories")
+        if not (dopple_id or user_id or all_tenants):
+            raise ValueError("dopple_id or user_id is required unless all_tenants is set")
+
+        def run(shard: str) -> Dict[str, int]:
+            return DeletionService._delete_on_shard(shard, filters, batch_size)
+
+        shards = [router.shard_for(dopple_id)] if dopple_id else None
+        results = [run(shard) for shard in shards] if shards else list(router.fan_out(run).values())
+        report = {
+            key: sum(result[key] for result in results) for key in ("memories", "archived_memories", "search_versions", "batches")
+        }
+        memories_deleted.inc(report["memories"], reason=reason)
+        if report["memories"] or report["archived_memories"]:
+            logger.info(
+                f"Deleted {report['memories']} memories and {report['archived_memories']} archived memories "
+                f"in {report['batches']} batches ({reason})"
+            )
+        return report
+
+    @staticmethod
+    def _delete_on_shard(shard: str, filters: Dict, batch_size: int) -> Dict[str, int]:
+        counts = {"memories": 0, "archived_memories": 0, "search_versions": 0, "batches": 0}
+        while True:
+            with session_scope(shard=shard) as db:
+                rows = DeletionService._matching(db, filters).limit(batch_size).all()
+                if not rows:
+                    break
+                for dopple_id in {row.dopple_id for row in rows}:
+                    router.check_writable(dopple_id)
+                DeletionService._delete_rows(db, [row.id for row in rows])
+                pairs: Dict[Tuple[str, str], List[str]] = {}
+                for row in rows:
+                    pairs.setdefault((row.dopple_id, row.user_id), []).append(row.id)
+                for (pair_dopple_id, pair_user_id), memory_ids in pairs.items():
+                    delete_after_commit(db, pair_dopple_id, pair_user_id, memory_ids)
+                    bump_version(db, pair_dopple_id, pair_user_id)
+            counts["memories"] += len(rows)
+            counts["batches"] += 1
+
+        if filters["emotions"] or filters["topics"] or filters["traits"]:
+            return counts
+        while True:
+            with session_scope(shard=shard) as db:
+                query = db.query(ArchivedMemory.id)
+                if filters["dopple_id"]:
+                    query = query.filter(ArchivedMemory.dopple_id == filters["dopple_id"])
+                if filters["user_id"]:
+                    query = query.filter(ArchivedMemory.user_id == filters["user_id"])
+                if filters["start_date"]:
+                    query = query.filter(ArchivedMemory.timestamp >= filters["start_date"])
+                if filters["end_date"]:
+                    query = query.filter(ArchivedMemory.timestamp <= filters["end_date"])
+                archived_ids = [row[0] for row in query.limit(batch_size).all()]
+                if not archived_ids:
+                    break
+                db.query(ArchivedMemory).filter(ArchivedMemory.id.in_(archived_ids)).delete(synchronize_session=False)
+            counts["archived_memories"] += len(archived_ids)
+            counts["batches"] += 1
+
+        if not filters["user_id"] or filters["start_date"] or filters["end_date"]:
+            return counts
+        while True:
+            with session_scope(shard=shard) as db:
+                query = db.query(SearchVersion.dopple_id).filter(SearchVersion.user_id == filters["user_id"])
+                if filters["dopple_id"]:
+                    query = query.filter(SearchVersion.dopple_id == filters["dopple_id"])
+                dopple_ids = [row[0] for row in query.limit(batch_size).all()]
+                if not dopple_ids:
+                    break
+                for dopple_id in dopple_ids:
+                    router.check_writable(dopple_id)
+                db.query(SearchVersion).filter(
+                    SearchVersion.user_id == filters["user_id"], SearchVersion.dopple_id.in_(dopple_ids)
+                ).delete(synchronize_session=False)
+                # Local entries were advanced to the old versions; drop them rather than let them match again
+                for dopple_id in dopple_ids:
+                    invalidate_after_commit(db, dopple_id, filters["user_id"])
+            counts["search_versions"] += len(dopple_ids)
+            counts["batches"] += 1
+        return counts
+
+    @staticmethod
+    def _matching(db: Session, filters: Dict):
+        query = db.query(Memory.id, Memory.dopple_id, Memory.user_id)
+        if filters["dopple_id"]:
+            query = query.filter(Memory.dopple_id == filters["dopple_id"])
+        if filters["user_id"]:
+            query = query.filter(Memory.user_id == filters["user_id"])
+        if filters["start_date"]:
+            query = query.filter(Memory.timestamp >= filters["start_date"])
+        if filters["end_date"]:
+            query = query.filter(Memory.timestamp <= filters["end_date"])
+        # EXISTS rather than joins, so a memory with several matching tags is selected once
+        if filters["emotions"]:
+            query = query.filter(Memory.emotions.any(Emotion.name.in_(filters["emotions"])))
+        if filters["topics"]:
+            query = query.filter(Memory.topics.any(Topic.name.in_(filters["topics"])))
+        if filters["traits"]:
+            query = query.filter(Memory.traits.any(PersonalityTrait.name.in_(filters["traits"])))
+        return query
+
+    @staticmethod
+    def _delete_rows(db: Session, memory_ids: List[str]):
+        """Delete memories with set-based statements, tag links and embeddings first"""
+        for association in (memory_emotion_association, memory_topic_association, memory_trait_association):
+            db.execute(association.delete().where(association.c.memory_id.in_(memory_ids)))
+        db.query(Embedding).filter(Embedding.memory_id.in_(memory_ids)).delete(synchronize_session=False)
+        db.query(Memory).filter(Memory.id.in_(memory_ids)).delete(synchronize_session=False)
+
+    @staticmethod
+    def apply_retention(max_age_days: float = RETENTION_MAX_AGE_DAYS) -> Optional[Dict]:
+        """
+        Delete memories older than the retention period
+
+        Returns:
+            Deletion counts, or None when retention is disabled
+        """
+        if max_age_days <= 0:
+            return None
+        cutoff = datetime.utcnow() - timedelta(days=max_age_days)
+        return DeletionService.delete_memories(end_date=cutoff, all_tenants=True, reason="retention")
+
+    @staticmethod
+    def compact(min_dead_ratio: float = VECTOR_COMPACTION_MIN_DEAD_RATIO) -> Dict[str, int]:
+        """
+        Rewrite vector structures whose share of tombstoned rows reached min_dead_ratio
+
+        Returns:
+            Number of structures compacted per store
+        """
+        report = {"vector_cache": vector_cache.compact(min_dead_ratio)}
+        if shared_vector_store is not None:
+            report["shared_vector_store"] = shared_vector_store.compact(min_dead_ratio)
+        if cold_segment_store is not None:
+            report["cold_segments"] = cold_segment_store.compact(min_dead_ratio)
+        for store, compacted in report.items():
+            vector_compactions.inc(compacted, store=store)
+        return report
+
+
+# ---- Background compaction and retention ----
+
+_compactor_thread: Optional[threading.Thread] = None
+_compactor_stop = threading.Event()
+
+
+def _compactor_loop(interval: float):
+    while not _compactor_stop.wait(interval):
+        try:
+            DeletionService.apply_retention()
+        except Exception as e:
+            logger.error(f"Retention pass failed: {str(e)}", exc_info=True)
+        try:
+            DeletionService.compact()
+        except Exception as e:
+            logger.error(f"Vector compaction failed: {str(e)}", exc_info=True)
+
+
+def start_compactor(interval: float = VECTOR_COMPACTION_INTERVAL_SECONDS) -> bool:
+    """
+    Start the background thread that applies retention and compacts tombstoned vectors
+
+    Args:
+        interval: Seconds between passes; values <= 0 leave the thread off
+
+    Returns:
+        True if the thread was started
+    """
+    global _compactor_thread
+    if interval <= 0 or (_compactor_thread is not None and _compactor_thread.is_alive()):
+        return False
+    _compactor_stop.clear()
+    _compactor_thread = threading.Thread(
+        target=_compactor_loop, args=(interval,), name="vector-compaction", daemon=True
+    )
+    _compactor_thread.start()
+    return True
+
+
+def stop_compactor():
+    """Stop the background compaction thread after its current pass"""
+    _compactor_stop.set()
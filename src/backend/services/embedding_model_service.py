@@ -0,0 +1,131 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from src.backend.db.database import for_each_shard, session_scope
+from src.backend.models.semantic_memory import Embedding, EmbeddingModelState, Memory
+from src.backend.services.embedding_service import EMBEDDING_MODEL
+from src.backend.services.vector_cache import vector_cache
+
+logger = logging.getLogger(__name__)
+
+# Seconds a worker trusts its cached active model; bounds how long workers disagree after a cutover
+EMBEDDING_MODEL_REFRESH_SECONDS = float(os.getenv("EMBEDDING_MODEL_REFRESH_SECONDS", "30"))
+
+_STATE_ROW = "active"
+
+
+class EmbeddingModelService:
+    """Service for the embedding model that searches and new memories use"""
+
+    _active: Optional[str] = None
+    _checked_at = 0.0
+    _lock = threading.Lock()
+
+    @staticmethod
+    def get_active_model(db: Optional[Session] = None) -> str:
+        """
+        Get the active embedding model, re-reading it from the database at most every refresh interval
+
+        Falls back to EMBEDDING_MODEL until a model has been activated. A change
+        seen here empties the per-process vector cache.
+
+        Args:
+            db: Optional request-scoped session
+
+        Returns:
+            Model name
+        """
+        now = time.monotonic()
+        with EmbeddingModelService._lock:
+            active, checked_at = EmbeddingModelService._active, EmbeddingModelService._checked_at
+        if active is not None and now - checked_at < EMBEDDING_MODEL_REFRESH_SECONDS:
+            return active
+
+        with session_scope(db) as db:
+            row = db.query(EmbeddingModelState).filter(EmbeddingModelState.name == _STATE_ROW).first()
+            model = row.model if row else EMBEDDING_MODEL
+        EmbeddingModelService._use(model, now)
+        return model
+
+    @staticmethod
+    def set_active_model(model: str, db: Optional[Session] = None) -> str:
+        """
+        Make a model the active one
+
+        Other workers pick the change up within EMBEDDING_MODEL_REFRESH_SECONDS.
+
+        Args:
+            model: Model name
+            db: Optional session; the caller commits it
+
+        Returns:
+            The previously active model
+        """
+        with session_scope(db) as db:
+            row = db.query(EmbeddingModelState).filter(EmbeddingModelState.name == _STATE_ROW).with_for_update().first()
+            previous = row.model if row else EMBEDDING_MODEL
+            if row is None:
+                db.add(EmbeddingModelState(name=_STATE_ROW, model=model))
+            else:
+                row.model = model
+                row.activated_at = datetime.utcnow()
+            db.flush()
+        EmbeddingModelService.refresh()
+        logger.info(f"Active embedding model changed from {previous} to {model}")
+        return previous
+
+    @staticmethod
+    def refresh():
+        """Forget the cached active model so the next lookup reads the database"""
+        with EmbeddingModelService._lock:
+            EmbeddingModelService._checked_at = 0.0
+
+    @staticmethod
+    def _use(model: str, now: float):
+        with EmbeddingModelService._lock:
+            EmbeddingModelService._active = model
+            EmbeddingModelService._checked_at = now
+        vector_cache.use_model(model)
+
+    @staticmethod
+    def get_stats(db: Optional[Session] = None) -> Dict:
+        """
+        Get the active model and how much of the corpus each model has embedded
+
+        Args:
+            db: Optional request-scoped session
+
+        Returns:
+            Dictionary with the active model, memory count and embeddings per model
+        """
+        with session_scope(db) as db:
+            row = db.query(EmbeddingModelState).filter(EmbeddingModelState.name == _STATE_ROW).first()
+            active = row.model if row else EMBEDDING_MODEL
+            activated_at = row.activated_at.isoformat() if row and row.activated_at else None
+
+        def count(session: Session) -> Tuple[int, List[Tuple[str, int]]]:
+            memories = session.query(func.count(Memory.id)).scalar() or 0
+            return memories, session.query(Embedding.model, func.count(Embedding.id)).group_by(Embedding.model).all()
+
+        memories = 0
+        counts: Dict[str, int] = {}
+        for shard_memories, shard_counts in for_each_shard(count, db):
+            memories += shard_memories
+            for model, model_count in shard_counts:
+                counts[model] = counts.get(model, 0) + model_count
+        return {
+            "active_model": active,
+            "activated_at": activated_at,
+            "memories": memories,
+            "models": {
+                model: {"embeddings": count, "coverage": count / memories if memories else 0.0}
+                for model, count in sorted(counts.items())
+            },
+        }
@@ -1,32 +1,38 @@
 import os
-import openai
 import numpy as np
 from typing import List, Dict, Any, Optional, Union
 import logging
 import json
-import time
 
-# Configure OpenAI API
-openai.api_key = os.getenv("OPENAI_API_KEY")
+from src.backend.services.profiling_service import profile_methods
+from src.backend.services.provider_client import estimate_tokens, openai_client
+from src.backend.services.single_flight import SingleFlight
 
 # Constants
-EMBEDDING_MODEL = "text-embedding-3-small"
+# Model used until another one is activated (see EmbeddingModelService)
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
 EMBEDDING_DIMENSIONS = 1536  # Dimensionality of text-embedding-3-small
-MAX_RETRIES = 3
-RETRY_DELAY = 2  # seconds
+MAX_BATCH_SIZE = 2048  # Inputs per embeddings API request
 
 logger = logging.getLogger(__name__)
 
+# Concurrent requests for the same text share one API call
+_embedding_flight = SingleFlight("embedding")
+
+@profile_methods
 class EmbeddingService:
     """Service for generating and manipulating text embeddings"""
     
     @staticmethod
-    def generate_embedding(text: str) -> List[float]:
+    def generate_embedding(text: str, model: Optional[str] = None) -> List[float]:
         """
-        Generate embedding vector for a text using OpenAI's text-embedding-3-small model
+        Generate embedding vector for a text using an OpenAI embedding model
+        
+        Concurrent calls with the same text and model share one API request.
         
         Args:
             text: The text to embed
+            model: Embedding model (defaults to EMBEDDING_MODEL)
             
         Returns:
             List of float values representing the embedding vector
@@ -34,28 +40,23 @@ class EmbeddingService:
         if not text.strip():
             raise ValueError("Empty text cannot be embedded")
         
-        retries = 0
-        while retries < MAX_RETRIES:
-            try:
-                # Make API call to OpenAI
-                response = openai.Embedding.create(
-                    input=text,
-                    model=EMBEDDING_MODEL
-                )
-                
-                # Extract the embedding from the response
-                embedding = response["data"][0]["embedding"]
-                
-                return embedding
-            
-            except Exception as e:
-                retries += 1
-                logger.warning(f"Embedding generation attempt {retries} failed: {str(e)}")
-                if retries < MAX_RETRIES:
-                    time.sleep(RETRY_DELAY)
-                else:
-                    logger.error(f"Failed to generate embedding after {MAX_RETRIES} attempts: {str(e)}")
-                    raise
+        model = model or EMBEDDING_MODEL
+        return _embedding_flight.do(
+            (model, text),
+            lambda: EmbeddingService._request_embeddings(text, model)[0],
+            share=list,
+        )
+    
+    @staticmethod
+    def _request_embeddings(inputs: Union[str, List[str]], model: Optional[str] = None) -> List[List[float]]:
+        """Call the embeddings API through the shared provider client; returns vectors in input order"""
+        texts = [inputs] if isinstance(inputs, str) else inputs
+        response = openai_client.call(
+            "embedding",
+            lambda client: client.embeddings.create(input=inputs, model=model or EMBEDDING_MODEL),
+            tokens=sum(estimate_tokens(text) for text in texts),
+        )
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
     
     @staticmethod
     def cosine_similarity(embedding1: List[float], embedding2: List[float]) -> float:
@@ -79,20 +80,23 @@ class EmbeddingService:
         return float(similarity)
     
     @staticmethod
-    def batch_generate_embeddings(texts: List[str]) -> List[List[float]]:
+    def batch_generate_embeddings(texts: List[str], model: Optional[str] = None) -> List[List[float]]:
         """
-        Generate embeddings for multiple texts
+        Generate embeddings for multiple texts with one API call per batch
         
         Args:
             texts: List of texts to embed
+            model: Embedding model (defaults to EMBEDDING_MODEL)
             
         Returns:
             List of embedding vectors
         """
+        if any(not text.strip() for text in texts):
+            raise ValueError("Empty text cannot be embedded")
+        
         embeddings = []
-        for text in texts:
-            embedding = EmbeddingService.generate_embedding(text)
-            embeddings.append(embedding)
+        for start in range(0, len(texts), MAX_BATCH_SIZE):
+            embeddings.extend(EmbeddingService._request_embeddings(texts[start:start + MAX_BATCH_SIZE], model))
         return embeddings
     
     @staticmethod
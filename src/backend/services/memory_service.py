@@ -1,17 +1,41 @@
+import copy
 import logging
 from typing import List, Dict, Any, Optional, Tuple, Union
 import numpy as np
 from datetime import datetime
 import json
+import time
+import uuid
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy import desc, func
 
-from src.backend.db.database import get_db
-from src.backend.models.semantic_memory import Memory, Embedding, Emotion, Topic, PersonalityTrait
+from src.backend.db.database import for_each_shard, router, run_read, session_scope
+from src.backend.db.sharding import on_primary, route
+from src.backend.models.semantic_memory import ArchivedMemory, Memory, Embedding, Emotion, Topic, PersonalityTrait
+from src.backend.services.cold_tier_store import cold_segment_store
+from src.backend.services.dedup_service import DedupService, text_hash
+from src.backend.services.embedding_model_service import EmbeddingModelService
 from src.backend.services.embedding_service import EmbeddingService
+from src.backend.services.metrics_service import time_stage
+from src.backend.services.profiling_service import profile_methods
+from src.backend.services.search_cache import bump_version, normalize_query, read_version, search_cache
+from src.backend.services.shared_vector_store import shared_vector_store
+from src.backend.services.single_flight import SingleFlight
+from src.backend.services.token_counter import count_tokens
+from src.backend.services.tiering_service import TIER_COLD, TIER_HOT, TIERING_ENABLED, tier_searches
+from src.backend.services.vector_cache import VECTOR_CACHE_ENABLED, VectorSet, append_after_commit, vector_cache
+from src.backend.services.vector_search import (
+    RELEVANCE_HALF_LIFE_DAYS, RELEVANCE_IMPORTANCE_WEIGHT, RELEVANCE_OVERFETCH, VectorRows,
+    build_matrix, mask_deleted, normalize, relevance_top_k, relevance_weights, score_top_k, to_epoch,
+    top_k as select_top_k,
+)
 
 logger = logging.getLogger(__name__)
 
+# Concurrent identical searches share one embedding call and scan
+_search_flight = SingleFlight("find_similar_memories")
+
+@profile_methods
 class MemoryService:
     """Service for managing semantic memories"""
     
@@ -27,11 +51,15 @@ class MemoryService:
         importance: int = 5,
         metadata: Dict = None,
         generate_embedding: bool = True,
-        mock_embedding: bool = False
+        mock_embedding: bool = False,
+        db: Optional[Session] = None
     ) -> str:
         """
         Store a new memory with optional embedding
         
+        Repeats of one of the speaker's memories are merged into it according to the
+        dopple's dedup policy (see DedupService) instead of being inserted.
+        
         Args:
             text: The text content of the memory
             dopple_id: ID of the dopple involved
@@ -44,11 +72,76 @@ class MemoryService:
             metadata: Additional metadata as dictionary
             generate_embedding: Whether to generate embedding for the text
             mock_embedding: Use mock embedding instead of calling API (for testing)
+            db: Optional request-scoped session; the caller commits it. Without one,
+                no connection is checked out while the embedding is generated
             
         Returns:
-            ID of the created memory
+            ID of the created memory, or of the existing memory a duplicate was merged into
         """
-        with get_db() as db:
+        digest = text_hash(text)
+        policy = DedupService.get_policy(dopple_id, db=db)
+        model = EmbeddingModelService.get_active_model(db)
+        
+        # A repeated text is merged before paying for an embedding, in its own short transaction
+        if policy["enabled"] and policy["exact_match"]:
+            with session_scope(db, dopple_id=dopple_id) as session:
+                with time_stage("store_memory", "db_read"):
+                    duplicate = DedupService.find_exact(session, dopple_id, user_id, role, digest)
+                if duplicate is not None:
+                    DedupService.merge(
+                        duplicate, importance, policy["bump_importance"],
+                        *MemoryService._resolve_tags(session, emotions, topics, traits)
+                    )
+                    bump_version(session, dopple_id, user_id)
+                    DedupService.record("exact")
+                    return duplicate.id
+        
+        # Embedded outside any transaction: provider latency and retries must not
+        # hold a pooled connection (a caller-provided session that already ran a
+        # query keeps its connection regardless)
+        vector = None
+        if generate_embedding:
+            with time_stage("store_memory", "embed"):
+                if mock_embedding:
+                    vector = EmbeddingService.mock_embedding()
+                else:
+                    try:
+                        vector = EmbeddingService.generate_embedding(text, model)
+                    except Exception as e:
+                        logger.error(f"Failed to generate embedding: {str(e)}")
+        
+        with session_scope(db, dopple_id=dopple_id) as db:
+            with time_stage("store_memory", "db_read"):
+                emotion_objs, topic_objs, trait_objs = MemoryService._resolve_tags(db, emotions, topics, traits)
+                # Checked again: the same text may have been stored while this one was embedding
+                duplicate = (
+                    DedupService.find_exact(db, dopple_id, user_id, role, digest)
+                    if policy["enabled"] and policy["exact_match"] else None
+                )
+            if duplicate is not None:
+                DedupService.merge(
+                    duplicate, importance, policy["bump_importance"], emotion_objs, topic_objs, trait_objs
+                )
+                bump_version(db, dopple_id, user_id)
+                DedupService.record("exact")
+                return duplicate.id
+            
+            # Near-duplicates of the speaker's recent memories are merged as well
+            if vector and policy["enabled"] and policy["similarity_threshold"]:
+                with time_stage("store_memory", "dedup"):
+                    duplicate = DedupService.find_similar(
+                        db, dopple_id, user_id, role, vector, model,
+                        policy["similarity_threshold"], policy["window"],
+                        rows=MemoryService._cached_vectors(db, dopple_id, user_id, model),
+                    )
+                if duplicate is not None:
+                    DedupService.merge(
+                        duplicate, importance, policy["bump_importance"], emotion_objs, topic_objs, trait_objs
+                    )
+                    bump_version(db, dopple_id, user_id)
+                    DedupService.record("similar")
+                    return duplicate.id
+            
             # Create memory instance
             memory = Memory(
                 dopple_id=dopple_id,
@@ -56,66 +149,239 @@ class MemoryService:
                 text=text,
                 role=role,
                 importance=importance,
-                metadata=metadata
+                text_hash=digest,
+                occurrences=1,
+                token_count=count_tokens(text),
+                memory_metadata=metadata
             )
-            
-            # Add emotions if provided
-            if emotions:
-                emotion_objs = db.query(Emotion).filter(Emotion.name.in_(emotions)).all()
-                memory.emotions = emotion_objs
-            
-            # Add topics if provided
-            if topics:
-                topic_objs = db.query(Topic).filter(Topic.name.in_(topics)).all()
-                memory.topics = topic_objs
-            
-            # Add traits if provided
-            if traits:
-                trait_objs = db.query(PersonalityTrait).filter(PersonalityTrait.name.in_(traits)).all()
-                memory.traits = trait_objs
+            memory.emotions = emotion_objs
+            memory.topics = topic_objs
+            memory.traits = trait_objs
             
             # Add memory to session
-            db.add(memory)
-            db.flush()  # Flush to get ID
-            
-            # Generate and store embedding
-            if generate_embedding:
-                vector = None
-                if mock_embedding:
-                    vector = EmbeddingService.mock_embedding()
-                else:
-                    try:
-                        vector = EmbeddingService.generate_embedding(text)
-                    except Exception as e:
-                        logger.error(f"Failed to generate embedding: {str(e)}")
+            with time_stage("store_memory", "db_write"):
+                db.add(memory)
+                db.flush()  # Flush to get ID
                 
                 if vector:
                     embedding = Embedding(
                         memory_id=memory.id,
                         vector=vector,
-                        model=EmbeddingService.EMBEDDING_MODEL
+                        model=model
                     )
                     db.add(embedding)
+                    append_after_commit(
+                        db, dopple_id, user_id, memory.id, vector, memory.timestamp, memory.importance, model
+                    )
+                bump_version(db, dopple_id, user_id)
+            DedupService.record("new")
             
-            db.commit()
+            # Committed once by the session owner
             return memory.id
     
     @staticmethod
-    def get_memory(memory_id: str) -> Optional[Dict]:
+    def _resolve_tags(
+        db: Session,
+        emotions: Optional[List[str]],
+        topics: Optional[List[str]],
+        traits: Optional[List[str]]
+    ) -> Tuple[List[Emotion], List[Topic], List[PersonalityTrait]]:
+        """Look up tag rows by name; unknown names are dropped"""
+        emotion_objs = db.query(Emotion).filter(Emotion.name.in_(emotions)).all() if emotions else []
+        topic_objs = db.query(Topic).filter(Topic.name.in_(topics)).all() if topics else []
+        trait_objs = db.query(PersonalityTrait).filter(PersonalityTrait.name.in_(traits)).all() if traits else []
+        return emotion_objs, topic_objs, trait_objs
+    
+    @staticmethod
+    def store_memories_bulk(
+        memories: List[Dict],
+        generate_embeddings: bool = True,
+        mock_embedding: bool = False,
+        deduplicate: bool = True,
+        db: Optional[Session] = None
+    ) -> List[str]:
+        """
+        Store many memories in one transaction with batched lookups and embeddings
+        
+        Memories are written shard by shard, each group with its own tag lookups
+        and flush. Repeats are merged according to each dopple's dedup policy as in
+        store_memory, including exact repeats within the batch. A merged memory that came
+        with its own 'id' is archived under the memory it was merged into, so storing
+        it again (a replayed chat sync batch) finds it instead of merging twice.
+        
+        Args:
+            memories: Dictionaries with the store_memory fields (text, dopple_id, user_id,
+                role, emotions, topics, traits, importance, metadata) and optionally
+                'id', 'timestamp' and a precomputed 'embedding'
+            generate_embeddings: Whether to embed texts that have no precomputed embedding
+            mock_embedding: Use mock embeddings instead of calling API (for testing)
+            deduplicate: Apply the dopple's dedup policy; off for corpora known to be unique
+            db: Optional request-scoped session; the caller commits it
+            
+        Returns:
+            IDs of the created memories, or of the memories duplicates were merged into, in input order
+        """
+        if not memories:
+            return []
+        
+        policies = {
+            dopple_id: DedupService.get_policy(dopple_id, db=db) if deduplicate else {"enabled": False}
+            for dopple_id in {data["dopple_id"] for data in memories}
+        }
+        
+        # Embed everything that was not precomputed in one batch, before a connection is checked out
+        vectors = [data.get("embedding") for data in memories]
+        model = EmbeddingModelService.get_active_model(db)
+        if generate_embeddings:
+            missing = [i for i, vector in enumerate(vectors) if vector is None]
+            if missing:
+                with time_stage("store_memories_bulk", "embed"):
+                    try:
+                        if mock_embedding:
+                            generated = [EmbeddingService.mock_embedding() for _ in missing]
+                        else:
+                            generated = EmbeddingService.batch_generate_embeddings(
+                                [memories[i]["text"] for i in missing], model
+                            )
+                        for i, vector in zip(missing, generated):
+                            vectors[i] = vector
+                    except Exception as e:
+                        logger.error(f"Failed to generate embeddings for bulk store: {str(e)}")
+        
+        with session_scope(db) as db:
+            groups: Dict[str, List[int]] = {}
+            for i, data in enumerate(memories):
+                groups.setdefault(router.shard_for(data["dopple_id"]), []).append(i)
+            
+            memory_ids: List[Optional[str]] = [None] * len(memories)
+            for shard, indices in groups.items():
+                route(db, shard=shard)
+                group = [memories[i] for i in indices]
+                for group_dopple_id in {data["dopple_id"] for data in group}:
+                    router.check_writable(group_dopple_id)
+                
+                # Resolve all tag names with one query per tag table
+                with time_stage("store_memories_bulk", "db_read"):
+                    tag_maps = {}
+                    for key, tag_model in (("emotions", Emotion), ("topics", Topic), ("traits", PersonalityTrait)):
+                        names = {name for data in group for name in (data.get(key) or [])}
+                        tag_maps[key] = (
+                            {obj.name: obj for obj in db.query(tag_model).filter(tag_model.name.in_(names)).all()}
+                            if names else {}
+                        )
+                
+                    # Latest memory per speaker and text, extended with the batch as it is added
+                    exact = [
+                        data for data in group
+                        if policies[data["dopple_id"]]["enabled"] and policies[data["dopple_id"]]["exact_match"]
+                    ]
+                    latest: Dict[Tuple[str, str, str, str], Memory] = {}
+                    if exact:
+                        for memory in db.query(Memory).filter(
+                            Memory.dopple_id.in_({data["dopple_id"] for data in exact}),
+                            Memory.text_hash.in_({text_hash(data["text"]) for data in exact}),
+                        ).order_by(Memory.timestamp):
+                            latest[(memory.dopple_id, memory.user_id, memory.role, memory.text_hash)] = memory
+                
+                with time_stage("store_memories_bulk", "db_write"):
+                    for i, data in zip(indices, group):
+                        policy = policies[data["dopple_id"]]
+                        digest = text_hash(data["text"])
+                        tags = [
+                            [tag_maps[key][name] for name in (data.get(key) or []) if name in tag_maps[key]]
+                            for key in ("emotions", "topics", "traits")
+                        ]
+                        decision, duplicate = None, None
+                        if policy["enabled"] and policy["exact_match"]:
+                            decision, duplicate = "exact", latest.get((data["dopple_id"], data["user_id"], data["role"], digest))
+                        if duplicate is None and vectors[i] and policy["enabled"] and policy["similarity_threshold"]:
+                            with time_stage("store_memories_bulk", "dedup"):
+                                decision, duplicate = "similar", DedupService.find_similar(
+                                    db, data["dopple_id"], data["user_id"], data["role"], vectors[i], model,
+                                    policy["similarity_threshold"], policy["window"],
+                                    rows=MemoryService._cached_vectors(db, data["dopple_id"], data["user_id"], model),
+                                )
+                        if duplicate is not None:
+                            DedupService.merge(duplicate, data.get("importance"), policy["bump_importance"], *tags)
+                            if data.get("id"):
+                                db.add(ArchivedMemory(
+                                    id=data["id"],
+                                    summary_id=duplicate.id,
+                                    dopple_id=data["dopple_id"],
+                                    user_id=data["user_id"],
+                                    text=data["text"],
+                                    role=data["role"],
+                                    timestamp=data.get("timestamp") or datetime.utcnow(),
+                                    importance=data.get("importance"),
+                                    emotions=list(data.get("emotions") or []),
+                                    topics=list(data.get("topics") or []),
+                                    traits=list(data.get("traits") or []),
+                                    memory_metadata=data.get("metadata"),
+                                    vector=vectors[i],
+                                    model=model if vectors[i] else None,
+                                ))
+                            DedupService.record(decision)
+                            memory_ids[i] = duplicate.id
+                            continue
+                        
+                        memory = Memory(
+                            id=data.get("id") or str(uuid.uuid4()),
+                            dopple_id=data["dopple_id"],
+                            user_id=data["user_id"],
+                            text=data["text"],
+                            role=data["role"],
+                            importance=data.get("importance") or 5,
+                            text_hash=digest,
+                            occurrences=1,
+                            token_count=count_tokens(data["text"]),
+                            memory_metadata=data.get("metadata")
+                        )
+                        if data.get("timestamp"):
+                            memory.timestamp = data["timestamp"]
+                        for key, objs in zip(("emotions", "topics", "traits"), tags):
+                            if objs:
+                                setattr(memory, key, objs)
+                        db.add(memory)
+                        if vectors[i]:
+                            db.add(Embedding(memory_id=memory.id, vector=vectors[i], model=model))
+                            append_after_commit(
+                                db, memory.dopple_id, memory.user_id, memory.id, vectors[i],
+                                memory.timestamp, memory.importance, model
+                            )
+                        memory_ids[i] = memory.id
+                        latest[(memory.dopple_id, memory.user_id, memory.role, digest)] = memory
+                        if deduplicate:
+                            DedupService.record("new")
+                    # Flushed before the session is routed to the next shard
+                    db.flush()
+                    for pair_dopple_id, pair_user_id in {(data["dopple_id"], data["user_id"]) for data in group}:
+                        bump_version(db, pair_dopple_id, pair_user_id)
+            
+            return memory_ids
+    
+    @staticmethod
+    def get_memory(
+        memory_id: str,
+        include_metadata: bool = True,
+        db: Optional[Session] = None
+    ) -> Optional[Dict]:
         """
         Get a memory by ID
         
         Args:
             memory_id: ID of the memory
+            include_metadata: Whether to include the metadata field
+            db: Optional request-scoped session
             
         Returns:
             Memory as a dictionary or None if not found
         """
-        with get_db() as db:
-            memory = db.query(Memory).filter(Memory.id == memory_id).first()
-            if memory:
-                return memory.to_dict()
-            return None
+        def lookup(session: Session) -> Optional[Dict]:
+            memory = session.query(Memory).filter(Memory.id == memory_id).first()
+            return memory.to_dict(include_metadata=include_metadata) if memory else None
+        
+        # IDs do not say which shard holds them; at most one shard has a match
+        return next((memory for memory in for_each_shard(lookup, db) if memory is not None), None)
     
     @staticmethod
     def find_similar_memories(
@@ -124,11 +390,29 @@ class MemoryService:
         user_id: Optional[str] = None,
         top_k: int = 5,
         similarity_threshold: float = 0.7,
-        mock: bool = False
+        mock: bool = False,
+        include_metadata: bool = True,
+        recency_half_life_days: Optional[float] = None,
+        importance_weight: Optional[float] = None,
+        db: Optional[Session] = None
     ) -> List[Dict]:
         """
         Find memories similar to the query text using embedding similarity
         
+        Only the hot tier is scanned unless fewer than top_k hot memories clear the
+        threshold, in which case the cold tier is scored as well. With a recency
+        half-life or importance weight, results are ranked by relevance (similarity
+        x recency decay x importance) instead of raw similarity. Searches that are
+        not scoped to a dopple run on every shard in parallel.
+        
+        Dopple-scoped results are cached per normalized request and served only
+        while no write has touched the scope since (see search_cache). A miss is
+        recomputed from vectors that were checked against the same write version
+        (see _get_vectors), so writes made by other processes are never cached
+        under the new version. Identical searches of the same write version arriving
+        while one is in flight wait for it and receive copies of its results
+        instead of running again.
+        
         Args:
             query_text: Text to find similar memories for
             dopple_id: Optional filter by dopple ID
@@ -136,53 +420,565 @@ class MemoryService:
             top_k: Maximum number of results to return
             similarity_threshold: Minimum similarity score (0-1)
             mock: Whether to use mock functionality (for testing)
+            include_metadata: Whether to include the metadata field in results
+            recency_half_life_days: Half-life of the recency decay (defaults to
+                RELEVANCE_HALF_LIFE_DAYS; 0 disables decay)
+            importance_weight: Weight of importance in the ranking from 0 to 1 (defaults
+                to RELEVANCE_IMPORTANCE_WEIGHT)
+            db: Optional request-scoped session
             
         Returns:
-            List of memory dictionaries with similarity scores
+            List of memory dictionaries with similarity (and relevance) scores
         """
+        # Queries are embedded with the model the stored vectors were built with
+        model = EmbeddingModelService.get_active_model(db)
+        key = (
+            normalize_query(query_text), dopple_id, user_id, top_k, similarity_threshold, mock, include_metadata,
+            recency_half_life_days, importance_weight, model,
+        )
+        
+        # Mock embeddings are random, so their results are never reused
+        cacheable = search_cache.enabled and bool(dopple_id) and not mock
+        version = None
+        if dopple_id:
+            # Read before searching: a write that commits meanwhile leaves the entry behind its version
+            version = run_read(lambda session: read_version(session, dopple_id, user_id), db, dopple_id, user_id)
+            if cacheable:
+                cached = search_cache.get(key, version)
+                if cached is not None:
+                    return cached
+        
+        # The version is part of the flight key: a search never joins one that started before a write it must see
+        results = _search_flight.do(
+            key + (version,),
+            lambda: MemoryService._find_similar_memories(
+                query_text, dopple_id, user_id, top_k, similarity_threshold, mock, include_metadata,
+                recency_half_life_days, importance_weight, model, db,
+            ),
+            share=copy.deepcopy,
+        )
+        # Empty results are also what a failed query embedding returns; those are not cached
+        if cacheable and results:
+            search_cache.put(key, version, results)
+        return results
+    
+    @staticmethod
+    def _find_similar_memories(
+        query_text: str,
+        dopple_id: Optional[str],
+        user_id: Optional[str],
+        top_k: int,
+        similarity_threshold: float,
+        mock: bool,
+        include_metadata: bool,
+        recency_half_life_days: Optional[float],
+        importance_weight: Optional[float],
+        model: str,
+        db: Optional[Session]
+    ) -> List[Dict]:
+        """Run one similarity search (see find_similar_memories)"""
         # Generate embedding for query text
         try:
-            if mock:
-                query_embedding = EmbeddingService.mock_embedding()
-            else:
-                query_embedding = EmbeddingService.generate_embedding(query_text)
+            with time_stage("find_similar_memories", "embed"):
+                if mock:
+                    query_embedding = EmbeddingService.mock_embedding()
+                else:
+                    query_embedding = EmbeddingService.generate_embedding(query_text, model)
         except Exception as e:
             logger.error(f"Failed to generate embedding for query: {str(e)}")
             return []
         
-        similar_memories = []
+        query_vector = normalize(query_embedding)
+        ranking = MemoryService._ranking(recency_half_life_days, importance_weight)
+        if dopple_id:
+            return run_read(
+                lambda session: MemoryService._search_vector(
+                    session, query_vector, dopple_id, user_id, top_k, similarity_threshold, include_metadata,
+                    ranking, model,
+                ),
+                db, dopple_id, user_id,
+            )
+        
+        # Unscoped searches score every shard in parallel and keep the best overall
+        results = [
+            result
+            for shard_results in for_each_shard(
+                lambda session: MemoryService._search_vector(
+                    session, query_vector, None, user_id, top_k, similarity_threshold, include_metadata,
+                    ranking, model,
+                ),
+                db,
+                reads=True,
+            )
+            for result in shard_results
+        ]
+        score = "relevance" if ranking else "similarity"
+        results.sort(key=lambda result: result[score], reverse=True)
+        return results[:top_k]
+    
+    @staticmethod
+    def _search_vector(
+        db: Session,
+        query_vector: np.ndarray,
+        dopple_id: Optional[str],
+        user_id: Optional[str],
+        top_k: int,
+        similarity_threshold: float,
+        include_metadata: bool,
+        ranking,
+        model: str
+    ) -> List[Dict]:
+        """Search one shard for a normalized query vector (see find_similar_memories)"""
+        candidates = MemoryService._rank_candidates(
+            db, query_vector, dopple_id, user_id, top_k, similarity_threshold, ranking, model
+        )
         
-        with get_db() as db:
-            # Build query
-            query = db.query(Memory).join(Embedding)
+        # Load only the memories that are returned
+        with time_stage("find_similar_memories", "db_read"):
+            selected_ids = [memory_id for memory_id, _, _ in candidates]
+            memories = {
+                memory.id: memory
+                for memory in db.query(Memory).filter(Memory.id.in_(selected_ids)).all()
+            } if selected_ids else {}
+        
+        with time_stage("find_similar_memories", "serialization"):
+            results = []
+            for memory_id, _, similarity in candidates:
+                # pop() also skips the rare duplicate row a shared file can hold
+                # after a write raced its initial build, or a memory promoted out
+                # of a cold segment that has not been rebuilt yet
+                memory = memories.pop(memory_id, None)
+                if memory is None:
+                    continue
+                memory_dict = memory.to_dict(include_metadata=include_metadata)
+                memory_dict["similarity"] = float(similarity)
+                if ranking:
+                    memory_dict["relevance"] = MemoryService._relevance(
+                        similarity, memory.timestamp, memory.importance, ranking
+                    )
+                results.append(memory_dict)
+            if ranking:
+                results.sort(key=lambda result: result["relevance"], reverse=True)
+        return results[:top_k]
+    
+    @staticmethod
+    def _rank_candidates(
+        db: Session,
+        query_vector: np.ndarray,
+        dopple_id: Optional[str],
+        user_id: Optional[str],
+        top_k: int,
+        similarity_threshold: float,
+        ranking,
+        model: str
+    ) -> List[Tuple[str, float, float]]:
+        """
+        Best (memory_id, score, similarity) candidates of one shard, hot tier first
+        
+        With ranking, top_k * RELEVANCE_OVERFETCH candidates are returned for the
+        caller to re-rank from the stored rows.
+        """
+        # Cached importance can lag a dedup merge; over-fetch and re-rank from the rows
+        fetch_k = top_k * RELEVANCE_OVERFETCH if ranking else top_k
+        
+        # Hot dopples are served from the vector cache without touching the embeddings table
+        rows = MemoryService._get_vectors(db, dopple_id, user_id, model)
+        
+        # Calculate similarity scores for all candidates at once
+        with time_stage("find_similar_memories", "scoring"):
+            candidates = MemoryService._score_candidates(
+                rows, query_vector, fetch_k, similarity_threshold, ranking
+            )
+        
+        # Fall through to the cold tier only when the hot tier cannot fill the results
+        if TIERING_ENABLED and len(candidates) < top_k:
+            cold_rows = MemoryService._get_cold_vectors(db, dopple_id, user_id, model)
+            with time_stage("find_similar_memories", "scoring"):
+                candidates = sorted(
+                    candidates + MemoryService._score_candidates(
+                        cold_rows, query_vector, fetch_k, similarity_threshold, ranking
+                    ),
+                    key=lambda candidate: candidate[1],
+                    reverse=True,
+                )[:fetch_k]
+            tier_searches.inc(tiers="hot+cold")
+        else:
+            tier_searches.inc(tiers="hot" if TIERING_ENABLED else "all")
+        return candidates
+    
+    @staticmethod
+    def find_similar_memories_batch(
+        query_texts: List[str],
+        dopple_id: Optional[str] = None,
+        user_id: Optional[str] = None,
+        top_k: int = 5,
+        similarity_threshold: float = 0.7,
+        mock: bool = False,
+        include_metadata: bool = True,
+        deduplicate: bool = False,
+        recency_half_life_days: Optional[float] = None,
+        importance_weight: Optional[float] = None,
+        db: Optional[Session] = None
+    ) -> List[List[Dict]]:
+        """
+        Find memories similar to several query texts in one pass
+        
+        All queries are embedded with a single API call and scored with one
+        matrix-matrix product against the candidate set.
+        
+        Args:
+            query_texts: Texts to find similar memories for
+            dopple_id: Optional filter by dopple ID
+            user_id: Optional filter by user ID
+            top_k: Maximum number of results per query
+            similarity_threshold: Minimum similarity score (0-1)
+            mock: Whether to use mock functionality (for testing)
+            include_metadata: Whether to include the metadata field in results
+            deduplicate: Return each memory at most once, under the query it matches best
+            recency_half_life_days: Half-life of the recency decay (see find_similar_memories)
+            importance_weight: Weight of importance in the ranking (see find_similar_memories)
+            db: Optional request-scoped session
             
-            # Apply filters if provided
+        Returns:
+            One list of memory dictionaries with similarity scores per query, in input order
+        """
+        if not query_texts:
+            return []
+        
+        model = EmbeddingModelService.get_active_model(db)
+        
+        # Generate embeddings for all query texts at once
+        try:
+            with time_stage("find_similar_memories_batch", "embed"):
+                if mock:
+                    query_embeddings = [EmbeddingService.mock_embedding() for _ in query_texts]
+                else:
+                    query_embeddings = EmbeddingService.batch_generate_embeddings(query_texts, model)
+        except Exception as e:
+            logger.error(f"Failed to generate embeddings for batch query: {str(e)}")
+            return [[] for _ in query_texts]
+        
+        queries, _ = build_matrix(query_embeddings)
+        ranking = MemoryService._ranking(recency_half_life_days, importance_weight)
+        if dopple_id or not router.sharded:
+            return run_read(
+                lambda session: MemoryService._search_batch(
+                    session, queries, dopple_id, user_id, top_k, similarity_threshold, include_metadata,
+                    deduplicate, ranking, model,
+                ),
+                db, dopple_id, user_id,
+            )
+        
+        # Unscoped searches score every shard in parallel; each returns enough
+        # candidates per query for the deduplication across shards below
+        shard_top_k = top_k * len(query_texts) if deduplicate else top_k
+        shard_results = for_each_shard(
+            lambda session: MemoryService._search_batch(
+                session, queries, None, user_id, shard_top_k, similarity_threshold, include_metadata,
+                False, ranking, model,
+            ),
+            db,
+            reads=True,
+        )
+        score = "relevance" if ranking else "similarity"
+        merged = [
+            sorted(
+                (result for results in shard_results for result in results[q]),
+                key=lambda result: result[score],
+                reverse=True,
+            )
+            for q in range(len(query_texts))
+        ]
+        if not deduplicate:
+            return [query_results[:top_k] for query_results in merged]
+        
+        # A memory goes to the highest-scoring query that still has room
+        selections = [[] for _ in query_texts]
+        claims = [(result[score], q, result) for q, query_results in enumerate(merged) for result in query_results]
+        claims.sort(key=lambda claim: claim[0], reverse=True)
+        assigned = set()
+        for _, q, result in claims:
+            if result["id"] not in assigned and len(selections[q]) < top_k:
+                assigned.add(result["id"])
+                selections[q].append(result)
+        return selections
+    
+    @staticmethod
+    def _search_batch(
+        db: Session,
+        queries: np.ndarray,
+        dopple_id: Optional[str],
+        user_id: Optional[str],
+        top_k: int,
+        similarity_threshold: float,
+        include_metadata: bool,
+        deduplicate: bool,
+        ranking,
+        model: str
+    ) -> List[List[Dict]]:
+        """Search one shard for a matrix of normalized query vectors (see find_similar_memories_batch)"""
+        rows = MemoryService._get_vectors(db, dopple_id, user_id, model)
+        
+        with time_stage("find_similar_memories_batch", "scoring"):
+            # With deduplication each query keeps enough candidates to backfill
+            # memories claimed by other queries
+            per_query = top_k * queries.shape[0] if deduplicate else top_k
+            if ranking:
+                per_query *= RELEVANCE_OVERFETCH
+            candidates = MemoryService._score_candidates_batch(
+                rows, queries, per_query, similarity_threshold, ranking
+            )
+        
+        # Fall through to the cold tier only when the hot tier cannot fill every query
+        if TIERING_ENABLED and any(len(query_candidates) < top_k for query_candidates in candidates):
+            cold_rows = MemoryService._get_cold_vectors(db, dopple_id, user_id, model)
+            with time_stage("find_similar_memories_batch", "scoring"):
+                cold_candidates = MemoryService._score_candidates_batch(
+                    cold_rows, queries, per_query, similarity_threshold, ranking
+                )
+                candidates = [
+                    sorted(hot + cold, key=lambda candidate: candidate[1], reverse=True)[:per_query]
+                    for hot, cold in zip(candidates, cold_candidates)
+                ]
+            tier_searches.inc(tiers="hot+cold")
+        else:
+            tier_searches.inc(tiers="hot" if TIERING_ENABLED else "all")
+        
+        with time_stage("find_similar_memories_batch", "scoring"):
+            if not deduplicate:
+                selections = candidates
+            else:
+                # A memory goes to the highest-scoring query that still has room
+                selections = [[] for _ in range(queries.shape[0])]
+                claims = [
+                    (score, q, memory_id, similarity)
+                    for q, query_candidates in enumerate(candidates)
+                    for memory_id, score, similarity in query_candidates
+                ]
+                claims.sort(key=lambda claim: claim[0], reverse=True)
+                assigned = set()
+                for score, q, memory_id, similarity in claims:
+                    if memory_id not in assigned and len(selections[q]) < top_k:
+                        assigned.add(memory_id)
+                        selections[q].append((memory_id, score, similarity))
+        
+        # Load every returned memory once
+        with time_stage("find_similar_memories_batch", "db_read"):
+            selected_ids = {memory_id for selection in selections for memory_id, _, _ in selection}
+            rows_by_id = {
+                memory.id: memory
+                for memory in db.query(Memory).filter(Memory.id.in_(selected_ids)).all()
+            } if selected_ids else {}
+        
+        with time_stage("find_similar_memories_batch", "serialization"):
+            memories = {
+                memory_id: memory.to_dict(include_metadata=include_metadata)
+                for memory_id, memory in rows_by_id.items()
+            }
+            results = []
+            for selection in selections:
+                query_results = []
+                seen = set()
+                for memory_id, _, similarity in selection:
+                    if memory_id not in memories or memory_id in seen:
+                        continue
+                    seen.add(memory_id)
+                    result = dict(memories[memory_id], similarity=float(similarity))
+                    if ranking:
+                        memory = rows_by_id[memory_id]
+                        result["relevance"] = MemoryService._relevance(
+                            similarity, memory.timestamp, memory.importance, ranking
+                        )
+                    query_results.append(result)
+                if ranking:
+                    query_results.sort(key=lambda result: result["relevance"], reverse=True)
+                results.append(query_results[:top_k])
+        return results
+    
+    @staticmethod
+    def _ranking(
+        recency_half_life_days: Optional[float],
+        importance_weight: Optional[float]
+    ) -> Optional[Tuple[float, Optional[float], float]]:
+        """Resolve ranking settings to (now, half-life, importance weight), or None for plain similarity"""
+        half_life = RELEVANCE_HALF_LIFE_DAYS if recency_half_life_days is None else recency_half_life_days
+        weight = RELEVANCE_IMPORTANCE_WEIGHT if importance_weight is None else importance_weight
+        if not (half_life and half_life > 0) and not weight:
+            return None
+        return time.time(), half_life if half_life and half_life > 0 else None, weight or 0.0
+    
+    @staticmethod
+    def _relevance(similarity: float, timestamp: Optional[datetime], importance: Optional[int], ranking) -> float:
+        """Exact relevance of one memory from its stored timestamp and importance"""
+        now, half_life, weight = ranking
+        factor = relevance_weights(
+            np.array([to_epoch(timestamp)]), np.array([importance or 5], dtype=np.float32), now, half_life, weight
+        )[0]
+        return float(similarity * factor)
+    
+    @staticmethod
+    def _get_vectors(db: Session, dopple_id: Optional[str], user_id: Optional[str], model: str) -> VectorRows:
+        """
+        Get memory IDs, normalized embeddings and ranking attributes for a search scope's hot tier
+        
+        Searches scoped to a dopple go through the node-wide shared vector store
+        when VECTOR_STORE_DIR is set, or the process-level vector cache otherwise;
+        unscoped searches always read from the database. Either is checked against
+        the scope's write version on the primary and rebuilt when it is behind.
+        Only embeddings of the given model are returned.
+        """
+        key = (dopple_id, user_id)
+        if dopple_id and shared_vector_store is not None:
+            return shared_vector_store.get_or_build(
+                key, lambda: MemoryService._load_primary(db, dopple_id, user_id, model), model,
+                MemoryService._primary_version(db, dopple_id, user_id),
+            )
+        
+        if dopple_id and VECTOR_CACHE_ENABLED and model == vector_cache.model:
+            version = MemoryService._primary_version(db, dopple_id, user_id)
+            vector_set = vector_cache.get(key, version)
+            if vector_set is not None:
+                return vector_set.snapshot()
+            generation = vector_cache.generation(dopple_id)
+            vector_set = VectorSet(MemoryService._load_primary(db, dopple_id, user_id, model))
+            vector_cache.put(key, vector_set, generation, model, version)
+            return vector_set.snapshot()
+        
+        return MemoryService._load_vectors(db, dopple_id, user_id, model)
+    
+    @staticmethod
+    def _primary_version(db: Session, dopple_id: str, user_id: Optional[str]) -> int:
+        """
+        Write version of a scope, read from the primary
+        
+        The vector caches check their entries against it on every read, since
+        writes by other processes and nodes never reach them.
+        """
+        with on_primary(db):
+            return read_version(db, dopple_id, user_id)
+    
+    @staticmethod
+    def _cached_vectors(db: Session, dopple_id: str, user_id: str, model: str) -> Optional[VectorRows]:
+        """A dopple/user pair's hot vectors when they are served from a cache, else None"""
+        if shared_vector_store is not None or (VECTOR_CACHE_ENABLED and model == vector_cache.model):
+            return MemoryService._get_vectors(db, dopple_id, user_id, model)
+        return None
+    
+    @staticmethod
+    def _get_cold_vectors(db: Session, dopple_id: Optional[str], user_id: Optional[str], model: str) -> VectorRows:
+        """
+        Get memory IDs, normalized embeddings and ranking attributes of a search scope's cold tier
+        
+        Dopple-scoped searches read compressed segments when COLD_SEGMENT_DIR is set;
+        like the hot caches, a segment behind the scope's write version is rebuilt.
+        """
+        if dopple_id and cold_segment_store is not None:
+            return cold_segment_store.get_or_build(
+                (dopple_id, user_id),
+                lambda: MemoryService._load_primary(db, dopple_id, user_id, model, tier=TIER_COLD),
+                model,
+                MemoryService._primary_version(db, dopple_id, user_id),
+            )
+        return MemoryService._load_vectors(db, dopple_id, user_id, model, tier=TIER_COLD)
+    
+    @staticmethod
+    def _score_candidates(
+        rows: VectorRows,
+        query_vector: np.ndarray,
+        top_k: int,
+        similarity_threshold: float,
+        ranking=None
+    ) -> List[Tuple[str, float, float]]:
+        """Top (memory_id, score, similarity) triples of one vector set, best score first"""
+        if not len(rows.ids) or rows.matrix.shape[1] != query_vector.shape[0]:
+            return []
+        if ranking is None:
+            indices, scores = score_top_k(rows.matrix, query_vector, top_k, similarity_threshold, deleted=rows.deleted)
+            return [(rows.ids[i], float(score), float(score)) for i, score in zip(indices, scores)]
+        now, half_life, weight = ranking
+        indices, scores, similarities = relevance_top_k(
+            rows, query_vector, top_k, similarity_threshold, now, half_life, weight
+        )
+        return [
+            (rows.ids[i], float(score), float(similarity))
+            for i, score, similarity in zip(indices, scores, similarities)
+        ]
+    
+    @staticmethod
+    def _score_candidates_batch(
+        rows: VectorRows,
+        queries: np.ndarray,
+        top_k: int,
+        similarity_threshold: float,
+        ranking=None
+    ) -> List[List[Tuple[str, float, float]]]:
+        """Top (memory_id, score, similarity) triples of one vector set for each query, best score first"""
+        if not len(rows.ids) or rows.matrix.shape[1] != queries.shape[1]:
+            return [[] for _ in range(queries.shape[0])]
+        # (candidates x queries) similarity matrix
+        similarities = rows.matrix @ queries.T
+        weights = None
+        if ranking is not None:
+            now, half_life, weight = ranking
+            weights = relevance_weights(rows.timestamps, rows.importance, now, half_life, weight)
+        candidates = []
+        for q in range(queries.shape[0]):
+            query_similarities = similarities[:, q]
+            if weights is None:
+                indices, scores = select_top_k(
+                    mask_deleted(query_similarities, rows.deleted), top_k, similarity_threshold
+                )
+            else:
+                scores = mask_deleted(np.where(
+                    query_similarities >= similarity_threshold, query_similarities * weights, -np.inf
+                ), rows.deleted)
+                indices, scores = select_top_k(scores, top_k, -np.inf)
+                finite = np.isfinite(scores)
+                indices, scores = indices[finite], scores[finite]
+            candidates.append([
+                (rows.ids[i], float(score), float(query_similarities[i])) for i, score in zip(indices, scores)
+            ])
+        return candidates
+    
+    @staticmethod
+    def _load_primary(
+        db: Session,
+        dopple_id: Optional[str],
+        user_id: Optional[str],
+        model: str,
+        tier: str = TIER_HOT
+    ) -> VectorRows:
+        """Load vectors for a cache from the primary; a lagging replica would leave the cache missing rows for good"""
+        with on_primary(db):
+            return MemoryService._load_vectors(db, dopple_id, user_id, model, tier)
+    
+    @staticmethod
+    def _load_vectors(
+        db: Session,
+        dopple_id: Optional[str],
+        user_id: Optional[str],
+        model: str,
+        tier: str = TIER_HOT
+    ) -> VectorRows:
+        """Read one model's embeddings and ranking attributes for a search scope and tier, oldest first"""
+        with time_stage("find_similar_memories", "db_read"):
+            query = db.query(Embedding.memory_id, Embedding.vector, Memory.timestamp, Memory.importance).join(Memory)
+            query = query.filter(Embedding.model == model)
+            if TIERING_ENABLED:
+                query = query.filter(Memory.tier == tier)
             if dopple_id:
                 query = query.filter(Memory.dopple_id == dopple_id)
             if user_id:
                 query = query.filter(Memory.user_id == user_id)
-            
-            # Get all memories with embeddings
-            memories = query.all()
-            
-            # Calculate similarity scores
-            for memory in memories:
-                if memory.embedding and memory.embedding.vector:
-                    # Get vector from embedding
-                    memory_vector = memory.embedding.vector
-                    
-                    # Calculate similarity
-                    similarity = EmbeddingService.cosine_similarity(query_embedding, memory_vector)
-                    
-                    # Add to results if above threshold
-                    if similarity >= similarity_threshold:
-                        memory_dict = memory.to_dict()
-                        memory_dict["similarity"] = similarity
-                        similar_memories.append(memory_dict)
-            
-            # Sort by similarity (descending) and limit to top_k
-            similar_memories.sort(key=lambda x: x["similarity"], reverse=True)
-            return similar_memories[:top_k]
+            rows = query.order_by(Memory.timestamp).all()
+        
+        matrix, kept = build_matrix([row[1] for row in rows])
+        return VectorRows(
+            [rows[i][0] for i in kept],
+            matrix,
+            np.array([to_epoch(rows[i][2]) for i in kept], dtype=np.float64),
+            np.array([rows[i][3] or 5 for i in kept], dtype=np.float32),
+        )
     
     @staticmethod
     def search_memories_by_metadata(
@@ -195,7 +991,9 @@ class MemoryService:
         start_date: datetime = None,
         end_date: datetime = None,
         limit: int = 20,
-        offset: int = 0
+        offset: int = 0,
+        include_metadata: bool = True,
+        db: Optional[Session] = None
     ) -> List[Dict]:
         """
         Search memories by metadata filters
@@ -211,112 +1009,163 @@ class MemoryService:
             end_date: End date for time range
             limit: Maximum number of results
             offset: Offset for pagination
+            include_metadata: Whether to include the metadata field in results
+            db: Optional request-scoped session
             
         Returns:
             List of memory dictionaries
         """
-        with get_db() as db:
-            # Build base query
-            query = db.query(Memory)
-            
-            # Apply filters
-            if dopple_id:
-                query = query.filter(Memory.dopple_id == dopple_id)
-            if user_id:
-                query = query.filter(Memory.user_id == user_id)
-            if min_importance is not None:
-                query = query.filter(Memory.importance >= min_importance)
-            if start_date:
-                query = query.filter(Memory.timestamp >= start_date)
-            if end_date:
-                query = query.filter(Memory.timestamp <= end_date)
-            
-            # Apply relationship filters
-            if emotions:
-                query = query.join(Memory.emotions).filter(Emotion.name.in_(emotions))
-            if topics:
-                query = query.join(Memory.topics).filter(Topic.name.in_(topics))
-            if traits:
-                query = query.join(Memory.traits).filter(PersonalityTrait.name.in_(traits))
-            
-            # Order by timestamp (newest first)
-            query = query.order_by(desc(Memory.timestamp))
-            
-            # Apply pagination
-            query = query.limit(limit).offset(offset)
-            
-            # Execute query
-            memories = query.all()
-            
-            # Convert to dictionaries
-            return [memory.to_dict() for memory in memories]
+        if dopple_id or not router.sharded:
+            return run_read(
+                lambda session: MemoryService._search_by_metadata(
+                    session, dopple_id, user_id, emotions, topics, traits, min_importance, start_date, end_date,
+                    limit, offset, include_metadata,
+                ),
+                db, dopple_id, user_id,
+            )
+        
+        # Every shard returns its first offset + limit matches; the page is cut from the merged order
+        results = [
+            result
+            for shard_results in for_each_shard(
+                lambda session: MemoryService._search_by_metadata(
+                    session, None, user_id, emotions, topics, traits, min_importance, start_date, end_date,
+                    offset + limit, 0, include_metadata,
+                ),
+                db,
+                reads=True,
+            )
+            for result in shard_results
+        ]
+        results.sort(key=lambda result: datetime.fromisoformat(result["timestamp"]), reverse=True)
+        return results[offset:offset + limit]
+    
+    @staticmethod
+    def _search_by_metadata(
+        db: Session,
+        dopple_id: Optional[str],
+        user_id: Optional[str],
+        emotions: Optional[List[str]],
+        topics: Optional[List[str]],
+        traits: Optional[List[str]],
+        min_importance: Optional[int],
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+        limit: int,
+        offset: int,
+        include_metadata: bool
+    ) -> List[Dict]:
+        """Run a metadata search on one shard (see search_memories_by_metadata)"""
+        # Build base query
+        query = db.query(Memory)
+        
+        # Apply filters
+        if dopple_id:
+            query = query.filter(Memory.dopple_id == dopple_id)
+        if user_id:
+            query = query.filter(Memory.user_id == user_id)
+        if min_importance is not None:
+            query = query.filter(Memory.importance >= min_importance)
+        if start_date:
+            query = query.filter(Memory.timestamp >= start_date)
+        if end_date:
+            query = query.filter(Memory.timestamp <= end_date)
+        
+        # Apply relationship filters
+        if emotions:
+            query = query.join(Memory.emotions).filter(Emotion.name.in_(emotions))
+        if topics:
+            query = query.join(Memory.topics).filter(Topic.name.in_(topics))
+        if traits:
+            query = query.join(Memory.traits).filter(PersonalityTrait.name.in_(traits))
+        
+        # Order by timestamp (newest first)
+        query = query.order_by(desc(Memory.timestamp))
+        
+        # Apply pagination
+        query = query.limit(limit).offset(offset)
+        
+        # Execute query
+        memories = query.all()
+        
+        # Convert to dictionaries
+        return [memory.to_dict(include_metadata=include_metadata) for memory in memories]
     
     @staticmethod
-    def get_memory_stats(dopple_id: str, user_id: Optional[str] = None) -> Dict:
+    def get_memory_stats(
+        dopple_id: str,
+        user_id: Optional[str] = None,
+        db: Optional[Session] = None
+    ) -> Dict:
         """
         Get statistics about memories
         
         Args:
             dopple_id: Dopple ID
             user_id: Optional user ID filter
+            db: Optional request-scoped session
             
         Returns:
             Dictionary with statistics
         """
-        with get_db() as db:
-            # Base query
-            query = db.query(Memory).filter(Memory.dopple_id == dopple_id)
-            
-            # Add user filter if provided
-            if user_id:
-                query = query.filter(Memory.user_id == user_id)
-            
-            # Get total count
-            total_count = query.count()
-            
-            # Get counts by role
-            user_count = query.filter(Memory.role == 'user').count()
-            dopple_count = query.filter(Memory.role == 'dopple').count()
-            
-            # Get top emotions
-            emotion_query = db.query(Emotion.name, db.func.count(Emotion.id).label('count')).\
-                join(Memory.emotions).\
-                filter(Memory.dopple_id == dopple_id)
-            
-            if user_id:
-                emotion_query = emotion_query.filter(Memory.user_id == user_id)
-            
-            top_emotions = emotion_query.group_by(Emotion.name).\
-                order_by(desc('count')).limit(5).all()
-            
-            # Get top topics
-            topic_query = db.query(Topic.name, db.func.count(Topic.id).label('count')).\
-                join(Memory.topics).\
-                filter(Memory.dopple_id == dopple_id)
-            
-            if user_id:
-                topic_query = topic_query.filter(Memory.user_id == user_id)
-            
-            top_topics = topic_query.group_by(Topic.name).\
-                order_by(desc('count')).limit(5).all()
-            
-            # Get top traits
-            trait_query = db.query(PersonalityTrait.name, db.func.count(PersonalityTrait.id).label('count')).\
-                join(Memory.traits).\
-                filter(Memory.dopple_id == dopple_id)
-            
-            if user_id:
-                trait_query = trait_query.filter(Memory.user_id == user_id)
-            
-            top_traits = trait_query.group_by(PersonalityTrait.name).\
-                order_by(desc('count')).limit(5).all()
-            
-            # Return statistics
-            return {
-                "total_memories": total_count,
-                "user_memories": user_count,
-                "dopple_memories": dopple_count,
-                "top_emotions": [{"name": name, "count": count} for name, count in top_emotions],
-                "top_topics": [{"name": name, "count": count} for name, count in top_topics],
-                "top_traits": [{"name": name, "count": count} for name, count in top_traits]
-            } 
\ No newline at end of file
+        return run_read(lambda session: MemoryService._memory_stats(session, dopple_id, user_id), db, dopple_id, user_id)
+    
+    @staticmethod
+    def _memory_stats(db: Session, dopple_id: str, user_id: Optional[str]) -> Dict:
+        """Compute get_memory_stats on one session"""
+        # Base query
+        query = db.query(Memory).filter(Memory.dopple_id == dopple_id)
+        
+        # Add user filter if provided
+        if user_id:
+            query = query.filter(Memory.user_id == user_id)
+        
+        # Get total count
+        total_count = query.count()
+        
+        # Get counts by role
+        user_count = query.filter(Memory.role == 'user').count()
+        dopple_count = query.filter(Memory.role == 'dopple').count()
+        
+        # Get top emotions
+        emotion_query = db.query(Emotion.name, func.count(Emotion.id).label('count')).\
+            join(Memory.emotions).\
+            filter(Memory.dopple_id == dopple_id)
+        
+        if user_id:
+            emotion_query = emotion_query.filter(Memory.user_id == user_id)
+        
+        top_emotions = emotion_query.group_by(Emotion.name).\
+            order_by(desc('count')).limit(5).all()
+        
+        # Get top topics
+        topic_query = db.query(Topic.name, func.count(Topic.id).label('count')).\
+            join(Memory.topics).\
+            filter(Memory.dopple_id == dopple_id)
+        
+        if user_id:
+            topic_query = topic_query.filter(Memory.user_id == user_id)
+        
+        top_topics = topic_query.group_by(Topic.name).\
+            order_by(desc('count')).limit(5).all()
+        
+        # Get top traits
+        trait_query = db.query(PersonalityTrait.name, func.count(PersonalityTrait.id).label('count')).\
+            join(Memory.traits).\
+            filter(Memory.dopple_id == dopple_id)
+        
+        if user_id:
+            trait_query = trait_query.filter(Memory.user_id == user_id)
+        
+        top_traits = trait_query.group_by(PersonalityTrait.name).\
+            order_by(desc('count')).limit(5).all()
+        
+        # Return statistics
+        return {
+            "total_memories": total_count,
+            "user_memories": user_count,
+            "dopple_memories": dopple_count,
+            "top_emotions": [{"name": name, "count": count} for name, count in top_emotions],
+            "top_topics": [{"name": name, "count": count} for name, count in top_topics],
+            "top_traits": [{"name": name, "count": count} for name, count in top_traits]
+        } 
\ No newline at end of file
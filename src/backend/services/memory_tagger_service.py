@@ -3,13 +3,14 @@ import random
 from typing import List, Dict, Any, Optional, Tuple
 import json
 import os
-import openai
 from datetime import datetime
 
+from src.backend.services.provider_client import OPENAI_API_KEY, ProviderUnavailable, estimate_tokens, openai_client
+
 logger = logging.getLogger(__name__)
 
-# Configure OpenAI API
-openai.api_key = os.getenv("OPENAI_API_KEY")
+# Texts tagged per API call by tag_memories
+TAG_BATCH_SIZE = int(os.getenv("TAG_BATCH_SIZE", "20"))
 
 # Common emotion categories
 EMOTIONS = [
@@ -94,59 +95,144 @@ class MemoryTaggerService:
             Text to analyze: "{text}"
             """
             
-            # Call OpenAI API
-            response = openai.ChatCompletion.create(
-                model="gpt-4-turbo-preview",
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant that analyzes text and extracts structured information."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,
-                max_tokens=300
+            # Call OpenAI API through the shared client (rate limits, retries, circuit breaker)
+            response = openai_client.call(
+                "tagging",
+                lambda client: client.chat.completions.create(
+                    model="gpt-4-turbo-preview",
+                    messages=[
+                        {"role": "system", "content": "You are a helpful assistant that analyzes text and extracts structured information."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=0.3,
+                    max_tokens=300
+                ),
+                tokens=estimate_tokens(prompt) + 300,
             )
             
             # Extract JSON response
             response_text = response.choices[0].message.content
             
-            # Try to parse JSON from response
-            # First, try to extract JSON if it's wrapped in code blocks
-            if "```json" in response_text:
-                json_str = response_text.split("```json")[1].split("```")[0].strip()
-            elif "```" in response_text:
-                json_str = response_text.split("```")[1].strip()
-            else:
-                json_str = response_text.strip()
-            
-            result = json.loads(json_str)
-            
-            # Validate response format
-            required_keys = ['emotions', 'topics', 'traits', 'importance']
-            for key in required_keys:
-                if key not in result:
-                    result[key] = []
-            
-            # Ensure all values are valid
-            result['emotions'] = [e for e in result.get('emotions', []) if e in EMOTIONS]
-            result['topics'] = [t for t in result.get('topics', []) if t in TOPICS]
-            result['traits'] = [t for t in result.get('traits', []) if t in TRAITS]
-            
-            # Ensure importance is an integer between 1 and 10
-            if 'importance' in result:
-                try:
-                    importance = int(result['importance'])
-                    result['importance'] = max(1, min(10, importance))  # Clamp between 1-10
-                except (ValueError, TypeError):
-                    result['importance'] = 5  # Default to 5 if invalid
-            else:
-                result['importance'] = 5
-            
-            return result
+            return MemoryTaggerService._validate_tags(json.loads(MemoryTaggerService._extract_json(response_text)))
             
+        except ProviderUnavailable as e:
+            # Throttled or circuit open: degrade to the local tagger without waiting on the provider
+            logger.warning(f"Tagging with OpenAI unavailable, using local tagger: {str(e)}")
+            return MemoryTaggerService.mock_tag_memory(text)
         except Exception as e:
             logger.error(f"Error tagging memory with OpenAI: {str(e)}")
             # Fall back to mock implementation
             return MemoryTaggerService.mock_tag_memory(text)
     
+    @staticmethod
+    def _extract_json(response_text: str) -> str:
+        """Strip the code fences the model sometimes wraps its JSON in"""
+        if "```json" in response_text:
+            return response_text.split("```json")[1].split("```")[0].strip()
+        if "```" in response_text:
+            return response_text.split("```")[1].strip()
+        return response_text.strip()
+    
+    @staticmethod
+    def _validate_tags(result: Dict[str, Any]) -> Dict[str, Any]:
+        """Keep only predefined categories and clamp importance to 1-10"""
+        # Validate response format
+        required_keys = ['emotions', 'topics', 'traits', 'importance']
+        for key in required_keys:
+            if key not in result:
+                result[key] = []
+        
+        # Ensure all values are valid
+        result['emotions'] = [e for e in result.get('emotions', []) if e in EMOTIONS]
+        result['topics'] = [t for t in result.get('topics', []) if t in TOPICS]
+        result['traits'] = [t for t in result.get('traits', []) if t in TRAITS]
+        
+        # Ensure importance is an integer between 1 and 10
+        try:
+            result['importance'] = max(1, min(10, int(result['importance'])))  # Clamp between 1-10
+        except (ValueError, TypeError):
+            result['importance'] = 5  # Default to 5 if invalid
+        
+        return result
+    
+    @staticmethod
+    def batch_tag_with_openai(texts: List[str]) -> List[Dict[str, Any]]:
+        """
+        Tag several texts with one OpenAI call
+        
+        Args:
+            texts: The texts to tag
+            
+        Returns:
+            Tags per text, in input order
+        """
+        try:
+            numbered = "\n".join(f"{i + 1}. {json.dumps(text, ensure_ascii=False)}" for i, text in enumerate(texts))
+            prompt = f"""
+            For each of the {len(texts)} numbered texts below, identify:
+            1. Emotions expressed or evoked (limit to 1-2)
+            2. Topics discussed (limit to 1-3)
+            3. Personality traits reflected (limit to 1-2)
+            4. Importance level (1-10 scale, where 10 is extremely important)
+            
+            Only select from the following predefined categories:
+            - Emotions: {', '.join(EMOTIONS)}
+            - Topics: {', '.join(TOPICS)}
+            - Traits: {', '.join(TRAITS)}
+            
+            Format your response as a JSON object with a single key 'results': a list with
+            one object per text, in the same order, each with keys 'emotions', 'topics',
+            'traits', and 'importance'.
+            
+            Texts to analyze:
+            {numbered}
+            """
+            max_tokens = 80 * len(texts) + 100
+            
+            response = openai_client.call(
+                "tagging",
+                lambda client: client.chat.completions.create(
+                    model="gpt-4-turbo-preview",
+                    messages=[
+                        {"role": "system", "content": "You are a helpful assistant that analyzes text and extracts structured information."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=0.3,
+                    max_tokens=max_tokens
+                ),
+                tokens=estimate_tokens(prompt) + max_tokens,
+            )
+            
+            results = json.loads(MemoryTaggerService._extract_json(response.choices[0].message.content))["results"]
+            if len(results) != len(texts):
+                raise ValueError(f"Expected tags for {len(texts)} texts, got {len(results)}")
+            return [MemoryTaggerService._validate_tags(result) for result in results]
+            
+        except ProviderUnavailable as e:
+            logger.warning(f"Batch tagging with OpenAI unavailable, using local tagger: {str(e)}")
+        except Exception as e:
+            logger.error(f"Error batch tagging with OpenAI: {str(e)}")
+        return [MemoryTaggerService.mock_tag_memory(text) for text in texts]
+    
+    @staticmethod
+    def tag_memories(texts: List[str], use_mock: bool = False) -> List[Dict[str, Any]]:
+        """
+        Tag many texts, TAG_BATCH_SIZE per API call
+        
+        Args:
+            texts: The texts to tag
+            use_mock: Whether to use mock implementation instead of API
+            
+        Returns:
+            Tags per text, in input order, as returned by tag_memory
+        """
+        if use_mock or not OPENAI_API_KEY:
+            return [MemoryTaggerService.mock_tag_memory(text) for text in texts]
+        results = []
+        for start in range(0, len(texts), TAG_BATCH_SIZE):
+            results.extend(MemoryTaggerService.batch_tag_with_openai(texts[start:start + TAG_BATCH_SIZE]))
+        return results
+    
     @staticmethod
     def tag_memory(text: str, use_mock: bool = False) -> Dict[str, List[str]]:
         """
@@ -159,7 +245,7 @@ class MemoryTaggerService:
         Returns:
             Dict with keys 'emotions', 'topics', 'traits', 'importance' and appropriate values
         """
-        if use_mock or not openai.api_key:
+        if use_mock or not OPENAI_API_KEY:
             return MemoryTaggerService.mock_tag_memory(text)
         else:
             return MemoryTaggerService.tag_memory_with_openai(text)
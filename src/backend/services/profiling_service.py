@@ -0,0 +1,307 @@
+import cProfile
+import contextvars
+import functools
+import io
+import json
+import logging
+import marshal
+import os
+import pstats
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Profile a fraction of all requests (0 disables env-driven sampling)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+# Honour the X-Profile request header; its value is the sampling rate ("1" always profiles)
+PROFILE_HEADER_ENABLED = os.getenv("PROFILE_HEADER_ENABLED", "false").lower() == "true"
+PROFILE_HEADER = "X-Profile"
+# Number of profiles kept in memory, and an optional directory to persist them to
+PROFILE_MAX_STORED = int(os.getenv("PROFILE_MAX_STORED", "20"))
+PROFILE_DIR = os.getenv("PROFILE_DIR")
+PROFILE_MAX_SQL_STATEMENTS = 500
+
+# When neither trigger is configured nothing is installed and service methods stay unwrapped
+PROFILING_ACTIVE = PROFILE_SAMPLE_RATE > 0 or PROFILE_HEADER_ENABLED
+
+_active_profile: contextvars.ContextVar[Optional["RequestProfile"]] = contextvars.ContextVar(
+    "active_profile", default=None
+)
+_thread_state = threading.local()
+
+
+class RequestProfile:
+    """cProfile data, service call spans and SQL timings captured for one request"""
+
+    def __init__(self, method: str, path: str):
+        self.id = str(uuid.uuid4())
+        self.method = method
+        self.path = path
+        self.started_at = datetime.utcnow()
+        self.duration = None
+        self.status_code = None
+        self.spans: List[Dict[str, Any]] = []
+        self.sql: List[Dict[str, Any]] = []
+        self._profiles: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+        self._stats_bytes: Optional[bytes] = None
+        self._stats_text: Optional[str] = None
+
+    def add_span(self, name: str, duration: float):
+        with self._lock:
+            self.spans.append({"name": name, "duration": duration})
+
+    def add_sql(self, statement: str, duration: float):
+        with self._lock:
+            if len(self.sql) < PROFILE_MAX_SQL_STATEMENTS:
+                self.sql.append({"statement": statement[:500], "duration": duration})
+
+    def add_profile(self, profile: cProfile.Profile):
+        with self._lock:
+            self._profiles.append(profile)
+
+    def finish(self, duration: float, status_code: int):
+        """Freeze the profile and merge per-thread cProfile data"""
+        self.duration = duration
+        self.status_code = status_code
+        if not self._profiles:
+            return
+        stats = pstats.Stats(self._profiles[0])
+        for profile in self._profiles[1:]:
+            stats.add(profile)
+        self._stats_bytes = marshal.dumps(stats.stats)
+        text = io.StringIO()
+        stats.stream = text
+        stats.sort_stats("cumulative").print_stats(40)
+        self._stats_text = text.getvalue()
+        self._profiles = []
+
+    @property
+    def pstats_bytes(self) -> Optional[bytes]:
+        """Profile in the pstats file format (load with pstats.Stats(path))"""
+        return self._stats_bytes
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "started_at": self.started_at.isoformat(),
+            "duration": self.duration,
+            "status_code": self.status_code,
+            "sql_statements": len(self.sql),
+            "sql_time": sum(item["duration"] for item in self.sql),
+            "has_pstats": self._stats_bytes is not None,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = self.summary()
+        data["spans"] = self.spans
+        data["sql"] = self.sql
+        data["top_functions"] = self._stats_text
+        return data
+
+
+class ProfileStore:
+    """Bounded store of finished profiles, optionally persisted to PROFILE_DIR"""
+
+    def __init__(self, max_items: int = PROFILE_MAX_STORED, directory: Optional[str] = PROFILE_DIR):
+        self.max_items = max_items
+        self.directory = directory
+        self._profiles: "OrderedDict[str, RequestProfile]" = OrderedDict()
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def save(self, profile: RequestProfile):
+        with self._lock:
+            self._profiles[profile.id] = profile
+            while len(self._profiles) > self.max_items:
+                self._profiles.popitem(last=False)
+        if self.directory:
+            # Persisted so any worker can serve profiles captured by another
+            with open(os.path.join(self.directory, f"{profile.id}.json"), "w") as f:
+                json.dump(profile.to_dict(), f)
+            if profile.pstats_bytes is not None:
+                with open(os.path.join(self.directory, f"{profile.id}.prof"), "wb") as f:
+                    f.write(profile.pstats_bytes)
+            self._prune_directory()
+
+    def list(self) -> List[Dict[str, Any]]:
+        if self.directory:
+            summaries = []
+            for path in self._stored_files()[:self.max_items]:
+                try:
+                    with open(path) as f:
+                        data = json.load(f)
+                except (OSError, ValueError):
+                    # Pruned by another worker, or still being written
+                    continue
+                summaries.append({key: data[key] for key in data if key not in ("spans", "sql", "top_functions")})
+            return sorted(summaries, key=lambda item: item["started_at"], reverse=True)
+        with self._lock:
+            return [profile.summary() for profile in reversed(self._profiles.values())]
+
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            profile = self._profiles.get(profile_id)
+        if profile is not None:
+            return profile.to_dict()
+        path = self._path(profile_id, ".json")
+        if path and os.path.exists(path):
+            with open(path) as f:
+                return json.load(f)
+        return None
+
+    def get_pstats(self, profile_id: str) -> Optional[bytes]:
+        with self._lock:
+            profile = self._profiles.get(profile_id)
+        if profile is not None:
+            return profile.pstats_bytes
+        path = self._path(profile_id, ".prof")
+        if path and os.path.exists(path):
+            with open(path, "rb") as f:
+                return f.read()
+        return None
+
+    def _stored_files(self) -> List[str]:
+        """Profile JSON files in the directory, newest first"""
+        paths = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json"):
+                try:
+                    paths.append((entry.stat().st_mtime, entry.path))
+                except OSError:
+                    continue
+        return [path for _, path in sorted(paths, reverse=True)]
+
+    def _prune_directory(self):
+        """Keep only the newest max_items profiles on disk; every worker writes to the same directory"""
+        for path in self._stored_files()[self.max_items:]:
+            for stale in (path, path[:-len(".json")] + ".prof"):
+                try:
+                    os.remove(stale)
+                except FileNotFoundError:
+                    pass
+
+    def _path(self, profile_id: str, suffix: str) -> Optional[str]:
+        if not self.directory:
+            return None
+        # Profile IDs are UUIDs; reject anything else to keep lookups inside the directory
+        try:
+            uuid.UUID(profile_id)
+        except ValueError:
+            return None
+        return os.path.join(self.directory, f"{profile_id}{suffix}")
+
+
+profile_store = ProfileStore()
+
+
+class ProfilingService:
+    """Opt-in per-request profiling"""
+
+    @staticmethod
+    def should_profile(header_value: Optional[str]) -> bool:
+        """
+        Decide whether to profile a request
+
+        Args:
+            header_value: Value of the X-Profile header, if any
+
+        Returns:
+            True if the request should be profiled
+        """
+        rate = PROFILE_SAMPLE_RATE
+        if PROFILE_HEADER_ENABLED and header_value:
+            try:
+                rate = max(rate, float(header_value))
+            except ValueError:
+                pass
+        return rate > 0 and random.random() < rate
+
+    @staticmethod
+    def start(method: str, path: str) -> contextvars.Token:
+        """Begin profiling the current request context"""
+        return _active_profile.set(RequestProfile(method, path))
+
+    @staticmethod
+    def finish(token: contextvars.Token, duration: float, status_code: int) -> RequestProfile:
+        """Stop profiling the current request context and store the result"""
+        profile = _active_profile.get()
+        _active_profile.reset(token)
+        profile.finish(duration, status_code)
+        profile_store.save(profile)
+        logger.info(f"Stored profile {profile.id} for {profile.method} {profile.path} ({duration:.4f}s)")
+        return profile
+
+    @staticmethod
+    def install_sql_timing(engine):
+        """Record statement timings for profiled requests on the given engine"""
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            if _active_profile.get() is not None:
+                conn.info.setdefault("profile_query_start", []).append(time.perf_counter())
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            profile = _active_profile.get()
+            starts = conn.info.get("profile_query_start")
+            if profile is not None and starts:
+                profile.add_sql(statement, time.perf_counter() - starts.pop())
+
+
+def _profile_call(name: str, func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profile = _active_profile.get()
+        if profile is None:
+            return func(*args, **kwargs)
+
+        # Only the outermost service call in a thread owns the cProfile session
+        outermost = not getattr(_thread_state, "profiling", False)
+        profiler = None
+        if outermost:
+            profiler = cProfile.Profile()
+            _thread_state.profiling = True
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiler is already running in this thread
+                profiler = None
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.add_span(name, time.perf_counter() - start)
+            if outermost:
+                _thread_state.profiling = False
+                if profiler is not None:
+                    profiler.disable()
+                    profile.add_profile(profiler)
+
+    return wrapper
+
+
+def profile_methods(cls):
+    """
+    Class decorator that profiles every static method of a service class
+
+    Returns the class untouched when profiling is not configured, so the
+    disabled path adds no per-call overhead.
+    """
+    if not PROFILING_ACTIVE:
+        return cls
+    for name, attr in list(vars(cls).items()):
+        if isinstance(attr, staticmethod) and not name.startswith("_"):
+            setattr(cls, name, staticmethod(_profile_call(f"{cls.__name__}.{name}", attr.__func__)))
+    return cls
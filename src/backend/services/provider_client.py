@@ -0,0 +1,355 @@
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional
+
+from tenacity import RetryCallState, Retrying, retry_if_exception, stop_after_attempt, stop_after_delay
+
+from src.backend.services.metrics_service import (
+    external_api_duration, external_api_requests, external_api_retries, registry,
+)
+
+if TYPE_CHECKING:
+    import openai
+
+logger = logging.getLogger(__name__)
+
+# The SDK is imported on the first provider call, not at startup (it takes about half a second)
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+
+# Provider quota; 0 disables a limit. Set these a little under the account's limits,
+# divided by the number of worker processes sharing the key.
+OPENAI_REQUESTS_PER_MINUTE = float(os.getenv("OPENAI_REQUESTS_PER_MINUTE", "3000"))
+OPENAI_TOKENS_PER_MINUTE = float(os.getenv("OPENAI_TOKENS_PER_MINUTE", "1000000"))
+# Seconds of quota that may be spent at once
+OPENAI_BURST_SECONDS = float(os.getenv("OPENAI_BURST_SECONDS", "5"))
+# In-flight calls per process, and how long a call waits for a slot or for quota before failing
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "16"))
+OPENAI_QUEUE_TIMEOUT = float(os.getenv("OPENAI_QUEUE_TIMEOUT", "10"))
+# Retries: exponential backoff with full jitter, bounded by attempts and total time
+OPENAI_MAX_ATTEMPTS = int(os.getenv("OPENAI_MAX_ATTEMPTS", "5"))
+OPENAI_BACKOFF_BASE = float(os.getenv("OPENAI_BACKOFF_BASE", "0.5"))
+OPENAI_BACKOFF_MAX = float(os.getenv("OPENAI_BACKOFF_MAX", "8"))
+OPENAI_RETRY_DEADLINE = float(os.getenv("OPENAI_RETRY_DEADLINE", "30"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "30"))
+# An operation's circuit opens when this share of its recent attempts failed
+# (judged over the last OPENAI_CIRCUIT_WINDOW attempts), and stays open for the reset interval
+OPENAI_CIRCUIT_FAILURE_RATIO = float(os.getenv("OPENAI_CIRCUIT_FAILURE_RATIO", "0.5"))
+OPENAI_CIRCUIT_WINDOW = int(os.getenv("OPENAI_CIRCUIT_WINDOW", "20"))
+OPENAI_CIRCUIT_RESET_SECONDS = float(os.getenv("OPENAI_CIRCUIT_RESET_SECONDS", "30"))
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+_CIRCUIT_STATE_VALUES = {CIRCUIT_CLOSED: 0, CIRCUIT_HALF_OPEN: 1, CIRCUIT_OPEN: 2}
+
+external_api_throttle_wait = registry.histogram(
+    "external_api_throttle_wait_seconds",
+    "Time a provider call waited for rate-limit quota and a concurrency slot",
+    ["operation"],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+
+external_api_rejections = registry.counter(
+    "external_api_rejections_total",
+    "Provider calls failed fast without reaching the provider",
+    ["operation", "reason"],
+)
+
+
+class ProviderUnavailable(Exception):
+    """Raised when a provider call is rejected locally instead of being sent"""
+
+
+class CircuitOpenError(ProviderUnavailable):
+    """Raised while an operation's circuit is open"""
+
+
+class ProviderBusy(ProviderUnavailable):
+    """Raised when quota or a concurrency slot is not available within the queue timeout"""
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at a per-minute rate
+
+    Callers reserve their amount up front and sleep off any debt, so waiters are
+    served in arrival order instead of all retrying when tokens appear.
+    """
+
+    def __init__(self, per_minute: float, burst_seconds: float = OPENAI_BURST_SECONDS):
+        self.rate = per_minute / 60.0
+        self.capacity = max(self.rate * burst_seconds, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float, timeout: float) -> float:
+        """
+        Take an amount from the bucket
+
+        Args:
+            amount: Tokens needed (clamped to the bucket's capacity)
+            timeout: Longest acceptable wait
+
+        Returns:
+            Seconds the caller must wait before using the reservation
+
+        Raises:
+            ProviderBusy: If the wait would exceed the timeout (nothing is taken)
+        """
+        if self.rate <= 0:
+            return 0.0
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = max(0.0, (amount - self._tokens) / self.rate)
+            if wait > timeout:
+                raise ProviderBusy(f"Rate limit would delay the call by {wait:.1f}s")
+            self._tokens -= amount
+            return wait
+
+
+class CircuitBreaker:
+    """
+    Failure-rate circuit breaker
+
+    Once at least `window` attempts have been seen and `failure_ratio` of the last
+    `window` failed, the circuit opens and calls fail immediately. Occasional
+    throttling under concurrency therefore does not trip it; a provider outage
+    does. After `reset_seconds` a single probe call is let through; its success
+    closes the circuit and its failure opens it again.
+    """
+
+    def __init__(
+        self,
+        failure_ratio: float = OPENAI_CIRCUIT_FAILURE_RATIO,
+        window: int = OPENAI_CIRCUIT_WINDOW,
+        reset_seconds: float = OPENAI_CIRCUIT_RESET_SECONDS
+    ):
+        self.failure_ratio = failure_ratio
+        self.window = window
+        self.reset_seconds = reset_seconds
+        self.state = CIRCUIT_CLOSED
+        self._outcomes = deque(maxlen=window)  # True for a failed attempt
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpenError unless the call may go ahead"""
+        with self._lock:
+            if self.state == CIRCUIT_CLOSED:
+                return
+            if self.state == CIRCUIT_OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self.state = CIRCUIT_HALF_OPEN
+            if self.state == CIRCUIT_HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            raise CircuitOpenError("Provider circuit is open")
+
+    def cancel_probe(self):
+        """Give up a probe slot taken by before_call for a call that was never sent or says nothing about health"""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self._probing = False
+            if self.state != CIRCUIT_CLOSED:
+                # Judge the recovered provider on fresh outcomes only
+                self._outcomes.clear()
+                self.state = CIRCUIT_CLOSED
+            self._outcomes.append(False)
+
+    def record_failure(self) -> bool:
+        """Count a failed attempt; returns True if this opened the circuit"""
+        with self._lock:
+            self._probing = False
+            self._outcomes.append(True)
+            failing = (
+                len(self._outcomes) >= self.window
+                and sum(self._outcomes) >= self.failure_ratio * len(self._outcomes)
+            )
+            if self.state == CIRCUIT_HALF_OPEN or (self.state == CIRCUIT_CLOSED and failing):
+                self.state = CIRCUIT_OPEN
+                self._opened_at = time.monotonic()
+                return True
+            return False
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Throttling, server errors, timeouts and dropped connections are worth retrying"""
+    import openai
+    if isinstance(error, (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class ProviderClient:
+    """
+    Shared client for calls to the OpenAI API
+
+    Every call passes the operation's circuit breaker, the request and token
+    buckets and a concurrency cap before it is sent, and retryable failures are
+    retried with exponential backoff and full jitter (or the provider's
+    Retry-After, if longer, up to OPENAI_BACKOFF_MAX). The SDK's own retries
+    are disabled so there is one retry policy.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = OPENAI_REQUESTS_PER_MINUTE,
+        tokens_per_minute: float = OPENAI_TOKENS_PER_MINUTE,
+        max_concurrency: int = OPENAI_MAX_CONCURRENCY
+    ):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+        self._client: Optional["openai.OpenAI"] = None
+
+    @property
+    def client(self) -> "openai.OpenAI":
+        # Created on first use; OPENAI_BASE_URL is read by the SDK at that point
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import openai
+                    self._client = openai.OpenAI(
+                        api_key=OPENAI_API_KEY,
+                        max_retries=0,
+                        timeout=OPENAI_TIMEOUT,
+                    )
+        return self._client
+
+    def breaker(self, operation: str) -> CircuitBreaker:
+        with self._lock:
+            if operation not in self._breakers:
+                self._breakers[operation] = CircuitBreaker()
+            return self._breakers[operation]
+
+    def call(self, operation: str, request: Callable[["openai.OpenAI"], Any], tokens: int = 0) -> Any:
+        """
+        Send a provider request with rate limiting, retries and circuit breaking
+
+        Args:
+            operation: Operation name for metrics and the circuit breaker (e.g. 'embedding')
+            request: Function that makes the SDK call with the given client
+            tokens: Estimated tokens the request consumes
+
+        Returns:
+            The SDK response
+
+        Raises:
+            ProviderUnavailable: If the call was rejected locally (open circuit, no quota or slot)
+            openai.OpenAIError: If the provider call failed and retries did not help
+        """
+        retrying = Retrying(
+            stop=stop_after_attempt(OPENAI_MAX_ATTEMPTS) | stop_after_delay(OPENAI_RETRY_DEADLINE),
+            wait=self._backoff,
+            retry=retry_if_exception(is_retryable),
+            before_sleep=lambda state: self._log_retry(operation, state),
+            reraise=True,
+        )
+        return retrying(self._attempt, operation, request, tokens)
+
+    def _attempt(self, operation: str, request: Callable[["openai.OpenAI"], Any], tokens: int) -> Any:
+        breaker = self.breaker(operation)
+        try:
+            breaker.before_call()
+        except CircuitOpenError:
+            external_api_rejections.inc(operation=operation, reason="circuit_open")
+            raise
+
+        queued = time.perf_counter()
+        try:
+            wait = max(
+                self.requests.reserve(1, OPENAI_QUEUE_TIMEOUT),
+                self.tokens.reserve(tokens, OPENAI_QUEUE_TIMEOUT),
+            )
+        except ProviderBusy:
+            breaker.cancel_probe()
+            external_api_rejections.inc(operation=operation, reason="rate_limit")
+            raise
+        if wait > 0:
+            time.sleep(wait)
+        if not self._slots.acquire(timeout=OPENAI_QUEUE_TIMEOUT):
+            breaker.cancel_probe()
+            external_api_rejections.inc(operation=operation, reason="concurrency")
+            raise ProviderBusy(f"No free provider slot within {OPENAI_QUEUE_TIMEOUT:.0f}s")
+        external_api_throttle_wait.observe(time.perf_counter() - queued, operation=operation)
+
+        start = time.perf_counter()
+        try:
+            response = request(self.client)
+        except Exception as e:
+            outcome = "rate_limited" if getattr(e, "status_code", None) == 429 else "error"
+            external_api_requests.inc(operation=operation, outcome=outcome)
+            if not is_retryable(e):
+                # Client errors (bad input, auth) say nothing about the provider's health:
+                # neither outcome is counted, and a half-open circuit waits for the next probe
+                breaker.cancel_probe()
+            elif breaker.record_failure():
+                logger.warning(f"Circuit for {operation} opened after repeated provider failures")
+            raise
+        finally:
+            self._slots.release()
+            external_api_duration.observe(time.perf_counter() - start, operation=operation)
+        external_api_requests.inc(operation=operation, outcome="success")
+        breaker.record_success()
+        return response
+
+    @staticmethod
+    def _backoff(state: RetryCallState) -> float:
+        # Full jitter: uniform between 0 and the exponential cap
+        cap = min(OPENAI_BACKOFF_MAX, OPENAI_BACKOFF_BASE * 2 ** (state.attempt_number - 1))
+        delay = random.uniform(0, cap)
+        retry_after = _retry_after(state.outcome.exception()) if state.outcome else None
+        return max(delay, min(retry_after, OPENAI_BACKOFF_MAX)) if retry_after else delay
+
+    @staticmethod
+    def _log_retry(operation: str, state: RetryCallState):
+        external_api_retries.inc(operation=operation)
+        logger.warning(
+            f"{operation} attempt {state.attempt_number} failed: {state.outcome.exception()}; "
+            f"retrying in {state.next_action.sleep:.2f}s"
+        )
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {operation: {"circuit": breaker.state} for operation, breaker in breakers.items()}
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for quota accounting (about four characters per token)"""
+    return len(text) // 4 + 1
+
+
+openai_client = ProviderClient()
+
+registry.gauge(
+    "external_api_circuit_state",
+    "Provider circuit state per operation: 0 closed, 1 half-open, 2 open",
+    ["operation"],
+    callback=lambda: {
+        (operation,): _CIRCUIT_STATE_VALUES[stats["circuit"]]
+        for operation, stats in openai_client.stats().items()
+    },
+)
@@ -0,0 +1,470 @@
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_, exists, func, or_
+from sqlalchemy.orm import Session
+
+from src.backend.db.database import for_each_shard, router, session_scope
+from src.backend.db.sharding import route
+from src.backend.models.semantic_memory import Embedding, Memory, ReembeddingJob
+from src.backend.services.embedding_model_service import EMBEDDING_MODEL_REFRESH_SECONDS, EmbeddingModelService
+from src.backend.services.embedding_service import EmbeddingService
+from src.backend.services.metrics_service import registry
+from src.backend.services.vector_cache import append_after_commit
+
+logger = logging.getLogger(__name__)
+
+# Defaults for new jobs
+REEMBED_BATCH_SIZE = int(os.getenv("REEMBED_BATCH_SIZE", "100"))
+REEMBED_RATE_LIMIT = float(os.getenv("REEMBED_RATE_LIMIT", "0"))  # Texts per second; 0 is unlimited
+# A worker that stops heartbeating for this long loses its job to another worker
+REEMBED_LEASE_SECONDS = float(os.getenv("REEMBED_LEASE_SECONDS", "120"))
+# Passes over memories written behind the checkpoint before giving up on a cutover
+REEMBED_MAX_SWEEPS = int(os.getenv("REEMBED_MAX_SWEEPS", "3"))
+
+# Memory fields a batch needs once its session is closed
+MEMORY_COLUMNS = (Memory.id, Memory.text, Memory.dopple_id, Memory.user_id, Memory.timestamp, Memory.importance)
+
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running"
+STATUS_PAUSED = "paused"
+STATUS_COMPLETED = "completed"
+STATUS_FAILED = "failed"
+ACTIVE_STATUSES = (STATUS_PENDING, STATUS_RUNNING, STATUS_PAUSED)
+
+reembedding_memories = registry.counter(
+    "reembedding_memories_total",
+    "Memories processed by re-embedding jobs",
+    ["outcome"],
+)
+
+reembedding_batch_duration = registry.histogram(
+    "reembedding_batch_duration_seconds",
+    "Time to embed and store one re-embedding batch, excluding rate-limit waits",
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+
+# Identifies this process as a lease holder
+_worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+_threads: Dict[str, threading.Thread] = {}
+_threads_lock = threading.Lock()
+_stop = threading.Event()
+
+
+class ReembeddingConflict(Exception):
+    """Raised when a job cannot be started or changed in its current state"""
+
+
+class ReembeddingService:
+    """Service for migrating stored embeddings to another model without downtime"""
+
+    @staticmethod
+    def start_job(
+        target_model: str,
+        batch_size: int = REEMBED_BATCH_SIZE,
+        rate_limit: Optional[float] = None,
+        cutover: bool = True
+    ) -> Dict:
+        """
+        Create a re-embedding job and start it in the background
+
+        Searches keep using the active model while the job runs; with cutover the
+        target model is activated once every memory has a target embedding.
+
+        Args:
+            target_model: Model to embed the corpus with
+            batch_size: Memories embedded per API call and checkpoint
+            rate_limit: Maximum texts per second (defaults to REEMBED_RATE_LIMIT; 0 is unlimited)
+            cutover: Whether to activate the target model when the job completes
+
+        Returns:
+            The job as a dictionary
+
+        Raises:
+            ReembeddingConflict: If another job is not finished yet
+        """
+        rate_limit = REEMBED_RATE_LIMIT if rate_limit is None else rate_limit
+        with session_scope() as db:
+            active_job = db.query(ReembeddingJob).filter(ReembeddingJob.status.in_(ACTIVE_STATUSES)).first()
+            if active_job is not None:
+                raise ReembeddingConflict(f"Re-embedding job {active_job.id} is {active_job.status}")
+            job = ReembeddingJob(
+                source_model=EmbeddingModelService.get_active_model(db),
+                target_model=target_model,
+                status=STATUS_PENDING,
+                batch_size=batch_size,
+                rate_limit=rate_limit or None,
+                cutover=cutover,
+                total=ReembeddingService._count_missing(target_model),
+            )
+            db.add(job)
+            db.flush()
+            job_dict = job.to_dict()
+        logger.info(
+            f"Re-embedding job {job_dict['id']} created: {job_dict['total']} memories "
+            f"from {job_dict['source_model']} to {target_model}"
+        )
+        _spawn(job_dict["id"])
+        return job_dict
+
+    @staticmethod
+    def get_job(job_id: str, db: Optional[Session] = None) -> Optional[Dict]:
+        with session_scope(db) as db:
+            job = db.query(ReembeddingJob).filter(ReembeddingJob.id == job_id).first()
+            return job.to_dict() if job else None
+
+    @staticmethod
+    def list_jobs(limit: int = 20, db: Optional[Session] = None) -> List[Dict]:
+        with session_scope(db) as db:
+            jobs = db.query(ReembeddingJob).order_by(ReembeddingJob.created_at.desc()).limit(limit).all()
+            return [job.to_dict() for job in jobs]
+
+    @staticmethod
+    def pause_job(job_id: str, db: Optional[Session] = None) -> Dict:
+        """
+        Pause a job after its current batch; its checkpoint is kept
+
+        Raises:
+            ReembeddingConflict: If the job is not pending or running
+            KeyError: If the job does not exist
+        """
+        return ReembeddingService._transition(job_id, (STATUS_PENDING, STATUS_RUNNING), STATUS_PAUSED, db)
+
+    @staticmethod
+    def resume_job(job_id: str) -> Dict:
+        """
+        Resume a paused or failed job from its checkpoint
+
+        Raises:
+            ReembeddingConflict: If the job is not paused or failed, or another job is active
+            KeyError: If the job does not exist
+        """
+        with session_scope() as db:
+            other = db.query(ReembeddingJob).filter(
+                ReembeddingJob.id != job_id,
+                ReembeddingJob.status.in_(ACTIVE_STATUSES),
+            ).first()
+            if other is not None:
+                raise ReembeddingConflict(f"Re-embedding job {other.id} is {other.status}")
+            job = ReembeddingService._transition(job_id, (STATUS_PAUSED, STATUS_FAILED), STATUS_PENDING, db)
+        _spawn(job_id)
+        return job
+
+    @staticmethod
+    def _transition(job_id: str, allowed: tuple, status: str, db: Optional[Session]) -> Dict:
+        with session_scope(db) as db:
+            job = db.query(ReembeddingJob).filter(ReembeddingJob.id == job_id).with_for_update().first()
+            if job is None:
+                raise KeyError(job_id)
+            if job.status not in allowed:
+                raise ReembeddingConflict(f"Re-embedding job {job_id} is {job.status}")
+            job.status = status
+            job.error = None
+            db.flush()
+            return job.to_dict()
+
+    @staticmethod
+    def _missing_query(db: Session, target_model: str):
+        """Memories without an embedding of the target model"""
+        has_target = exists().where(and_(Embedding.memory_id == Memory.id, Embedding.model == target_model))
+        return db.query(Memory).filter(~has_target)
+
+    @staticmethod
+    def _count_missing(target_model: str, embeddable_only: bool = False) -> int:
+        """Memories without an embedding of the target model, summed over all shards"""
+        def count(db: Session) -> int:
+            query = ReembeddingService._missing_query(db, target_model)
+            if embeddable_only:
+                query = query.filter(func.length(func.trim(Memory.text)) > 0)
+            return query.count()
+
+        return sum(for_each_shard(count))
+
+    # ---- Worker ----
+
+    @staticmethod
+    def run_job(job_id: str) -> None:
+        """
+        Process a job to completion, pause or failure if this worker can lease it
+
+        Each batch is embedded in one API call and committed together with the
+        advanced (timestamp, id) checkpoint, so an interrupted job resumes after
+        the last committed batch without re-embedding anything. Shards are
+        processed one after another in configuration order.
+        """
+        if not ReembeddingService._claim(job_id):
+            return
+        try:
+            sweeps = 0
+            while True:
+                outcome = ReembeddingService._run_batch(job_id)
+                if outcome == "stopped":
+                    return
+                if outcome == "batch":
+                    continue
+                # Checkpoint reached the end; memories written behind it get another pass
+                sweeps += 1
+                if ReembeddingService._finish(job_id, sweeps):
+                    return
+        except Exception as e:
+            logger.error(f"Re-embedding job {job_id} failed: {str(e)}", exc_info=True)
+            with session_scope() as db:
+                db.query(ReembeddingJob).filter(
+                    ReembeddingJob.id == job_id, ReembeddingJob.lease_owner == _worker_id
+                ).update({
+                    ReembeddingJob.status: STATUS_FAILED,
+                    ReembeddingJob.error: str(e)[:2000],
+                    ReembeddingJob.lease_owner: None,
+                }, synchronize_session=False)
+
+    @staticmethod
+    def _claim(job_id: str) -> bool:
+        """Take the job's lease with one conditional update; only one worker can win it"""
+        now = datetime.utcnow()
+        with session_scope() as db:
+            claimed = db.query(ReembeddingJob).filter(
+                ReembeddingJob.id == job_id,
+                ReembeddingJob.status.in_((STATUS_PENDING, STATUS_RUNNING)),
+                or_(
+                    ReembeddingJob.lease_owner.is_(None),
+                    ReembeddingJob.lease_owner == _worker_id,
+                    ReembeddingJob.lease_expires_at < now,
+                ),
+            ).update({
+                ReembeddingJob.status: STATUS_RUNNING,
+                ReembeddingJob.lease_owner: _worker_id,
+                ReembeddingJob.lease_expires_at: now + timedelta(seconds=REEMBED_LEASE_SECONDS),
+                ReembeddingJob.started_at: func.coalesce(ReembeddingJob.started_at, now),
+            }, synchronize_session=False)
+        if claimed:
+            logger.info(f"Re-embedding job {job_id} leased by {_worker_id}")
+        return bool(claimed)
+
+    @staticmethod
+    def _run_batch(job_id: str) -> str:
+        """
+        Embed the next batch after the checkpoint
+
+        The batch is read in one short transaction and written with the advanced
+        checkpoint in another; no session is open while the provider is called.
+
+        Returns:
+            "batch" after a committed batch, "done" when the checkpoint reached the
+            end, "stopped" when the job was paused, taken over or the worker is shutting down
+        """
+        if _stop.is_set():
+            ReembeddingService._release(job_id)
+            return "stopped"
+        start = time.perf_counter()
+        with session_scope() as db:
+            job = ReembeddingService._leased_job(db, job_id)
+            if job is None:
+                return "stopped"
+
+            # The job row stays on the first shard; memories and embeddings go to the shard being processed
+            shard = job.cursor_shard if job.cursor_shard in router.engines else router.default
+            route(db, shard=shard)
+            query = ReembeddingService._missing_query(db, job.target_model)
+            if job.cursor_timestamp is not None:
+                query = query.filter(or_(
+                    Memory.timestamp > job.cursor_timestamp,
+                    and_(Memory.timestamp == job.cursor_timestamp, Memory.id > job.cursor_id),
+                ))
+            memories = query.with_entities(*MEMORY_COLUMNS).order_by(Memory.timestamp, Memory.id).\
+                limit(job.batch_size).all()
+            if not memories:
+                position = router.names.index(shard)
+                if position + 1 == len(router.names):
+                    return "done"
+                job.cursor_shard = router.names[position + 1]
+                job.cursor_timestamp = None
+                job.cursor_id = None
+                return "batch"
+            target_model, rate_limit = job.target_model, job.rate_limit
+
+        embeddable = [memory for memory in memories if memory.text and memory.text.strip()]
+        vectors = EmbeddingService.batch_generate_embeddings(
+            [memory.text for memory in embeddable], target_model
+        ) if embeddable else []
+
+        with session_scope() as db:
+            # Paused or taken over while embedding: the batch is dropped and redone by the lease holder
+            job = ReembeddingService._leased_job(db, job_id)
+            if job is None:
+                return "stopped"
+            route(db, shard=shard)
+            stored = ReembeddingService._store_vectors(db, embeddable, vectors, target_model)
+            skipped = len(memories) - len(embeddable)
+            job.cursor_shard = shard
+            job.cursor_timestamp = memories[-1].timestamp
+            job.cursor_id = memories[-1].id
+            job.processed += stored
+            job.failed += skipped
+            job.total = max(job.total, job.processed + job.failed)
+            job.lease_expires_at = datetime.utcnow() + timedelta(seconds=REEMBED_LEASE_SECONDS)
+        duration = time.perf_counter() - start
+
+        reembedding_memories.inc(stored, outcome="embedded")
+        reembedding_memories.inc(skipped, outcome="skipped")
+        reembedding_batch_duration.observe(duration)
+        if rate_limit:
+            # Spread batches so the job never exceeds its share of the provider's quota
+            _stop.wait(max(0.0, len(memories) / rate_limit - duration))
+        return "batch"
+
+    @staticmethod
+    def _leased_job(db: Session, job_id: str) -> Optional[ReembeddingJob]:
+        """The job if it is running under this worker's lease; otherwise None, giving up the lease if held"""
+        job = db.query(ReembeddingJob).filter(ReembeddingJob.id == job_id).first()
+        if job is None or job.status != STATUS_RUNNING or job.lease_owner != _worker_id:
+            logger.info(f"Re-embedding job {job_id} stopped ({job.status if job else 'deleted'})")
+            if job is not None and job.lease_owner == _worker_id:
+                job.lease_owner = None
+            return None
+        return job
+
+    @staticmethod
+    def _store_vectors(db: Session, memories: List, vectors: List[List[float]], target_model: str) -> int:
+        """
+        Add target-model embeddings for memories read earlier
+
+        Memories deleted or embedded elsewhere since they were read are skipped.
+
+        Returns:
+            Number of embeddings added
+        """
+        ids = [memory.id for memory in memories]
+        still_missing = {
+            row[0] for row in ReembeddingService._missing_query(db, target_model).
+            with_entities(Memory.id).filter(Memory.id.in_(ids))
+        } if ids else set()
+        stored = 0
+        for memory, vector in zip(memories, vectors):
+            if memory.id not in still_missing:
+                continue
+            db.add(Embedding(memory_id=memory.id, vector=vector, model=target_model))
+            # Built vector files of the target model stay current for the cutover
+            append_after_commit(
+                db, memory.dopple_id, memory.user_id, memory.id, vector,
+                memory.timestamp, memory.importance, target_model
+            )
+            stored += 1
+        return stored
+
+    @staticmethod
+    def _finish(job_id: str, sweeps: int) -> bool:
+        """
+        Complete the job, cutting over to the target model if requested
+
+        Returns:
+            True if the job is finished; False if it should sweep again from the start
+        """
+        with session_scope() as db:
+            job = db.query(ReembeddingJob).filter(ReembeddingJob.id == job_id).first()
+            # Blank memories can never be embedded; anything else left was written behind the checkpoint
+            remaining = ReembeddingService._count_missing(job.target_model, embeddable_only=True)
+            if remaining and sweeps < REEMBED_MAX_SWEEPS:
+                job.cursor_shard = None
+                job.cursor_timestamp = None
+                job.cursor_id = None
+                job.total += remaining
+                logger.info(f"Re-embedding job {job_id} sweeping {remaining} memories written during the run")
+                return False
+            if remaining:
+                raise RuntimeError(f"{remaining} memories still lack a {job.target_model} embedding")
+
+            target_model, cutover = job.target_model, job.cutover
+            if cutover:
+                # Same transaction as the completion, so the switch and the job state cannot diverge
+                EmbeddingModelService.set_active_model(target_model, db)
+            job.status = STATUS_COMPLETED
+            job.completed_at = datetime.utcnow()
+            job.lease_owner = None
+        EmbeddingModelService.refresh()
+        logger.info(f"Re-embedding job {job_id} completed{' and activated ' + target_model if cutover else ''}")
+        if cutover:
+            _sweep_stragglers(target_model)
+        return True
+
+    @staticmethod
+    def _release(job_id: str):
+        with session_scope() as db:
+            db.query(ReembeddingJob).filter(
+                ReembeddingJob.id == job_id, ReembeddingJob.lease_owner == _worker_id
+            ).update({ReembeddingJob.lease_owner: None}, synchronize_session=False)
+
+
+def _sweep_stragglers(target_model: str):
+    """
+    Embed memories that workers still on the previous model stored after the cutover
+
+    Waits out the active-model refresh interval first, after which no worker
+    stores embeddings of the previous model any more.
+    """
+    if _stop.wait(EMBEDDING_MODEL_REFRESH_SECONDS):
+        return
+    embedded = 0
+    for shard in router.names:
+        with session_scope(shard=shard) as db:
+            memories = ReembeddingService._missing_query(db, target_model).filter(
+                func.length(func.trim(Memory.text)) > 0
+            ).with_entities(*MEMORY_COLUMNS).all()
+        # Embedded between short transactions, as in _run_batch
+        for start in range(0, len(memories), REEMBED_BATCH_SIZE):
+            batch = memories[start:start + REEMBED_BATCH_SIZE]
+            vectors = EmbeddingService.batch_generate_embeddings([memory.text for memory in batch], target_model)
+            with session_scope(shard=shard) as db:
+                embedded += ReembeddingService._store_vectors(db, batch, vectors, target_model)
+    if not embedded:
+        return
+    reembedding_memories.inc(embedded, outcome="embedded")
+    logger.info(f"Embedded {embedded} memories stored with the previous model after the cutover")
+
+
+# ---- Background workers ----
+
+def _spawn(job_id: str) -> bool:
+    with _threads_lock:
+        thread = _threads.get(job_id)
+        if thread is not None and thread.is_alive():
+            return False
+        _stop.clear()
+        thread = threading.Thread(
+            target=ReembeddingService.run_job, args=(job_id,), name=f"reembed-{job_id[:8]}", daemon=True
+        )
+        _threads[job_id] = thread
+        thread.start()
+        return True
+
+
+def resume_jobs() -> int:
+    """
+    Start workers for jobs left pending or running, e.g. by a restart
+
+    Jobs still leased by a live worker elsewhere are skipped by the lease check.
+
+    Returns:
+        Number of jobs picked up
+    """
+    try:
+        with session_scope() as db:
+            job_ids = [
+                row[0] for row in db.query(ReembeddingJob.id).filter(
+                    ReembeddingJob.status.in_((STATUS_PENDING, STATUS_RUNNING))
+                ).all()
+            ]
+    except Exception as e:
+        logger.error(f"Could not look up re-embedding jobs to resume: {str(e)}")
+        return 0
+    return sum(_spawn(job_id) for job_id in job_ids)
+
+
+def stop_workers():
+    """Stop job workers after their current batch; their leases are released for other workers"""
+    _stop.set()
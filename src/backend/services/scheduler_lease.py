@@ -0,0 +1,52 @@
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+
+from src.backend.db.database import session_scope
+from src.backend.models.semantic_memory import SchedulerLease
+
+logger = logging.getLogger(__name__)
+
+_worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def claim_run(name: str, interval: float) -> bool:
+    """
+    Take a periodic job's run slot, so one worker in the cluster runs it per interval
+
+    The slot is held until it expires rather than released after the run, so
+    schedulers started on every worker share a single run per interval. A
+    worker that dies mid-run loses the slot when it expires.
+
+    Args:
+        name: Job name
+        interval: Seconds until the slot opens again
+
+    Returns:
+        True if this worker should run the job now
+    """
+    now = datetime.utcnow()
+    try:
+        with session_scope() as db:
+            if not db.query(SchedulerLease).filter(SchedulerLease.name == name).first():
+                db.add(SchedulerLease(name=name))
+                db.flush()
+            claimed = db.query(SchedulerLease).filter(
+                SchedulerLease.name == name,
+                or_(SchedulerLease.lease_expires_at.is_(None), SchedulerLease.lease_expires_at <= now),
+            ).update({
+                SchedulerLease.lease_owner: _worker_id,
+                SchedulerLease.lease_expires_at: now + timedelta(seconds=interval),
+                SchedulerLease.last_run_at: now,
+            }, synchronize_session=False)
+    except IntegrityError:
+        # Another worker created the row first and holds the slot
+        return False
+    if claimed:
+        logger.info(f"Took the {name} run slot for {interval:.0f}s")
+    return bool(claimed)
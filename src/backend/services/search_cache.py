@@ -0,0 +1,188 @@
+import copy
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from src.backend.db.database import pin_after_commit
+from src.backend.models.semantic_memory import SearchVersion
+from src.backend.services.metrics_service import record_cache_access, registry
+
+logger = logging.getLogger(__name__)
+
+SEARCH_CACHE_ENABLED = os.getenv("SEARCH_CACHE_ENABLED", "true").lower() == "true"
+SEARCH_CACHE_MAX_BYTES = int(os.getenv("SEARCH_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+# Writes invalidate entries precisely; the TTL only bounds drift of time-decayed relevance scores
+SEARCH_CACHE_TTL_SECONDS = float(os.getenv("SEARCH_CACHE_TTL_SECONDS", "300"))
+
+# Rough per-result overhead of the dictionaries on top of the text
+_RESULT_OVERHEAD_BYTES = 1024
+
+_WHITESPACE = re.compile(r"\s+")
+
+# Session info key counting the version bumps of each pair in the transaction;
+# the vector cache advances its entries by them once the transaction commits
+VERSION_BUMPS_KEY = "search_version_bumps"
+
+
+def normalize_query(text: str) -> str:
+    """Collapse runs of whitespace so retried and re-sent queries share an entry"""
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def bump_version(db: Session, dopple_id: str, user_id: str) -> None:
+    """
+    Advance a dopple/user pair's write version in the caller's transaction
+
+    Every write that can change a search result for the pair (new memories,
+    dedup merges, tier moves, consolidation, deletes) calls this, so cached
+    results computed before the write stop matching once it commits. The pair's
+    reads also stay on the primary for a while after the commit, until the
+    replicas have caught up.
+
+    Args:
+        db: Session of the write
+        dopple_id: Dopple ID
+        user_id: User ID
+    """
+    pin_after_commit(db, dopple_id, user_id)
+    bumps = db.info.setdefault(VERSION_BUMPS_KEY, {})
+    bumps[(dopple_id, user_id)] = bumps.get((dopple_id, user_id), 0) + 1
+    table = SearchVersion.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        statement = dialect_insert(table).values(dopple_id=dopple_id, user_id=user_id, version=1)
+        db.execute(statement.on_conflict_do_update(
+            index_elements=[table.c.dopple_id, table.c.user_id],
+            set_={"version": table.c.version + 1},
+        ))
+        return
+
+    updated = db.execute(
+        table.update()
+        .where(table.c.dopple_id == dopple_id, table.c.user_id == user_id)
+        .values(version=table.c.version + 1)
+    ).rowcount
+    if not updated:
+        db.execute(table.insert().values(dopple_id=dopple_id, user_id=user_id, version=1))
+
+
+def read_version(db: Session, dopple_id: str, user_id: Optional[str] = None) -> int:
+    """
+    Current write version of a search scope
+
+    A dopple-wide scope's version is the sum over its users, which grows with
+    every write to any of them.
+    """
+    query = db.query(func.coalesce(func.sum(SearchVersion.version), 0)).filter(SearchVersion.dopple_id == dopple_id)
+    if user_id is not None:
+        query = query.filter(SearchVersion.user_id == user_id)
+    return int(query.scalar() or 0)
+
+
+class SearchResultCache:
+    """
+    Process-level LRU cache of similarity search results
+
+    Each entry remembers the write version of its scope; a lookup at any other
+    version is a miss, so a result is never served after a write it does not
+    reflect.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = SEARCH_CACHE_MAX_BYTES,
+        ttl_seconds: float = SEARCH_CACHE_TTL_SECONDS,
+        enabled: bool = SEARCH_CACHE_ENABLED
+    ):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        # key -> (version, expires_at, results, size)
+        self._entries: "OrderedDict[Hashable, Tuple[int, float, List[Dict], int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, version: int) -> Optional[List[Dict]]:
+        """Copy of the results cached for a request at the scope's current version"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[0] != version or entry[1] <= now):
+                self.bytes -= self._entries.pop(key)[3]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        record_cache_access("search", entry is not None)
+        return copy.deepcopy(entry[2]) if entry is not None else None
+
+    def put(self, key: Hashable, version: int, results: List[Dict]) -> bool:
+        """
+        Cache a request's results
+
+        Args:
+            key: Normalized request
+            version: Scope version read before the search ran
+            results: Search results; a copy is stored
+
+        Returns:
+            True if the results were cached
+        """
+        size = sum(len(result.get("text") or "") + _RESULT_OVERHEAD_BYTES for result in results)
+        if size > self.max_bytes:
+            return False
+        entry = (version, time.monotonic() + self.ttl_seconds, copy.deepcopy(results), size)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous[3]
+            self._entries[key] = entry
+            self.bytes += size
+            while self.bytes > self.max_bytes and self._entries:
+                self.bytes -= self._entries.popitem(last=False)[1][3]
+                self.evictions += 1
+        return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+search_cache = SearchResultCache()
+
+registry.gauge(
+    "search_cache",
+    "Similarity search result cache size and usage",
+    ["stat"],
+    callback=lambda: {(key,): value for key, value in search_cache.stats().items()},
+)
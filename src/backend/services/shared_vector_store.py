@@ -0,0 +1,499 @@
+import fcntl
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from src.backend.services.metrics_service import record_cache_access, registry
+from src.backend.services.vector_search import VectorRows, normalize
+
+logger = logging.getLogger(__name__)
+
+# Directory for memory-mapped vector files; unset keeps vectors in the per-process cache.
+# Point it at node-local storage (ideally tmpfs such as /dev/shm) shared by all workers.
+VECTOR_STORE_DIR = os.getenv("VECTOR_STORE_DIR")
+VECTOR_STORE_MAX_OPEN = int(os.getenv("VECTOR_STORE_MAX_OPEN", "1024"))
+
+# File layout: header | ids (capacity x ID_SIZE bytes) | vectors (capacity x dim float32)
+#              | timestamps (capacity float64) | importance (capacity float32)
+#              | tombstones (capacity bits)
+# Header: magic, format, dim, flags, capacity, count, version, tombstoned rows; the version is the
+# scope's database write version (see search_cache.read_version) the rows are current with
+HEADER = struct.Struct("<4sIIIQQQQ")
+HEADER_SIZE = 64
+ID_SIZE = 64
+MAGIC = b"WVEC"
+FORMAT_VERSION = 4  # files in an older format are rebuilt on first use
+FLAG_SUPERSEDED = 1  # set on a file that has been replaced by a larger copy
+MIN_CAPACITY = 64
+
+
+def _vectors_offset(capacity: int) -> int:
+    return HEADER_SIZE + capacity * ID_SIZE
+
+
+def _timestamps_offset(capacity: int, dim: int) -> int:
+    return _vectors_offset(capacity) + capacity * dim * 4
+
+
+def _importance_offset(capacity: int, dim: int) -> int:
+    return _timestamps_offset(capacity, dim) + capacity * 8
+
+
+def _tombstones_offset(capacity: int, dim: int) -> int:
+    return _importance_offset(capacity, dim) + capacity * 4
+
+
+def _file_size(capacity: int, dim: int) -> int:
+    return _tombstones_offset(capacity, dim) + (capacity + 7) // 8
+
+
+def _digest(value: str) -> str:
+    return hashlib.sha1(value.encode("utf-8")).hexdigest()[:20]
+
+
+class IdView:
+    """Sequence of memory IDs backed by a shared fixed-width byte array"""
+
+    def __init__(self, array: np.ndarray):
+        self._array = array
+
+    def __len__(self) -> int:
+        return len(self._array)
+
+    def __getitem__(self, index) -> str:
+        return self._array[index].rstrip(b"\0").decode("utf-8")
+
+
+class SharedVectorFile:
+    """Read-only mapping of one key's vector file, refreshed as writers append"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._map = None
+        self._capacity = 0
+        self._open()
+
+    def _open(self):
+        with open(self.path, "rb") as f:
+            # Old mappings are left to the garbage collector: numpy views may still reference them
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._capacity = self.header()[4]
+
+    def header(self) -> tuple:
+        return HEADER.unpack_from(self._map, 0)
+
+    def version(self) -> int:
+        return self.header()[6]
+
+    def dead(self) -> int:
+        return self.header()[7]
+
+    def format(self) -> int:
+        return self.header()[1]
+
+    def refresh(self):
+        """Reopen the file if a writer replaced it (grown, compacted or rebuilt)"""
+        with self._lock:
+            _, _, _, flags, capacity, _, _, _ = self.header()
+            if flags & FLAG_SUPERSEDED or capacity != self._capacity:
+                self._open()
+
+    def snapshot(self) -> VectorRows:
+        """Current view of the file; only reopens when the writer grew the file"""
+        with self._lock:
+            _, _, dim, flags, capacity, count, _, dead = self.header()
+            if flags & FLAG_SUPERSEDED or capacity != self._capacity:
+                self._open()
+                _, _, dim, flags, capacity, count, _, dead = self.header()
+            count = min(count, capacity)
+            ids = np.frombuffer(self._map, dtype=f"S{ID_SIZE}", count=count, offset=HEADER_SIZE)
+            matrix = np.frombuffer(
+                self._map, dtype=np.float32, count=count * dim, offset=_vectors_offset(capacity)
+            ).reshape(count, dim)
+            timestamps = np.frombuffer(
+                self._map, dtype=np.float64, count=count, offset=_timestamps_offset(capacity, dim)
+            )
+            importance = np.frombuffer(
+                self._map, dtype=np.float32, count=count, offset=_importance_offset(capacity, dim)
+            )
+            deleted = None
+            if dead:
+                bits = np.frombuffer(
+                    self._map, dtype=np.uint8, count=(count + 7) // 8, offset=_tombstones_offset(capacity, dim)
+                )
+                deleted = np.unpackbits(bits, count=count).astype(bool)
+            return VectorRows(IdView(ids), matrix, timestamps, importance, deleted)
+
+
+class SharedVectorStore:
+    """
+    Memory-mapped vector files shared by all worker processes on a node
+
+    Every (dopple_id, user_id) key maps to one file. Readers map it read-only, so
+    the pages live once in the OS page cache no matter how many workers search it.
+    Each file records the scope's database write version it is current with;
+    readers pass the version they read from the primary and a file that does not
+    match (written to by another node, or while this one was down) is rebuilt.
+    Files are kept in one subdirectory per embedding model, so vectors of
+    different models never mix and a model switch needs no rebuild of the old set.
+    Writes are serialized across processes with a per-key file lock. The header
+    count and version are bumped after the row is written, so readers see appends
+    on their next search without reloading. Deletes set a row's bit in the
+    tombstone bitmap the same way; compaction later rewrites the file without
+    tombstoned rows. A local write's version bumps are added to the header
+    (advance) once its changes are in the file.
+    """
+
+    def __init__(self, directory: str, max_open: int = VECTOR_STORE_MAX_OPEN):
+        self.directory = directory
+        self.max_open = max_open
+        self._files: "OrderedDict[tuple, SharedVectorFile]" = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: tuple) -> str:
+        # Prefixed by the dopple's digest so all files of a dopple can be found
+        dopple_id, user_id, model = key
+        return os.path.join(self.directory, _digest(model), f"{_digest(dopple_id)}-{_digest(user_id or '')}.vec")
+
+    def _model_dirs(self) -> List[str]:
+        return [
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if os.path.isdir(os.path.join(self.directory, name))
+        ]
+
+    @contextmanager
+    def _write_lock(self, path: str):
+        """Exclusive cross-process lock for writes to one vector file"""
+        with open(path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _get_open(self, key: tuple) -> Optional[SharedVectorFile]:
+        with self._lock:
+            vector_file = self._files.get(key)
+            if vector_file is not None:
+                self._files.move_to_end(key)
+                return vector_file
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        vector_file = SharedVectorFile(path)
+        with self._lock:
+            self._files[key] = vector_file
+            while len(self._files) > self.max_open:
+                self._files.popitem(last=False)
+        return vector_file
+
+    def get_or_build(
+        self,
+        key: tuple,
+        loader: Callable[[], VectorRows],
+        model: str,
+        version: int
+    ) -> VectorRows:
+        """
+        Get a key's vectors, building the shared file from the database if needed
+
+        Args:
+            key: (dopple_id, user_id) key; user_id None covers the whole dopple
+            loader: Returns the key's rows (normalized vectors) from the database
+            model: Embedding model the loader's vectors come from
+            version: The scope's current write version, read from the primary before the loader runs
+
+        Returns:
+            View of the shared file
+        """
+        key = (key[0], key[1], model)
+        vector_file = self._get_open(key)
+        current = False
+        if vector_file is not None:
+            try:
+                vector_file.refresh()
+                current = vector_file.format() == FORMAT_VERSION and vector_file.version() == version
+            except FileNotFoundError:
+                # Invalidated by another worker; rebuild below
+                pass
+        record_cache_access("shared_vector", current)
+        if current:
+            try:
+                return vector_file.snapshot()
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self._files.pop(key, None)
+
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._write_lock(path):
+            # Another worker may have built it while we waited for the lock
+            header = self._read_header(path)
+            if header is None or header[6] != version:
+                if os.path.exists(path):
+                    # Workers that mapped the stale file reopen it on their next read
+                    self._mark_superseded(path)
+                self._write_file(path, loader(), version=version)
+            vector_file = self._get_open(key)
+            return vector_file.snapshot()
+
+    def version(self, key: tuple, model: str) -> Optional[int]:
+        """Write version a key's file is current with, or None if it has not been built"""
+        vector_file = self._get_open((key[0], key[1], model))
+        return vector_file.version() if vector_file is not None else None
+
+    def append(
+        self,
+        dopple_id: str,
+        user_id: str,
+        memory_id: str,
+        vector,
+        timestamp: float,
+        importance: float,
+        model: str
+    ) -> None:
+        """Append a committed memory's vector to every built file of its model that covers it"""
+        normalized = normalize(vector)
+        for key in ((dopple_id, user_id, model), (dopple_id, None, model)):
+            # Checked under the lock: a build in progress already holds it and
+            # its snapshot may predate this write
+            path = self._path(key)
+            if not os.path.isdir(os.path.dirname(path)):
+                continue
+            with self._write_lock(path):
+                if os.path.exists(path) and self._read_format(path) == FORMAT_VERSION:
+                    self._append_locked(path, memory_id, normalized, timestamp, importance)
+
+    def advance(self, dopple_id: str, user_id: str, bumps: int) -> None:
+        """
+        Account for a committed local write's version bumps of a dopple/user pair
+
+        Called once the write's changes are in the files (see vector_cache.advance);
+        if another node wrote meanwhile the versions no longer line up and the
+        files are rebuilt on next use.
+        """
+        for model_dir in self._model_dirs():
+            for key_user in (user_id, ""):
+                path = os.path.join(model_dir, f"{_digest(dopple_id)}-{_digest(key_user)}.vec")
+                if not os.path.exists(path):
+                    continue
+                with self._write_lock(path):
+                    header = self._read_header(path)
+                    if header is not None:
+                        header = list(header)
+                        header[6] += bumps
+                        with open(path, "r+b") as f:
+                            os.pwrite(f.fileno(), HEADER.pack(*header), 0)
+
+    def delete(self, dopple_id: str, user_id: str, memory_ids: List[str]) -> None:
+        """Tombstone deleted memories in every built file, of any model, that covers them"""
+        wanted = set(memory_ids)
+        for model_dir in self._model_dirs():
+            for key_user in (user_id, ""):
+                path = os.path.join(model_dir, f"{_digest(dopple_id)}-{_digest(key_user)}.vec")
+                if not os.path.exists(path):
+                    continue
+                with self._write_lock(path):
+                    if os.path.exists(path) and self._read_format(path) == FORMAT_VERSION:
+                        self._delete_locked(path, wanted)
+
+    def compact(self, min_dead_ratio: float) -> int:
+        """
+        Rewrite files whose share of tombstoned rows reached min_dead_ratio
+
+        Readers keep searching the old file until they see it superseded.
+
+        Returns:
+            Number of files compacted
+        """
+        compacted = 0
+        for model_dir in self._model_dirs():
+            for name in os.listdir(model_dir):
+                if not name.endswith(".vec"):
+                    continue
+                path = os.path.join(model_dir, name)
+                try:
+                    with open(path, "rb") as f:
+                        _, fmt, _, _, _, count, _, dead = HEADER.unpack(f.read(HEADER.size))
+                except (FileNotFoundError, struct.error):
+                    continue
+                if fmt != FORMAT_VERSION or not dead or dead < min_dead_ratio * count:
+                    continue
+                with self._write_lock(path):
+                    if os.path.exists(path):
+                        with open(path, "r+b") as f:
+                            self._rewrite_locked(f, path)
+                        compacted += 1
+        return compacted
+
+    def invalidate(self, dopple_id: str, user_id: Optional[str] = None) -> None:
+        """Remove built files of every model so they are rebuilt from the database on next use"""
+        paths = []
+        for model_dir in self._model_dirs():
+            if user_id is not None:
+                names = [f"{_digest(dopple_id)}-{_digest(key_user)}.vec" for key_user in (user_id, "")]
+            else:
+                prefix = f"{_digest(dopple_id)}-"
+                names = [name for name in os.listdir(model_dir) if name.startswith(prefix) and name.endswith(".vec")]
+            paths.extend(os.path.join(model_dir, name) for name in names)
+        for path in paths:
+            with self._write_lock(path):
+                if os.path.exists(path):
+                    self._mark_superseded(path)
+                    os.remove(path)
+        with self._lock:
+            for key in [key for key in self._files if key[0] == dopple_id]:
+                if user_id is None or key[1] in (user_id, None):
+                    self._files.pop(key)
+
+    def _append_locked(self, path: str, memory_id: str, vector: np.ndarray, timestamp: float, importance: float):
+        with open(path, "r+b") as f:
+            magic, fmt, dim, flags, capacity, count, version, dead = HEADER.unpack(f.read(HEADER.size))
+            if vector.shape[0] != dim and count:
+                return
+            if count >= capacity or vector.shape[0] != dim:
+                # Grow (or give an empty file its dimensionality) in a new file,
+                # dropping tombstoned rows; readers of the old one are told to reopen
+                self._rewrite_locked(f, path, (memory_id, vector, timestamp, importance))
+                return
+            fd = f.fileno()
+            os.pwrite(fd, memory_id.encode("utf-8").ljust(ID_SIZE, b"\0"), HEADER_SIZE + count * ID_SIZE)
+            os.pwrite(fd, vector.astype(np.float32).tobytes(), _vectors_offset(capacity) + count * dim * 4)
+            os.pwrite(fd, np.float64(timestamp).tobytes(), _timestamps_offset(capacity, dim) + count * 8)
+            os.pwrite(fd, np.float32(importance).tobytes(), _importance_offset(capacity, dim) + count * 4)
+            # Publish the row only after its data is in place
+            os.pwrite(fd, HEADER.pack(magic, fmt, dim, flags, capacity, count + 1, version, dead), 0)
+
+    def _delete_locked(self, path: str, memory_ids: set):
+        with open(path, "r+b") as f:
+            magic, fmt, dim, flags, capacity, count, version, dead = HEADER.unpack(f.read(HEADER.size))
+            f.seek(HEADER_SIZE)
+            raw_ids = f.read(count * ID_SIZE)
+            positions = [
+                i for i in range(count)
+                if raw_ids[i * ID_SIZE:(i + 1) * ID_SIZE].rstrip(b"\0").decode("utf-8") in memory_ids
+            ]
+            if not positions:
+                return
+            offset = _tombstones_offset(capacity, dim)
+            f.seek(offset)
+            bits = np.unpackbits(np.frombuffer(f.read((count + 7) // 8), dtype=np.uint8), count=count).astype(bool)
+            newly = [i for i in positions if not bits[i]]
+            if not newly:
+                return
+            bits[newly] = True
+            fd = f.fileno()
+            os.pwrite(fd, np.packbits(bits).tobytes(), offset)
+            # Publish the tombstones
+            os.pwrite(fd, HEADER.pack(magic, fmt, dim, flags, capacity, count, version, dead + len(newly)), 0)
+
+    def _rewrite_locked(self, f, path: str, appended: Optional[tuple] = None):
+        """Replace a locked file with a copy without tombstoned rows, optionally adding one row"""
+        f.seek(0)
+        magic, fmt, dim, flags, capacity, count, version, dead = HEADER.unpack(f.read(HEADER.size))
+        rows = self._read_rows(f, dim, capacity, count)
+        live = ~rows.deleted if rows.deleted is not None else np.ones(count, dtype=bool)
+        ids = [memory_id for memory_id, keep in zip(rows.ids, live) if keep]
+        matrix, timestamps, importance = rows.matrix[live], rows.timestamps[live], rows.importance[live]
+        if appended is not None:
+            memory_id, vector, timestamp, importance_value = appended
+            if not count:
+                matrix = np.zeros((0, vector.shape[0]), dtype=np.float32)
+            ids.append(memory_id)
+            matrix = np.vstack([matrix, vector[None, :]])
+            timestamps = np.append(timestamps, timestamp)
+            importance = np.append(importance, importance_value)
+        self._write_file(path, VectorRows(ids, matrix, timestamps, importance), version)
+        os.pwrite(f.fileno(), HEADER.pack(magic, fmt, dim, flags | FLAG_SUPERSEDED, capacity, count, version, dead), 0)
+
+    def _read_rows(self, f, dim: int, capacity: int, count: int) -> VectorRows:
+        f.seek(HEADER_SIZE)
+        raw_ids = f.read(count * ID_SIZE)
+        ids = [raw_ids[i * ID_SIZE:(i + 1) * ID_SIZE].rstrip(b"\0").decode("utf-8") for i in range(count)]
+        f.seek(_vectors_offset(capacity))
+        matrix = np.frombuffer(f.read(count * dim * 4), dtype=np.float32).reshape(count, dim)
+        f.seek(_timestamps_offset(capacity, dim))
+        timestamps = np.frombuffer(f.read(count * 8), dtype=np.float64)
+        f.seek(_importance_offset(capacity, dim))
+        importance = np.frombuffer(f.read(count * 4), dtype=np.float32)
+        f.seek(_tombstones_offset(capacity, dim))
+        bits = np.frombuffer(f.read((count + 7) // 8), dtype=np.uint8)
+        deleted = np.unpackbits(bits, count=count).astype(bool)
+        return VectorRows(ids, matrix, timestamps, importance, deleted if deleted.any() else None)
+
+    def _read_format(self, path: str) -> int:
+        with open(path, "rb") as f:
+            return HEADER.unpack(f.read(HEADER.size))[1]
+
+    def _read_header(self, path: str) -> Optional[tuple]:
+        """Header of a file in the current format, or None if there is none"""
+        try:
+            with open(path, "rb") as f:
+                header = HEADER.unpack(f.read(HEADER.size))
+        except (FileNotFoundError, struct.error):
+            return None
+        return header if header[1] == FORMAT_VERSION else None
+
+    def _mark_superseded(self, path: str):
+        with open(path, "r+b") as f:
+            header = list(HEADER.unpack(f.read(HEADER.size)))
+            header[3] |= FLAG_SUPERSEDED
+            os.pwrite(f.fileno(), HEADER.pack(*header), 0)
+
+    def _write_file(self, path: str, rows: VectorRows, version: int):
+        """Write a complete file next to the target and atomically move it into place"""
+        ids, matrix = rows.ids, rows.matrix
+        count = len(ids)
+        dim = matrix.shape[1] if matrix.ndim == 2 and matrix.shape[1] else 0
+        capacity = max(MIN_CAPACITY, count * 2)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.truncate(_file_size(capacity, dim))
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, dim, 0, capacity, count, version, 0))
+            f.seek(HEADER_SIZE)
+            f.write(b"".join(memory_id.encode("utf-8").ljust(ID_SIZE, b"\0") for memory_id in ids))
+            f.seek(_vectors_offset(capacity))
+            f.write(np.ascontiguousarray(matrix, dtype=np.float32).tobytes())
+            f.seek(_timestamps_offset(capacity, dim))
+            f.write(np.ascontiguousarray(rows.timestamps, dtype=np.float64).tobytes())
+            f.seek(_importance_offset(capacity, dim))
+            f.write(np.ascontiguousarray(rows.importance, dtype=np.float32).tobytes())
+        os.replace(tmp_path, path)
+
+    def stats(self) -> dict:
+        with self._lock:
+            open_files = len(self._files)
+        files = [
+            os.path.join(model_dir, name)
+            for model_dir in self._model_dirs()
+            for name in os.listdir(model_dir)
+            if name.endswith(".vec")
+        ]
+        return {
+            "open_files": open_files,
+            "files": len(files),
+            "bytes": sum(os.path.getsize(path) for path in files),
+        }
+
+
+shared_vector_store = SharedVectorStore(VECTOR_STORE_DIR) if VECTOR_STORE_DIR else None
+
+if shared_vector_store is not None:
+    registry.gauge(
+        "shared_vector_store",
+        "Memory-mapped vector store files on this node",
+        ["stat"],
+        callback=lambda: {(key,): value for key, value in shared_vector_store.stats().items()},
+    )
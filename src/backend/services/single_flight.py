@@ -0,0 +1,96 @@
+import logging
+import os
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional, TypeVar
+
+from src.backend.services.metrics_service import registry
+
+logger = logging.getLogger(__name__)
+
+# When disabled every call runs on its own
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+
+T = TypeVar("T")
+
+single_flight_calls = registry.counter(
+    "single_flight_calls_total",
+    "Calls that went through single-flight coalescing, by whether they ran or joined an in-flight call",
+    ["operation", "role"],
+)
+
+
+_flights: Dict[str, "SingleFlight"] = {}
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical calls into one execution
+
+    The first caller for a key runs the function; callers arriving with the same
+    key while it is in flight wait for it and receive its result (or exception).
+    Nothing is cached: once the call returns, the next caller runs it again.
+    """
+
+    def __init__(self, operation: str, enabled: bool = SINGLE_FLIGHT_ENABLED):
+        self.operation = operation
+        self.enabled = enabled
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        _flights[operation] = self
+
+    def do(self, key: Hashable, fn: Callable[[], T], share: Optional[Callable[[T], T]] = None) -> T:
+        """
+        Run fn, or wait for an identical in-flight call
+
+        Args:
+            key: Identity of the call; must cover every argument that affects the result
+            fn: Function to run when no identical call is in flight
+            share: Optional copy applied to the result handed to waiting callers, for
+                mutable results
+
+        Returns:
+            Result of fn
+        """
+        if not self.enabled:
+            return fn()
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+
+        if not leader:
+            single_flight_calls.inc(operation=self.operation, role="follower")
+            result = future.result()
+            return share(result) if share is not None else result
+
+        single_flight_calls.inc(operation=self.operation, role="leader")
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight(),
+            "executed": int(single_flight_calls.value(operation=self.operation, role="leader")),
+            "coalesced": int(single_flight_calls.value(operation=self.operation, role="follower")),
+        }
+
+
+def get_stats() -> Dict[str, Dict[str, Any]]:
+    """Executed, coalesced and in-flight call counts per operation"""
+    return {operation: flight.stats() for operation, flight in sorted(_flights.items())}
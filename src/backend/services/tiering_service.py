@@ -0,0 +1,196 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session
+
+from src.backend.db.database import for_each_shard, session_scope
+from src.backend.models.semantic_memory import Memory
+from src.backend.services.cold_tier_store import cold_segment_store
+from src.backend.services.metrics_service import registry
+from src.backend.services.scheduler_lease import claim_run
+from src.backend.services.search_cache import bump_version
+from src.backend.services.vector_cache import invalidate_after_commit
+
+logger = logging.getLogger(__name__)
+
+TIER_HOT = "hot"
+TIER_COLD = "cold"
+
+# When disabled, searches scan every memory and rebalancing is a no-op
+TIERING_ENABLED = os.getenv("TIERING_ENABLED", "true").lower() == "true"
+# A memory stays hot while it is recent enough or important enough
+HOT_TIER_MAX_AGE_DAYS = float(os.getenv("HOT_TIER_MAX_AGE_DAYS", "90"))
+HOT_TIER_MIN_IMPORTANCE = int(os.getenv("HOT_TIER_MIN_IMPORTANCE", "8"))
+# Seconds between background rebalances; 0 disables the scheduler. Every worker may run
+# it: a lease in the database lets one rebalance run per interval across the cluster
+TIER_REBALANCE_INTERVAL_SECONDS = float(os.getenv("TIER_REBALANCE_INTERVAL_SECONDS", "3600"))
+
+tier_migrations = registry.counter(
+    "memory_tier_migrations_total",
+    "Memories moved between the hot and cold tiers",
+    ["direction"],
+)
+
+tier_searches = registry.counter(
+    "memory_tier_searches_total",
+    "Similarity searches by the tiers they had to scan",
+    ["tiers"],
+)
+
+
+class TieringService:
+    """Service that assigns memories to the hot or cold tier by age and importance"""
+
+    @staticmethod
+    def rebalance(
+        dopple_id: Optional[str] = None,
+        max_age_days: float = HOT_TIER_MAX_AGE_DAYS,
+        min_importance: int = HOT_TIER_MIN_IMPORTANCE,
+        db: Optional[Session] = None
+    ) -> Dict:
+        """
+        Demote old, unimportant hot memories and promote cold ones that qualify again
+
+        Hot vector caches and cold segments of every affected dopple/user pair are
+        invalidated once the change commits.
+
+        Args:
+            dopple_id: Optional dopple to restrict the rebalance to
+            max_age_days: Memories newer than this stay hot
+            min_importance: Memories at least this important stay hot
+            db: Optional session; the caller commits it
+
+        Returns:
+            Counts of demoted and promoted memories and affected pairs
+        """
+        if not TIERING_ENABLED:
+            return {"enabled": False, "demoted": 0, "promoted": 0, "pairs": 0}
+
+        start = time.perf_counter()
+        cutoff = datetime.utcnow() - timedelta(days=max_age_days)
+        is_hot = or_(Memory.timestamp >= cutoff, Memory.importance >= min_importance)
+        demote = and_(Memory.tier == TIER_HOT, ~is_hot)
+        promote = and_(Memory.tier == TIER_COLD, is_hot)
+        if dopple_id:
+            demote = and_(demote, Memory.dopple_id == dopple_id)
+            promote = and_(promote, Memory.dopple_id == dopple_id)
+
+        def apply(session: Session) -> Tuple[int, int, Set[Tuple[str, str]]]:
+            pairs = {
+                (row[0], row[1])
+                for condition in (demote, promote)
+                for row in session.query(Memory.dopple_id, Memory.user_id).filter(condition).distinct().all()
+            }
+            demoted = session.query(Memory).filter(demote).update({Memory.tier: TIER_COLD}, synchronize_session=False)
+            promoted = session.query(Memory).filter(promote).update({Memory.tier: TIER_HOT}, synchronize_session=False)
+            for pair_dopple_id, pair_user_id in pairs:
+                invalidate_after_commit(session, pair_dopple_id, pair_user_id)
+                bump_version(session, pair_dopple_id, pair_user_id)
+            return demoted, promoted, pairs
+
+        if dopple_id:
+            with session_scope(db, dopple_id=dopple_id) as session:
+                results = [apply(session)]
+        else:
+            # Each shard rebalances in its own transaction
+            results = for_each_shard(apply, db)
+        demoted = sum(result[0] for result in results)
+        promoted = sum(result[1] for result in results)
+        pairs = set().union(*(result[2] for result in results))
+
+        tier_migrations.inc(demoted, direction="demote")
+        tier_migrations.inc(promoted, direction="promote")
+        report = {
+            "enabled": True,
+            "demoted": demoted,
+            "promoted": promoted,
+            "pairs": len(pairs),
+            "duration_seconds": time.perf_counter() - start,
+        }
+        logger.info(
+            f"Tier rebalance moved {demoted} memories to cold and {promoted} to hot "
+            f"across {len(pairs)} pairs in {report['duration_seconds']:.2f}s"
+        )
+        return report
+
+    @staticmethod
+    def get_stats(dopple_id: Optional[str] = None, db: Optional[Session] = None) -> Dict:
+        """
+        Get memory counts per tier and cold segment usage
+
+        Args:
+            dopple_id: Optional dopple filter
+            db: Optional request-scoped session
+
+        Returns:
+            Dictionary with tier counts and cold segment stats
+        """
+        def count(session: Session) -> List[Tuple[Optional[str], int]]:
+            query = session.query(Memory.tier, func.count(Memory.id))
+            if dopple_id:
+                query = query.filter(Memory.dopple_id == dopple_id)
+            return query.group_by(Memory.tier).all()
+
+        if dopple_id:
+            with session_scope(db, dopple_id=dopple_id) as session:
+                results = [count(session)]
+        else:
+            results = for_each_shard(count, db)
+        counts: Dict[str, int] = {}
+        for rows in results:
+            for tier, tier_count in rows:
+                counts[tier or TIER_HOT] = counts.get(tier or TIER_HOT, 0) + tier_count
+        stats = {"enabled": TIERING_ENABLED, "hot": counts.get(TIER_HOT, 0), "cold": counts.get(TIER_COLD, 0)}
+        if cold_segment_store is not None:
+            stats["cold_segments"] = cold_segment_store.stats()
+        return stats
+
+
+# ---- Background scheduler ----
+
+_scheduler_thread: Optional[threading.Thread] = None
+_scheduler_stop = threading.Event()
+SCHEDULER_LEASE_NAME = "tier_rebalance"
+
+
+def _scheduler_loop(interval: float):
+    while not _scheduler_stop.wait(interval):
+        try:
+            if claim_run(SCHEDULER_LEASE_NAME, interval):
+                TieringService.rebalance()
+        except Exception as e:
+            logger.error(f"Scheduled tier rebalance failed: {str(e)}", exc_info=True)
+
+
+def start_scheduler(interval: float = TIER_REBALANCE_INTERVAL_SECONDS) -> bool:
+    """
+    Start the background tier rebalancing thread
+
+    Each tick only rebalances if this worker takes the interval's run slot.
+
+    Args:
+        interval: Seconds between rebalances; values <= 0 leave the scheduler off
+
+    Returns:
+        True if the scheduler was started
+    """
+    global _scheduler_thread
+    if interval <= 0 or not TIERING_ENABLED or (_scheduler_thread is not None and _scheduler_thread.is_alive()):
+        return False
+    _scheduler_stop.clear()
+    _scheduler_thread = threading.Thread(
+        target=_scheduler_loop, args=(interval,), name="tier-rebalance", daemon=True
+    )
+    _scheduler_thread.start()
+    logger.info(f"Tier rebalancing scheduled every {interval:.0f}s")
+    return True
+
+
+def stop_scheduler():
+    """Stop the background tier rebalancing thread after its current run"""
+    _scheduler_stop.set()
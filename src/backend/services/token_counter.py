@@ -0,0 +1,61 @@
+"""
+Token counts of memory texts for prompt context budgets
+
+Counts are taken with tiktoken when it is installed and fall back to the
+provider client's character-based estimate otherwise. They are computed once
+when a memory is stored (Memory.token_count) so context assembly never has to
+re-tokenize stored texts.
+"""
+import logging
+import os
+import threading
+from typing import Optional
+
+from src.backend.services.provider_client import estimate_tokens
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken is optional; fall back to the character estimate
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# tiktoken encoding used for token counts (that of the chat model the context is for)
+CONTEXT_TOKENIZER = os.getenv("CONTEXT_TOKENIZER", "cl100k_base")
+
+_encoding = None
+_encoding_failed = False
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    global _encoding, _encoding_failed
+    if _encoding is not None or _encoding_failed or tiktoken is None:
+        return _encoding
+    with _encoding_lock:
+        if _encoding is None and not _encoding_failed:
+            try:
+                _encoding = tiktoken.get_encoding(CONTEXT_TOKENIZER)
+            except Exception as e:
+                # Encodings are downloaded on first use; offline nodes keep estimating
+                _encoding_failed = True
+                logger.warning(f"Token encoding {CONTEXT_TOKENIZER} unavailable, estimating token counts: {str(e)}")
+    return _encoding
+
+
+def count_tokens(text: Optional[str]) -> int:
+    """
+    Count the tokens of a text
+
+    Args:
+        text: Text to count
+
+    Returns:
+        Number of tokens under CONTEXT_TOKENIZER, or an estimate when tiktoken is unavailable
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
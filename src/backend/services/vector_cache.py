@@ -0,0 +1,442 @@
+import logging
+import os
+import sys
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from src.backend.services.cold_tier_store import cold_segment_store
+from src.backend.services.embedding_service import EMBEDDING_MODEL
+from src.backend.services.metrics_service import record_cache_access, registry
+from src.backend.services.search_cache import VERSION_BUMPS_KEY
+from src.backend.services.shared_vector_store import shared_vector_store
+from src.backend.services.vector_search import VectorRows, normalize, to_epoch
+
+logger = logging.getLogger(__name__)
+
+VECTOR_CACHE_ENABLED = os.getenv("VECTOR_CACHE_ENABLED", "true").lower() == "true"
+VECTOR_CACHE_MAX_BYTES = int(os.getenv("VECTOR_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Approximate per-ID overhead of a Python str holding a UUID plus its list slot
+_ID_BYTES = sys.getsizeof("00000000-0000-0000-0000-000000000000") + 8
+
+CacheKey = Tuple[str, Optional[str]]
+
+
+class VectorSet:
+    """Normalized float32 vectors, memory IDs and ranking attributes for one (dopple_id, user_id) key"""
+
+    def __init__(self, rows: VectorRows):
+        self._lock = threading.Lock()
+        self._ids = list(rows.ids)
+        self._count = len(self._ids)
+        self._matrix = rows.matrix
+        self._timestamps = np.asarray(rows.timestamps, dtype=np.float64)
+        self._importance = np.asarray(rows.importance, dtype=np.float32)
+        # Tombstones: rows deleted from the database stay in the arrays, masked, until compacted
+        self._deleted = np.zeros(self._count, dtype=bool)
+        self._dead = 0
+        self._positions: Optional[Dict[str, int]] = None
+        self._changes = 0
+        # Write version of the scope (see search_cache.read_version) the vectors are current with
+        self.version = 0
+
+    @property
+    def dim(self) -> int:
+        return self._matrix.shape[1] if self._matrix.ndim == 2 else 0
+
+    @property
+    def dead(self) -> int:
+        return self._dead
+
+    def snapshot(self) -> VectorRows:
+        """Consistent view; later appends and deletes do not change it"""
+        with self._lock:
+            count = self._count
+            return VectorRows(
+                self._ids[:count], self._matrix[:count], self._timestamps[:count], self._importance[:count],
+                self._deleted[:count].copy() if self._dead else None,
+            )
+
+    def delete(self, memory_ids) -> int:
+        """
+        Tombstone rows of deleted memories
+
+        Returns:
+            Number of rows newly tombstoned
+        """
+        with self._lock:
+            if self._positions is None:
+                self._positions = {memory_id: i for i, memory_id in enumerate(self._ids[:self._count])}
+            deleted = 0
+            for memory_id in memory_ids:
+                i = self._positions.get(memory_id)
+                if i is not None and not self._deleted[i]:
+                    self._deleted[i] = True
+                    deleted += 1
+            self._dead += deleted
+            self._changes += 1
+            return deleted
+
+    def compact(self) -> int:
+        """
+        Rebuild the arrays without tombstoned rows
+
+        The copy is made outside the lock so searches and appends are not held
+        up; it is discarded if the set changed meanwhile and retried next time.
+
+        Returns:
+            Change in memory usage in bytes (0 if nothing was compacted)
+        """
+        with self._lock:
+            if not self._dead:
+                return 0
+            changes, count = self._changes, self._count
+            ids, matrix = self._ids[:count], self._matrix[:count]
+            timestamps, importance = self._timestamps[:count], self._importance[:count]
+            live = ~self._deleted[:count]
+        kept_ids = [memory_id for memory_id, keep in zip(ids, live) if keep]
+        matrix, timestamps, importance = matrix[live], timestamps[live], importance[live]
+        with self._lock:
+            if self._changes != changes or self._count != count:
+                return 0
+            before = self.nbytes
+            self._ids, self._matrix, self._timestamps, self._importance = kept_ids, matrix, timestamps, importance
+            self._count = len(kept_ids)
+            self._deleted = np.zeros(self._count, dtype=bool)
+            self._dead = 0
+            self._positions = None
+            self._changes += 1
+            return self.nbytes - before
+
+    def append(self, memory_id: str, vector: np.ndarray, timestamp: float, importance: float) -> int:
+        """
+        Append a normalized vector, growing capacity geometrically
+
+        Returns:
+            Change in memory usage in bytes
+        """
+        with self._lock:
+            if self._count and vector.shape[0] != self.dim:
+                return 0
+            before = self.nbytes
+            if self._count == 0 and self.dim != vector.shape[0]:
+                self._matrix = np.zeros((4, vector.shape[0]), dtype=np.float32)
+                self._timestamps = np.zeros(4, dtype=np.float64)
+                self._importance = np.zeros(4, dtype=np.float32)
+                self._deleted = np.zeros(4, dtype=bool)
+            elif self._count >= self._matrix.shape[0]:
+                capacity = max(4, self._matrix.shape[0] * 2)
+                grown = np.zeros((capacity, self.dim), dtype=np.float32)
+                grown[:self._count] = self._matrix[:self._count]
+                self._matrix = grown
+                self._timestamps = np.resize(self._timestamps[:self._count], capacity)
+                self._importance = np.resize(self._importance[:self._count], capacity)
+                self._deleted = np.concatenate([self._deleted[:self._count], np.zeros(capacity - self._count, dtype=bool)])
+            self._matrix[self._count] = vector
+            self._timestamps[self._count] = timestamp
+            self._importance[self._count] = importance
+            self._ids.append(memory_id)
+            if self._positions is not None:
+                self._positions[memory_id] = self._count
+            self._count += 1
+            self._changes += 1
+            return self.nbytes - before
+
+    @property
+    def nbytes(self) -> int:
+        return (
+            self._matrix.nbytes + self._timestamps.nbytes + self._importance.nbytes + self._deleted.nbytes
+            + len(self._ids) * _ID_BYTES
+        )
+
+    def __len__(self) -> int:
+        return self._count
+
+
+class VectorCache:
+    """
+    Process-level LRU cache of per-(dopple_id, user_id) vector matrices
+
+    Entries are kept current by appending vectors from committed writes, so a
+    cached entry never misses a stored memory. Loads race-proof themselves with
+    a per-dopple write generation: a load that overlapped a write to the same
+    dopple is not cached. All entries hold vectors of one embedding model;
+    switching models empties the cache.
+
+    Commit hooks only see this process's writes. Each entry therefore records
+    the scope's write version it is current with, advanced by the version bumps
+    of local commits; a lookup at any other version (a write by another worker,
+    the chat sync or an admin job) drops the entry so it is reloaded.
+    """
+
+    def __init__(self, max_bytes: int = VECTOR_CACHE_MAX_BYTES, model: str = EMBEDDING_MODEL):
+        self.max_bytes = max_bytes
+        self.model = model
+        self._entries: "OrderedDict[CacheKey, VectorSet]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale = 0
+
+    def get(self, key: CacheKey, version: int) -> Optional[VectorSet]:
+        """
+        Cached entry of a key, if it is current with the scope's write version
+
+        Args:
+            key: (dopple_id, user_id) key
+            version: The scope's current write version, read from the primary
+        """
+        with self._lock:
+            vector_set = self._entries.get(key)
+            if vector_set is not None and vector_set.version != version:
+                # Written to by another process since the entry was loaded
+                self.bytes -= self._entries.pop(key).nbytes
+                self.stale += 1
+                vector_set = None
+            if vector_set is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        record_cache_access("vector", vector_set is not None)
+        return vector_set
+
+    def generation(self, dopple_id: str) -> int:
+        """Write generation to read before loading an entry from the database"""
+        with self._lock:
+            return self._generations.get(dopple_id, 0)
+
+    def use_model(self, model: str) -> None:
+        """Switch the cache to another embedding model, dropping every entry"""
+        with self._lock:
+            if model == self.model:
+                return
+            self.model = model
+            self._entries.clear()
+            self.bytes = 0
+            # Loads of the previous model that are still in flight must not be cached
+            for dopple_id in self._generations:
+                self._generations[dopple_id] += 1
+        logger.info(f"Vector cache switched to embedding model {model}")
+
+    def put(self, key: CacheKey, vector_set: VectorSet, generation: int, model: str, version: int) -> bool:
+        """
+        Cache a freshly loaded entry
+
+        Args:
+            key: (dopple_id, user_id) key; user_id None covers the whole dopple
+            vector_set: Loaded vectors
+            generation: Value of generation(dopple_id) read before the load
+            model: Embedding model the vectors come from
+            version: The scope's write version read before the load
+
+        Returns:
+            True if the entry was cached
+        """
+        size = vector_set.nbytes
+        if size > self.max_bytes:
+            return False
+        with self._lock:
+            if model != self.model or self._generations.get(key[0], 0) != generation:
+                return False
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous.nbytes
+            vector_set.version = version
+            self._entries[key] = vector_set
+            self.bytes += size
+            self._evict()
+            return True
+
+    def append(
+        self,
+        dopple_id: str,
+        user_id: str,
+        memory_id: str,
+        vector,
+        timestamp: float,
+        importance: float,
+        model: str
+    ) -> None:
+        """Add a committed memory's vector to every cached entry that covers it"""
+        normalized = normalize(vector)
+        with self._lock:
+            self._generations[dopple_id] = self._generations.get(dopple_id, 0) + 1
+            if model != self.model:
+                return
+            for key in ((dopple_id, user_id), (dopple_id, None)):
+                vector_set = self._entries.get(key)
+                if vector_set is not None:
+                    self.bytes += vector_set.append(memory_id, normalized, timestamp, importance)
+            self._evict()
+
+    def delete(self, dopple_id: str, user_id: str, memory_ids: List[str]) -> None:
+        """Tombstone deleted memories in every cached entry that covers them"""
+        with self._lock:
+            # A load that overlapped the delete may still hold the rows
+            self._generations[dopple_id] = self._generations.get(dopple_id, 0) + 1
+            entries = [self._entries.get(key) for key in ((dopple_id, user_id), (dopple_id, None))]
+        for vector_set in entries:
+            if vector_set is not None:
+                vector_set.delete(memory_ids)
+
+    def advance(self, dopple_id: str, user_id: str, bumps: int) -> None:
+        """
+        Account for a committed local write's version bumps of a dopple/user pair
+
+        The write's changes have already been applied to the entries (or dropped
+        them), so they stay current; with a concurrent write by another process
+        the versions no longer line up and the entries are reloaded on next use.
+        """
+        with self._lock:
+            for key in ((dopple_id, user_id), (dopple_id, None)):
+                vector_set = self._entries.get(key)
+                if vector_set is not None:
+                    vector_set.version += bumps
+
+    def compact(self, min_dead_ratio: float) -> int:
+        """
+        Compact entries whose share of tombstoned rows reached min_dead_ratio
+
+        Returns:
+            Number of entries compacted
+        """
+        with self._lock:
+            candidates = [
+                (key, vector_set) for key, vector_set in self._entries.items()
+                if vector_set.dead and vector_set.dead >= min_dead_ratio * len(vector_set)
+            ]
+        compacted = 0
+        for key, vector_set in candidates:
+            change = vector_set.compact()
+            if change:
+                with self._lock:
+                    # Evicted or replaced entries no longer count towards the cache size
+                    if self._entries.get(key) is vector_set:
+                        self.bytes += change
+                compacted += 1
+        return compacted
+
+    def invalidate(self, dopple_id: str, user_id: Optional[str] = None) -> None:
+        """Drop cached entries for a dopple (or a single dopple/user pair)"""
+        with self._lock:
+            self._generations[dopple_id] = self._generations.get(dopple_id, 0) + 1
+            for key in list(self._entries):
+                if key[0] == dopple_id and (user_id is None or key[1] in (user_id, None)):
+                    self.bytes -= self._entries.pop(key).nbytes
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def _evict(self):
+        while self.bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self.bytes -= evicted.nbytes
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "vectors": sum(len(entry) for entry in self._entries.values()),
+                "tombstones": sum(entry.dead for entry in self._entries.values()),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "stale": self.stale,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+vector_cache = VectorCache()
+
+registry.gauge(
+    "vector_cache",
+    "Hot vector cache size and usage",
+    ["stat"],
+    callback=lambda: {(key,): value for key, value in vector_cache.stats().items()},
+)
+
+
+# ---- Commit hooks ----
+# Writes are queued on the session and only reach the cache once the
+# transaction commits, so rolled-back memories never appear in search.
+
+_PENDING_KEY = "vector_cache_pending"
+_INVALIDATE_KEY = "vector_cache_invalidate"
+_DELETE_KEY = "vector_cache_delete"
+
+
+def append_after_commit(
+    db: Session,
+    dopple_id: str,
+    user_id: str,
+    memory_id: str,
+    vector,
+    timestamp: Optional[datetime] = None,
+    importance: Optional[int] = None,
+    model: Optional[str] = None
+) -> None:
+    """Queue a vector for the cache, applied when the session commits"""
+    if VECTOR_CACHE_ENABLED or shared_vector_store is not None:
+        db.info.setdefault(_PENDING_KEY, []).append((
+            dopple_id, user_id, memory_id, vector, to_epoch(timestamp or datetime.utcnow()), importance or 5,
+            model or vector_cache.model,
+        ))
+
+
+def invalidate_after_commit(db: Session, dopple_id: str, user_id: Optional[str] = None) -> None:
+    """Queue cache invalidation for rows removed or rewritten, applied when the session commits"""
+    if VECTOR_CACHE_ENABLED or shared_vector_store is not None or cold_segment_store is not None:
+        db.info.setdefault(_INVALIDATE_KEY, set()).add((dopple_id, user_id))
+
+
+def delete_after_commit(db: Session, dopple_id: str, user_id: str, memory_ids: List[str]) -> None:
+    """Queue tombstones for deleted memories, applied when the session commits"""
+    if VECTOR_CACHE_ENABLED or shared_vector_store is not None or cold_segment_store is not None:
+        db.info.setdefault(_DELETE_KEY, []).append((dopple_id, user_id, list(memory_ids)))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending(session):
+    # With a shared store the per-process cache is bypassed entirely
+    target = shared_vector_store if shared_vector_store is not None else vector_cache
+    # Invalidate first; entries are rebuilt from the committed rows on next use
+    for dopple_id, user_id in session.info.pop(_INVALIDATE_KEY, set()):
+        target.invalidate(dopple_id, user_id)
+        if cold_segment_store is not None:
+            cold_segment_store.invalidate(dopple_id, user_id)
+    # Deleted rows are masked in place rather than forcing a rebuild
+    for dopple_id, user_id, memory_ids in session.info.pop(_DELETE_KEY, []):
+        target.delete(dopple_id, user_id, memory_ids)
+        if cold_segment_store is not None:
+            cold_segment_store.delete(dopple_id, user_id, memory_ids)
+    for dopple_id, user_id, memory_id, vector, timestamp, importance, model in session.info.pop(_PENDING_KEY, []):
+        target.append(dopple_id, user_id, memory_id, vector, timestamp, importance, model)
+    # Only after the write's changes are in the entries
+    for (dopple_id, user_id), bumps in session.info.pop(VERSION_BUMPS_KEY, {}).items():
+        target.advance(dopple_id, user_id, bumps)
+        if cold_segment_store is not None:
+            cold_segment_store.advance(dopple_id, user_id, bumps)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop(_PENDING_KEY, None)
+    session.info.pop(_INVALIDATE_KEY, None)
+    session.info.pop(_DELETE_KEY, None)
+    session.info.pop(VERSION_BUMPS_KEY, None)
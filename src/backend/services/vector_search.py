@@ -0,0 +1,304 @@
+import heapq
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Candidate sets with at least this many rows are scored in parallel shards
+SCORING_PARALLEL_THRESHOLD = int(os.getenv("SCORING_PARALLEL_THRESHOLD", "100000"))
+SCORING_WORKERS = int(os.getenv("SCORING_WORKERS", str(min(8, os.cpu_count() or 1))))
+
+# Default ranking; both 0 keeps plain similarity ordering unless a request asks otherwise
+RELEVANCE_HALF_LIFE_DAYS = float(os.getenv("RELEVANCE_HALF_LIFE_DAYS", "0"))
+RELEVANCE_IMPORTANCE_WEIGHT = float(os.getenv("RELEVANCE_IMPORTANCE_WEIGHT", "0"))
+# Candidates fetched per result when ranking, so rows can be re-ranked with their stored values
+RELEVANCE_OVERFETCH = int(os.getenv("RELEVANCE_OVERFETCH", "2"))
+# Rows per pruning bucket for recency/importance-weighted scoring
+RELEVANCE_BUCKET_SIZE = int(os.getenv("RELEVANCE_BUCKET_SIZE", "4096"))
+# Share of the recency weight a memory keeps however old it is
+RELEVANCE_RECENCY_FLOOR = float(os.getenv("RELEVANCE_RECENCY_FLOOR", "0.0"))
+
+SECONDS_PER_DAY = 86400.0
+
+
+class VectorRows(NamedTuple):
+    """Memory IDs with row-aligned normalized vectors and ranking attributes"""
+    ids: Sequence[str]
+    matrix: np.ndarray
+    timestamps: np.ndarray  # POSIX seconds, float64
+    importance: np.ndarray  # 1-10 scale, float32
+    # Tombstones of deleted rows not yet compacted away; None when there are none
+    deleted: Optional[np.ndarray] = None
+
+
+def live_count(rows: VectorRows) -> int:
+    """Rows not tombstoned"""
+    return len(rows.ids) - (int(rows.deleted.sum()) if rows.deleted is not None else 0)
+
+
+def mask_deleted(scores: np.ndarray, deleted: Optional[np.ndarray]) -> np.ndarray:
+    """Scores with tombstoned rows set to -inf so no threshold or top-k selects them"""
+    if deleted is None:
+        return scores
+    return np.where(deleted[:len(scores)], -np.inf, scores)
+
+
+def empty_rows() -> VectorRows:
+    return VectorRows([], np.zeros((0, 0), dtype=np.float32), np.zeros(0), np.zeros(0, dtype=np.float32))
+
+
+def to_epoch(timestamp: Optional[datetime]) -> float:
+    """POSIX seconds of a naive UTC datetime as stored on Memory.timestamp (0 if unknown)"""
+    if timestamp is None:
+        return 0.0
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.timestamp()
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def normalize(vector) -> np.ndarray:
+    """
+    Convert a vector to a unit-length float32 array
+
+    Args:
+        vector: Embedding as a list or array
+
+    Returns:
+        Unit vector (zero vectors are returned unchanged)
+    """
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    return array / norm if norm > 0 else array
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Normalize each row of a float32 matrix to unit length in place"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+
+def top_k(scores: np.ndarray, k: int, threshold: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Select the k highest scores at or above a threshold
+
+    Args:
+        scores: 1-D array of similarity scores
+        k: Maximum number of results
+        threshold: Minimum score
+
+    Returns:
+        (indices, scores) sorted by descending score
+    """
+    candidates = np.flatnonzero(scores >= threshold)
+    if k <= 0 or candidates.size == 0:
+        return candidates[:0], scores[candidates[:0]]
+    if candidates.size > k:
+        candidate_scores = scores[candidates]
+        best = np.argpartition(candidate_scores, -k)[-k:]
+        candidates = candidates[best]
+    order = np.argsort(-scores[candidates], kind="stable")
+    candidates = candidates[order]
+    return candidates, scores[candidates]
+
+
+def relevance_weights(
+    timestamps: np.ndarray,
+    importance: np.ndarray,
+    now: float,
+    half_life_days: Optional[float],
+    importance_weight: float
+) -> np.ndarray:
+    """
+    Multiplicative recency and importance weights, each at most 1
+
+    Recency decays exponentially with the configured half-life down to
+    RELEVANCE_RECENCY_FLOOR; importance scales from (1 - importance_weight) at 0
+    to 1 at 10. Both weights grow with their input, so the weight of the newest,
+    most important row in a bucket bounds the weight of every row in it.
+
+    Args:
+        timestamps: POSIX seconds per row
+        importance: Importance per row (1-10)
+        now: Current POSIX time
+        half_life_days: Recency half-life; None or <= 0 disables decay
+        importance_weight: 0 ignores importance, 1 makes weight proportional to it
+
+    Returns:
+        float32 weight per row
+    """
+    weights = np.ones(len(timestamps), dtype=np.float32)
+    if half_life_days and half_life_days > 0:
+        age_days = np.maximum(now - np.asarray(timestamps, dtype=np.float64), 0.0) / SECONDS_PER_DAY
+        decay = np.exp2(-age_days / half_life_days)
+        weights *= (RELEVANCE_RECENCY_FLOOR + (1.0 - RELEVANCE_RECENCY_FLOOR) * decay).astype(np.float32)
+    if importance_weight:
+        scaled = np.clip(np.asarray(importance, dtype=np.float32), 0, 10) / 10.0
+        weights *= (1.0 - importance_weight) + importance_weight * scaled
+    return weights
+
+
+def relevance_top_k(
+    rows: VectorRows,
+    query: np.ndarray,
+    k: int,
+    threshold: float,
+    now: float,
+    half_life_days: Optional[float],
+    importance_weight: float,
+    bucket_size: int = None
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Select the k rows with the highest similarity x recency x importance
+
+    Rows are split into contiguous buckets (vector sets are stored oldest first,
+    so buckets are roughly time-ordered). Each bucket's best possible score is
+    the weight of its newest, most important row, since similarity is at most 1.
+    Buckets are visited best bound first, and scoring stops once no remaining
+    bucket can beat the current k-th result.
+
+    Args:
+        rows: Normalized vectors with timestamps and importance
+        query: Normalized query vector
+        k: Maximum number of results
+        threshold: Minimum cosine similarity
+        now: Current POSIX time
+        half_life_days: Recency half-life; None or <= 0 disables decay
+        importance_weight: Weight of importance in the score (0-1)
+        bucket_size: Rows per bucket (defaults to RELEVANCE_BUCKET_SIZE)
+
+    Returns:
+        (indices, relevance scores, similarities) sorted by descending relevance
+    """
+    count = rows.matrix.shape[0]
+    bucket_size = bucket_size or RELEVANCE_BUCKET_SIZE
+    if k <= 0 or count == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.float32)
+
+    timestamps = np.asarray(rows.timestamps[:count], dtype=np.float64)
+    importance = np.asarray(rows.importance[:count], dtype=np.float32)
+    starts = np.arange(0, count, bucket_size)
+    bounds = relevance_weights(
+        np.maximum.reduceat(timestamps, starts),
+        np.maximum.reduceat(importance, starts),
+        now, half_life_days, importance_weight,
+    )
+
+    best_indices = np.zeros(0, dtype=np.int64)
+    best_scores = np.zeros(0, dtype=np.float32)
+    best_similarities = np.zeros(0, dtype=np.float32)
+    for bucket in np.argsort(-bounds, kind="stable"):
+        if best_scores.size >= k and bounds[bucket] <= best_scores[-1]:
+            break
+        start = starts[bucket]
+        end = min(start + bucket_size, count)
+        similarities = rows.matrix[start:end] @ query
+        scores = similarities * relevance_weights(
+            timestamps[start:end], importance[start:end], now, half_life_days, importance_weight
+        )
+        # Rows below the similarity threshold can never be returned
+        scores = np.where(similarities >= threshold, scores, -np.inf)
+        if rows.deleted is not None:
+            scores = mask_deleted(scores, rows.deleted[start:end])
+        local, local_scores = top_k(scores, k, -np.inf)
+        local = local[np.isfinite(local_scores)]
+
+        merged_indices = np.concatenate([best_indices, local + start])
+        merged_scores = np.concatenate([best_scores, scores[local]])
+        merged_similarities = np.concatenate([best_similarities, similarities[local]])
+        keep, _ = top_k(merged_scores, k, -np.inf)
+        best_indices, best_scores, best_similarities = (
+            merged_indices[keep], merged_scores[keep], merged_similarities[keep]
+        )
+    return best_indices, best_scores, best_similarities
+
+
+def build_matrix(vectors: List[List[float]]) -> Tuple[np.ndarray, List[int]]:
+    """
+    Stack embedding vectors into a normalized float32 matrix
+
+    Vectors whose dimensionality differs from the first one are skipped.
+
+    Args:
+        vectors: Embedding vectors
+
+    Returns:
+        (matrix, positions of the input vectors that were kept)
+    """
+    if not vectors:
+        return np.zeros((0, 0), dtype=np.float32), []
+    dim = len(vectors[0])
+    kept = [i for i, vector in enumerate(vectors) if vector is not None and len(vector) == dim]
+    matrix = np.asarray([vectors[i] for i in kept], dtype=np.float32).reshape(len(kept), dim)
+    return normalize_rows(matrix), kept
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=SCORING_WORKERS, thread_name_prefix="scoring")
+    return _executor
+
+
+def _score_shard(
+    matrix: np.ndarray, query: np.ndarray, start: int, k: int, threshold: float, deleted: Optional[np.ndarray]
+) -> List[Tuple[float, int]]:
+    indices, scores = top_k(mask_deleted(matrix @ query, deleted), k, threshold)
+    return [(float(score), int(index) + start) for index, score in zip(indices, scores)]
+
+
+def score_top_k(
+    matrix: np.ndarray,
+    query: np.ndarray,
+    k: int,
+    threshold: float,
+    parallel_threshold: int = None,
+    deleted: Optional[np.ndarray] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Score a normalized matrix against a query vector and select the top k
+
+    Large matrices are split into row shards scored on a thread pool (NumPy
+    releases the GIL during the product and selection); each shard keeps its own
+    top k and the sorted shard results are merged.
+
+    Args:
+        matrix: Normalized candidate vectors, one per row
+        query: Normalized query vector
+        k: Maximum number of results
+        threshold: Minimum similarity score
+        parallel_threshold: Row count at which to shard (defaults to SCORING_PARALLEL_THRESHOLD)
+        deleted: Tombstones of rows that must not be returned
+
+    Returns:
+        (indices, scores) sorted by descending score
+    """
+    rows = matrix.shape[0]
+    parallel_threshold = SCORING_PARALLEL_THRESHOLD if parallel_threshold is None else parallel_threshold
+    if SCORING_WORKERS <= 1 or rows < max(parallel_threshold, 2):
+        return top_k(mask_deleted(matrix @ query, deleted), k, threshold)
+
+    shard_size = -(-rows // SCORING_WORKERS)
+    executor = _get_executor()
+    futures = [
+        executor.submit(
+            _score_shard, matrix[start:start + shard_size], query, start, k, threshold,
+            deleted[start:start + shard_size] if deleted is not None else None,
+        )
+        for start in range(0, rows, shard_size)
+    ]
+    merged = heapq.merge(*(future.result() for future in futures), key=lambda item: item[0], reverse=True)
+    best = [item for _, item in zip(range(k), merged)]
+    return (
+        np.array([index for _, index in best], dtype=np.int64),
+        np.array([score for score, _ in best], dtype=np.float32),
+    )
@@ -0,0 +1,284 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import desc, func
+from sqlalchemy.orm import Session
+
+from src.backend.db.database import for_each_shard, session_scope
+from src.backend.models.semantic_memory import Memory
+from src.backend.services.cold_tier_store import cold_segment_store
+from src.backend.services.dedup_service import DedupService
+from src.backend.services.embedding_model_service import EmbeddingModelService
+from src.backend.services.memory_service import MemoryService
+from src.backend.services.metrics_service import registry
+from src.backend.services.shared_vector_store import shared_vector_store
+from src.backend.services.tiering_service import TIERING_ENABLED
+from src.backend.services.vector_cache import VECTOR_CACHE_ENABLED, vector_cache
+from src.backend.services.vector_search import live_count
+
+logger = logging.getLogger(__name__)
+
+# When disabled, /ready reports ready as soon as the database is initialized
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+# Dopples warmed, ranked by memories written in the activity window
+WARMUP_TOP_DOPPLES = int(os.getenv("WARMUP_TOP_DOPPLES", "50"))
+# Most active users warmed per dopple; each (dopple, user) pair is one search scope
+WARMUP_USERS_PER_DOPPLE = int(os.getenv("WARMUP_USERS_PER_DOPPLE", "5"))
+WARMUP_ACTIVITY_DAYS = float(os.getenv("WARMUP_ACTIVITY_DAYS", "7"))
+# Scopes loaded at once; keeps warm-up from saturating the pool while traffic starts
+WARMUP_CONCURRENCY = int(os.getenv("WARMUP_CONCURRENCY", "4"))
+# Seconds after which /ready reports ready even if warm-up is still running; 0 waits indefinitely
+WARMUP_READY_TIMEOUT = float(os.getenv("WARMUP_READY_TIMEOUT", "300"))
+
+STATUS_DISABLED = "disabled"
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running"
+STATUS_COMPLETED = "completed"
+STATUS_FAILED = "failed"
+
+Scope = Tuple[str, str]
+
+
+class WarmupProgress:
+    """Thread-safe progress of the current warm-up run"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset(STATUS_PENDING if WARMUP_ENABLED else STATUS_DISABLED)
+
+    def reset(self, status: str, total: int = 0):
+        with self._lock:
+            self.status = status
+            self.total = total
+            self.warmed = 0
+            self.failed = 0
+            self.skipped = 0
+            self.vectors = 0
+            self.started_at: Optional[float] = time.monotonic() if status == STATUS_RUNNING else None
+            self.finished_at: Optional[float] = None
+            self.error: Optional[str] = None
+
+    def set_total(self, total: int):
+        with self._lock:
+            self.total = total
+
+    def record(self, vectors: Optional[int] = None, failed: bool = False, skipped: bool = False):
+        with self._lock:
+            if failed:
+                self.failed += 1
+            elif skipped:
+                self.skipped += 1
+            else:
+                self.warmed += 1
+                self.vectors += vectors or 0
+
+    def finish(self, status: str, error: Optional[str] = None):
+        with self._lock:
+            self.status = status
+            self.error = error
+            self.finished_at = time.monotonic()
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            now = time.monotonic()
+            elapsed = None
+            if self.started_at is not None:
+                elapsed = (self.finished_at or now) - self.started_at
+            done = self.warmed + self.failed + self.skipped
+            timed_out = (
+                self.status == STATUS_RUNNING and WARMUP_READY_TIMEOUT > 0
+                and elapsed is not None and elapsed >= WARMUP_READY_TIMEOUT
+            )
+            return {
+                "status": self.status,
+                "ready": self.status in (STATUS_COMPLETED, STATUS_FAILED, STATUS_DISABLED) or timed_out,
+                "timed_out": timed_out,
+                "scopes_total": self.total,
+                "scopes_warmed": self.warmed,
+                "scopes_failed": self.failed,
+                "scopes_skipped": self.skipped,
+                "progress": done / self.total if self.total else (1.0 if self.finished_at else 0.0),
+                "vectors": self.vectors,
+                "elapsed_seconds": round(elapsed, 3) if elapsed is not None else None,
+                "error": self.error,
+            }
+
+
+progress = WarmupProgress()
+
+registry.gauge(
+    "warmup",
+    "Progress of the startup cache warm-up",
+    ["stat"],
+    callback=lambda: {
+        (key,): float(value) for key, value in progress.snapshot().items()
+        if isinstance(value, (int, float))
+    },
+)
+
+
+class WarmupService:
+    """Service that preloads search state for the most active dopples"""
+
+    @staticmethod
+    def select_scopes(
+        top_dopples: int = WARMUP_TOP_DOPPLES,
+        users_per_dopple: int = WARMUP_USERS_PER_DOPPLE,
+        activity_days: float = WARMUP_ACTIVITY_DAYS,
+        db: Optional[Session] = None
+    ) -> List[Scope]:
+        """
+        Rank (dopple, user) search scopes by recent write activity
+
+        Args:
+            top_dopples: Number of dopples to warm
+            users_per_dopple: Most active users kept per dopple
+            activity_days: Only memories written in this many days count as activity
+            db: Optional session
+
+        Returns:
+            Scopes, hottest dopple first and its most active user first
+        """
+        since = datetime.utcnow() - timedelta(days=activity_days)
+        activity = func.count(Memory.id)
+
+        def rank(session: Session) -> Tuple[List[Tuple[str, int]], List[Tuple[str, str, int]]]:
+            # Each shard ranks its own dopples; a dopple lives on a single shard
+            dopples = (
+                session.query(Memory.dopple_id, activity)
+                .filter(Memory.timestamp >= since)
+                .group_by(Memory.dopple_id)
+                .order_by(desc(activity))
+                .limit(top_dopples)
+                .all()
+            )
+            if not dopples:
+                return [], []
+            pairs = (
+                session.query(Memory.dopple_id, Memory.user_id, activity)
+                .filter(Memory.timestamp >= since, Memory.dopple_id.in_([dopple_id for dopple_id, _ in dopples]))
+                .group_by(Memory.dopple_id, Memory.user_id)
+                .order_by(desc(activity))
+                .all()
+            )
+            return dopples, pairs
+
+        ranked = for_each_shard(rank, db)
+        counts = sorted(
+            (row for shard_dopples, _ in ranked for row in shard_dopples), key=lambda row: row[1], reverse=True
+        )
+        dopples = [dopple_id for dopple_id, _ in counts[:top_dopples]]
+        if not dopples:
+            return []
+        pairs = sorted((row for _, shard_pairs in ranked for row in shard_pairs), key=lambda row: row[2], reverse=True)
+
+        users: Dict[str, List[str]] = {dopple_id: [] for dopple_id in dopples}
+        for dopple_id, user_id, _ in pairs:
+            if dopple_id in users and len(users[dopple_id]) < users_per_dopple:
+                users[dopple_id].append(user_id)
+        return [(dopple_id, user_id) for dopple_id in dopples for user_id in users[dopple_id]]
+
+    @staticmethod
+    def warm_scope(dopple_id: str, user_id: str, model: str) -> int:
+        """
+        Load one scope's dedup policy, hot vectors and cold segment into their caches
+
+        Args:
+            dopple_id: Dopple ID
+            user_id: User ID
+            model: Active embedding model
+
+        Returns:
+            Number of hot vectors loaded
+        """
+        with session_scope(dopple_id=dopple_id) as db:
+            DedupService.get_policy(dopple_id, db=db)
+            rows = MemoryService._get_vectors(db, dopple_id, user_id, model)
+            if TIERING_ENABLED and cold_segment_store is not None:
+                MemoryService._get_cold_vectors(db, dopple_id, user_id, model)
+        return live_count(rows)
+
+    @staticmethod
+    def run(concurrency: int = WARMUP_CONCURRENCY) -> Dict:
+        """
+        Warm the most active scopes, hottest first, with a bounded number in flight
+
+        Stops early once the per-process vector cache is full, since loading more
+        would only evict the hotter scopes warmed before.
+
+        Args:
+            concurrency: Scopes loaded at once
+
+        Returns:
+            Progress snapshot after the run
+        """
+        progress.reset(STATUS_RUNNING)
+        try:
+            model = EmbeddingModelService.get_active_model()
+            scopes = WarmupService.select_scopes()
+        except Exception as e:
+            logger.error(f"Warm-up failed to select scopes: {str(e)}")
+            progress.finish(STATUS_FAILED, str(e))
+            return progress.snapshot()
+        progress.set_total(len(scopes))
+
+        def warm(scope: Scope):
+            if _stop.is_set() or _cache_full():
+                progress.record(skipped=True)
+                return
+            try:
+                progress.record(WarmupService.warm_scope(scope[0], scope[1], model))
+            except Exception as e:
+                logger.warning(f"Warm-up of {scope} failed: {str(e)}")
+                progress.record(failed=True)
+
+        with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="warmup") as pool:
+            list(pool.map(warm, scopes))
+        progress.finish(STATUS_COMPLETED)
+        snapshot = progress.snapshot()
+        logger.info(
+            f"Warm-up completed in {snapshot['elapsed_seconds']}s: {snapshot['scopes_warmed']}/{snapshot['scopes_total']} "
+            f"scopes, {snapshot['vectors']} vectors ({snapshot['scopes_skipped']} skipped, {snapshot['scopes_failed']} failed)"
+        )
+        return snapshot
+
+
+def _cache_full() -> bool:
+    if shared_vector_store is not None or not VECTOR_CACHE_ENABLED:
+        return False
+    return vector_cache.bytes >= vector_cache.max_bytes
+
+
+_warmup_thread: Optional[threading.Thread] = None
+_stop = threading.Event()
+
+
+def start_warmup() -> bool:
+    """
+    Start warming caches in a background thread
+
+    Returns:
+        True if a warm-up was started
+    """
+    global _warmup_thread
+    if not WARMUP_ENABLED or (_warmup_thread is not None and _warmup_thread.is_alive()):
+        return False
+    _stop.clear()
+    _warmup_thread = threading.Thread(target=WarmupService.run, name="warmup", daemon=True)
+    _warmup_thread.start()
+    return True
+
+
+def stop_warmup():
+    """Skip the scopes a running warm-up has not started yet"""
+    _stop.set()
+
+
+def get_status() -> Dict:
+    """Warm-up progress, including whether the process should receive traffic yet"""
+    return progress.snapshot()
@@ -0,0 +1,73 @@
+"""
+Shared test setup
+
+The database, shard router and provider client read their configuration at
+import time, so the environment is set here, before any test imports
+src.backend: every test run uses three SQLite shards in a temporary
+directory and a local stand-in for the OpenAI API (benchmarks.stub_openai).
+Child processes started by tests inherit the same environment.
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from typing import Dict, Optional
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SHARDS = ("s0", "s1", "s2")
+
+_data_dir = tempfile.mkdtemp(prefix="semantic-memory-tests-")
+os.environ["DATABASE_SHARDS"] = ",".join(
+    f"{name}=sqlite:///{os.path.join(_data_dir, name + '.db')}" for name in SHARDS
+)
+os.environ["DATABASE_SHARD_MAP"] = os.path.join(_data_dir, "shard_map.json")
+os.environ["SHARD_MAP_RELOAD_SECONDS"] = "0.1"
+os.environ["OPENAI_API_KEY"] = "test"
+os.environ["WARMUP_ENABLED"] = "false"
+os.environ["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")]))
+for name in ("DATABASE_URL", "DATABASE_REPLICA_URLS", "VECTOR_STORE_DIR", "COLD_SEGMENT_DIR", "ADMIN_API_TOKEN"):
+    os.environ.pop(name, None)
+
+from benchmarks.stub_openai import start_stub_server  # noqa: E402  (needs the environment above)
+
+_stub, _stub_url = start_stub_server()
+os.environ["OPENAI_BASE_URL"] = _stub_url
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    """Create the schema and seed data on every shard once per run"""
+    from src.backend.db.database import bootstrap_db
+
+    bootstrap_db()
+    yield
+    _stub.shutdown()
+    shutil.rmtree(_data_dir, ignore_errors=True)
+
+
+@pytest.fixture
+def stub():
+    """The stub OpenAI server; its settings are restored after the test"""
+    config = _stub.config
+    saved = dict(vars(config))
+    yield _stub
+    for key in ("latency_ms", "jitter_ms", "error_rate", "rpm_limit", "retry_after"):
+        setattr(config, key, saved[key])
+
+
+@pytest.fixture
+def run_python():
+    """Run code in a separate interpreter (another worker) with the test environment plus env; returns its stdout"""
+
+    def run(code: str, timeout: float = 60, env: Optional[Dict[str, str]] = None) -> str:
+        completed = subprocess.run(
+            [sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, timeout=timeout,
+            env={**os.environ, **(env or {})},
+        )
+        assert completed.returncode == 0, f"Child process failed:\n{completed.stderr}"
+        return completed.stdout
+
+    return run
@@ -0,0 +1,73 @@
+"""The batch search endpoint answers like one single search per query"""
+import uuid
+
+from fastapi.testclient import TestClient
+
+from src.backend.main import app
+from src.backend.services.memory_service import MemoryService
+
+QUERIES = ["What do I like about cooking?", "Tell me about hiking", "Any plans for travel?"]
+TEXTS = [
+    f"{phrase} {topic}" for topic in ("cooking", "hiking", "travel", "music")
+    for phrase in ("I love", "Lately I think a lot about", "My friend hates")
+]
+
+
+def seed() -> str:
+    dopple_id = f"dopple-{uuid.uuid4().hex[:8]}"
+    for text in TEXTS:
+        MemoryService.store_memory(text, dopple_id, "user-1", "user")
+    return dopple_id
+
+
+def single(client: TestClient, dopple_id: str, text: str, top_k: int):
+    response = client.post("/api/memory/search/similar", json={
+        "text": text, "dopple_id": dopple_id, "user_id": "user-1", "top_k": top_k, "similarity_threshold": -1.0,
+    })
+    assert response.status_code == 200
+    return [(result["id"], result["similarity"]) for result in response.json()]
+
+
+def batch(client: TestClient, dopple_id: str, top_k: int, deduplicate: bool):
+    response = client.post("/api/memory/search/similar/batch", json={
+        "queries": QUERIES, "dopple_id": dopple_id, "user_id": "user-1", "top_k": top_k,
+        "similarity_threshold": -1.0, "deduplicate": deduplicate,
+    })
+    assert response.status_code == 200
+    return [[(result["id"], result["similarity"]) for result in results] for results in response.json()]
+
+
+def test_batch_results_equal_single_searches():
+    client = TestClient(app)
+    dopple_id = seed()
+    batched = batch(client, dopple_id, top_k=4, deduplicate=False)
+    assert len(batched) == len(QUERIES)
+    for query, results in zip(QUERIES, batched):
+        expected = single(client, dopple_id, query, top_k=4)
+        assert [memory_id for memory_id, _ in results] == [memory_id for memory_id, _ in expected]
+        assert all(abs(a - b) < 1e-5 for (_, a), (_, b) in zip(results, expected))
+
+
+def test_deduplicated_batch_returns_each_memory_under_its_best_query():
+    client = TestClient(app)
+    dopple_id = seed()
+    top_k = 4
+    batched = batch(client, dopple_id, top_k=top_k, deduplicate=True)
+
+    returned = [memory_id for results in batched for memory_id, _ in results]
+    assert len(returned) == len(set(returned)) == top_k * len(QUERIES)
+
+    similarities = [dict(single(client, dopple_id, query, top_k=len(TEXTS))) for query in QUERIES]
+    def filled_before(q: int, memory_id: str) -> bool:
+        """Query q's results were full of memories it matches at least as well"""
+        return len(batched[q]) == top_k and all(
+            similarities[q][other] >= similarities[q][memory_id] for other, _ in batched[q]
+        )
+
+    for q, results in enumerate(batched):
+        for memory_id, similarity in results:
+            assert abs(similarity - similarities[q][memory_id]) < 1e-5
+            best = max(range(len(QUERIES)), key=lambda other: similarities[other][memory_id])
+            assert best == q or filled_before(best, memory_id)
+    for memory_id in set(similarities[0]) - set(returned):
+        assert all(filled_before(q, memory_id) for q in range(len(QUERIES)))
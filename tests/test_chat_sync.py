@@ -0,0 +1,57 @@
+"""Chat sync against a SQLite stand-in for chat_messages: dedup and replays from an earlier checkpoint"""
+import json
+import sqlite3
+import uuid
+
+from src.backend.db.database import for_each_shard, session_scope
+from src.backend.models.semantic_memory import ArchivedMemory, ChatSyncState, Memory
+from src.backend.services.chat_sync_service import STATE_NAME
+
+SYNC = "from src.backend.services.chat_sync_service import main; main({argv!r})"
+
+
+def test_replayed_batches_store_nothing_twice(tmp_path, run_python):
+    source = tmp_path / "chat.db"
+    env = {"CHAT_SYNC_SOURCE_URL": f"sqlite:///{source}", "CHAT_SYNC_MOCK": "true"}
+    dopple_id, user_id = f"dopple-{uuid.uuid4().hex[:8]}", "42"
+
+    assert json.loads(run_python(SYNC.format(argv=["create-source"]), env=env)) == {"created": "chat_messages"}
+    texts = [
+        ("user", "I adopted a cat named Miso"),
+        ("assistant", "What a lovely name!"),
+        ("user", "thanks"),
+        ("system", "You are a helpful dopple"),
+        ("user", "Thanks "),
+    ]
+    with sqlite3.connect(source) as connection:
+        connection.executemany(
+            "INSERT INTO chat_messages (id, user_id, dopple_id, conversation_id, role, content, timestamp) "
+            "VALUES (?, ?, ?, 'conversation-1', ?, ?, ?)",
+            [(f"{dopple_id}-{i}", user_id, dopple_id, role, text, 1_700_000_000_000 + i) for i, (role, text) in enumerate(texts)],
+        )
+
+    first = json.loads(run_python(SYNC.format(argv=["run"]), env=env))
+    assert first["read"] == 5 and first["skipped"] == 1 and first["caught_up"]
+
+    def memories():
+        with session_scope(dopple_id=dopple_id) as db:
+            return {
+                memory.text: memory.occurrences
+                for memory in db.query(Memory).filter(Memory.dopple_id == dopple_id)
+            }
+
+    # The repeated "thanks" is merged like any other write to the dopple
+    assert memories() == {"I adopted a cat named Miso": 1, "What a lovely name!": 1, "thanks": 2}
+
+    with session_scope() as db:
+        db.query(ChatSyncState).filter(ChatSyncState.name == STATE_NAME).update(
+            {ChatSyncState.cursor_timestamp: None, ChatSyncState.cursor_id: None}
+        )
+    replay = json.loads(run_python(SYNC.format(argv=["run"]), env=env))
+    assert replay["read"] == 5 and replay["stored"] == 0 and replay["duplicates"] == 4
+
+    assert memories() == {"I adopted a cat named Miso": 1, "What a lovely name!": 1, "thanks": 2}
+    archived = sum(for_each_shard(
+        lambda db: db.query(ArchivedMemory).filter(ArchivedMemory.dopple_id == dopple_id).count()
+    ))
+    assert archived == 1
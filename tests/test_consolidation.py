@@ -0,0 +1,83 @@
+"""Consolidation clusters old memories into summaries, archives the originals and keeps their provenance"""
+import uuid
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from src.backend.db.database import session_scope
+from src.backend.models.semantic_memory import Memory
+from src.backend.services import consolidation_service
+from src.backend.services.consolidation_service import ConsolidationService
+from src.backend.services.memory_service import MemoryService
+
+DIM = 16
+
+
+def old_memories(dopple_id: str, rng, clusters: int, size: int, outliers: int, days_ago: float):
+    """Memories around `clusters` directions plus unrelated outliers, one hour apart, oldest first"""
+    vectors = []
+    for _ in range(clusters):
+        center = rng.standard_normal(DIM)
+        center /= np.linalg.norm(center)
+        vectors.extend(center + 0.05 * rng.standard_normal(DIM) for _ in range(size))
+    vectors.extend(rng.standard_normal(DIM) for _ in range(outliers))
+    start = datetime.utcnow() - timedelta(days=days_ago)
+    return MemoryService.store_memories_bulk([
+        {
+            "text": f"Old memory {i}", "dopple_id": dopple_id, "user_id": "user-1", "role": "user",
+            "importance": 2, "timestamp": start + timedelta(hours=i), "embedding": vector.tolist(),
+        }
+        for i, vector in enumerate(vectors)
+    ], generate_embeddings=False, deduplicate=False)
+
+
+def live_memories(dopple_id: str):
+    with session_scope(dopple_id=dopple_id) as db:
+        return {
+            memory.id: memory.memory_metadata
+            for memory in db.query(Memory).filter(Memory.dopple_id == dopple_id)
+        }
+
+
+def test_clusters_are_archived_behind_summaries_with_provenance():
+    dopple_id = f"dopple-{uuid.uuid4().hex[:8]}"
+    rng = np.random.default_rng(1)
+    ids = old_memories(dopple_id, rng, clusters=2, size=3, outliers=2, days_ago=100)
+    recent = MemoryService.store_memory("A recent memory", dopple_id, "user-1", "user", importance=2)
+
+    report = ConsolidationService.run(dopple_id=dopple_id)
+    assert (report["clusters"], report["archived"], report["summaries"]) == (2, 6, 2)
+    assert report["net_reduction"] == 4
+
+    live = live_memories(dopple_id)
+    summaries = {memory_id: metadata for memory_id, metadata in live.items() if (metadata or {}).get("consolidation")}
+    assert len(summaries) == 2
+    # Outliers and memories younger than the minimum age stay as they are
+    assert set(live) - set(summaries) == {ids[6], ids[7], recent}
+
+    for cluster, (summary_id, metadata) in zip((ids[0:3], ids[3:6]), sorted(
+        summaries.items(), key=lambda item: item[1]["consolidation"]["first_timestamp"]
+    )):
+        assert metadata["consolidation"]["source_ids"] == cluster
+        sources = ConsolidationService.get_sources(summary_id)
+        assert [source["id"] for source in sources] == cluster
+        assert all(source["summary_id"] == summary_id for source in sources)
+        assert MemoryService.get_memory(cluster[0]) is None
+
+    # A second run finds nothing new to merge
+    assert ConsolidationService.run(dopple_id=dopple_id)["archived"] == 0
+
+
+def test_earlier_summaries_do_not_take_up_the_candidate_limit(monkeypatch):
+    dopple_id = f"dopple-{uuid.uuid4().hex[:8]}"
+    rng = np.random.default_rng(2)
+    old_memories(dopple_id, rng, clusters=2, size=3, outliers=0, days_ago=100)
+    assert ConsolidationService.run(dopple_id=dopple_id)["summaries"] == 2
+
+    # Newer than both summaries, which are now the oldest eligible memories
+    newer = old_memories(dopple_id, rng, clusters=1, size=3, outliers=0, days_ago=60)
+    monkeypatch.setattr(consolidation_service, "CONSOLIDATION_MAX_CANDIDATES", 3)
+    report = ConsolidationService.run(dopple_id=dopple_id)
+    assert report["candidates"] == 3
+    assert report["archived"] == 3
+    assert set(newer).isdisjoint(live_memories(dopple_id))
@@ -0,0 +1,54 @@
+"""Context packing stays within its token budget, fills it with smaller memories and can order by time"""
+from datetime import datetime
+
+from src.backend.services.context_service import ContextService, _line_overhead
+
+
+def item(memory_id: str, token_count: int, timestamp=None, role: str = "user") -> dict:
+    return {
+        "id": memory_id, "role": role, "timestamp": timestamp, "text": f"text of {memory_id}",
+        "token_count": token_count, "similarity": 0.9,
+    }
+
+
+def test_budget_counts_line_overheads():
+    overhead = _line_overhead("user")
+    items = [item("a", 10), item("b", 10)]
+
+    # The bare token counts fit, but not with the second line's prefix and newline
+    packed = ContextService.pack(items, 20 + overhead)
+    assert [memory["id"] for memory in packed["memories"]] == ["a"]
+    assert packed["tokens"] == 10 + overhead
+    assert packed["skipped"] == 1
+
+    packed = ContextService.pack(items, 20 + 2 * overhead)
+    assert [memory["id"] for memory in packed["memories"]] == ["a", "b"]
+    assert packed["tokens"] == packed["max_tokens"]
+    assert packed["context"] == "user: text of a\nuser: text of b"
+
+
+def test_skipped_memories_leave_budget_for_smaller_ones():
+    overhead = _line_overhead("user")
+    items = [item("a", 30), item("big", 50), item("b", 10), item("c", 5)]
+
+    packed = ContextService.pack(items, 45 + 3 * overhead)
+    assert [memory["id"] for memory in packed["memories"]] == ["a", "b", "c"]
+    assert packed["candidates"] == 4
+    assert packed["skipped"] == 1
+
+
+def test_chronological_order_tolerates_missing_timestamps():
+    items = [
+        item("late", 5, datetime(2024, 3, 1)),
+        item("undated", 5),
+        item("early", 5, datetime(2024, 1, 1)),
+        item("undated-2", 5),
+    ]
+
+    packed = ContextService.pack(items, 1000)
+    assert [memory["id"] for memory in packed["memories"]] == ["late", "undated", "early", "undated-2"]
+
+    packed = ContextService.pack(items, 1000, chronological=True)
+    assert [memory["id"] for memory in packed["memories"]] == ["undated", "undated-2", "early", "late"]
+    assert packed["memories"][0]["timestamp"] is None
+    assert packed["memories"][2]["timestamp"] == "2024-01-01T00:00:00"
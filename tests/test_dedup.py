@@ -0,0 +1,44 @@
+"""Repeated memories are merged into the speaker's earlier memory instead of being stored again"""
+import uuid
+
+from src.backend.services.dedup_service import DedupService
+from src.backend.services.memory_service import MemoryService
+from src.backend.services.memory_tagger_service import TOPICS
+
+
+def new_dopple() -> str:
+    return f"dopple-{uuid.uuid4().hex[:8]}"
+
+
+def test_exact_repeats_are_merged():
+    dopple_id = new_dopple()
+    first = MemoryService.store_memory("I love rainy days", dopple_id, "user-1", "user", importance=4)
+    # Case and whitespace do not make a text new
+    again = MemoryService.store_memory("  i LOVE rainy   days ", dopple_id, "user-1", "user", importance=3)
+    assert again == first
+    memory = MemoryService.get_memory(first)
+    assert memory["occurrences"] == 2
+    # Repetition bumps importance by one above the larger of the two
+    assert memory["importance"] == 5
+
+    # Another speaker, user or dopple keeps its own memory
+    assert MemoryService.store_memory("I love rainy days", dopple_id, "user-1", "dopple") != first
+    assert MemoryService.store_memory("I love rainy days", dopple_id, "user-2", "user") != first
+    assert MemoryService.store_memory("I love rainy days", new_dopple(), "user-1", "user") != first
+
+
+def test_near_duplicates_are_merged_above_the_policy_threshold():
+    dopple_id = new_dopple()
+    # Stub embeddings of texts about the same topic are about 0.85 similar, other topics about 0
+    DedupService.set_policy(dopple_id, {"similarity_threshold": 0.8, "bump_importance": False})
+    first = MemoryService.store_memory(f"We talked about {TOPICS[1]} today", dopple_id, "user-1", "user", importance=3)
+    similar = MemoryService.store_memory(f"More thoughts on {TOPICS[1]}", dopple_id, "user-1", "user", importance=6)
+    other = MemoryService.store_memory(f"We talked about {TOPICS[2]} today", dopple_id, "user-1", "user")
+    assert similar == first
+    assert other != first
+    memory = MemoryService.get_memory(first)
+    assert memory["occurrences"] == 2
+    assert memory["importance"] == 6
+
+    DedupService.set_policy(dopple_id, {"enabled": False})
+    assert MemoryService.store_memory(f"We talked about {TOPICS[1]} today", dopple_id, "user-1", "user") != first
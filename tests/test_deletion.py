@@ -0,0 +1,100 @@
+"""Bulk deletes remove every row of the matching memories in small batches and keep caches consistent"""
+import uuid
+
+from src.backend.db.database import get_db
+from src.backend.models.semantic_memory import (
+    ArchivedMemory, Embedding, Memory, SearchVersion,
+    memory_emotion_association, memory_topic_association, memory_trait_association,
+)
+from src.backend.services.deletion_service import DeletionService
+from src.backend.services.memory_service import MemoryService
+from src.backend.services.search_cache import read_version, search_cache
+from src.backend.services.vector_cache import vector_cache
+
+
+def store(dopple_id: str, user_id: str, count: int) -> list:
+    return MemoryService.store_memories_bulk([
+        {
+            "text": f"I cook dish number {index} for {user_id}", "dopple_id": dopple_id, "user_id": user_id,
+            "role": "user", "emotions": ["happy"], "topics": ["hobbies"], "traits": ["curious"],
+        }
+        for index in range(count)
+    ], deduplicate=False)
+
+
+def search(dopple_id: str) -> set:
+    results = MemoryService.find_similar_memories(
+        "what do I cook", dopple_id, top_k=50, similarity_threshold=-1.0
+    )
+    return {result["id"] for result in results}
+
+
+def remaining(dopple_id: str, memory_ids: list) -> dict:
+    with get_db(dopple_id=dopple_id) as db:
+        links = {
+            association.name: db.execute(
+                association.select().where(association.c.memory_id.in_(memory_ids))
+            ).fetchall()
+            for association in (memory_emotion_association, memory_topic_association, memory_trait_association)
+        }
+        return {
+            "memories": db.query(Memory).filter(Memory.id.in_(memory_ids)).count(),
+            "embeddings": db.query(Embedding).filter(Embedding.memory_id.in_(memory_ids)).count(),
+            "links": sum(len(rows) for rows in links.values()),
+        }
+
+
+def test_forget_user_deletes_in_batches_and_tombstones_cached_vectors():
+    dopple_id = f"dopple-{uuid.uuid4().hex[:8]}"
+    forgotten = store(dopple_id, "user-1", 5)
+    kept = store(dopple_id, "user-2", 2)
+    with get_db(dopple_id=dopple_id) as db:
+        for index in range(3):
+            db.add(ArchivedMemory(
+                id=str(uuid.uuid4()), dopple_id=dopple_id, user_id="user-1", text=f"old dish {index}", role="user",
+            ))
+        db.commit()
+        versions_before = read_version(db, dopple_id)
+    assert remaining(dopple_id, forgotten) == {"memories": 5, "embeddings": 5, "links": 15}
+
+    # Load the dopple-wide vector entry and cache the dopple-wide search
+    assert search(dopple_id) == set(forgotten) | set(kept)
+    entry = vector_cache._entries[(dopple_id, None)]
+    misses = search_cache.misses
+    assert search(dopple_id) == set(forgotten) | set(kept)
+    assert search_cache.misses == misses
+
+    report = DeletionService.delete_memories(dopple_id=dopple_id, user_id="user-1", batch_size=2)
+    # Three memory batches, two archived batches and one search version batch
+    assert report == {"memories": 5, "archived_memories": 3, "search_versions": 1, "batches": 6}
+    assert remaining(dopple_id, forgotten) == {"memories": 0, "embeddings": 0, "links": 0}
+    assert remaining(dopple_id, kept) == {"memories": 2, "embeddings": 2, "links": 6}
+    with get_db(dopple_id=dopple_id) as db:
+        assert db.query(ArchivedMemory).filter(ArchivedMemory.dopple_id == dopple_id).count() == 0
+        assert db.query(SearchVersion).filter(
+            SearchVersion.dopple_id == dopple_id, SearchVersion.user_id == "user-1"
+        ).count() == 0
+        # The dopple-wide version drops to the remaining user's, so it no longer matches the cached one
+        versions_after = read_version(db, dopple_id)
+        assert versions_after == read_version(db, dopple_id, "user-2")
+    assert versions_after != versions_before
+
+    # The deleted rows were tombstoned in the loaded entry before it was dropped with the version rows
+    assert entry.dead == 5
+    assert (dopple_id, None) not in vector_cache._entries
+    misses = search_cache.misses
+    assert search(dopple_id) == set(kept)
+    assert search_cache.misses == misses + 1
+
+
+def test_filtered_deletes_keep_search_versions():
+    dopple_id = f"dopple-{uuid.uuid4().hex[:8]}"
+    store(dopple_id, "user-1", 3)
+    with get_db(dopple_id=dopple_id) as db:
+        version = read_version(db, dopple_id, "user-1")
+
+    report = DeletionService.delete_memories(dopple_id=dopple_id, user_id="user-1", topics=["hobbies"], batch_size=2)
+    assert report == {"memories": 3, "archived_memories": 0, "search_versions": 0, "batches": 2}
+    with get_db(dopple_id=dopple_id) as db:
+        # Tag-filtered deletes only bump the pair's version, once per batch
+        assert read_version(db, dopple_id, "user-1") == version + 2
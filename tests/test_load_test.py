@@ -0,0 +1,44 @@
+"""Smoke run of the end-to-end load test (benchmarks/load_test.py) with a small corpus and a few users"""
+import json
+import subprocess
+import sys
+
+from benchmarks.load_test import OPERATIONS
+
+ROUTES = {
+    "store": "POST /api/memory/store",
+    "similar": "POST /api/memory/search/similar",
+    "metadata": "POST /api/memory/search/metadata",
+    "stats": "GET /api/memory/stats/{dopple_id}",
+    "context": "POST /api/memory/context",
+}
+
+
+def test_load_test_smoke(tmp_path):
+    output = tmp_path / "load.json"
+    completed = subprocess.run(
+        [
+            sys.executable, "-m", "benchmarks.load_test",
+            "--db-url", f"sqlite:///{tmp_path / 'load.db'}",
+            "--seed-memories", "200", "--dopples", "3", "--users", "5", "--dim", "64",
+            "--duration", "2", "--warmup", "0.5", "--concurrency", "4",
+            "--stub-latency-ms", "0", "--stub-jitter-ms", "0",
+            "--mix", ",".join(f"{operation}=1" for operation in OPERATIONS),
+            "--output", str(output),
+        ],
+        capture_output=True, text=True, timeout=180,
+    )
+    assert completed.returncode == 0, completed.stderr
+
+    report = json.loads(output.read_text())
+    results = report["results"]["c4"]
+    assert report["meta"]["database"] == "sqlite"
+    assert set(results) == set(ROUTES.values()) | {"all"}
+    for route in ROUTES.values():
+        assert results[route]["requests"] > 0, route
+    assert results["all"]["requests"] == sum(results[route]["requests"] for route in ROUTES.values())
+    assert results["all"]["errors"] == 0
+    assert results["all"]["error_rate"] == 0.0
+    assert results["all"]["statuses"] == {"200": results["all"]["requests"]}
+    assert 0 < results["all"]["p50_ms"] <= results["all"]["p95_ms"] <= results["all"]["p99_ms"]
+    assert report["meta"]["server_health"] is not None
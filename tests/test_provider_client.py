@@ -0,0 +1,197 @@
+"""Retries, circuit breaking and rate limiting of the provider client against a scripted local server"""
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import openai
+import pytest
+
+from src.backend.services import provider_client
+from src.backend.services.provider_client import (
+    CIRCUIT_CLOSED, CIRCUIT_HALF_OPEN, CIRCUIT_OPEN, CircuitBreaker, CircuitOpenError, ProviderBusy, ProviderClient,
+    TokenBucket,
+)
+
+OPERATION = "embedding"
+
+
+class ScriptedServer:
+    """Answers each request with the next scripted status (200 with an embedding once the script runs out)"""
+
+    def __init__(self):
+        self.script = deque()
+        self.requests = []
+        script, requests = self.script, self.requests
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                requests.append(time.monotonic())
+                status, headers = script.popleft() if script else (200, {})
+                if status == 200:
+                    body = {
+                        "object": "list",
+                        "data": [{"object": "embedding", "index": 0, "embedding": [0.1, 0.2, 0.3]}],
+                        "model": "test",
+                        "usage": {"prompt_tokens": 1, "total_tokens": 1},
+                    }
+                else:
+                    body = {"error": {"message": f"status {status}", "type": "test", "code": None}}
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def respond(self, *statuses, **headers):
+        self.script.extend((status, dict(headers)) for status in statuses)
+
+
+@pytest.fixture
+def server():
+    server = ScriptedServer()
+    yield server
+    server.server.shutdown()
+
+
+@pytest.fixture
+def client(server, monkeypatch):
+    monkeypatch.setattr(provider_client, "OPENAI_BACKOFF_BASE", 0.01)
+    monkeypatch.setattr(provider_client, "OPENAI_BACKOFF_MAX", 1.0)
+    monkeypatch.setattr(provider_client, "OPENAI_MAX_ATTEMPTS", 4)
+    client = ProviderClient(requests_per_minute=0, tokens_per_minute=0)
+    client._client = openai.OpenAI(api_key="test", base_url=server.url, max_retries=0, timeout=5)
+    return client
+
+
+def embed(client: ProviderClient):
+    return client.call(OPERATION, lambda sdk: sdk.embeddings.create(model="test", input="hello"), tokens=1)
+
+
+def use_breaker(client: ProviderClient, **settings) -> CircuitBreaker:
+    breaker = client._breakers[OPERATION] = CircuitBreaker(**settings)
+    return breaker
+
+
+def test_429_is_retried_after_retry_after(client, server):
+    server.respond(429, 429, **{"Retry-After": "0.2"})
+
+    assert embed(client).data[0].embedding == [0.1, 0.2, 0.3]
+    assert len(server.requests) == 3
+    # The provider's Retry-After outweighs the short jittered backoff
+    assert server.requests[1] - server.requests[0] >= 0.2
+    assert server.requests[2] - server.requests[1] >= 0.2
+    assert client.breaker(OPERATION).state == CIRCUIT_CLOSED
+
+
+def test_retries_stop_after_max_attempts(client, server):
+    server.respond(429, 429, 429, 429, 429)
+
+    with pytest.raises(openai.RateLimitError):
+        embed(client)
+    assert len(server.requests) == 4
+
+
+def test_client_errors_are_not_retried(client, server):
+    server.respond(400)
+
+    with pytest.raises(openai.BadRequestError):
+        embed(client)
+    assert len(server.requests) == 1
+
+
+def test_circuit_opens_fails_fast_and_closes_after_probe(client, server, monkeypatch):
+    monkeypatch.setattr(provider_client, "OPENAI_MAX_ATTEMPTS", 1)
+    breaker = use_breaker(client, failure_ratio=0.5, window=2, reset_seconds=0.2)
+    server.respond(500, 500)
+
+    for _ in range(2):
+        with pytest.raises(openai.InternalServerError):
+            embed(client)
+    assert breaker.state == CIRCUIT_OPEN
+
+    with pytest.raises(CircuitOpenError):
+        embed(client)
+    assert len(server.requests) == 2
+
+    time.sleep(0.25)
+    embed(client)
+    assert breaker.state == CIRCUIT_CLOSED
+    assert len(server.requests) == 3
+
+
+def test_failed_probe_reopens_circuit(client, server, monkeypatch):
+    monkeypatch.setattr(provider_client, "OPENAI_MAX_ATTEMPTS", 1)
+    breaker = use_breaker(client, failure_ratio=0.5, window=2, reset_seconds=0.2)
+    server.respond(500, 500, 500)
+    for _ in range(2):
+        with pytest.raises(openai.InternalServerError):
+            embed(client)
+
+    time.sleep(0.25)
+    with pytest.raises(openai.InternalServerError):
+        embed(client)
+    assert breaker.state == CIRCUIT_OPEN
+    with pytest.raises(CircuitOpenError):
+        embed(client)
+
+
+def test_client_error_during_half_open_does_not_close_circuit(client, server, monkeypatch):
+    monkeypatch.setattr(provider_client, "OPENAI_MAX_ATTEMPTS", 1)
+    breaker = use_breaker(client, failure_ratio=0.5, window=2, reset_seconds=0.2)
+    server.respond(500, 500, 401)
+    for _ in range(2):
+        with pytest.raises(openai.InternalServerError):
+            embed(client)
+
+    time.sleep(0.25)
+    with pytest.raises(openai.AuthenticationError):
+        embed(client)
+    # The probe slot is released without judging the provider; the next call probes again
+    assert breaker.state == CIRCUIT_HALF_OPEN
+    embed(client)
+    assert breaker.state == CIRCUIT_CLOSED
+
+
+def test_token_bucket_spaces_out_requests(client, server):
+    # 10 requests per second with room for one at a time
+    client.requests = TokenBucket(600, burst_seconds=0.1)
+
+    start = time.monotonic()
+    for _ in range(3):
+        embed(client)
+    assert time.monotonic() - start >= 0.18
+    assert server.requests[2] - server.requests[0] >= 0.18
+
+
+def test_token_bucket_rejects_waits_beyond_queue_timeout(client, server, monkeypatch):
+    monkeypatch.setattr(provider_client, "OPENAI_QUEUE_TIMEOUT", 0.05)
+    client.requests = TokenBucket(60, burst_seconds=1)
+
+    embed(client)
+    with pytest.raises(ProviderBusy):
+        embed(client)
+    assert len(server.requests) == 1
+
+
+def test_token_bucket_reserves_in_arrival_order():
+    bucket = TokenBucket(600, burst_seconds=0.1)
+
+    assert bucket.reserve(1, timeout=1) == 0
+    assert bucket.reserve(1, timeout=1) == pytest.approx(0.1, abs=0.02)
+    assert bucket.reserve(1, timeout=1) == pytest.approx(0.2, abs=0.02)
+    with pytest.raises(ProviderBusy):
+        bucket.reserve(1, timeout=0.1)
@@ -0,0 +1,82 @@
+"""A re-embedding job resumes from its checkpoint in another worker and cuts over to the target model"""
+import json
+
+TARGET = "stub-embedding-v2"
+
+SETUP = """
+import json
+from src.backend.db.database import bootstrap_db
+from src.backend.services import reembedding_service
+from src.backend.services.memory_service import MemoryService
+from src.backend.services.reembedding_service import ReembeddingService
+
+bootstrap_db()
+for i in range(7):
+    MemoryService.store_memory(f"Memory {{i}} about gardening", f"dopple-{{i % 3}}", "user-1", "user")
+MemoryService.store_memory("   ", "dopple-0", "user-1", "user", generate_embedding=False)
+
+# This worker stops after two batches, as if it were killed, and never releases its lease
+reembedding_service._spawn = lambda job_id: False
+job = ReembeddingService.start_job({target!r}, batch_size=2)
+assert ReembeddingService._claim(job["id"])
+for _ in range(2):
+    assert ReembeddingService._run_batch(job["id"]) == "batch"
+print(json.dumps(ReembeddingService.get_job(job["id"])))
+"""
+
+RESUME = """
+import json
+from src.backend.db.database import for_each_shard, router
+from src.backend.services import reembedding_service
+from src.backend.services.embedding_model_service import EmbeddingModelService
+from src.backend.services.embedding_service import EmbeddingService
+from src.backend.services.memory_service import MemoryService
+from src.backend.services.reembedding_service import ReembeddingService
+
+embedded, connections_held = [], []
+generate = EmbeddingService.batch_generate_embeddings
+def recording(texts, model):
+    embedded.extend(texts)
+    connections_held.append(sum(engine.pool.checkedout() for engine in router.engines.values()))
+    return generate(texts, model)
+EmbeddingService.batch_generate_embeddings = recording
+
+[job] = ReembeddingService.list_jobs()
+ReembeddingService.run_job(job["id"])
+missing = sum(for_each_shard(lambda db: ReembeddingService._missing_query(db, {target!r}).count()))
+results = MemoryService.find_similar_memories("gardening", "dopple-1", "user-1", top_k=10, similarity_threshold=-1.0)
+print(json.dumps({{
+    "job": ReembeddingService.get_job(job["id"]),
+    "embedded": embedded,
+    "connections_held": connections_held,
+    "missing": missing,
+    "active_model": EmbeddingModelService.get_active_model(),
+    "results": len(results),
+}}))
+"""
+
+
+def test_job_resumes_from_its_checkpoint_and_cuts_over(tmp_path, run_python):
+    env = {
+        "DATABASE_SHARDS": ",".join(f"{name}=sqlite:///{tmp_path / name}.db" for name in ("s0", "s1")),
+        "DATABASE_SHARD_MAP": str(tmp_path / "shard_map.json"),
+        # A dead worker's lease lapses at once, and the cutover does not wait for other workers
+        "REEMBED_LEASE_SECONDS": "0",
+        "EMBEDDING_MODEL_REFRESH_SECONDS": "0",
+    }
+    interrupted = json.loads(run_python(SETUP.format(target=TARGET), env=env).splitlines()[-1])
+    assert interrupted["status"] == "running"
+    assert interrupted["processed"] == 4
+    assert interrupted["checkpoint"]["id"] is not None
+
+    resumed = json.loads(run_python(RESUME.format(target=TARGET), env=env).splitlines()[-1])
+    job = resumed["job"]
+    assert job["status"] == "completed"
+    assert job["processed"] == 7 and job["failed"] == 1
+    # Nothing committed before the interruption was embedded again
+    assert len(resumed["embedded"]) == 3
+    # No connection is checked out while the provider is called
+    assert resumed["connections_held"] and not any(resumed["connections_held"])
+    assert resumed["missing"] == 1  # the blank memory
+    assert resumed["active_model"] == TARGET
+    assert resumed["results"] == 2
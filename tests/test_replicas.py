@@ -0,0 +1,88 @@
+"""Reads go to replicas unless a scope was just written to, and fail over to the primary"""
+import json
+
+# The "replica" is a backup of the primary's SQLite file, refreshed by hand, so it
+# shows which database a read went to: rows written after the copy are missing from it
+WORKER = """
+import json, os, sqlite3, time
+from src.backend.db.database import bootstrap_db, get_replica_stats, replicas
+from src.backend.services.memory_service import MemoryService
+
+primary, replica_path = {primary!r}, {replica!r}
+[replica] = replicas.replicas["s0"]
+
+def copy_primary():
+    replica.engine.dispose()
+    if os.path.exists(replica_path):
+        os.remove(replica_path)
+    source, target = sqlite3.connect(primary), sqlite3.connect(replica_path)
+    source.backup(target)
+    source.close()
+    target.close()
+
+def count(user_id):
+    return MemoryService.get_memory_stats("dopple-1", user_id)["total_memories"]
+
+def report(step, **counts):
+    stats = get_replica_stats()
+    print(json.dumps({{"step": step, **counts, "primary_reads": stats["primary_reads"], **stats["replicas"][replica.name]}}))
+
+bootstrap_db()
+MemoryService.store_memory("Written before the copy", "dopple-1", "user-1", "user")
+MemoryService.store_memory("Also before the copy", "dopple-1", "user-2", "user")
+copy_primary()
+time.sleep(0.3)
+
+MemoryService.store_memory("Written after the copy", "dopple-1", "user-1", "user")
+report("pinned", written=count("user-1"), other=count("user-2"))
+time.sleep(0.3)
+report("unpinned", written=count("user-1"))
+
+# The replica breaks: its file is no longer a database
+os.remove(replica_path)
+with open(replica_path, "wb") as f:
+    f.write(b"not a database" * 100)
+replica.engine.dispose()
+report("failed_over", written=count("user-1"), again=count("user-1"))
+
+copy_primary()
+replicas.probe_all()
+report("recovered", written=count("user-1"))
+"""
+
+
+def test_replica_reads_pinning_and_failover(tmp_path, run_python):
+    primary, replica = tmp_path / "primary.db", tmp_path / "replica.db"
+    output = run_python(WORKER.format(primary=str(primary), replica=str(replica)), env={
+        "DATABASE_SHARDS": f"s0=sqlite:///{primary}",
+        "DATABASE_SHARD_MAP": str(tmp_path / "shard_map.json"),
+        "DATABASE_REPLICA_URLS": f"sqlite:///{replica}",
+        "REPLICA_PIN_SECONDS": "0.2",
+    })
+    steps = {step["step"]: step for step in map(json.loads, output.splitlines()) if "step" in step}
+
+    # The writer's own scope reads its write from the primary; other scopes use the replica
+    pinned = steps["pinned"]
+    assert pinned["written"] == 2
+    assert pinned["other"] == 1
+    assert pinned["reads"] == 1
+
+    # Once the pin lapses, the scope reads the (lagging) replica again
+    unpinned = steps["unpinned"]
+    assert unpinned["written"] == 1
+    assert unpinned["reads"] == 2
+    assert unpinned["healthy"]
+
+    # A failing replica is taken out of rotation and the read is rerun on the primary
+    failed_over = steps["failed_over"]
+    assert failed_over["written"] == failed_over["again"] == 2
+    assert not failed_over["healthy"]
+    assert failed_over["failures"] == 1
+    assert failed_over["last_error"]
+    assert failed_over["primary_reads"] >= 1
+
+    # The health probe puts it back once it answers again
+    recovered = steps["recovered"]
+    assert recovered["healthy"]
+    assert recovered["written"] == 2
+    assert recovered["reads"] == failed_over["reads"] + 1
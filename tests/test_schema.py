@@ -0,0 +1,45 @@
+"""Bootstrapping a database created by an older release adds the columns the models gained since"""
+import json
+import sqlite3
+
+# Tables as the first release created them, before dedup, tiering, model versioning and token counts
+OLD_SCHEMA = """
+CREATE TABLE memories (
+    id VARCHAR PRIMARY KEY, dopple_id VARCHAR NOT NULL, user_id VARCHAR NOT NULL, text TEXT NOT NULL,
+    role VARCHAR NOT NULL, timestamp DATETIME, importance INTEGER, metadata JSON
+);
+CREATE TABLE embeddings (
+    id VARCHAR PRIMARY KEY, memory_id VARCHAR NOT NULL UNIQUE REFERENCES memories (id), vector JSON NOT NULL,
+    model VARCHAR NOT NULL
+);
+INSERT INTO memories VALUES ('m1', 'dopple-old', 'user-1', 'I used to live in Lisbon', 'user', '2024-01-01 00:00:00', 5, NULL);
+"""
+
+BOOTSTRAP = """
+import json
+from src.backend.db.database import bootstrap_db, engine, schema_differences
+from src.backend.services.context_service import ContextService
+from src.backend.services.memory_service import MemoryService
+first = bootstrap_db()
+second = bootstrap_db()
+MemoryService.store_memory("I moved to Porto last year", "dopple-old", "user-1", "user")
+context = ContextService.build_context("Lisbon", "dopple-old", "user-1", similarity_threshold=-1.0)
+print(json.dumps({"first": first, "second": second, "missing": schema_differences(engine), "context": context["context"]}))
+"""
+
+
+def test_bootstrap_migrates_old_tables(tmp_path, run_python):
+    path = tmp_path / "old.db"
+    with sqlite3.connect(path) as connection:
+        connection.executescript(OLD_SCHEMA)
+
+    result = json.loads(run_python(BOOTSTRAP, env={"DATABASE_URL": f"sqlite:///{path}", "DATABASE_SHARDS": ""}))
+
+    assert result["first"]["schema"] == "applied"
+    assert result["second"] == {"schema": "current", "seed": "current"}
+    assert result["missing"] == []
+    assert "I moved to Porto last year" in result["context"]
+    with sqlite3.connect(path) as connection:
+        row = connection.execute("SELECT tier, occurrences, text_hash, token_count FROM memories WHERE id = 'm1'").fetchone()
+    # Existing rows get the column defaults
+    assert row == ("hot", 1, None, None)
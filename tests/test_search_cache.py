@@ -0,0 +1,85 @@
+"""Cached searches stay fresh when another worker process writes to the scope"""
+import threading
+import uuid
+
+from src.backend.services.memory_service import MemoryService
+from src.backend.services.search_cache import search_cache
+from src.backend.services.vector_cache import vector_cache
+
+STORE = """
+from src.backend.services.memory_service import MemoryService
+MemoryService.store_memory({text!r}, {dopple_id!r}, {user_id!r}, "user")
+"""
+
+
+def search(dopple_id: str, user_id: str):
+    return MemoryService.find_similar_memories(
+        "What does the user like to cook?", dopple_id, user_id, top_k=10, similarity_threshold=-1.0
+    )
+
+
+def test_search_sees_writes_from_another_process(run_python):
+    dopple_id, user_id = f"dopple-{uuid.uuid4().hex[:8]}", "user-1"
+    MemoryService.store_memory("I like to cook pasta on Sundays", dopple_id, user_id, "user")
+    MemoryService.store_memory("My favourite dish is a green curry", dopple_id, user_id, "user")
+
+    assert len(search(dopple_id, user_id)) == 2
+    hits = search_cache.hits
+    assert len(search(dopple_id, user_id)) == 2
+    assert search_cache.hits == hits + 1
+
+    # Neither this process's search cache nor its vector cache hears about this write
+    run_python(STORE.format(text="I bake sourdough bread every week", dopple_id=dopple_id, user_id=user_id))
+
+    stale = vector_cache.stale
+    texts = {memory["text"] for memory in search(dopple_id, user_id)}
+    assert "I bake sourdough bread every week" in texts
+    assert len(texts) == 3
+    assert vector_cache.stale == stale + 1
+
+
+def test_local_write_keeps_vector_cache_entry():
+    dopple_id, user_id = f"dopple-{uuid.uuid4().hex[:8]}", "user-1"
+    MemoryService.store_memory("I grow tomatoes on the balcony", dopple_id, user_id, "user")
+    assert len(search(dopple_id, user_id)) == 1
+
+    stale = vector_cache.stale
+    MemoryService.store_memory("Basil grows next to the tomatoes", dopple_id, user_id, "user")
+    assert len(search(dopple_id, user_id)) == 2
+    # The commit hook appended the row and advanced the entry's version, so nothing was rebuilt
+    assert vector_cache.stale == stale
+
+
+def test_search_after_a_write_does_not_join_an_older_search(monkeypatch):
+    dopple_id, user_id = f"dopple-{uuid.uuid4().hex[:8]}", "user-1"
+    MemoryService.store_memory("I like to cook pasta on Sundays", dopple_id, user_id, "user")
+
+    # Hold the first search after it has ranked the vectors it saw
+    ranked, release = threading.Event(), threading.Event()
+    rank_candidates = MemoryService._rank_candidates
+
+    def held_rank_candidates(*args, **kwargs):
+        result = rank_candidates(*args, **kwargs)
+        if not ranked.is_set():
+            ranked.set()
+            release.wait(10)
+        return result
+
+    monkeypatch.setattr(MemoryService, "_rank_candidates", staticmethod(held_rank_candidates))
+    results = {}
+    before = threading.Thread(target=lambda: results.update(before=search(dopple_id, user_id)))
+    before.start()
+    assert ranked.wait(10)
+
+    MemoryService.store_memory("My favourite dish is a green curry", dopple_id, user_id, "user")
+    after = threading.Thread(target=lambda: results.update(after=search(dopple_id, user_id)))
+    after.start()
+    after.join(0.5)
+    release.set()
+    before.join(10)
+    after.join(10)
+
+    assert len(results["before"]) == 1
+    assert len(results["after"]) == 2
+    # Nothing stale was cached under the new version
+    assert len(search(dopple_id, user_id)) == 2
@@ -0,0 +1,139 @@
+"""Dopple routing across the three SQLite shards of the test configuration, fan-out searches and online moves"""
+import threading
+import time
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from src.backend.db.database import router
+from src.backend.db.sharding import HashRing, ShardMoving, move_dopple, plan_moves
+from src.backend.main import app
+from src.backend.services.memory_service import MemoryService
+
+# s0, s1 and s2 (see conftest.py)
+SHARDS = tuple(router.names)
+
+
+def new_dopple(shard: str) -> str:
+    """A fresh dopple ID that the ring places on the given shard"""
+    while True:
+        dopple_id = f"dopple-{uuid.uuid4().hex[:8]}"
+        if router.ring_shard(dopple_id) == shard:
+            return dopple_id
+
+
+def count_rows(shard: str, dopple_id: str) -> int:
+    with router.engines[shard].connect() as connection:
+        return connection.execute(
+            text("SELECT COUNT(*) FROM memories WHERE dopple_id = :dopple_id"), {"dopple_id": dopple_id}
+        ).scalar()
+
+
+def test_ring_spreads_dopples_and_is_stable():
+    assert len(SHARDS) == 3
+    ring = HashRing(SHARDS)
+    dopples = [f"dopple-{i}" for i in range(3000)]
+    placement = {dopple_id: ring.lookup(dopple_id) for dopple_id in dopples}
+
+    counts = {shard: list(placement.values()).count(shard) for shard in SHARDS}
+    assert all(count > 600 for count in counts.values()), counts
+    assert placement == {dopple_id: HashRing(SHARDS).lookup(dopple_id) for dopple_id in dopples}
+
+    # Adding a shard only moves dopples onto it
+    grown = HashRing(SHARDS + ("s3",))
+    moved = {dopple_id for dopple_id in dopples if grown.lookup(dopple_id) != placement[dopple_id]}
+    assert moved and all(grown.lookup(dopple_id) == "s3" for dopple_id in moved)
+    assert len(moved) < len(dopples) / 2
+
+
+def test_writes_land_on_the_dopples_shard():
+    for shard in SHARDS:
+        dopple_id = new_dopple(shard)
+        MemoryService.store_memory("I keep bees in the garden", dopple_id, "user-1", "user")
+        assert router.shard_for(dopple_id) == shard
+        assert {name: count_rows(name, dopple_id) for name in SHARDS} == {
+            name: int(name == shard) for name in SHARDS
+        }
+
+
+def test_unscoped_search_merges_every_shard():
+    user_id = f"user-{uuid.uuid4().hex[:8]}"
+    stored = {}
+    for shard in SHARDS:
+        dopple_id = new_dopple(shard)
+        for text_ in (f"Notes about sailing from {shard}", f"Notes about chess from {shard}"):
+            stored[MemoryService.store_memory(text_, dopple_id, user_id, "user")] = shard
+
+    results = MemoryService.find_similar_memories(
+        "Notes about sailing", user_id=user_id, top_k=4, similarity_threshold=-1.0
+    )
+
+    assert len(results) == 4
+    similarities = [result["similarity"] for result in results]
+    assert similarities == sorted(similarities, reverse=True)
+    # Each shard returned its own best candidates; the merge keeps the best overall
+    everything = MemoryService.find_similar_memories(
+        "Notes about sailing", user_id=user_id, top_k=10, similarity_threshold=-1.0
+    )
+    assert {result["id"] for result in everything} == set(stored)
+    assert [result["id"] for result in everything[:4]] == [result["id"] for result in results]
+
+
+def test_online_move_freezes_writes_with_503():
+    source = SHARDS[0]
+    dopple_id = new_dopple(source)
+    target = SHARDS[1]
+    for i in range(5):
+        MemoryService.store_memory(f"Memory number {i} about the move", dopple_id, "user-1", "user")
+
+    report = {}
+    mover = threading.Thread(
+        target=lambda: report.update(move_dopple(router, dopple_id, target, drain_seconds=0.5))
+    )
+    mover.start()
+    deadline = time.monotonic() + 10
+    while not router.shard_map.is_frozen(dopple_id):
+        assert time.monotonic() < deadline, "the move never froze the dopple"
+        time.sleep(0.01)
+
+    client = TestClient(app)
+    response = client.post(
+        "/api/memory/store",
+        json={"text": "Written during the move", "dopple_id": dopple_id, "user_id": "user-1", "role": "user"},
+    )
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+    # Searches keep working from the source while writes are frozen
+    assert len(MemoryService.find_similar_memories(
+        "the move", dopple_id, "user-1", top_k=10, similarity_threshold=-1.0
+    )) == 5
+
+    mover.join(timeout=30)
+    assert report["copied"]["memories"] == 5
+    assert not router.shard_map.is_frozen(dopple_id)
+    assert router.shard_for(dopple_id) == target
+    assert count_rows(source, dopple_id) == 0
+    assert count_rows(target, dopple_id) == 5
+    assert {"dopple_id": dopple_id, "from": target, "to": source, "routed_to": target} in plan_moves(router)
+
+    # Writes go to the new shard once the move has finished
+    response = client.post(
+        "/api/memory/store",
+        json={"text": "Written after the move", "dopple_id": dopple_id, "user_id": "user-1", "role": "user"},
+    )
+    assert response.status_code == 200
+    assert count_rows(target, dopple_id) == 6
+
+
+def test_writes_to_a_frozen_dopple_raise_shard_moving():
+    dopple_id = new_dopple(SHARDS[2])
+    router.shard_map.update(freeze=[dopple_id])
+    try:
+        with pytest.raises(ShardMoving) as moving:
+            MemoryService.store_memory("Should not be written", dopple_id, "user-1", "user")
+        assert moving.value.dopple_id == dopple_id
+    finally:
+        router.shard_map.update(thaw=[dopple_id])
+    assert count_rows(SHARDS[2], dopple_id) == 0
@@ -0,0 +1,94 @@
+"""Memory-mapped vector files follow writes made by other nodes and while a node was down"""
+import json
+import os
+import subprocess
+import sys
+import uuid
+
+from src.backend.services.memory_service import MemoryService
+
+SEARCH = """
+import json, os, sys, time
+from src.backend.db.database import get_db
+from src.backend.services.embedding_model_service import EmbeddingModelService
+from src.backend.services.memory_service import MemoryService
+from src.backend.services.search_cache import read_version
+from src.backend.services.shared_vector_store import shared_vector_store
+
+dopple_id, user_id = {dopple_id!r}, {user_id!r}
+model = EmbeddingModelService.get_active_model()
+
+def search():
+    return len(MemoryService.find_similar_memories("cooking", dopple_id, user_id, top_k=20, similarity_threshold=-1.0))
+
+def state():
+    with get_db(dopple_id=dopple_id) as db:
+        return {{"results": search(), "file": shared_vector_store.version((dopple_id, user_id), model),
+                 "db": read_version(db, dopple_id, user_id)}}
+
+{body}
+"""
+
+
+def run(code: str, store_dir, **env) -> list:
+    completed = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, timeout=60,
+        env={**os.environ, "VECTOR_STORE_DIR": str(store_dir), **env},
+    )
+    assert completed.returncode == 0, completed.stderr
+    return [json.loads(line) for line in completed.stdout.splitlines() if line.startswith("{")]
+
+
+def test_files_are_rebuilt_after_writes_elsewhere(tmp_path):
+    dopple_id, user_id = f"dopple-{uuid.uuid4().hex[:8]}", "user-1"
+    store_dir = tmp_path / "vectors"
+    MemoryService.store_memory("I cook risotto", dopple_id, user_id, "user")
+    MemoryService.store_memory("I cook dumplings", dopple_id, user_id, "user")
+
+    first = SEARCH.format(dopple_id=dopple_id, user_id=user_id, body="print(json.dumps(state()))")
+    [built] = run(first, store_dir)
+    assert built["results"] == 2
+    assert built["file"] == built["db"]
+
+    # Written by a node without this store (here: the test process) while the node was down
+    MemoryService.store_memory("I cook ramen", dopple_id, user_id, "user")
+
+    restarted = SEARCH.format(dopple_id=dopple_id, user_id=user_id, body="""
+print(json.dumps(state()))
+MemoryService.store_memory("I cook paella", dopple_id, user_id, "user")
+print(json.dumps(state()))
+""")
+    after_restart, after_local_write = run(restarted, store_dir)
+    assert after_restart["results"] == 3
+    assert after_restart["file"] == after_restart["db"]
+    # A local write is appended and advances the file's version instead of forcing a rebuild
+    assert after_local_write["results"] == 4
+    assert after_local_write["file"] == after_local_write["db"] == after_restart["db"] + 1
+
+
+def test_running_worker_sees_writes_from_another_node(tmp_path):
+    dopple_id, user_id = f"dopple-{uuid.uuid4().hex[:8]}", "user-1"
+    MemoryService.store_memory("I cook curry", dopple_id, user_id, "user")
+    flag = tmp_path / "written"
+
+    worker = subprocess.Popen(
+        [sys.executable, "-c", SEARCH.format(dopple_id=dopple_id, user_id=user_id, body=f"""
+print(json.dumps(state()), flush=True)
+while not os.path.exists({str(flag)!r}):
+    time.sleep(0.01)
+print(json.dumps(state()), flush=True)
+""")],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+        env={**os.environ, "VECTOR_STORE_DIR": str(tmp_path / "vectors")},
+    )
+    try:
+        before = json.loads(worker.stdout.readline())
+        MemoryService.store_memory("I cook pho", dopple_id, user_id, "user")
+        flag.touch()
+        after = json.loads(worker.stdout.readline())
+    finally:
+        worker.wait(30)
+    assert worker.returncode == 0, worker.stderr.read()
+    assert before["results"] == 1
+    assert after["results"] == 2
+    assert after["file"] == after["db"] == before["db"] + 1
@@ -0,0 +1,86 @@
+"""Concurrent identical calls run once and are counted as executed or coalesced"""
+import threading
+import time
+import uuid
+
+import pytest
+
+from src.backend.services.single_flight import SingleFlight, get_stats
+
+
+def wait_for(condition, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition never became true"
+        time.sleep(0.005)
+
+
+def test_identical_calls_in_flight_are_coalesced_and_counted():
+    flight = SingleFlight(f"test-{uuid.uuid4().hex[:8]}", enabled=True)
+    release = threading.Event()
+    runs = []
+
+    def slow():
+        runs.append(1)
+        release.wait(10)
+        return ["result"]
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(flight.do("key", slow, share=list)))
+        for _ in range(5)
+    ]
+    threads[0].start()
+    wait_for(lambda: flight.in_flight() == 1)
+    for thread in threads[1:]:
+        thread.start()
+    wait_for(lambda: flight.stats()["coalesced"] == 4)
+    # A different key is not held up by the call in flight
+    assert flight.do("other", lambda: "other") == "other"
+    release.set()
+    for thread in threads:
+        thread.join(10)
+
+    assert len(runs) == 1
+    assert results == [["result"]] * 5
+    # Followers get their own copy of a mutable result
+    assert len({id(result) for result in results}) == 5
+    assert flight.stats() == {"in_flight": 0, "executed": 2, "coalesced": 4}
+    assert get_stats()[flight.operation] == flight.stats()
+
+    # Nothing is cached once the call has returned
+    assert flight.do("key", lambda: ["again"]) == ["again"]
+    assert flight.stats()["executed"] == 3
+
+
+def test_followers_receive_the_leaders_exception():
+    flight = SingleFlight(f"test-{uuid.uuid4().hex[:8]}", enabled=True)
+    release = threading.Event()
+    errors = []
+
+    def failing():
+        release.wait(10)
+        raise ValueError("provider down")
+
+    def call():
+        with pytest.raises(ValueError):
+            flight.do("key", failing)
+        errors.append(1)
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    threads[0].start()
+    wait_for(lambda: flight.in_flight() == 1)
+    for thread in threads[1:]:
+        thread.start()
+    wait_for(lambda: flight.stats()["coalesced"] == 2)
+    release.set()
+    for thread in threads:
+        thread.join(10)
+    assert len(errors) == 3
+    assert flight.stats() == {"in_flight": 0, "executed": 1, "coalesced": 2}
+
+
+def test_disabled_flight_runs_every_call():
+    flight = SingleFlight(f"test-{uuid.uuid4().hex[:8]}", enabled=False)
+    assert flight.do("key", lambda: 1) == 1
+    assert flight.stats() == {"in_flight": 0, "executed": 0, "coalesced": 0}
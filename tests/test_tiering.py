@@ -0,0 +1,87 @@
+"""Cold segments follow writes made by other nodes, and rebalances share one run slot"""
+import json
+import os
+import subprocess
+import sys
+import uuid
+from datetime import datetime, timedelta
+
+from src.backend.db.database import session_scope
+from src.backend.models.semantic_memory import SchedulerLease
+from src.backend.services import scheduler_lease
+from src.backend.services.memory_service import MemoryService
+from src.backend.services.scheduler_lease import claim_run
+from src.backend.services.tiering_service import TieringService
+
+SEARCH = """
+import glob, json, os
+from src.backend.services.memory_service import MemoryService
+
+dopple_id, user_id = {dopple_id!r}, {user_id!r}
+
+def state():
+    results = MemoryService.find_similar_memories("cooking", dopple_id, user_id, top_k=20, similarity_threshold=-1.0)
+    segments = [path for path in glob.glob(os.path.join(os.environ["COLD_SEGMENT_DIR"], "*", "*.npz"))
+                if not path.endswith(".tomb.npz")]
+    return {{"results": len(results), "mtimes": sorted(os.stat(path).st_mtime_ns for path in segments)}}
+
+{body}
+"""
+
+
+def run(code: str, segment_dir) -> list:
+    completed = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, timeout=60,
+        env={**os.environ, "COLD_SEGMENT_DIR": str(segment_dir)},
+    )
+    assert completed.returncode == 0, completed.stderr
+    return [json.loads(line) for line in completed.stdout.splitlines() if line.startswith("{")]
+
+
+def demote_all(dopple_id: str):
+    TieringService.rebalance(dopple_id, max_age_days=-1, min_importance=11)
+
+
+def test_cold_segments_are_rebuilt_after_writes_elsewhere(tmp_path):
+    dopple_id, user_id = f"dopple-{uuid.uuid4().hex[:8]}", "user-1"
+    segment_dir = tmp_path / "segments"
+    MemoryService.store_memory("I cook risotto", dopple_id, user_id, "user")
+    MemoryService.store_memory("I cook dumplings", dopple_id, user_id, "user")
+    demote_all(dopple_id)
+
+    [built] = run(SEARCH.format(dopple_id=dopple_id, user_id=user_id, body="print(json.dumps(state()))"), segment_dir)
+    assert built["results"] == 2
+    assert len(built["mtimes"]) == 1
+
+    # Demoted by a node without the segment store while this one was down
+    MemoryService.store_memory("I cook ramen", dopple_id, user_id, "user")
+    demote_all(dopple_id)
+
+    restarted = SEARCH.format(dopple_id=dopple_id, user_id=user_id, body="""
+print(json.dumps(state()))
+MemoryService.store_memory("I cook paella", dopple_id, user_id, "user")
+print(json.dumps(state()))
+""")
+    after_restart, after_local_write = run(restarted, segment_dir)
+    assert after_restart["results"] == 3
+    assert after_restart["mtimes"] != built["mtimes"]
+    # A local hot-tier write advances the segment's version instead of forcing a rebuild
+    assert after_local_write["results"] == 4
+    assert after_local_write["mtimes"] == after_restart["mtimes"]
+
+
+def test_one_worker_takes_each_run_slot(monkeypatch):
+    name = f"job-{uuid.uuid4().hex[:8]}"
+    assert claim_run(name, 60)
+    assert not claim_run(name, 60)
+
+    monkeypatch.setattr(scheduler_lease, "_worker_id", "other-worker")
+    assert not claim_run(name, 60)
+
+    with session_scope() as db:
+        db.query(SchedulerLease).filter(SchedulerLease.name == name).update(
+            {SchedulerLease.lease_expires_at: datetime.utcnow() - timedelta(seconds=1)}
+        )
+    assert claim_run(name, 60)
+    with session_scope() as db:
+        assert db.query(SchedulerLease).filter(SchedulerLease.name == name).one().lease_owner == "other-worker"
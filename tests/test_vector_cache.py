@@ -0,0 +1,89 @@
+"""Cached vector matrices follow local appends and deletes, and are reloaded after writes by other processes"""
+import uuid
+from datetime import datetime
+
+import numpy as np
+
+from src.backend.db.database import get_db
+from src.backend.services.deletion_service import DeletionService
+from src.backend.services.memory_service import MemoryService
+from src.backend.services.search_cache import read_version
+from src.backend.services.vector_cache import VectorSet, vector_cache
+from src.backend.services.vector_search import VectorRows, normalize
+
+STORE = """
+from src.backend.services.memory_service import MemoryService
+MemoryService.store_memory("I cook in another worker", {dopple_id!r}, {user_id!r}, "user")
+"""
+
+
+def search(dopple_id: str, user_id: str) -> set:
+    results = MemoryService.find_similar_memories(
+        f"cooking {uuid.uuid4().hex}", dopple_id, user_id, top_k=20, similarity_threshold=-1.0
+    )
+    return {result["id"] for result in results}
+
+
+def version(dopple_id: str, user_id: str) -> int:
+    with get_db(dopple_id=dopple_id) as db:
+        return read_version(db, dopple_id, user_id)
+
+
+def test_vector_set_appends_tombstones_and_compacts():
+    rng = np.random.default_rng(0)
+    matrix = np.stack([normalize(rng.standard_normal(8)) for _ in range(3)])
+    vector_set = VectorSet(VectorRows(["a", "b", "c"], matrix, np.zeros(3), np.full(3, 5, dtype=np.float32)))
+
+    for memory_id in ("d", "e"):
+        vector_set.append(memory_id, normalize(rng.standard_normal(8)), 1.0, 7.0)
+    assert len(vector_set) == 5
+    before = vector_set.snapshot()
+
+    assert vector_set.delete(["b", "d", "missing"]) == 2
+    assert vector_set.delete(["b"]) == 0
+    snapshot = vector_set.snapshot()
+    assert list(snapshot.ids) == ["a", "b", "c", "d", "e"]
+    assert snapshot.deleted.tolist() == [False, True, False, True, False]
+    # Earlier snapshots are not changed by later tombstones
+    assert before.deleted is None
+
+    vector_set.compact()
+    snapshot = vector_set.snapshot()
+    assert list(snapshot.ids) == ["a", "c", "e"]
+    assert snapshot.deleted is None
+    assert np.allclose(snapshot.matrix[:2], matrix[[0, 2]])
+    assert snapshot.importance.tolist() == [5, 5, 7]
+
+
+def test_entries_follow_local_writes_and_revalidate_against_other_writers(run_python):
+    dopple_id, user_id = f"dopple-{uuid.uuid4().hex[:8]}", "user-1"
+    first = MemoryService.store_memory("I cook risotto", dopple_id, user_id, "user")
+    second = MemoryService.store_memory("I cook dumplings", dopple_id, user_id, "user")
+    assert search(dopple_id, user_id) == {first, second}
+    entry = vector_cache._entries[(dopple_id, user_id)]
+    assert entry.version == version(dopple_id, user_id)
+
+    # A local write is appended to the loaded entry and advances its version
+    third = MemoryService.store_memory("I cook ramen", dopple_id, user_id, "user")
+    assert vector_cache._entries[(dopple_id, user_id)] is entry
+    assert len(entry) == 3
+    assert entry.version == version(dopple_id, user_id)
+    assert search(dopple_id, user_id) == {first, second, third}
+
+    # A local delete tombstones the row instead of dropping the entry
+    created = datetime.fromisoformat(MemoryService.get_memory(third)["timestamp"])
+    assert DeletionService.delete_memories(dopple_id=dopple_id, user_id=user_id, start_date=created)["memories"] == 1
+    assert vector_cache._entries[(dopple_id, user_id)] is entry
+    assert entry.dead == 1
+    assert entry.version == version(dopple_id, user_id)
+    assert search(dopple_id, user_id) == {first, second}
+
+    # A write by another process is not seen by the commit hooks; the version tells
+    stale = vector_cache.stale
+    run_python(STORE.format(dopple_id=dopple_id, user_id=user_id))
+    found = search(dopple_id, user_id)
+    assert len(found) == 3 and {first, second} < found
+    assert vector_cache.stale == stale + 1
+    reloaded = vector_cache._entries[(dopple_id, user_id)]
+    assert reloaded is not entry
+    assert reloaded.version == version(dopple_id, user_id)
@@ -0,0 +1,57 @@
+"""Vector scoring kernels return the same results as a plain full scan"""
+import numpy as np
+import pytest
+
+from src.backend.services import vector_search
+from src.backend.services.vector_search import (
+    VectorRows, normalize, normalize_rows, relevance_top_k, relevance_weights, score_top_k, top_k,
+)
+
+
+def random_rows(count: int, dim: int = 32, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    return normalize_rows(rng.standard_normal((count, dim)).astype(np.float32)), normalize(rng.standard_normal(dim))
+
+
+@pytest.mark.parametrize("k, threshold", [(10, -1.0), (1, -1.0), (50, 0.1), (5000, -1.0)])
+def test_sharded_scoring_matches_single_threaded_top_k(monkeypatch, k, threshold):
+    monkeypatch.setattr(vector_search, "SCORING_WORKERS", 4)
+    matrix, query = random_rows(1001)
+    deleted = np.zeros(len(matrix), dtype=bool)
+    deleted[::7] = True
+
+    for tombstones in (None, deleted):
+        expected_indices, expected_scores = top_k(vector_search.mask_deleted(matrix @ query, tombstones), k, threshold)
+        indices, scores = score_top_k(matrix, query, k, threshold, parallel_threshold=2, deleted=tombstones)
+        assert indices.tolist() == expected_indices.tolist()
+        assert np.allclose(scores, expected_scores)
+        if tombstones is not None:
+            assert not tombstones[indices].any()
+
+
+@pytest.mark.parametrize("half_life_days, importance_weight, threshold", [
+    (30.0, 0.0, -1.0), (None, 0.5, -1.0), (7.0, 0.3, 0.0), (1.0, 1.0, 0.2),
+])
+def test_bucket_pruning_returns_the_full_scan_top_k(half_life_days, importance_weight, threshold):
+    count, now = 5000, 1_700_000_000.0
+    matrix, query = random_rows(count, seed=3)
+    rng = np.random.default_rng(4)
+    # Stored oldest first, one hour apart, with random importance
+    timestamps = now - 3600.0 * np.arange(count, 0, -1)
+    importance = rng.integers(1, 11, count).astype(np.float32)
+    deleted = np.zeros(count, dtype=bool)
+    deleted[-50:] = True
+    rows = VectorRows([str(i) for i in range(count)], matrix, timestamps, importance, deleted)
+
+    similarities = matrix @ query
+    full = similarities * relevance_weights(timestamps, importance, now, half_life_days, importance_weight)
+    full = vector_search.mask_deleted(np.where(similarities >= threshold, full, -np.inf), deleted)
+    expected_indices, expected_scores = top_k(full, 10, -np.inf)
+
+    for bucket_size in (64, 1000, count):
+        indices, scores, found_similarities = relevance_top_k(
+            rows, query, 10, threshold, now, half_life_days, importance_weight, bucket_size=bucket_size
+        )
+        assert indices.tolist() == expected_indices.tolist()
+        assert np.allclose(scores, expected_scores)
+        assert np.allclose(found_similarities, similarities[indices])
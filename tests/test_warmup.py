@@ -0,0 +1,44 @@
+"""/ready keeps a starting worker out of rotation until its caches are warm"""
+import json
+
+WORKER = """
+import json, threading
+from fastapi.testclient import TestClient
+from src.backend.main import app
+from src.backend.services import warmup_service
+from src.backend.services.memory_service import MemoryService
+from src.backend.services.warmup_service import WarmupService
+
+MemoryService.store_memory("I water the plants on Sundays", "dopple-warm", "user-1", "user")
+
+release = threading.Event()
+warm_scope = WarmupService.warm_scope
+def held(*args):
+    release.wait(30)
+    return warm_scope(*args)
+WarmupService.warm_scope = staticmethod(held)
+
+with TestClient(app) as client:
+    warming = client.get("/ready")
+    print(json.dumps({"status_code": warming.status_code, "body": warming.json()}))
+    release.set()
+    warmup_service._warmup_thread.join(30)
+    ready = client.get("/ready")
+    print(json.dumps({"status_code": ready.status_code, "body": ready.json()}))
+"""
+
+
+def test_ready_returns_503_until_warmup_finishes(run_python):
+    output = run_python(WORKER, env={"WARMUP_ENABLED": "true", "WARMUP_CONCURRENCY": "1"})
+    warming, ready = [json.loads(line) for line in output.splitlines() if line.startswith("{")]
+
+    assert warming["status_code"] == 503
+    assert warming["body"]["status"] == "warming"
+    assert warming["body"]["database"] is True
+    assert warming["body"]["warmup"]["status"] in ("pending", "running")
+    assert warming["body"]["warmup"]["ready"] is False
+
+    assert ready["status_code"] == 200
+    assert ready["body"]["status"] == "ready"
+    assert ready["body"]["warmup"]["status"] == "completed"
+    assert ready["body"]["warmup"]["scopes_warmed"] >= 1